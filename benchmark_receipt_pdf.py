@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark for receipt PDF generation
+Compares rebuilding the ReportLab template per receipt with the reusable one
+"""
+import os
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'it_store.settings')
+django.setup()
+
+import sys
+import time
+import tracemalloc
+
+from store.models import Order, OrderItem, Payment, Product, Category
+from store.pdf_utils import ReceiptTemplate, get_receipt_template
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+User = get_user_model()
+
+ITERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+
+def create_test_payment():
+    """Create a test payment with a few order lines"""
+    user, created = User.objects.get_or_create(
+        email='test@example.com',
+        defaults={
+            'first_name': 'Test',
+            'last_name': 'User',
+            'user_type': 'customer'
+        }
+    )
+    category, created = Category.objects.get_or_create(
+        name='Test Category',
+        defaults={
+            'description': 'Test category for PDF generation',
+            'slug': 'test-category'
+        }
+    )
+    order = Order.objects.create(
+        customer=user,
+        order_number=f"BENCH-{timezone.now().strftime('%Y%m%d%H%M%S')}",
+        status='confirmed',
+        shipping_address='Test Address, Test City',
+        contact_phone='+212 6 00 00 00 00',
+        contact_email='test@example.com',
+        subtotal=300.00,
+        tax_amount=0.00,
+        shipping_cost=0.00,
+        total_amount=300.00
+    )
+    for i in range(3):
+        product, created = Product.objects.get_or_create(
+            sku=f'TEST-BENCH-{i}',
+            defaults={
+                'name': f'Benchmark Product {i}',
+                'description': 'Benchmark product',
+                'price': 100.00,
+                'stock_quantity': 10,
+                'category': category,
+                'slug': f'test-bench-product-{i}'
+            }
+        )
+        OrderItem.objects.create(order=order, product=product, quantity=1, unit_price=100.00, total_price=100.00)
+    payment = Payment.objects.create(
+        order=order,
+        payment_method='credit_card',
+        amount=300.00,
+        status='completed',
+        card_last_four='4242',
+        card_brand='visa',
+        processed_at=timezone.now()
+    )
+    return payment, order
+
+
+def measure(label, render, payment, order):
+    """Time ``render`` and trace the memory it allocates per receipt"""
+    render(payment, order)  # warm up imports and font metrics
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        render(payment, order)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / ITERATIONS
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    allocated = 0
+    for _ in range(ITERATIONS):
+        tracemalloc.reset_peak()
+        render(payment, order)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    print(f"  {label:<28} {elapsed_ms:8.2f} ms/receipt {allocated / ITERATIONS / 1024:10.1f} KB/receipt")
+    return elapsed_ms
+
+
+def benchmark_receipts():
+    """Benchmark receipt rendering"""
+    print("⏱️  Receipt PDF micro-benchmark")
+    print("=" * 70)
+    print(f"  {ITERATIONS} receipts per run (peak KB allocated while rendering)\n")
+
+    payment, order = create_test_payment()
+    try:
+        fresh = measure("template rebuilt per receipt", lambda p, o: ReceiptTemplate().render(p, o), payment, order)
+        cached = measure("reusable template", lambda p, o: get_receipt_template().render(p, o), payment, order)
+        print(f"\n  ✅ Speed-up: {fresh / cached:.2f}x")
+    finally:
+        payment.delete()
+        order.delete()
+
+
+if __name__ == '__main__':
+    benchmark_receipts()
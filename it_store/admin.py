@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path
 from django.shortcuts import redirect
 from store.admin_views import admin_dashboard
+from support.admin_views import support_dashboard
 
 
 class KeyReportAdminSite(admin.AdminSite):
@@ -16,6 +17,7 @@ class KeyReportAdminSite(admin.AdminSite):
         urls = super().get_urls()
         custom_urls = [
             path('store-dashboard/', self.admin_view(admin_dashboard), name='store_dashboard'),
+            path('support-dashboard/', self.admin_view(support_dashboard), name='support_dashboard'),
         ]
         return custom_urls + urls
     
@@ -2,7 +2,11 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import Category, Product, ProductImage, Order, OrderItem, Cart, CartItem, Payment, Wishlist, ProductReview
+from .inventory import InventoryService
+from .shipping import ShippingService
+from .models import Category, Product, ProductImage, Order, OrderItem, Cart, CartItem, Payment, Wishlist, ProductReview, DocumentSequence, IdempotencyKey, StockMovement, LowStockAlert, PaymentJob, PaymentEvent, WebhookEvent
+from .stock_alerts import LowStockService
+from .webhooks import WebhookService
 
 
 @admin.register(Category)
@@ -42,6 +46,21 @@ class ProductImageAdmin(admin.ModelAdmin):
     image_preview.short_description = 'Preview'
 
 
+class LowStockFilter(admin.SimpleListFilter):
+    """Filter products at or below their minimum stock level."""
+    
+    title = 'stock level'
+    parameter_name = 'low_stock'
+    
+    def lookups(self, request, model_admin):
+        return (('yes', 'Low stock'),)
+    
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.filter(id__in=LowStockService.low_stock_products(active_only=False).values('id'))
+        return queryset
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     """Admin configuration for Product model."""
@@ -51,7 +70,7 @@ class ProductAdmin(admin.ModelAdmin):
         'average_rating_display', 'total_reviews_display', 'is_active', 'is_featured', 'condition', 'created_at'
     )
     list_filter = (
-        'category', 'is_active', 'is_featured', 'condition', 
+        LowStockFilter, 'category', 'is_active', 'is_featured', 'condition', 
         'brand', 'created_at'
     )
     search_fields = ('name', 'sku', 'description', 'brand', 'model')
@@ -67,7 +86,7 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('price', 'sale_price', 'sku', 'stock_quantity', 'min_stock_level')
         }),
         ('Product Details', {
-            'fields': ('brand', 'model', 'condition', 'warranty_months')
+            'fields': ('brand', 'model', 'condition', 'warranty_months', 'weight_kg')
         }),
         ('Images', {
             'fields': ('main_image', 'additional_images')
@@ -111,6 +130,18 @@ class ProductAdmin(admin.ModelAdmin):
             return format_html('<a href="{}">{} reviews</a>', url, count)
         return '0 reviews'
     total_reviews_display.short_description = 'Reviews'
+    
+    def save_model(self, request, obj, form, change):
+        """Save product and record stock changes in the stock ledger."""
+        old_quantity = form.initial.get('stock_quantity', 0) if change else 0
+        super().save_model(request, obj, form, change)
+        if not change or 'stock_quantity' in form.changed_data:
+            InventoryService.record_adjustment(
+                obj, old_quantity, obj.stock_quantity,
+                reason='adjustment' if change else 'initial',
+                reference='admin',
+                user=request.user,
+            )
 
 
 class OrderItemInline(admin.TabularInline):
@@ -166,6 +197,19 @@ class OrderAdmin(admin.ModelAdmin):
         super().save_formset(request, form, formset, change)
         if formset.model == OrderItem:
             form.instance.calculate_total()
+    
+    actions = ['requote_shipping']
+    
+    def requote_shipping(self, request, queryset):
+        """Recalculate shipping of selected pending orders from the rate table."""
+        orders = list(queryset.filter(status='pending'))
+        quotes = ShippingService.quote_orders(orders)
+        for order in orders:
+            order.shipping_cost = quotes[order.id]
+            order.total_amount = order.subtotal + order.tax_amount + order.shipping_cost
+        Order.objects.bulk_update(orders, ['shipping_cost', 'total_amount'])
+        self.message_user(request, f'Shipping recalculated for {len(orders)} pending orders.')
+    requote_shipping.short_description = 'Recalculate shipping for selected pending orders'
 
 
 @admin.register(Cart)
@@ -203,6 +247,19 @@ class CartItemAdmin(admin.ModelAdmin):
     total_price.short_description = 'Total Price'
 
 
+class PaymentEventInline(admin.TabularInline):
+    """Read-only event history shown on the payment page."""
+    model = PaymentEvent
+    extra = 0
+    can_delete = False
+    fields = ('created_at', 'event_type', 'gateway', 'amount', 'external_id', 'payload')
+    readonly_fields = fields
+    ordering = ('created_at', 'id')
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     """Admin configuration for Payment model."""
@@ -212,16 +269,17 @@ class PaymentAdmin(admin.ModelAdmin):
         'transaction_id', 'created_at'
     )
     list_filter = ('payment_method', 'status', 'created_at')
-    search_fields = ('order__order_number', 'transaction_id', 'order__customer__email')
-    readonly_fields = ('created_at', 'processed_at')
+    search_fields = ('order__order_number', 'transaction_id', 'receipt_number', 'order__customer__email')
+    readonly_fields = ('receipt_number', 'created_at', 'processed_at')
     list_editable = ('status',)
+    inlines = [PaymentEventInline]
     
     fieldsets = (
         (None, {
             'fields': ('order', 'payment_method', 'amount', 'status')
         }),
         ('Transaction Details', {
-            'fields': ('transaction_id', 'processor_response')
+            'fields': ('transaction_id', 'receipt_number')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'processed_at'),
@@ -292,3 +350,124 @@ class ProductReviewAdmin(admin.ModelAdmin):
         updated = queryset.update(is_approved=False)
         self.message_user(request, f'{updated} reviews were disapproved.')
     disapprove_reviews.short_description = 'Disapprove selected reviews'
+
+
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    """Admin configuration for DocumentSequence model."""
+    
+    list_display = ('name', 'next_value', 'updated_at')
+    search_fields = ('name',)
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    """Admin configuration for IdempotencyKey model."""
+    
+    list_display = ('key', 'user', 'request_path', 'status', 'response_status', 'created_at', 'expires_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('key', 'user__email', 'request_path')
+    readonly_fields = ('created_at',)
+    exclude = ('response_body',)
+    list_select_related = ('user',)
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """Admin configuration for StockMovement model (read-only ledger)."""
+    
+    list_display = ('product', 'quantity_delta', 'reason', 'reference', 'order', 'created_by', 'created_at')
+    list_filter = ('reason', 'created_at')
+    search_fields = ('product__name', 'product__sku', 'reference', 'order__order_number')
+    date_hierarchy = 'created_at'
+    list_select_related = ('product', 'order', 'created_by')
+    raw_id_fields = ('product', 'order', 'created_by')
+    
+    def has_add_permission(self, request):
+        # Movements are written by InventoryService, which applies them to stock
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LowStockAlert)
+class LowStockAlertAdmin(admin.ModelAdmin):
+    """Admin configuration for LowStockAlert model."""
+    
+    list_display = ('product', 'event_type', 'stock_quantity', 'min_stock_level', 'is_acknowledged', 'acknowledged_by', 'created_at')
+    list_filter = ('event_type', 'is_acknowledged', 'created_at')
+    search_fields = ('product__name', 'product__sku')
+    readonly_fields = ('product', 'event_type', 'stock_quantity', 'min_stock_level', 'acknowledged_by', 'acknowledged_at', 'created_at')
+    list_select_related = ('product', 'acknowledged_by')
+    
+    actions = ['acknowledge_alerts']
+    
+    def acknowledge_alerts(self, request, queryset):
+        """Acknowledge selected alerts."""
+        updated = LowStockService.acknowledge(queryset, request.user)
+        self.message_user(request, f'{updated} alerts were acknowledged.')
+    acknowledge_alerts.short_description = 'Acknowledge selected alerts'
+
+
+@admin.register(PaymentJob)
+class PaymentJobAdmin(admin.ModelAdmin):
+    """Admin configuration for PaymentJob model."""
+    
+    list_display = ('id', 'payment', 'status', 'stage', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'stage', 'created_at')
+    search_fields = ('payment__order__order_number', 'payment__transaction_id')
+    readonly_fields = ('payment', 'gateway_kwargs', 'result', 'error', 'receipt', 'attempts', 'created_at', 'started_at', 'finished_at')
+    list_select_related = ('payment__order',)
+    
+    actions = ['requeue_jobs']
+    
+    def requeue_jobs(self, request, queryset):
+        """Requeue selected failed jobs."""
+        updated = queryset.filter(status='failed').update(status='queued', stage='queued', error='')
+        self.message_user(request, f'{updated} jobs were requeued.')
+    requeue_jobs.short_description = 'Requeue selected failed jobs'
+
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    """Admin configuration for PaymentEvent model."""
+    
+    list_display = ('created_at', 'payment', 'event_type', 'gateway', 'amount', 'external_id')
+    list_filter = ('event_type', 'gateway', 'created_at')
+    search_fields = ('payment__order__order_number', 'payment__transaction_id', 'external_id')
+    readonly_fields = ('payment', 'event_type', 'gateway', 'amount', 'currency', 'external_id', 'payload', 'created_at')
+    list_select_related = ('payment__order',)
+    date_hierarchy = 'created_at'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    """Admin configuration for WebhookEvent model."""
+    
+    list_display = ('event_id', 'processor', 'event_type', 'status', 'attempts', 'received_at', 'applied_at')
+    list_filter = ('status', 'processor', 'event_type', 'received_at')
+    search_fields = ('event_id',)
+    readonly_fields = ('event_id', 'processor', 'event_type', 'payload', 'error', 'attempts', 'received_at', 'applied_at')
+    date_hierarchy = 'received_at'
+    
+    actions = ['retry_events']
+    
+    def retry_events(self, request, queryset):
+        """Put selected failed events back in the inbox."""
+        updated = WebhookService.retry_failed(queryset)
+        self.message_user(request, f'{updated} webhook events were requeued.')
+    retry_events.short_description = 'Retry selected failed events'
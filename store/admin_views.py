@@ -1,9 +1,16 @@
 from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse, StreamingHttpResponse
 from django.db.models import Count, Avg, Sum
 from django.utils import timezone
-from datetime import timedelta
+import logging
+from datetime import datetime, timedelta
 from .models import Product, Order, OrderItem, ProductReview, Wishlist, Category
+from .payment_events import PaymentEventService
+from .receipt_export import ReceiptExportService
+from .stock_alerts import LowStockService
+
+logger = logging.getLogger(__name__)
 
 
 @staff_member_required
@@ -32,6 +39,11 @@ def admin_dashboard(request):
     weekly_revenue = sum(order.total_amount for order in orders_this_week)
     monthly_revenue = sum(order.total_amount for order in orders_this_month)
     
+    # Money actually moved, from the payment event log
+    payment_totals = PaymentEventService.totals(timezone.now() - timedelta(days=30))
+    monthly_collected = payment_totals.get('charge_succeeded', {}).get('total', 0)
+    monthly_refunded = payment_totals.get('refund_succeeded', {}).get('total', 0)
+    
     # Top products by sales
     top_products = Product.objects.annotate(
         total_sold=Sum('orderitem__quantity')
@@ -63,6 +75,10 @@ def admin_dashboard(request):
         count=Count('id')
     ).order_by('-count')
     
+    # Low stock
+    low_stock_products = LowStockService.low_stock_products().select_related('category')[:10]
+    low_stock_alerts = LowStockService.open_alerts(limit=10)
+    
     context = {
         'total_products': total_products,
         'total_orders': total_orders,
@@ -70,6 +86,9 @@ def admin_dashboard(request):
         'total_wishlist_items': total_wishlist_items,
         'weekly_revenue': weekly_revenue,
         'monthly_revenue': monthly_revenue,
+        'monthly_collected': monthly_collected,
+        'monthly_refunded': monthly_refunded,
+        'payment_totals': payment_totals,
         'recent_orders': recent_orders,
         'recent_reviews': recent_reviews,
         'top_products': top_products,
@@ -77,13 +96,65 @@ def admin_dashboard(request):
         'category_stats': category_stats,
         'review_stats': review_stats,
         'order_status_stats': order_status_stats,
+        'low_stock_products': low_stock_products,
+        'low_stock_alerts': low_stock_alerts,
     }
     
     return render(request, 'admin/store_dashboard.html', context)
 
 
+@staff_member_required
+def low_stock_feed(request):
+    """JSON feed of low-stock products and unacknowledged alerts."""
+    try:
+        limit = min(int(request.GET.get('limit', 50)), 500)
+    except ValueError:
+        limit = 50
+    
+    products = LowStockService.low_stock_products().values(
+        'id', 'sku', 'name', 'stock_quantity', 'min_stock_level'
+    )[:limit]
+    alerts = LowStockService.open_alerts(limit=limit).values(
+        'id', 'product_id', 'product__name', 'event_type',
+        'stock_quantity', 'min_stock_level', 'created_at'
+    )
+    
+    return JsonResponse({
+        'products': [
+            dict(product, reorder_quantity=LowStockService.reorder_quantity(
+                product['stock_quantity'], product['min_stock_level']
+            ))
+            for product in products
+        ],
+        'alerts': list(alerts),
+    })
 
 
-
-
-
+@staff_member_required
+def export_receipts(request):
+    """ZIP of the receipts matching the since/until/customer/method filters."""
+    filters = {}
+    for name in ('since', 'until'):
+        value = request.GET.get(name)
+        if value:
+            try:
+                filters[name] = timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+            except ValueError:
+                return JsonResponse({'error': f'{name} must be YYYY-MM-DD'}, status=400)
+    payments = ReceiptExportService.payments(
+        customer=request.GET.get('customer') or None,
+        payment_method=request.GET.get('method') or None,
+        **filters
+    )
+    
+    def progress(done, total, per_worker):
+        if done == total:
+            logger.info('Receipt export for %s: %s receipts from %s workers', request.user, total, len(per_worker))
+    
+    response = StreamingHttpResponse(
+        # Rendered serially: the pool is for the export_receipts command only
+        ReceiptExportService.stream_zip(payments, workers=1, progress=progress),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = f'attachment; filename="receipts_{timezone.now():%Y%m%d_%H%M}.zip"'
+    return response
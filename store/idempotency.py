@@ -0,0 +1,133 @@
+"""
+Idempotency support for checkout and payment submissions
+Replays the stored result of a POST when the same idempotency key is sent again
+"""
+
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+IDEMPOTENCY_FIELD = 'idempotency_key'
+
+# Response headers kept so a replay looks like the original response
+REPLAYED_HEADERS = ('Content-Type', 'Content-Disposition', 'Location')
+
+# Larger bodies are not stored; the key still prevents re-execution
+MAX_STORED_BODY = 5 * 1024 * 1024
+
+
+def get_idempotency_ttl() -> timedelta:
+    """How long a key (and its stored response) stays valid."""
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def get_request_key(request):
+    """Read the idempotency key from the header or the submitted form."""
+    key = request.META.get(IDEMPOTENCY_HEADER) or request.POST.get(IDEMPOTENCY_FIELD)
+    if key:
+        return key.strip()[:64]
+    return None
+
+
+def replay_response(record: IdempotencyKey) -> HttpResponse:
+    """Rebuild the response stored for ``record``."""
+    response = HttpResponse(
+        bytes(record.response_body),
+        status=record.response_status,
+        content_type=record.response_headers.get('Content-Type'),
+    )
+    for header, value in record.response_headers.items():
+        response[header] = value
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def store_response(record: IdempotencyKey, response):
+    """Save the parts of ``response`` needed to replay it."""
+    record.status = 'completed'
+    record.response_status = response.status_code
+    record.response_headers = {
+        header: response[header] for header in REPLAYED_HEADERS if response.has_header(header)
+    }
+    if not response.streaming and len(response.content) <= MAX_STORED_BODY:
+        record.response_body = response.content
+    record.save(update_fields=['status', 'response_status', 'response_headers', 'response_body'])
+
+
+def idempotent_post(view_func):
+    """
+    Make a POST view safe to submit twice.
+
+    The first request with a given key runs the view and stores its
+    response; later requests with the same key get that response back
+    without running the view again. Error responses are not stored, so
+    the key can be reused once the submission is fixed. Requests without
+    a key, or from anonymous users, run unchanged.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'POST' or not request.user.is_authenticated:
+            return view_func(request, *args, **kwargs)
+
+        key = get_request_key(request)
+        if not key:
+            return view_func(request, *args, **kwargs)
+
+        while True:
+            now = timezone.now()
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        key=key,
+                        user=request.user,
+                        request_path=request.path,
+                        expires_at=now + get_idempotency_ttl(),
+                    )
+                break
+            except IntegrityError:
+                record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if record is None:
+                # The request holding the key failed and released it just now
+                response = HttpResponse('Request with this idempotency key is being retried.', status=409)
+                response['Retry-After'] = '1'
+                return response
+            if record.expires_at <= now:
+                # Expired: forget it and treat this request as a new one
+                IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+                continue
+            if record.request_path != request.path:
+                return HttpResponse('Idempotency key reused for a different request.', status=422)
+            if record.status == 'completed':
+                return replay_response(record)
+            messages.info(request, 'Votre demande est déjà en cours de traitement.')
+            return redirect(request.META.get('HTTP_REFERER') or 'store:order_list')
+
+        try:
+            response = view_func(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 400:
+            # Rejected submissions can be corrected and sent again with the same key
+            record.delete()
+            return response
+        store_response(record, response)
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys() -> int:
+    """Delete expired idempotency keys and return how many were removed."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,202 @@
+"""
+Inventory ledger for KeyReport IT Store
+Records every stock change as an append-only StockMovement and keeps
+Product.stock_quantity as a snapshot of the ledger
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Q, Sum, When
+
+from .models import Product, StockMovement
+from .stock_alerts import LowStockService
+
+# Rows per INSERT when writing movements
+MOVEMENT_BATCH_SIZE = 500
+
+# Movements that establish a product's starting stock in the ledger
+BASELINE_REASONS = ('initial', 'import')
+
+
+class InventoryService:
+    """Service class to record and query stock movements."""
+
+    @staticmethod
+    def record_movements(movements: Iterable[StockMovement], apply: bool = True) -> List[StockMovement]:
+        """
+        Insert ``movements`` in batches.
+
+        When ``apply`` is true the product snapshots are updated in the
+        same transaction with a single UPDATE. Pass ``apply=False`` when
+        the caller already saved the new stock_quantity itself.
+        """
+        # Zero-quantity movements carry no information, except opening balances
+        movements = [
+            movement for movement in movements
+            if movement.quantity_delta or movement.reason == 'initial'
+        ]
+        if not movements:
+            return []
+
+        deltas: Dict[int, int] = {}
+        for movement in movements:
+            deltas[movement.product_id] = deltas.get(movement.product_id, 0) + movement.quantity_delta
+
+        with transaction.atomic():
+            StockMovement.objects.bulk_create(movements, batch_size=MOVEMENT_BATCH_SIZE)
+            if apply:
+                InventoryService.apply_deltas(deltas)
+            # Opening balances are not a change in stock, so they never raise alerts
+            LowStockService.check_crossings({
+                movement.product_id: deltas[movement.product_id]
+                for movement in movements
+                if movement.reason not in BASELINE_REASONS
+            })
+        return movements
+
+    @staticmethod
+    def apply_deltas(deltas: Dict[int, int]) -> int:
+        """Add ``deltas`` to the stock snapshot of several products in one UPDATE."""
+        deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+        return Product.objects.filter(id__in=deltas).update(
+            stock_quantity=Case(
+                *[When(id=product_id, then=F('stock_quantity') + delta)
+                  for product_id, delta in deltas.items()],
+                default=F('stock_quantity'),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+
+    @staticmethod
+    def record_order(order, quantities: Dict[int, int]) -> List[StockMovement]:
+        """Record the stock taken by ``order`` and update the snapshots."""
+        return InventoryService.record_movements(
+            StockMovement(
+                product_id=product_id,
+                quantity_delta=-quantity,
+                reason='order',
+                reference=order.order_number,
+                order=order,
+            )
+            for product_id, quantity in quantities.items()
+        )
+
+    @staticmethod
+    def record_import(products: Iterable[Product], reference: str) -> List[StockMovement]:
+        """Record the stock of newly imported products as import movements."""
+        return InventoryService.record_movements(
+            (
+                StockMovement(
+                    product_id=product.id,
+                    quantity_delta=product.stock_quantity,
+                    reason='import',
+                    reference=reference,
+                )
+                for product in products
+            ),
+            apply=False,
+        )
+
+    @staticmethod
+    def record_adjustment(product: Product, old_quantity: int, new_quantity: int,
+                          reason: str = 'adjustment', reference: str = '', user=None) -> List[StockMovement]:
+        """Record a stock change already saved on ``product``."""
+        return InventoryService.record_movements(
+            [StockMovement(
+                product_id=product.id,
+                quantity_delta=new_quantity - old_quantity,
+                reason=reason,
+                reference=reference,
+                created_by=user,
+            )],
+            apply=False,
+        )
+
+    @staticmethod
+    def movement_history(product: Product, since: Optional[datetime] = None,
+                         until: Optional[datetime] = None):
+        """Movements of ``product``, newest first, served from the (product, created_at) index."""
+        movements = StockMovement.objects.filter(product=product)
+        if since:
+            movements = movements.filter(created_at__gte=since)
+        if until:
+            movements = movements.filter(created_at__lte=until)
+        return movements.select_related('order', 'created_by').order_by('-created_at', '-id')
+
+    @staticmethod
+    def stock_as_of(when: datetime, product_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+        """
+        Stock level of each product at ``when``.
+
+        Starts from the current snapshot and subtracts only the movements
+        recorded after ``when``, so the cost depends on how far back the
+        date is rather than on the length of the whole history.
+        """
+        products = Product.objects.all()
+        movements = StockMovement.objects.filter(created_at__gt=when)
+        if product_ids is not None:
+            product_ids = list(product_ids)
+            products = products.filter(id__in=product_ids)
+            movements = movements.filter(product_id__in=product_ids)
+
+        levels = dict(products.values_list('id', 'stock_quantity'))
+        for product_id, delta in movements.values('product_id').annotate(
+            total=Sum('quantity_delta')
+        ).values_list('product_id', 'total'):
+            if product_id in levels:
+                levels[product_id] -= delta
+        return levels
+
+    @staticmethod
+    def reconcile(product_ids: Optional[Iterable[int]] = None, dry_run: bool = False) -> Dict[str, List]:
+        """
+        Bring the stock_quantity snapshots back in line with the ledger.
+
+        Products without an opening balance (created before the ledger
+        existed, or through bulk inserts) get one that makes the ledger
+        match their current stock. Products whose snapshot differs from
+        the sum of their movements, because it was changed outside the
+        ledger, get a ``reconciliation`` movement for the difference, so
+        the ledger and ``stock_as_of`` agree with the stock on hand.
+        Returns the ids of the opened products and the (id, snapshot,
+        ledger) triples that were corrected.
+        """
+        products = Product.objects.all()
+        if product_ids is not None:
+            products = products.filter(id__in=list(product_ids))
+        products = products.order_by().annotate(
+            ledger=Sum('stock_movements__quantity_delta'),
+            baselines=Count('stock_movements', filter=Q(stock_movements__reason__in=BASELINE_REASONS)),
+        )
+
+        opened: List[int] = []
+        corrected: List[tuple] = []
+        movements: List[StockMovement] = []
+        rows = products.values_list('id', 'stock_quantity', 'ledger', 'baselines')
+        for product_id, snapshot, ledger, baselines in rows.iterator():
+            ledger = ledger or 0
+            if not baselines:
+                opened.append(product_id)
+                movements.append(StockMovement(
+                    product_id=product_id,
+                    quantity_delta=snapshot - ledger,
+                    reason='initial',
+                    reference='reconcile',
+                ))
+            elif ledger != snapshot:
+                corrected.append((product_id, snapshot, ledger))
+                movements.append(StockMovement(
+                    product_id=product_id,
+                    quantity_delta=snapshot - ledger,
+                    reason='reconciliation',
+                    reference='reconcile',
+                ))
+
+        if not dry_run:
+            InventoryService.record_movements(movements, apply=False)
+
+        return {'opened': opened, 'corrected': corrected}
@@ -6,6 +6,7 @@ import random
 from decimal import Decimal
 
 from store.models import Product, Order, OrderItem, Wishlist, Payment
+from store.sequences import SequenceService
 from users.models import UserProfile
 
 User = get_user_model()
@@ -70,7 +71,7 @@ class Command(BaseCommand):
                 
                 # Create order
                 order = Order.objects.create(
-                    order_number=f"ORD-{random.randint(100000, 999999)}",
+                    order_number=SequenceService.next_number('order'),
                     customer=user,
                     status=random.choice(order_statuses),
                     subtotal=Decimal('0.00'),
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from store.webhooks import WebhookService
+
+
+class Command(BaseCommand):
+    help = 'Apply received payment webhooks to payments and orders in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the inbox once and exit')
+        parser.add_argument('--batch', type=int, default=100, help='Events applied per transaction')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the inbox is empty')
+        parser.add_argument('--retry-failed', action='store_true', help='Put failed events back in the inbox first')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            retried = WebhookService.retry_failed()
+            self.stdout.write(self.style.WARNING(f'Requeued {retried} failed webhook events'))
+
+        while True:
+            close_old_connections()
+            applied = WebhookService.apply_pending(options['batch'])
+            if applied:
+                self.stdout.write(f'Applied {applied} webhook events')
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
@@ -0,0 +1,98 @@
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import Cart, CartItem, Category, Order, Product
+from store.inventory import InventoryService
+from store.order_service import OrderPlacementService
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark order placement throughput (orders per second) on large carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=50, help='Number of orders to place')
+        parser.add_argument('--lines', type=int, default=100, help='Number of cart lines per order')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark data instead of rolling back')
+
+    def handle(self, *args, **options):
+        orders = options['orders']
+        lines = options['lines']
+
+        self.stdout.write(f'Placing {orders} orders of {lines} lines each...')
+
+        try:
+            with transaction.atomic():
+                elapsed = self.run_benchmark(orders, lines)
+                if not options['keep']:
+                    raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write('=' * 50)
+        self.stdout.write(f'Orders placed:   {orders}')
+        self.stdout.write(f'Lines per order: {lines}')
+        self.stdout.write(f'Total time:      {elapsed:.3f} s')
+        self.stdout.write(f'Per order:       {elapsed / orders * 1000:.2f} ms')
+        self.stdout.write(
+            self.style.SUCCESS(f'Throughput:      {orders / elapsed:.1f} orders/s')
+        )
+
+    def run_benchmark(self, orders, lines):
+        """Create synthetic data and time the order placements."""
+        user, _ = User.objects.get_or_create(
+            email='benchmark@keyreport.ma',
+            defaults={'first_name': 'Benchmark', 'last_name': 'User'}
+        )
+        category, _ = Category.objects.get_or_create(
+            slug='benchmark-category',
+            defaults={'name': 'Benchmark Category'}
+        )
+        run = uuid.uuid4().hex[:6]
+        products = Product.objects.bulk_create([
+            Product(
+                name=f'Benchmark Product {i}',
+                slug=f'benchmark-product-{run}-{i}',
+                sku=f'BENCH-{run}-{i:06d}',
+                category=category,
+                description='Benchmark product',
+                price=Decimal('100.00'),
+                stock_quantity=orders * 10,
+                main_image='products/benchmark.jpg',
+            )
+            for i in range(lines)
+        ])
+        InventoryService.record_import(products, reference='benchmark')
+        cart, _ = Cart.objects.get_or_create(user=user)
+
+        elapsed = 0.0
+        for _ in range(orders):
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product=product, quantity=2)
+                for product in products
+            ])
+
+            start = time.perf_counter()
+            OrderPlacementService.place_order(cart, Order(
+                customer=user,
+                shipping_address='Benchmark',
+                shipping_city='Casablanca',
+                shipping_state='Casablanca-Settat',
+                shipping_zip_code='20000',
+                shipping_country='Maroc',
+                contact_phone='+212 6 00 00 00 00',
+                contact_email=user.email,
+            ))
+            elapsed += time.perf_counter() - start
+
+        return elapsed
+
+
+class _Rollback(Exception):
+    """Used to discard the benchmark data."""
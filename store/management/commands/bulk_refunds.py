@@ -0,0 +1,57 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.reconciliation import ReconciliationService
+
+
+class Command(BaseCommand):
+    help = 'Refund the payments listed in a CSV file (payment_id, transaction_id or order_number, optional amount)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='CSV with a header row')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the file without refunding')
+        parser.add_argument('--chunk-size', type=int, help='Rows resolved per batch')
+        parser.add_argument('--output', help='Write one result row per input row to this CSV file')
+
+    def handle(self, *args, **options):
+        try:
+            source = open(options['csv_file'], newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f'Cannot read {options["csv_file"]}: {e}')
+
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else None
+        try:
+            reader = csv.DictReader(source)
+            if not set(reader.fieldnames or []) & {'payment_id', 'transaction_id', 'order_number'}:
+                raise CommandError('CSV needs a payment_id, transaction_id or order_number column')
+
+            writer = None
+            if output:
+                writer = csv.DictWriter(output, fieldnames=['line', 'payment_id', 'amount', 'outcome', 'detail'])
+                writer.writeheader()
+
+            def report(result):
+                if writer:
+                    writer.writerow(result)
+                elif result['outcome'] not in ('refunded', 'would_refund'):
+                    self.stdout.write(self.style.WARNING(
+                        f"Line {result['line']}: {result['outcome']} {result['detail']}".rstrip()
+                    ))
+
+            counts = ReconciliationService.bulk_refund(
+                reader,
+                dry_run=options['dry_run'],
+                chunk_size=options['chunk_size'],
+                report=report,
+            )
+        finally:
+            source.close()
+            if output:
+                output.close()
+
+        self.stdout.write('=' * 50)
+        self.stdout.write(f"Rows: {counts.get('rows', 0)}")
+        for outcome in ('refunded', 'would_refund', 'skipped', 'not_found', 'error'):
+            if counts.get(outcome):
+                self.stdout.write(f'  {outcome:<14} {counts[outcome]:>8}')
@@ -0,0 +1,48 @@
+import tracemalloc
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store.statements import StatementService
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Write a customer account statement PDF for one month'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Customer email')
+        parser.add_argument('month', help='Month in YYYY-MM format')
+        parser.add_argument('--output', help='PDF file to write (default: releve_<id>_<month>.pdf)')
+        parser.add_argument('--chunk-size', type=int, help='Orders fetched per query')
+        parser.add_argument('--trace-memory', action='store_true', help='Report peak memory while rendering')
+
+    def handle(self, *args, **options):
+        try:
+            customer = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f"No customer with email {options['email']}")
+        try:
+            month = datetime.strptime(options['month'], '%Y-%m')
+        except ValueError:
+            raise CommandError('Month must be in YYYY-MM format')
+        since = timezone.make_aware(month)
+        until = timezone.make_aware(month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1))
+
+        output = options['output'] or f'releve_{customer.pk}_{month:%Y_%m}.pdf'
+        if options['trace_memory']:
+            tracemalloc.start()
+        size = 0
+        with open(output, 'wb') as handle:
+            for chunk in StatementService.render(customer, since, until, chunk_size=options['chunk_size']):
+                handle.write(chunk)
+                size += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {output} ({size / 1024:.0f} KB)'))
+        if options['trace_memory']:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.stdout.write(f'Peak memory while rendering: {peak / 1024:.0f} KB')
@@ -0,0 +1,60 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store.receipt_export import ReceiptExportService, get_export_workers
+
+
+class Command(BaseCommand):
+    help = 'Export payment receipts as a ZIP archive, rendering them in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='ZIP file to write')
+        parser.add_argument('--since', help='Start date YYYY-MM-DD')
+        parser.add_argument('--until', help='End date YYYY-MM-DD, exclusive')
+        parser.add_argument('--customer', help='Customer email')
+        parser.add_argument('--method', help='Payment method code')
+        parser.add_argument('--workers', type=int, help='Rendering processes (default: RECEIPT_EXPORT_WORKERS or CPU count)')
+        parser.add_argument('--every', type=int, default=50, help='Print progress every N receipts')
+
+    def parse_date(self, value):
+        try:
+            return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format')
+
+    def handle(self, *args, **options):
+        payments = ReceiptExportService.payments(
+            since=self.parse_date(options['since']) if options['since'] else None,
+            until=self.parse_date(options['until']) if options['until'] else None,
+            customer=options['customer'],
+            payment_method=options['method'],
+        )
+        workers = options['workers'] or get_export_workers()
+        start = time.perf_counter()
+        stats = {}
+
+        def progress(done, total, per_worker):
+            stats.update(per_worker)
+            if done % options['every'] == 0 or done == total:
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f'{done}/{total} receipts ({done / elapsed:.1f}/s)')
+
+        written = 0
+        with open(options['output'], 'wb') as handle:
+            for chunk in ReceiptExportService.stream_zip(payments, workers=workers, progress=progress):
+                handle.write(chunk)
+                written += len(chunk)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write('=' * 50)
+        self.stdout.write(f'Workers: {workers}')
+        for pid, worker in sorted(stats.items()):
+            rate = worker['receipts'] / worker['seconds'] if worker['seconds'] else 0
+            self.stdout.write(f"  pid {pid:<8} {worker['receipts']:>6} receipts {rate:>8.1f}/s busy")
+        total = sum(worker['receipts'] for worker in stats.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {total} receipts ({written / 1024:.0f} KB) to {options['output']} in {elapsed:.2f} s"
+        ))
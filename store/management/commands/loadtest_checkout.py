@@ -0,0 +1,247 @@
+import threading
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import Resolver404, resolve, reverse
+
+from store.inventory import InventoryService
+from store.models import CartItem, Category, Order, Product
+from store.payment_gateway import GatewayRegistry
+from store.payment_stub import StubProcessor
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Load-test checkout through the store views (order, payment pipeline, gateway) against the local stub processor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=200, help='Total checkouts to run')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent customers')
+        parser.add_argument('--lines', type=int, default=3, help='Cart lines per checkout')
+        parser.add_argument('--methods', default='credit_card,paypal', help='Comma-separated payment methods to rotate through')
+        parser.add_argument('--stub-url', help='Use an already running stub processor instead of starting one')
+        parser.add_argument('--latency-ms', type=float, default=120, help='Median processor latency (lognormal)')
+        parser.add_argument('--error-rate', type=float, default=0.02)
+        parser.add_argument('--decline-rate', type=float, default=0.03)
+        parser.add_argument('--timeout-rate', type=float, default=0.0)
+        parser.add_argument('--gateway-timeout', type=float, default=2.0, help='Gateway HTTP timeout in seconds')
+        parser.add_argument('--poll-interval', type=float, default=0.05, help='Seconds between payment status polls')
+        parser.add_argument('--seed', type=int, help='Random seed for the stub processor')
+        parser.add_argument('--keep', action='store_true', help='Keep the orders and products created')
+
+    def handle(self, *args, **options):
+        server = None
+        stub_url = options['stub_url']
+        if not stub_url:
+            processor = StubProcessor({
+                'latency': {'distribution': 'lognormal', 'median_ms': options['latency_ms'], 'sigma': 0.5},
+                'error_rate': options['error_rate'],
+                'decline_rate': options['decline_rate'],
+                'timeout_rate': options['timeout_rate'],
+                'hang_seconds': options['gateway_timeout'] * 2,
+                'seed': options['seed'],
+            })
+            server = processor.make_server(port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            stub_url = f"http://127.0.0.1:{server.server_address[1]}"
+        stub_url = stub_url.rstrip('/')
+
+        gateway_settings = {
+            'PAYMENT_GATEWAY_URLS': {
+                'stripe': f'{stub_url}/stripe',
+                'paypal': f'{stub_url}/paypal',
+                'moroccan_bank': f'{stub_url}/bank',
+            },
+            'PAYMENT_GATEWAY_HTTP': {
+                'default': {
+                    'timeout': options['gateway_timeout'],
+                    'max_retries': 0,
+                    'pool_maxsize': options['concurrency'],
+                },
+            },
+            'PAYMENT_PIPELINE_THREADS': options['concurrency'],
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+        }
+
+        run = uuid.uuid4().hex[:6]
+        users, products = self.create_fixtures(run, options)
+        self.stdout.write(
+            f"Running {options['checkouts']} checkouts with {options['concurrency']} customers against {stub_url}..."
+        )
+
+        try:
+            with override_settings(**gateway_settings):
+                GatewayRegistry.reset()
+                latencies, outcomes, wall = self.run_load(users, products, options)
+        finally:
+            GatewayRegistry.reset()
+            if server:
+                server.shutdown()
+            if not options['keep']:
+                Order.objects.filter(customer__in=users).delete()
+                Product.objects.filter(id__in=[product.id for product in products]).delete()
+                User.objects.filter(id__in=[user.id for user in users]).delete()
+
+        self.report(latencies, outcomes, wall)
+
+    def create_fixtures(self, run, options):
+        category, _ = Category.objects.get_or_create(
+            slug='benchmark-category',
+            defaults={'name': 'Benchmark Category'}
+        )
+        products = Product.objects.bulk_create([
+            Product(
+                name=f'Load Test Product {i}',
+                slug=f'loadtest-product-{run}-{i}',
+                sku=f'LOAD-{run}-{i:04d}',
+                category=category,
+                description='Load test product',
+                price=Decimal('250.00'),
+                stock_quantity=options['checkouts'] * 10,
+                main_image='products/benchmark.jpg',
+            )
+            for i in range(options['lines'])
+        ])
+        InventoryService.record_import(products, reference='loadtest')
+        users = [
+            User.objects.create_user(
+                email=f'loadtest-{run}-{i}@keyreport.ma',
+                password=None,
+                first_name='Load',
+                last_name=f'Test {i}',
+            )
+            for i in range(options['concurrency'])
+        ]
+        return users, products
+
+    def run_load(self, users, products, options):
+        """
+        Each customer thread drives the real checkout URLs with its own
+        test Client: cart, order form, payment submission (with an
+        idempotency key) and status polling until the pipeline finishes.
+        """
+        methods = [method.strip() for method in options['methods'].split(',') if method.strip()]
+        latencies = []
+        outcomes = Counter()
+        lock = threading.Lock()
+        counter = iter(range(options['checkouts']))
+
+        def customer(user):
+            client = Client()
+            client.force_login(user)
+            try:
+                while True:
+                    with lock:
+                        index = next(counter, None)
+                    if index is None:
+                        return
+
+                    start = time.perf_counter()
+                    try:
+                        outcome = self.checkout(client, user, products, methods[index % len(methods)], options)
+                    except Exception as e:
+                        outcome = f'exception: {type(e).__name__}: {e}'
+                    elapsed = time.perf_counter() - start
+
+                    with lock:
+                        latencies.append(elapsed)
+                        outcomes[self.classify(outcome)] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=customer, args=(user,)) for user in users]
+        wall_start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, outcomes, time.perf_counter() - wall_start
+
+    def checkout(self, client, user, products, method, options):
+        """One checkout through the views; returns the outcome."""
+        for product in products:
+            client.post(reverse('store:add_to_cart', args=[product.id]), {'quantity': 1})
+
+        response = client.post(reverse('store:order_form'), {
+            'shipping_address': '1 rue du Load Test',
+            'shipping_city': 'Casablanca',
+            'shipping_state': 'Casablanca-Settat',
+            'shipping_zip_code': '20000',
+            'shipping_country': 'Maroc',
+            'contact_phone': '+212 6 00 00 00 00',
+            'contact_email': user.email,
+        }, HTTP_IDEMPOTENCY_KEY=uuid.uuid4().hex)
+        order_id = self.redirect_kwargs(response).get('order_id')
+        if order_id is None:
+            CartItem.objects.filter(cart__user=user).delete()
+            return f'order form: HTTP {response.status_code}'
+
+        data = {'payment_method': method}
+        if method == 'credit_card':
+            data.update(card_number='4242 4242 4242 4242', expiry_date='12/35', cvv='123', cardholder_name='Load Test')
+        elif method == 'paypal':
+            data.update(paypal_email=user.email)
+        response = client.post(reverse('store:process_professional_payment', args=[order_id]), data,
+                               HTTP_IDEMPOTENCY_KEY=uuid.uuid4().hex)
+        payment_id = self.redirect_kwargs(response).get('payment_id')
+        if payment_id is None:
+            return f'payment: HTTP {response.status_code}'
+
+        deadline = time.perf_counter() + options['gateway_timeout'] * 3 + 30
+        status_url = reverse('store:payment_status_json', args=[payment_id])
+        while time.perf_counter() < deadline:
+            status = client.get(status_url).json()
+            if status['finished']:
+                if status['status'] in ('succeeded', 'unknown'):
+                    return status['payment_status']
+                return status.get('error') or 'failed'
+            time.sleep(options['poll_interval'])
+        return 'pipeline did not finish'
+
+    @staticmethod
+    def redirect_kwargs(response):
+        """URL kwargs of the view a response redirects to, or {}."""
+        if response.status_code != 302:
+            return {}
+        try:
+            return resolve(urlparse(response.url).path).kwargs
+        except Resolver404:
+            return {}
+
+    @staticmethod
+    def classify(outcome):
+        """Group error messages (timeouts and lock errors carry the full exception text)."""
+        if 'database is locked' in outcome.lower():
+            return 'database is locked'
+        if 'timed out' in outcome.lower() or 'timeout' in outcome.lower():
+            return 'timeout'
+        return outcome
+
+    def report(self, latencies, outcomes, wall):
+        if not latencies:
+            self.stdout.write(self.style.WARNING('No checkouts completed'))
+            return
+        ordered = sorted(latencies)
+
+        def percentile(p):
+            return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)] * 1000
+
+        self.stdout.write('=' * 50)
+        self.stdout.write(f'Checkouts:  {len(ordered)} in {wall:.2f} s')
+        self.stdout.write(self.style.SUCCESS(f'Throughput: {len(ordered) / wall:.1f} checkouts/s'))
+        self.stdout.write(
+            f'Latency ms: p50 {percentile(50):.0f}  p90 {percentile(90):.0f}  '
+            f'p95 {percentile(95):.0f}  p99 {percentile(99):.0f}  max {ordered[-1] * 1000:.0f}'
+        )
+        self.stdout.write('Outcomes:')
+        for outcome, count in outcomes.most_common():
+            self.stdout.write(f'  {outcome[:50]:<50} {count:>6} ({count * 100 / len(ordered):.1f}%)')
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store.models import PaymentEvent
+from store.payment_events import PaymentEventService
+
+
+class Command(BaseCommand):
+    help = 'Summarise charges and refunds from the payment event log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Start date YYYY-MM-DD (default: 30 days ago)')
+        parser.add_argument('--until', help='End date YYYY-MM-DD, exclusive (default: now)')
+        parser.add_argument('--refunds', action='store_true', help='List every refund in the period')
+
+    def parse_date(self, value):
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format')
+        return timezone.make_aware(day)
+
+    def handle(self, *args, **options):
+        since = self.parse_date(options['since']) if options['since'] else timezone.now() - timedelta(days=30)
+        until = self.parse_date(options['until']) if options['until'] else None
+
+        totals = PaymentEventService.totals(since, until)
+        labels = dict(PaymentEvent.EVENT_TYPE_CHOICES)
+        self.stdout.write(f"Payment events from {since:%Y-%m-%d}" + (f" to {until:%Y-%m-%d}" if until else ''))
+        self.stdout.write('=' * 50)
+        for event_type, label in labels.items():
+            row = totals.get(event_type, {'count': 0, 'total': 0})
+            self.stdout.write(f"{str(label):<20} {row['count']:>8} {row['total']:>14.2f} MAD")
+
+        collected = totals.get('charge_succeeded', {}).get('total', 0)
+        refunded = totals.get('refund_succeeded', {}).get('total', 0)
+        self.stdout.write('=' * 50)
+        self.stdout.write(self.style.SUCCESS(f"Net collected: {collected - refunded:.2f} MAD"))
+
+        if options['refunds']:
+            self.stdout.write('')
+            for event in PaymentEventService.refunds(since, until).iterator():
+                self.stdout.write(
+                    f"{event.created_at:%Y-%m-%d %H:%M}  {event.payment.order.order_number}  "
+                    f"{event.gateway:<16} {event.amount:>10.2f}  {event.external_id}"
+                )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from store.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys and their stored responses'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys.')
+        )
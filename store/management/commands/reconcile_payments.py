@@ -0,0 +1,44 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from store.reconciliation import ReconciliationService
+
+
+class Command(BaseCommand):
+    help = 'Reconcile Order.payment_status with payments and report duplicates and orphans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report issues without fixing them')
+        parser.add_argument('--chunk-size', type=int, help='Rows fetched and updated per batch')
+        parser.add_argument('--output', help='Write every issue to this CSV file instead of stdout')
+        parser.add_argument('--quiet', action='store_true', help='Only print the summary')
+
+    def handle(self, *args, **options):
+        handle = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else None
+        try:
+            writer = None
+            if handle or not options['quiet']:
+                writer = csv.writer(handle or self.stdout)
+                writer.writerow(['kind', 'order_id', 'payment_ids', 'detail'])
+
+            def report(kind, order_id, payment_ids, detail):
+                if writer:
+                    writer.writerow([kind, order_id, ' '.join(map(str, payment_ids)), detail])
+
+            counts = ReconciliationService.reconcile(
+                dry_run=options['dry_run'],
+                chunk_size=options['chunk_size'],
+                report=report,
+            )
+        finally:
+            if handle:
+                handle.close()
+
+        self.stdout.write('=' * 50)
+        self.stdout.write(f"Orders checked: {counts.get('orders', 0)}")
+        for kind in ('status_mismatch', 'duplicate', 'amount_mismatch', 'dead_order', 'unbacked_paid', 'orphan'):
+            self.stdout.write(f"  {kind:<16} {counts.get(kind, 0):>8}")
+        action = 'Would fix' if options['dry_run'] else 'Fixed'
+        fixed = counts.get('status_mismatch', 0) if options['dry_run'] else counts.get('fixed', 0)
+        self.stdout.write(self.style.SUCCESS(f'{action} {fixed} order payment statuses'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from store.inventory import InventoryService
+
+
+class Command(BaseCommand):
+    help = 'Reconcile Product.stock_quantity snapshots with the stock movement ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report differences without fixing them')
+        parser.add_argument('--product', type=int, action='append', dest='product_ids', help='Only reconcile this product id (repeatable)')
+
+    def handle(self, *args, **options):
+        result = InventoryService.reconcile(options['product_ids'], dry_run=options['dry_run'])
+
+        for product_id, snapshot, ledger in result['corrected']:
+            self.stdout.write(
+                self.style.WARNING(f'Product {product_id}: snapshot {snapshot} != ledger {ledger}')
+            )
+
+        action = 'Would open' if options['dry_run'] else 'Opened'
+        self.stdout.write(f"{action} ledger for {len(result['opened'])} products")
+        action = 'Would reconcile' if options['dry_run'] else 'Reconciled'
+        self.stdout.write(
+            self.style.SUCCESS(f"{action} the ledger of {len(result['corrected'])} products with their stock")
+        )
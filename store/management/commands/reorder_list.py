@@ -0,0 +1,43 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from store.stock_alerts import LowStockService
+
+FIELDS = ['product_id', 'sku', 'name', 'brand', 'stock_quantity', 'min_stock_level', 'reorder_quantity']
+
+
+class Command(BaseCommand):
+    help = 'List products at or below their minimum stock level with a suggested reorder quantity'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['text', 'csv'], default='text', help='Output format')
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+        parser.add_argument('--include-inactive', action='store_true', help='Include inactive products')
+
+    def handle(self, *args, **options):
+        rows = LowStockService.reorder_list(active_only=not options['include_inactive'])
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as handle:
+                self.write_rows(handle, rows, options['format'])
+            self.stdout.write(self.style.SUCCESS(f"{len(rows)} products written to {options['output']}"))
+        else:
+            self.write_rows(self.stdout, rows, options['format'])
+
+    def write_rows(self, stream, rows, output_format):
+        if output_format == 'csv':
+            writer = csv.DictWriter(stream, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+            return
+
+        if not rows:
+            stream.write('No products below their minimum stock level.\n')
+            return
+        for row in rows:
+            stream.write(
+                f"{row['sku']:<20} {row['name'][:40]:<40} "
+                f"stock {row['stock_quantity']:>4} / min {row['min_stock_level']:>4}  "
+                f"reorder {row['reorder_quantity']}\n"
+            )
@@ -0,0 +1,36 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from store.payment_pipeline import PaymentPipeline
+
+
+class Command(BaseCommand):
+    help = 'Run queued payment jobs (gateway call, order update and receipt generation)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the queued jobs once and exit')
+        parser.add_argument('--batch', type=int, default=20, help='Jobs to claim per poll')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=300, help='Requeue running jobs older than this many seconds')
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(seconds=options['stale_after'])
+
+        requeued = PaymentPipeline.requeue_stale(stale_after)
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale jobs'))
+
+        while True:
+            close_old_connections()
+            processed = PaymentPipeline.run_pending(options['batch'])
+            if processed:
+                self.stdout.write(f'Processed {processed} payment jobs')
+
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['sleep'])
+                PaymentPipeline.requeue_stale(stale_after)
@@ -0,0 +1,62 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.payment_stub import StubProcessor
+
+
+class Command(BaseCommand):
+    help = 'Run a local payment processor stand-in with injected latency, errors and webhooks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--config', help='JSON file with stub settings (merged over PAYMENT_STUB)')
+        parser.add_argument('--latency', choices=['fixed', 'uniform', 'lognormal', 'exponential'], help='Latency distribution')
+        parser.add_argument('--latency-ms', type=float, help='Fixed/median/mean latency in milliseconds')
+        parser.add_argument('--error-rate', type=float, help='Share of 503 responses')
+        parser.add_argument('--decline-rate', type=float, help='Share of 402 declines')
+        parser.add_argument('--timeout-rate', type=float, help='Share of requests that hang')
+        parser.add_argument('--webhook-url', help='URL receiving signed event notifications')
+        parser.add_argument('--seed', type=int, help='Random seed for reproducible runs')
+
+    def handle(self, *args, **options):
+        config = dict(getattr(settings, 'PAYMENT_STUB', {}))
+        if options['config']:
+            with open(options['config'], encoding='utf-8') as handle:
+                config.update(json.load(handle))
+
+        if options['latency'] or options['latency_ms'] is not None:
+            latency = dict(config.get('latency', {}))
+            if options['latency']:
+                latency['distribution'] = options['latency']
+            if options['latency_ms'] is not None:
+                latency.update(ms=options['latency_ms'], median_ms=options['latency_ms'], mean_ms=options['latency_ms'])
+            config['latency'] = latency
+        for option, key in (
+            ('error_rate', 'error_rate'),
+            ('decline_rate', 'decline_rate'),
+            ('timeout_rate', 'timeout_rate'),
+            ('webhook_url', 'webhook_url'),
+            ('seed', 'seed'),
+        ):
+            if options[option] is not None:
+                config[key] = options[option]
+
+        processor = StubProcessor(config)
+        server = processor.make_server(options['host'], options['port'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stub processor listening on http://{options['host']}:{server.server_address[1]}/"
+        ))
+        self.stdout.write(json.dumps(processor.config, indent=2))
+        self.stdout.write(
+            "Point the gateways at it with PAYMENT_GATEWAY_URLS = {'stripe': '.../stripe', "
+            "'paypal': '.../paypal', 'moroccan_bank': '.../bank'}"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from store.models import Category, Product
+from store.inventory import InventoryService
 from support.models import SupportTicket, ServiceRequest
 import random
 from decimal import Decimal
@@ -171,6 +172,7 @@ class Command(BaseCommand):
         ]
         
         products = []
+        imported_products = []
         for prod_data in products_data:
             product, created = Product.objects.get_or_create(
                 slug=prod_data['slug'],
@@ -178,8 +180,12 @@ class Command(BaseCommand):
             )
             products.append(product)
             if created:
+                imported_products.append(product)
                 self.stdout.write(f'Created product: {product.name}')
         
+        # Record the initial stock of the new products in the stock ledger
+        InventoryService.record_import(imported_products, reference='setup_sample_data')
+        
         return products
 
     def create_users(self):
@@ -0,0 +1,31 @@
+import csv
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store.inventory import InventoryService
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Print the stock level of every product as of a date (end of day)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('date', help='Date in YYYY-MM-DD format')
+        parser.add_argument('--product', type=int, action='append', dest='product_ids', help='Only this product id (repeatable)')
+
+    def handle(self, *args, **options):
+        try:
+            day = datetime.strptime(options['date'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('Date must be in YYYY-MM-DD format')
+
+        when = timezone.make_aware(datetime.combine(day, time.max))
+        levels = InventoryService.stock_as_of(when, options['product_ids'])
+        products = Product.objects.filter(id__in=levels).values_list('id', 'sku', 'name').order_by('sku')
+
+        writer = csv.writer(self.stdout)
+        writer.writerow(['product_id', 'sku', 'name', 'stock'])
+        for product_id, sku, name in products.iterator():
+            writer.writerow([product_id, sku, name, levels[product_id]])
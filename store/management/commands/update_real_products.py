@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from store.models import Category, Product
+from store.inventory import InventoryService
 from decimal import Decimal
 
 class Command(BaseCommand):
@@ -313,6 +314,7 @@ class Command(BaseCommand):
         ]
         
         created_count = 0
+        imported_products = []
         for prod_data in real_products:
             product, created = Product.objects.get_or_create(
                 slug=prod_data['slug'],
@@ -325,12 +327,16 @@ class Command(BaseCommand):
                     f'({"Sale: " + str(product.sale_price) + " MAD" if product.sale_price else "No sale"})'
                 )
                 created_count += 1
+                imported_products.append(product)
             else:
                 self.stdout.write(
                     f'🔄 Updated: {product.name} - {product.price} MAD '
                     f'({"Sale: " + str(product.sale_price) + " MAD" if product.sale_price else "No sale"})'
                 )
         
+        # Record the initial stock of the new products in the stock ledger
+        InventoryService.record_import(imported_products, reference='update_real_products')
+        
         self.stdout.write(
             self.style.SUCCESS(f'\n🎉 Successfully processed {len(real_products)} real IT components!')
         )
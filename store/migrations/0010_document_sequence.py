@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_order_delivery_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Sequence Name')),
+                ('next_value', models.PositiveBigIntegerField(default=1, verbose_name='Next Value')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Document Sequence',
+                'verbose_name_plural': 'Document Sequences',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='receipt_number',
+            field=models.CharField(blank=True, db_index=True, max_length=20, verbose_name='Receipt Number'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0010_document_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, verbose_name='Key')),
+                ('request_path', models.CharField(max_length=255, verbose_name='Request Path')),
+                ('status', models.CharField(choices=[('in_progress', 'In Progress'), ('completed', 'Completed')], default='in_progress', max_length=20, verbose_name='Status')),
+                ('response_status', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Response Status')),
+                ('response_headers', models.JSONField(blank=True, default=dict, verbose_name='Response Headers')),
+                ('response_body', models.BinaryField(blank=True, default=b'', verbose_name='Response Body')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(verbose_name='Expires At')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Idempotency Key',
+                'verbose_name_plural': 'Idempotency Keys',
+                'indexes': [models.Index(fields=['expires_at'], name='store_idemp_expires_be4c1a_idx')],
+                'unique_together': {('user', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0011_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_delta', models.IntegerField(verbose_name='Quantity Change')),
+                ('reason', models.CharField(choices=[('initial', 'Opening Balance'), ('order', 'Order'), ('sale', 'Sale'), ('import', 'Import'), ('adjustment', 'Manual Adjustment'), ('return', 'Return'), ('reconciliation', 'Reconciliation')], max_length=20, verbose_name='Reason')),
+                ('reference', models.CharField(blank=True, max_length=100, verbose_name='Reference')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to=settings.AUTH_USER_MODEL, verbose_name='Created By')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='store.order', verbose_name='Order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='store.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name': 'Stock Movement',
+                'verbose_name_plural': 'Stock Movements',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['product', 'created_at'], name='store_stock_product_860bf2_idx'), models.Index(fields=['reason', 'created_at'], name='store_stock_reason_cda94c_idx'), models.Index(fields=['created_at'], name='store_stock_created_957fb4_idx')],
+            },
+        ),
+    ]
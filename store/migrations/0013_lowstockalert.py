@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0012_stockmovement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LowStockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('low_stock', 'Low Stock'), ('restocked', 'Restocked')], default='low_stock', max_length=20, verbose_name='Event Type')),
+                ('stock_quantity', models.PositiveIntegerField(verbose_name='Stock Quantity')),
+                ('min_stock_level', models.PositiveIntegerField(verbose_name='Minimum Stock Level')),
+                ('is_acknowledged', models.BooleanField(default=False, verbose_name='Acknowledged')),
+                ('acknowledged_at', models.DateTimeField(blank=True, null=True, verbose_name='Acknowledged At')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Low Stock Alert',
+                'verbose_name_plural': 'Low Stock Alerts',
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock_quantity__lte', models.F('min_stock_level'))), fields=['stock_quantity', 'min_stock_level'], name='store_product_low_stock_idx'),
+        ),
+        migrations.AddField(
+            model_name='lowstockalert',
+            name='acknowledged_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='acknowledged_stock_alerts', to=settings.AUTH_USER_MODEL, verbose_name='Acknowledged By'),
+        ),
+        migrations.AddField(
+            model_name='lowstockalert',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='low_stock_alerts', to='store.product', verbose_name='Product'),
+        ),
+        migrations.AddIndex(
+            model_name='lowstockalert',
+            index=models.Index(fields=['is_acknowledged', 'created_at'], name='store_lowst_is_ackn_7878ea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lowstockalert',
+            index=models.Index(fields=['product', 'created_at'], name='store_lowst_product_6d4b46_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:54
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_lowstockalert'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='weight_kg',
+            field=models.DecimalField(decimal_places=3, default=Decimal('1.000'), max_digits=7, verbose_name='Shipping Weight (kg)'),
+        ),
+    ]
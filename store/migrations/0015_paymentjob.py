@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_product_weight_kg'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20, verbose_name='Status')),
+                ('stage', models.CharField(choices=[('queued', 'Waiting for a worker'), ('gateway', 'Contacting the payment processor'), ('order', 'Updating the order'), ('receipt', 'Generating the receipt'), ('done', 'Done')], default='queued', max_length=20, verbose_name='Stage')),
+                ('gateway_kwargs', models.JSONField(blank=True, default=dict, verbose_name='Gateway Arguments')),
+                ('order_status', models.CharField(blank=True, max_length=20, verbose_name='Order Status On Success')),
+                ('success_url', models.CharField(blank=True, max_length=200, verbose_name='Success URL')),
+                ('failure_url', models.CharField(blank=True, max_length=200, verbose_name='Failure URL')),
+                ('result', models.JSONField(blank=True, default=dict, verbose_name='Result')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('receipt', models.FileField(blank=True, upload_to='receipts/', verbose_name='Receipt')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started At')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished At')),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='store.payment', verbose_name='Payment')),
+            ],
+            options={
+                'verbose_name': 'Payment Job',
+                'verbose_name_plural': 'Payment Jobs',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='store_payme_status_d5c279_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+CHARGE_EVENTS = {
+    'completed': 'charge_succeeded',
+    'refunded': 'charge_succeeded',
+    'pending': 'charge_pending',
+    'failed': 'charge_failed',
+}
+
+
+def backfill_events(apps, schema_editor):
+    """Turn existing processor_response blobs into events."""
+    Payment = apps.get_model('store', 'Payment')
+    PaymentEvent = apps.get_model('store', 'PaymentEvent')
+    events = []
+    payments = Payment.objects.exclude(processor_response={}).only(
+        'id', 'payment_method', 'amount', 'status', 'transaction_id', 'processor_response', 'created_at', 'processed_at'
+    )
+    for payment in payments.iterator(chunk_size=500):
+        response = dict(payment.processor_response or {})
+        refund = response.pop('refund', None)
+        event_type = CHARGE_EVENTS.get(payment.status)
+        if event_type and response:
+            events.append(PaymentEvent(
+                payment_id=payment.id,
+                event_type=event_type,
+                gateway=payment.payment_method,
+                amount=payment.amount,
+                external_id=payment.transaction_id or '',
+                payload=response,
+                created_at=payment.processed_at or payment.created_at,
+            ))
+        if isinstance(refund, dict):
+            events.append(PaymentEvent(
+                payment_id=payment.id,
+                event_type='refund_succeeded',
+                gateway=payment.payment_method,
+                amount=refund.get('amount') or payment.amount,
+                external_id=refund.get('refund_id', refund.get('id', '')),
+                payload=refund,
+                created_at=payment.processed_at or payment.created_at,
+            ))
+        if len(events) >= 500:
+            PaymentEvent.objects.bulk_create(events)
+            events = []
+    PaymentEvent.objects.bulk_create(events)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_paymentjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('charge_succeeded', 'Charge Succeeded'), ('charge_pending', 'Charge Pending'), ('charge_failed', 'Charge Failed'), ('refund_succeeded', 'Refund Succeeded'), ('refund_failed', 'Refund Failed'), ('verification', 'Verification')], max_length=30, verbose_name='Event Type')),
+                ('gateway', models.CharField(blank=True, max_length=50, verbose_name='Gateway')),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Amount')),
+                ('currency', models.CharField(default='MAD', max_length=3, verbose_name='Currency')),
+                ('external_id', models.CharField(blank=True, db_index=True, max_length=100, verbose_name='External ID')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Raw Payload')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created At')),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='store.payment', verbose_name='Payment')),
+            ],
+            options={
+                'verbose_name': 'Payment Event',
+                'verbose_name_plural': 'Payment Events',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['event_type', 'created_at'], name='store_payme_event_t_3f754a_idx'), models.Index(fields=['payment', 'created_at'], name='store_payme_payment_69c83e_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_paymentevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=100, unique=True, verbose_name='Event ID')),
+                ('processor', models.CharField(blank=True, max_length=50, verbose_name='Processor')),
+                ('event_type', models.CharField(max_length=50, verbose_name='Event Type')),
+                ('payload', models.JSONField(default=dict, verbose_name='Payload')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('applied', 'Applied'), ('ignored', 'Ignored'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='Status')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Received At')),
+                ('applied_at', models.DateTimeField(blank=True, null=True, verbose_name='Applied At')),
+            ],
+            options={
+                'verbose_name': 'Webhook Event',
+                'verbose_name_plural': 'Webhook Events',
+                'ordering': ['-received_at', '-id'],
+                'indexes': [models.Index(fields=['status', 'received_at'], name='store_webho_status_81b8f8_idx')],
+            },
+        ),
+    ]
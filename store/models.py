@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
+from django.utils import timezone
 from decimal import Decimal
 
 User = get_user_model()
@@ -94,6 +95,7 @@ class Product(models.Model):
     model = models.CharField(max_length=100, blank=True, verbose_name=_('Model'))
     condition = models.CharField(max_length=20, choices=CONDITION_CHOICES, default='new', verbose_name=_('Condition'))
     warranty_months = models.PositiveIntegerField(default=12, verbose_name=_('Warranty (Months)'))
+    weight_kg = models.DecimalField(max_digits=7, decimal_places=3, default=Decimal('1.000'), verbose_name=_('Shipping Weight (kg)'))
     
     # Images
     main_image = models.ImageField(upload_to='products/', verbose_name=_('Main Image'))
@@ -115,6 +117,12 @@ class Product(models.Model):
             models.Index(fields=['category', 'is_active']),
             models.Index(fields=['price']),
             models.Index(fields=['stock_quantity']),
+            # Partial index covering only the products at or below their reorder level
+            models.Index(
+                fields=['stock_quantity', 'min_stock_level'],
+                name='store_product_low_stock_idx',
+                condition=models.Q(stock_quantity__lte=models.F('min_stock_level')),
+            ),
         ]
     
     def __str__(self):
@@ -176,11 +184,14 @@ class Product(models.Model):
         main_gallery = self.images.filter(image_type='main', is_active=True).first()
         return main_gallery.image if main_gallery else self.main_image
     
-    def reduce_stock(self, quantity):
-        """Reduce stock quantity."""
+    def reduce_stock(self, quantity, reference=''):
+        """Reduce stock quantity, recording the change in the stock ledger."""
+        from .inventory import InventoryService
         if self.stock_quantity >= quantity:
+            InventoryService.record_movements([
+                StockMovement(product=self, quantity_delta=-quantity, reason='sale', reference=reference)
+            ])
             self.stock_quantity -= quantity
-            self.save()
             return True
         return False
     
@@ -295,6 +306,7 @@ class Order(models.Model):
         ('pending', _('Pending')),
         ('paid', _('Paid')),
         ('failed', _('Failed')),
+        ('partially_refunded', _('Partially Refunded')),
         ('refunded', _('Refunded')),
     ]
     
@@ -479,6 +491,7 @@ class Payment(models.Model):
         ('processing', _('Processing')),
         ('completed', _('Completed')),
         ('failed', _('Failed')),
+        ('partially_refunded', _('Partially Refunded')),
         ('refunded', _('Refunded')),
     ]
     
@@ -488,6 +501,7 @@ class Payment(models.Model):
     
     amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_('Amount'))
     transaction_id = models.CharField(max_length=100, blank=True, verbose_name=_('Transaction ID'))
+    receipt_number = models.CharField(max_length=20, blank=True, db_index=True, verbose_name=_('Receipt Number'))
     
     # Card details (for card payments) - should be encrypted in production
     card_last_four = models.CharField(max_length=4, blank=True, verbose_name=_('Card Last 4 Digits'))
@@ -515,6 +529,7 @@ class Payment(models.Model):
             'processing': 'info',
             'completed': 'success',
             'failed': 'danger',
+            'partially_refunded': 'secondary',
             'refunded': 'secondary',
         }
         return status_classes.get(self.status, 'secondary')
@@ -575,4 +590,240 @@ class ProductReview(models.Model):
     @property
     def rating_display(self):
         """Return rating as stars display."""
-        return '★' * self.rating + '☆' * (5 - self.rating)
\ No newline at end of file
+        return '★' * self.rating + '☆' * (5 - self.rating)
+
+class DocumentSequence(models.Model):
+    """Database-backed counter used to number orders, tickets, services and receipts."""
+    
+    name = models.CharField(max_length=50, unique=True, verbose_name=_('Sequence Name'))
+    next_value = models.PositiveBigIntegerField(default=1, verbose_name=_('Next Value'))
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Document Sequence')
+        verbose_name_plural = _('Document Sequences')
+        ordering = ['name']
+    
+    def __str__(self):
+        return f"{self.name} (next: {self.next_value})"
+
+
+class IdempotencyKey(models.Model):
+    """Stored result of a POST request, replayed when the same key is submitted again."""
+    
+    STATUS_CHOICES = [
+        ('in_progress', _('In Progress')),
+        ('completed', _('Completed')),
+    ]
+    
+    key = models.CharField(max_length=64, verbose_name=_('Key'))
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys', verbose_name=_('User'))
+    request_path = models.CharField(max_length=255, verbose_name=_('Request Path'))
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in_progress', verbose_name=_('Status'))
+    
+    # Stored response
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True, verbose_name=_('Response Status'))
+    response_headers = models.JSONField(default=dict, blank=True, verbose_name=_('Response Headers'))
+    response_body = models.BinaryField(blank=True, default=b'', verbose_name=_('Response Body'))
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(verbose_name=_('Expires At'))
+    
+    class Meta:
+        verbose_name = _('Idempotency Key')
+        verbose_name_plural = _('Idempotency Keys')
+        unique_together = ['user', 'key']
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.key} - {self.request_path} ({self.status})"
+
+
+class StockMovement(models.Model):
+    """Append-only ledger entry recording a change of product stock."""
+    
+    REASON_CHOICES = [
+        ('initial', _('Opening Balance')),
+        ('order', _('Order')),
+        ('sale', _('Sale')),
+        ('import', _('Import')),
+        ('adjustment', _('Manual Adjustment')),
+        ('return', _('Return')),
+        ('reconciliation', _('Reconciliation')),
+    ]
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements', verbose_name=_('Product'))
+    quantity_delta = models.IntegerField(verbose_name=_('Quantity Change'))
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, verbose_name=_('Reason'))
+    reference = models.CharField(max_length=100, blank=True, verbose_name=_('Reference'))
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements', verbose_name=_('Order'))
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements', verbose_name=_('Created By'))
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Stock Movement')
+        verbose_name_plural = _('Stock Movements')
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+            models.Index(fields=['reason', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name}: {self.quantity_delta:+d} ({self.get_reason_display()})"
+
+
+class LowStockAlert(models.Model):
+    """Event raised when a product's stock crosses its minimum stock level."""
+    
+    EVENT_TYPE_CHOICES = [
+        ('low_stock', _('Low Stock')),
+        ('restocked', _('Restocked')),
+    ]
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='low_stock_alerts', verbose_name=_('Product'))
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPE_CHOICES, default='low_stock', verbose_name=_('Event Type'))
+    stock_quantity = models.PositiveIntegerField(verbose_name=_('Stock Quantity'))
+    min_stock_level = models.PositiveIntegerField(verbose_name=_('Minimum Stock Level'))
+    
+    is_acknowledged = models.BooleanField(default=False, verbose_name=_('Acknowledged'))
+    acknowledged_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='acknowledged_stock_alerts', verbose_name=_('Acknowledged By'))
+    acknowledged_at = models.DateTimeField(blank=True, null=True, verbose_name=_('Acknowledged At'))
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Low Stock Alert')
+        verbose_name_plural = _('Low Stock Alerts')
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['is_acknowledged', 'created_at']),
+            models.Index(fields=['product', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name}: {self.get_event_type_display()} ({self.stock_quantity}/{self.min_stock_level})"
+
+
+
+class PaymentEvent(models.Model):
+    """Append-only record of everything a gateway did to a payment."""
+    
+    EVENT_TYPE_CHOICES = [
+        ('charge_succeeded', _('Charge Succeeded')),
+        ('charge_pending', _('Charge Pending')),
+        ('charge_failed', _('Charge Failed')),
+        ('refund_succeeded', _('Refund Succeeded')),
+        ('refund_failed', _('Refund Failed')),
+        ('verification', _('Verification')),
+    ]
+    
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='events', verbose_name=_('Payment'))
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPE_CHOICES, verbose_name=_('Event Type'))
+    gateway = models.CharField(max_length=50, blank=True, verbose_name=_('Gateway'))
+    amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, verbose_name=_('Amount'))
+    currency = models.CharField(max_length=3, default='MAD', verbose_name=_('Currency'))
+    external_id = models.CharField(max_length=100, blank=True, db_index=True, verbose_name=_('External ID'))
+    payload = models.JSONField(default=dict, blank=True, verbose_name=_('Raw Payload'))
+    created_at = models.DateTimeField(default=timezone.now, verbose_name=_('Created At'))
+    
+    class Meta:
+        verbose_name = _('Payment Event')
+        verbose_name_plural = _('Payment Events')
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['event_type', 'created_at']),
+            models.Index(fields=['payment', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_event_type_display()} - Payment {self.payment_id}"
+
+
+class PaymentJob(models.Model):
+    """Background job that runs a payment through its gateway and builds the receipt."""
+    
+    STATUS_CHOICES = [
+        ('queued', _('Queued')),
+        ('running', _('Running')),
+        ('succeeded', _('Succeeded')),
+        ('failed', _('Failed')),
+    ]
+    
+    STAGE_CHOICES = [
+        ('queued', _('Waiting for a worker')),
+        ('gateway', _('Contacting the payment processor')),
+        ('order', _('Updating the order')),
+        ('receipt', _('Generating the receipt')),
+        ('done', _('Done')),
+    ]
+    
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='jobs', verbose_name=_('Payment'))
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', verbose_name=_('Status'))
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES, default='queued', verbose_name=_('Stage'))
+    
+    # Never card numbers or CVVs: those are validated in the request and dropped
+    gateway_kwargs = models.JSONField(default=dict, blank=True, verbose_name=_('Gateway Arguments'))
+    order_status = models.CharField(max_length=20, blank=True, verbose_name=_('Order Status On Success'))
+    success_url = models.CharField(max_length=200, blank=True, verbose_name=_('Success URL'))
+    failure_url = models.CharField(max_length=200, blank=True, verbose_name=_('Failure URL'))
+    
+    result = models.JSONField(default=dict, blank=True, verbose_name=_('Result'))
+    error = models.TextField(blank=True, verbose_name=_('Error'))
+    receipt = models.FileField(upload_to='receipts/', blank=True, verbose_name=_('Receipt'))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_('Attempts'))
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name=_('Started At'))
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name=_('Finished At'))
+    
+    class Meta:
+        verbose_name = _('Payment Job')
+        verbose_name_plural = _('Payment Jobs')
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Job {self.id} - Payment {self.payment_id} ({self.get_status_display()})"
+    
+    @property
+    def is_finished(self):
+        return self.status in ('succeeded', 'failed')
+
+
+class WebhookEvent(models.Model):
+    """Processor notification stored as received, applied later by the webhook worker."""
+    
+    STATUS_CHOICES = [
+        ('pending', _('Pending')),
+        ('applied', _('Applied')),
+        ('ignored', _('Ignored')),
+        ('failed', _('Failed')),
+    ]
+    
+    event_id = models.CharField(max_length=100, unique=True, verbose_name=_('Event ID'))
+    processor = models.CharField(max_length=50, blank=True, verbose_name=_('Processor'))
+    event_type = models.CharField(max_length=50, verbose_name=_('Event Type'))
+    payload = models.JSONField(default=dict, verbose_name=_('Payload'))
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name=_('Status'))
+    error = models.TextField(blank=True, verbose_name=_('Error'))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_('Attempts'))
+    
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Received At'))
+    applied_at = models.DateTimeField(blank=True, null=True, verbose_name=_('Applied At'))
+    
+    class Meta:
+        verbose_name = _('Webhook Event')
+        verbose_name_plural = _('Webhook Events')
+        ordering = ['-received_at', '-id']
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} ({self.get_status_display()})"
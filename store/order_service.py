@@ -0,0 +1,123 @@
+"""
+Order placement service for KeyReport IT Store
+Turns a shopping cart into an order inside a single database transaction
+"""
+
+from decimal import Decimal
+from typing import Dict, List
+
+from django.db import transaction
+
+from .inventory import InventoryService
+from .models import Cart, CartItem, Order, OrderItem, Product
+from .sequences import SequenceService
+from .shipping import ShippingService
+
+
+class OrderPlacementError(Exception):
+    """Raised when a cart cannot be turned into an order."""
+
+
+class EmptyCartError(OrderPlacementError):
+    """Raised when the cart has no items."""
+
+
+class InsufficientStockError(OrderPlacementError):
+    """Raised when one or more cart lines exceed the available stock."""
+
+    def __init__(self, shortages: Dict[str, int]):
+        self.shortages = shortages
+        names = ', '.join(shortages)
+        super().__init__(f"Stock insuffisant pour: {names}")
+
+
+class OrderPlacementService:
+    """Service class to place orders from a shopping cart."""
+
+    @staticmethod
+    def generate_order_number() -> str:
+        """Generate a new order number."""
+        return SequenceService.next_number('order')
+
+    @staticmethod
+    def place_order(cart: Cart, order: Order) -> Order:
+        """
+        Create ``order`` and its items from ``cart`` atomically.
+
+        ``order`` is an unsaved Order carrying the shipping and contact
+        details. Lines are priced from a single query, stock is reserved
+        through the inventory ledger with one batched INSERT and one
+        UPDATE, and the cart is emptied with one DELETE. Shipping is rated
+        from the locked products' weights when the shipping region is in
+        the rate table. Any failure rolls the whole placement back.
+        """
+        if not order.order_number or order.order_number.startswith('TEMP-'):
+            # Allocated outside the transaction so the number block is kept
+            order.order_number = OrderPlacementService.generate_order_number()
+
+        with transaction.atomic():
+            lines = list(
+                CartItem.objects.filter(cart=cart)
+                .order_by('id')
+                .values_list('product_id', 'quantity')
+            )
+            if not lines:
+                raise EmptyCartError('Votre panier est vide.')
+
+            quantities: Dict[int, int] = {}
+            for product_id, quantity in lines:
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+            # Lock the products so concurrent checkouts cannot oversell
+            products = {
+                product.id: product
+                for product in Product.objects.select_for_update()
+                .filter(id__in=quantities)
+                .only('id', 'name', 'sku', 'price', 'sale_price', 'stock_quantity', 'weight_kg')
+            }
+
+            shortages = {
+                products[product_id].name: products[product_id].stock_quantity
+                for product_id, quantity in quantities.items()
+                if products[product_id].stock_quantity < quantity
+            }
+            if shortages:
+                raise InsufficientStockError(shortages)
+
+            items: List[OrderItem] = []
+            subtotal = Decimal('0.00')
+            for product_id, quantity in lines:
+                product = products[product_id]
+                unit_price = product.current_price
+                total_price = unit_price * quantity
+                subtotal += total_price
+                items.append(OrderItem(
+                    product_id=product_id,
+                    quantity=quantity,
+                    unit_price=unit_price,
+                    total_price=total_price,
+                    product_name=product.name,
+                    product_sku=product.sku or "N/A",
+                ))
+
+            order.customer_id = cart.user_id
+            order.subtotal = subtotal
+            order.tax_amount = order.tax_amount or Decimal('0.00')
+            shipping_cost = ShippingService.quote_lines(
+                order.shipping_state,
+                quantities.items(),
+                {product_id: product.weight_kg for product_id, product in products.items()},
+            )
+            order.shipping_cost = shipping_cost if shipping_cost is not None else (order.shipping_cost or Decimal('0.00'))
+            order.total_amount = subtotal + order.tax_amount + order.shipping_cost
+            order.save()
+
+            for item in items:
+                item.order = order
+            OrderItem.objects.bulk_create(items)
+
+            InventoryService.record_order(order, quantities)
+
+            CartItem.objects.filter(cart=cart).delete()
+
+        return order
@@ -0,0 +1,70 @@
+"""
+Payment event log for KeyReport IT Store
+Records gateway activity as typed, indexed rows and answers reporting queries from them
+"""
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from .models import Payment, PaymentEvent
+
+
+class PaymentEventService:
+    """Service class to write and query payment events."""
+
+    @staticmethod
+    def record(payment: Payment, event_type: str, payload: Optional[Dict[str, Any]] = None,
+               amount: Optional[Decimal] = None, external_id: str = '', gateway: str = '') -> PaymentEvent:
+        """Append one event for ``payment``."""
+        return PaymentEvent.objects.create(
+            payment=payment,
+            event_type=event_type,
+            gateway=gateway,
+            amount=amount,
+            external_id=external_id or '',
+            payload=payload or {},
+        )
+
+    @staticmethod
+    def events_between(since: datetime, until: Optional[datetime] = None,
+                       event_types: Optional[Iterable[str]] = None):
+        """Events in [since, until), served by the (event_type, created_at) index."""
+        events = PaymentEvent.objects.filter(created_at__gte=since)
+        if until:
+            events = events.filter(created_at__lt=until)
+        if event_types is not None:
+            events = events.filter(event_type__in=list(event_types))
+        return events
+
+    @staticmethod
+    def refunds(since: datetime, until: Optional[datetime] = None):
+        """Successful refunds in the period, newest first."""
+        return PaymentEventService.events_between(since, until, ['refund_succeeded']).select_related(
+            'payment__order'
+        ).order_by('-created_at', '-id')
+
+    @staticmethod
+    def totals(since: datetime, until: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+        """Count and amount per event type in the period, in one grouped query."""
+        rows = PaymentEventService.events_between(since, until).values('event_type').annotate(
+            count=Count('id'),
+            total=Sum('amount'),
+        ).order_by()
+        return {
+            row['event_type']: {'count': row['count'], 'total': row['total'] or Decimal('0.00')}
+            for row in rows
+        }
+
+    @staticmethod
+    def daily_totals(event_type: str, since: datetime, until: Optional[datetime] = None):
+        """(day, count, amount) rows for one event type."""
+        return PaymentEventService.events_between(since, until, [event_type]).annotate(
+            day=TruncDate('created_at'),
+        ).values('day').annotate(
+            count=Count('id'),
+            total=Sum('amount'),
+        ).order_by('day').values_list('day', 'count', 'total')
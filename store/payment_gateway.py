@@ -6,19 +6,174 @@ Supports multiple payment methods including Moroccan banks and international gat
 import json
 import hashlib
 import hmac
+import threading
 import time
 from decimal import Decimal
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
+from django.db.models import Sum
 from django.utils import timezone
+from django.utils.module_loading import import_string
 from .models import Payment, Order
+from .payment_events import PaymentEventService
+from .shipping import ShippingService
 
 
 class PaymentGateway:
     """Base payment gateway class."""
     
+    # Key looked up in settings.PAYMENT_GATEWAY_URLS when gateway_name has no entry
+    processor_key = None
+    
     def __init__(self):
         self.gateway_name = "base"
+        self._http = None
+        self._http_lock = threading.Lock()
+    
+    def get_http_options(self) -> Dict[str, Any]:
+        """HTTP settings for this gateway from ``settings.PAYMENT_GATEWAY_HTTP``."""
+        options = {'timeout': 10, 'pool_connections': 4, 'pool_maxsize': 10, 'max_retries': 2}
+        configured = getattr(settings, 'PAYMENT_GATEWAY_HTTP', {})
+        options.update(configured.get('default', {}))
+        options.update(configured.get(self.gateway_name, {}))
+        return options
+    
+    @property
+    def http(self):
+        """
+        Pooled HTTP session for calls to the gateway API.
+        
+        Created on first use, so gateways that never talk to a remote API
+        never open connections.
+        """
+        if self._http is None:
+            with self._http_lock:
+                if self._http is None:
+                    options = self.get_http_options()
+                    adapter = HTTPAdapter(
+                        pool_connections=options['pool_connections'],
+                        pool_maxsize=options['pool_maxsize'],
+                        max_retries=options['max_retries'],
+                    )
+                    session = requests.Session()
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._http = session
+        return self._http
+    
+    def request(self, method: str, url: str, **kwargs):
+        """Send a request through the pooled session with the gateway timeout."""
+        kwargs.setdefault('timeout', self.get_http_options()['timeout'])
+        return self.http.request(method, url, **kwargs)
+    
+    def close(self):
+        """Release pooled connections."""
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+    
+    def record_event(self, payment: Payment, event_type: str, payload: Dict[str, Any],
+                     amount: Optional[Decimal] = None, external_id: Optional[str] = None):
+        """Append a PaymentEvent; money events default to the payment's amount and transaction id."""
+        if amount is None and event_type != 'verification':
+            amount = payment.amount
+        return PaymentEventService.record(
+            payment,
+            event_type,
+            payload=payload,
+            amount=amount,
+            external_id=payment.transaction_id if external_id is None else external_id,
+            gateway=self.gateway_name,
+        )
+    
+    @property
+    def api_url(self) -> str:
+        """
+        Base URL of the processor API, from ``settings.PAYMENT_GATEWAY_URLS``.
+        
+        Empty by default, in which case the gateway simulates the processor
+        in-process. Point it at ``run_stub_processor`` to exercise real HTTP
+        round trips with injected latency and failures.
+        """
+        urls = getattr(settings, 'PAYMENT_GATEWAY_URLS', {})
+        return urls.get(self.gateway_name) or urls.get(self.processor_key or '', '')
+    
+    def refund_status(self, payment: Payment, refund_amount: Decimal) -> str:
+        """Payment status after refunding ``refund_amount``: refunded once refunds cover the payment."""
+        refunded = payment.events.filter(event_type='refund_succeeded').aggregate(total=Sum('amount'))['total']
+        if (refunded or Decimal('0.00')) + refund_amount >= payment.amount:
+            return 'refunded'
+        return 'partially_refunded'
+    
+    def process_remote_payment(self, payment: Payment, **kwargs) -> Dict[str, Any]:
+        """Charge ``payment`` through the processor API at ``api_url``."""
+        try:
+            response = self.request('POST', f"{self.api_url.rstrip('/')}/charges", json={
+                'amount': str(payment.amount),
+                'currency': 'MAD',
+                'reference': payment.order.order_number,
+            })
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            payment.status = 'failed'
+            payment.save()
+            self.record_event(payment, 'charge_failed', {'error': str(e)})
+            return {'success': False, 'error': str(e), 'message': 'Payment processor unreachable'}
+        
+        if response.status_code == 200:
+            payment.status = 'completed'
+            payment.processed_at = timezone.now()
+            payment.transaction_id = data['id']
+            payment.save()
+            self.record_event(payment, 'charge_succeeded', data)
+            return {
+                'success': True,
+                'transaction_id': payment.transaction_id,
+                'status': 'completed',
+                'message': 'Payment processed successfully'
+            }
+        
+        payment.status = 'failed'
+        payment.save()
+        self.record_event(payment, 'charge_failed', data, external_id=data.get('id', ''))
+        return {
+            'success': False,
+            'error': data.get('error', f'HTTP {response.status_code}'),
+            'message': 'Payment declined' if response.status_code == 402 else 'Payment processor error'
+        }
+    
+    def refund_remote_payment(self, payment: Payment, amount: Optional[Decimal] = None) -> Dict[str, Any]:
+        """Refund ``payment`` through the processor API at ``api_url``."""
+        refund_amount = amount or payment.amount
+        try:
+            response = self.request('POST', f"{self.api_url.rstrip('/')}/refunds", json={
+                'charge_id': payment.transaction_id,
+                'amount': str(refund_amount),
+            })
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            self.record_event(payment, 'refund_failed', {'error': str(e)}, amount=refund_amount, external_id='')
+            return {'success': False, 'error': str(e), 'message': 'Payment processor unreachable'}
+        
+        if response.status_code != 200:
+            self.record_event(payment, 'refund_failed', data, amount=refund_amount, external_id='')
+            return {
+                'success': False,
+                'error': data.get('error', f'HTTP {response.status_code}'),
+                'message': 'Refund failed'
+            }
+        
+        payment.status = self.refund_status(payment, refund_amount)
+        payment.save()
+        self.record_event(payment, 'refund_succeeded', data, amount=refund_amount, external_id=data.get('id', ''))
+        return {
+            'success': True,
+            'refund_amount': refund_amount,
+            'message': 'Refund processed successfully'
+        }
     
     def process_payment(self, payment: Payment, **kwargs) -> Dict[str, Any]:
         """Process a payment through the gateway."""
@@ -36,6 +191,8 @@ class PaymentGateway:
 class StripeGateway(PaymentGateway):
     """Stripe payment gateway integration."""
     
+    processor_key = 'stripe'
+    
     def __init__(self):
         super().__init__()
         self.gateway_name = "stripe"
@@ -45,6 +202,9 @@ class StripeGateway(PaymentGateway):
     
     def process_payment(self, payment: Payment, **kwargs) -> Dict[str, Any]:
         """Process payment through Stripe."""
+        if self.api_url and kwargs.get('payment_method_id'):
+            return self.process_remote_payment(payment, **kwargs)
+        
         try:
             # Simulate Stripe API call
             payment_intent_data = {
@@ -60,13 +220,14 @@ class StripeGateway(PaymentGateway):
                 payment.status = 'completed'
                 payment.processed_at = timezone.now()
                 payment.transaction_id = f"pi_{hashlib.md5(str(payment.id).encode()).hexdigest()[:24]}"
-                payment.processor_response = {
+                response_data = {
                     'payment_intent_id': payment.transaction_id,
                     'status': 'succeeded',
                     'amount_received': int(payment.amount * 100),
                     'currency': 'mad'
                 }
                 payment.save()
+                self.record_event(payment, 'charge_succeeded', response_data)
                 
                 return {
                     'success': True,
@@ -83,8 +244,8 @@ class StripeGateway(PaymentGateway):
                 
         except Exception as e:
             payment.status = 'failed'
-            payment.processor_response = {'error': str(e)}
             payment.save()
+            self.record_event(payment, 'charge_failed', {'error': str(e)})
             
             return {
                 'success': False,
@@ -95,24 +256,30 @@ class StripeGateway(PaymentGateway):
     def verify_payment(self, payment: Payment, **kwargs) -> Dict[str, Any]:
         """Verify payment status with Stripe."""
         # Simulate API call to Stripe
-        return {
+        result = {
             'success': True,
             'status': payment.status,
             'transaction_id': payment.transaction_id
         }
+        self.record_event(payment, 'verification', result)
+        return result
     
     def refund_payment(self, payment: Payment, amount: Optional[Decimal] = None) -> Dict[str, Any]:
         """Refund payment through Stripe."""
+        if self.api_url:
+            return self.refund_remote_payment(payment, amount)
+        
         refund_amount = amount or payment.amount
         
         # Simulate refund
-        payment.status = 'refunded'
-        payment.processor_response['refund'] = {
+        payment.status = self.refund_status(payment, refund_amount)
+        refund_data = {
             'amount': float(refund_amount),
             'status': 'succeeded',
             'refund_id': f"re_{hashlib.md5(str(payment.id).encode()).hexdigest()[:24]}"
         }
         payment.save()
+        self.record_event(payment, 'refund_succeeded', refund_data, amount=refund_amount, external_id=refund_data['refund_id'])
         
         return {
             'success': True,
@@ -124,6 +291,8 @@ class StripeGateway(PaymentGateway):
 class PayPalGateway(PaymentGateway):
     """PayPal payment gateway integration."""
     
+    processor_key = 'paypal'
+    
     def __init__(self):
         super().__init__()
         self.gateway_name = "paypal"
@@ -132,6 +301,9 @@ class PayPalGateway(PaymentGateway):
     
     def process_payment(self, payment: Payment, **kwargs) -> Dict[str, Any]:
         """Process payment through PayPal."""
+        if self.api_url:
+            return self.process_remote_payment(payment, **kwargs)
+        
         try:
             # Simulate PayPal API call
             payment.status = 'processing'
@@ -141,7 +313,7 @@ class PayPalGateway(PaymentGateway):
             payment.status = 'completed'
             payment.processed_at = timezone.now()
             payment.transaction_id = f"PAYID-{hashlib.md5(str(payment.id).encode()).hexdigest()[:17].upper()}"
-            payment.processor_response = {
+            response_data = {
                 'payment_id': payment.transaction_id,
                 'state': 'approved',
                 'amount': {
@@ -150,6 +322,7 @@ class PayPalGateway(PaymentGateway):
                 }
             }
             payment.save()
+            self.record_event(payment, 'charge_succeeded', response_data)
             
             return {
                 'success': True,
@@ -160,8 +333,8 @@ class PayPalGateway(PaymentGateway):
             
         except Exception as e:
             payment.status = 'failed'
-            payment.processor_response = {'error': str(e)}
             payment.save()
+            self.record_event(payment, 'charge_failed', {'error': str(e)})
             
             return {
                 'success': False,
@@ -171,23 +344,29 @@ class PayPalGateway(PaymentGateway):
     
     def verify_payment(self, payment: Payment, **kwargs) -> Dict[str, Any]:
         """Verify payment status with PayPal."""
-        return {
+        result = {
             'success': True,
             'status': payment.status,
             'transaction_id': payment.transaction_id
         }
+        self.record_event(payment, 'verification', result)
+        return result
     
     def refund_payment(self, payment: Payment, amount: Optional[Decimal] = None) -> Dict[str, Any]:
         """Refund payment through PayPal."""
+        if self.api_url:
+            return self.refund_remote_payment(payment, amount)
+        
         refund_amount = amount or payment.amount
         
-        payment.status = 'refunded'
-        payment.processor_response['refund'] = {
+        payment.status = self.refund_status(payment, refund_amount)
+        refund_data = {
             'amount': str(refund_amount),
             'status': 'completed',
             'refund_id': f"REF-{hashlib.md5(str(payment.id).encode()).hexdigest()[:17].upper()}"
         }
         payment.save()
+        self.record_event(payment, 'refund_succeeded', refund_data, amount=refund_amount, external_id=refund_data['refund_id'])
         
         return {
             'success': True,
@@ -199,6 +378,8 @@ class PayPalGateway(PaymentGateway):
 class MoroccanBankGateway(PaymentGateway):
     """Moroccan bank payment gateway (CIH, Attijariwafa, BMCE)."""
     
+    processor_key = 'moroccan_bank'
+    
     def __init__(self, bank_name: str):
         super().__init__()
         self.gateway_name = f"moroccan_bank_{bank_name.lower()}"
@@ -206,6 +387,9 @@ class MoroccanBankGateway(PaymentGateway):
     
     def process_payment(self, payment: Payment, **kwargs) -> Dict[str, Any]:
         """Process payment through Moroccan bank."""
+        if self.api_url:
+            return self.process_remote_payment(payment, **kwargs)
+        
         try:
             # Simulate bank API call
             payment.status = 'processing'
@@ -215,7 +399,7 @@ class MoroccanBankGateway(PaymentGateway):
             payment.status = 'completed'
             payment.processed_at = timezone.now()
             payment.transaction_id = f"{self.bank_name.upper()}-{hashlib.md5(str(payment.id).encode()).hexdigest()[:12].upper()}"
-            payment.processor_response = {
+            response_data = {
                 'bank': self.bank_name,
                 'transaction_id': payment.transaction_id,
                 'status': 'approved',
@@ -223,6 +407,7 @@ class MoroccanBankGateway(PaymentGateway):
                 'currency': 'MAD'
             }
             payment.save()
+            self.record_event(payment, 'charge_succeeded', response_data)
             
             return {
                 'success': True,
@@ -233,8 +418,8 @@ class MoroccanBankGateway(PaymentGateway):
             
         except Exception as e:
             payment.status = 'failed'
-            payment.processor_response = {'error': str(e)}
             payment.save()
+            self.record_event(payment, 'charge_failed', {'error': str(e)})
             
             return {
                 'success': False,
@@ -244,24 +429,30 @@ class MoroccanBankGateway(PaymentGateway):
     
     def verify_payment(self, payment: Payment, **kwargs) -> Dict[str, Any]:
         """Verify payment status with bank."""
-        return {
+        result = {
             'success': True,
             'status': payment.status,
             'transaction_id': payment.transaction_id,
             'bank': self.bank_name
         }
+        self.record_event(payment, 'verification', result)
+        return result
     
     def refund_payment(self, payment: Payment, amount: Optional[Decimal] = None) -> Dict[str, Any]:
         """Refund payment through bank."""
+        if self.api_url:
+            return self.refund_remote_payment(payment, amount)
+        
         refund_amount = amount or payment.amount
         
-        payment.status = 'refunded'
-        payment.processor_response['refund'] = {
+        payment.status = self.refund_status(payment, refund_amount)
+        refund_data = {
             'amount': float(refund_amount),
             'status': 'completed',
             'refund_id': f"{self.bank_name.upper()}-REF-{hashlib.md5(str(payment.id).encode()).hexdigest()[:8].upper()}"
         }
         payment.save()
+        self.record_event(payment, 'refund_succeeded', refund_data, amount=refund_amount, external_id=refund_data['refund_id'])
         
         return {
             'success': True,
@@ -282,12 +473,13 @@ class CashOnDeliveryGateway(PaymentGateway):
         # COD payments are always pending until delivery
         payment.status = 'pending'
         payment.transaction_id = f"COD-{hashlib.md5(str(payment.id).encode()).hexdigest()[:12].upper()}"
-        payment.processor_response = {
+        response_data = {
             'method': 'cash_on_delivery',
             'status': 'pending_confirmation',
             'delivery_instructions': 'Payment to be collected upon delivery'
         }
         payment.save()
+        self.record_event(payment, 'charge_pending', response_data)
         
         return {
             'success': True,
@@ -298,22 +490,25 @@ class CashOnDeliveryGateway(PaymentGateway):
     
     def verify_payment(self, payment: Payment, **kwargs) -> Dict[str, Any]:
         """Verify COD payment status."""
-        return {
+        result = {
             'success': True,
             'status': payment.status,
             'transaction_id': payment.transaction_id,
             'method': 'cash_on_delivery'
         }
+        self.record_event(payment, 'verification', result)
+        return result
     
     def refund_payment(self, payment: Payment, amount: Optional[Decimal] = None) -> Dict[str, Any]:
         """Refund COD payment (cancel order)."""
-        payment.status = 'refunded'
-        payment.processor_response['refund'] = {
+        payment.status = self.refund_status(payment, amount or payment.amount)
+        refund_data = {
             'amount': float(amount or payment.amount),
             'status': 'cancelled',
             'reason': 'Order cancelled before delivery'
         }
         payment.save()
+        self.record_event(payment, 'refund_succeeded', refund_data, amount=amount or payment.amount)
         
         return {
             'success': True,
@@ -322,52 +517,107 @@ class CashOnDeliveryGateway(PaymentGateway):
         }
 
 
+class GatewayRegistry:
+    """
+    Process-wide registry of payment gateways.
+    
+    Gateways are registered under a key together with the payment methods
+    they handle. Each gateway is built once, on first use, and the instance
+    (with its HTTP connection pool) is shared by every later call. Apps can
+    add gateways with ``register`` or through ``settings.PAYMENT_GATEWAYS``::
+    
+        PAYMENT_GATEWAYS = {
+            'cmi': {
+                'class': 'payments.gateways.CMIGateway',
+                'methods': ['cmi'],
+                'metadata': {'cmi': {'name': 'CMI', ...}},
+            },
+        }
+    """
+    
+    DEFAULT_GATEWAY = 'cash_on_delivery'
+    
+    _factories: Dict[str, Callable[[], PaymentGateway]] = {}
+    _methods: Dict[str, str] = {}
+    _metadata: Dict[str, Dict[str, Any]] = {}
+    _instances: Dict[str, PaymentGateway] = {}
+    _settings_loaded = False
+    _lock = threading.RLock()
+    
+    @classmethod
+    def register(cls, key: str, factory: Callable[[], PaymentGateway], methods: Iterable[str],
+                 metadata: Optional[Dict[str, Dict[str, Any]]] = None):
+        """Register ``factory`` as gateway ``key`` for ``methods``."""
+        with cls._lock:
+            cls._factories[key] = factory
+            old = cls._instances.pop(key, None)
+            if old is not None:
+                old.close()
+            for method in methods:
+                cls._methods[method] = key
+            if metadata:
+                cls.add_payment_methods(metadata)
+    
+    @classmethod
+    def add_payment_methods(cls, metadata: Dict[str, Dict[str, Any]]):
+        """Add or replace payment-method metadata."""
+        with cls._lock:
+            cls._metadata.update(metadata)
+    
+    @classmethod
+    def get_gateway(cls, payment_method: str) -> PaymentGateway:
+        """Return the shared gateway instance for ``payment_method``."""
+        cls._load_settings()
+        key = cls._methods.get(payment_method, cls.DEFAULT_GATEWAY)
+        gateway = cls._instances.get(key)
+        if gateway is None:
+            with cls._lock:
+                gateway = cls._instances.get(key)
+                if gateway is None:
+                    gateway = cls._factories[key]()
+                    cls._instances[key] = gateway
+        return gateway
+    
+    @classmethod
+    def get_payment_methods(cls) -> Dict[str, Dict[str, Any]]:
+        """Metadata of every registered payment method (shared, do not modify)."""
+        cls._load_settings()
+        return cls._metadata
+    
+    @classmethod
+    def reset(cls):
+        """Drop the built gateways so the next call rebuilds them from current settings."""
+        with cls._lock:
+            for gateway in cls._instances.values():
+                gateway.close()
+            cls._instances.clear()
+            cls._settings_loaded = False
+    
+    @classmethod
+    def _load_settings(cls):
+        """Register the gateways declared in ``settings.PAYMENT_GATEWAYS`` once."""
+        if cls._settings_loaded:
+            return
+        with cls._lock:
+            if cls._settings_loaded:
+                return
+            for key, config in getattr(settings, 'PAYMENT_GATEWAYS', {}).items():
+                cls.register(
+                    key,
+                    import_string(config['class']),
+                    config.get('methods', [key]),
+                    config.get('metadata'),
+                )
+            cls._settings_loaded = True
+
+
 class PaymentGatewayFactory:
     """Factory class to create appropriate payment gateway instances."""
     
     @staticmethod
     def get_gateway(payment_method: str) -> PaymentGateway:
         """Get the appropriate payment gateway for the payment method."""
-        gateway_map = {
-            # Cartes bancaires
-            'credit_card': StripeGateway,
-            'debit_card': StripeGateway,
-            'visa': StripeGateway,
-            'mastercard': StripeGateway,
-            
-            # Paiements numériques
-            'paypal': PayPalGateway,
-            'apple_pay': StripeGateway,
-            'google_pay': StripeGateway,
-            
-            # Paiement à la livraison
-            'cash_delivery': CashOnDeliveryGateway,
-            
-            # Services marocains
-            'wafacash': lambda: MoroccanBankGateway('WafaCash'),
-            'cashplus': lambda: MoroccanBankGateway('CashPlus'),
-            'baridbanque': lambda: MoroccanBankGateway('Barid Bank'),
-            
-            # Virements bancaires
-            'bank_transfer': lambda: MoroccanBankGateway('Bank Transfer'),
-            'cih_bank': lambda: MoroccanBankGateway('CIH'),
-            'attijariwafa': lambda: MoroccanBankGateway('Attijariwafa'),
-            'bmce': lambda: MoroccanBankGateway('BMCE'),
-            
-            # Méthodes legacy
-            'cash': CashOnDeliveryGateway,
-            'stripe': StripeGateway,
-        }
-        
-        gateway_class = gateway_map.get(payment_method)
-        if gateway_class:
-            return gateway_class()
-        else:
-            # Default to Stripe for unknown card payments
-            if payment_method in ['visa', 'mastercard', 'apple_pay', 'google_pay', 'credit_card', 'debit_card']:
-                return StripeGateway()
-            else:
-                return CashOnDeliveryGateway()
+        return GatewayRegistry.get_gateway(payment_method)
 
 
 class MoroccanShippingService:
@@ -376,47 +626,12 @@ class MoroccanShippingService:
     @staticmethod
     def get_shipping_cost(region: str, weight: float = 1.0) -> Decimal:
         """Calculate shipping cost based on Moroccan region."""
-        base_costs = {
-            'Casablanca-Settat': Decimal('0.00'),  # Free shipping in Casablanca
-            'Rabat-Salé-Kénitra': Decimal('15.00'),
-            'Fès-Meknès': Decimal('25.00'),
-            'Marrakech-Safi': Decimal('30.00'),
-            'Tanger-Tétouan-Al Hoceïma': Decimal('35.00'),
-            'Oriental': Decimal('40.00'),
-            'Béni Mellal-Khénifra': Decimal('30.00'),
-            'Souss-Massa': Decimal('45.00'),
-            'Guelmim-Oued Noun': Decimal('60.00'),
-            'Laâyoune-Sakia El Hamra': Decimal('80.00'),
-            'Dakhla-Oued Ed-Dahab': Decimal('100.00'),
-            'Drâa-Tafilalet': Decimal('50.00'),
-        }
-        
-        base_cost = base_costs.get(region, Decimal('50.00'))
-        
-        # Add weight-based pricing (5 MAD per kg)
-        weight_cost = Decimal(str(weight)) * Decimal('5.00')
-        
-        return base_cost + weight_cost
+        return ShippingService.quote(region, weight)
     
     @staticmethod
     def get_delivery_time(region: str) -> str:
         """Get estimated delivery time for Moroccan regions."""
-        delivery_times = {
-            'Casablanca-Settat': '1-2 jours',
-            'Rabat-Salé-Kénitra': '2-3 jours',
-            'Fès-Meknès': '3-4 jours',
-            'Marrakech-Safi': '3-5 jours',
-            'Tanger-Tétouan-Al Hoceïma': '4-5 jours',
-            'Oriental': '4-6 jours',
-            'Béni Mellal-Khénifra': '3-5 jours',
-            'Souss-Massa': '5-7 jours',
-            'Guelmim-Oued Noun': '7-10 jours',
-            'Laâyoune-Sakia El Hamra': '10-14 jours',
-            'Dakhla-Oued Ed-Dahab': '14-21 jours',
-            'Drâa-Tafilalet': '6-8 jours',
-        }
-        
-        return delivery_times.get(region, '5-7 jours')
+        return ShippingService.get_delivery_time(region)
 
 
 class PaymentService:
@@ -437,142 +652,165 @@ class PaymentService:
     @staticmethod
     def refund_payment(payment: Payment, amount: Optional[Decimal] = None) -> Dict[str, Any]:
         """Refund a payment using the appropriate gateway."""
+        from .receipt_cache import ReceiptCache
+        
         gateway = PaymentGatewayFactory.get_gateway(payment.payment_method)
-        return gateway.refund_payment(payment, amount)
+        result = gateway.refund_payment(payment, amount)
+        ReceiptCache.invalidate(payment.id)
+        return result
     
     @staticmethod
     def get_payment_methods() -> Dict[str, Dict[str, Any]]:
         """Get available payment methods with their details."""
-        return {
-            # Cartes bancaires
-            'credit_card': {
-                'name': 'Credit Card',
-                'description': 'Pay with your credit card',
-                'icon': 'fas fa-credit-card',
-                'available': True,
-                'processing_fee': 2.5
-            },
-            'debit_card': {
-                'name': 'Debit Card',
-                'description': 'Pay with your debit card',
-                'icon': 'fas fa-credit-card',
-                'available': True,
-                'processing_fee': 2.5
-            },
-            'visa': {
-                'name': 'Visa',
-                'description': 'Pay with your Visa card',
-                'icon': 'fab fa-cc-visa',
-                'available': True,
-                'processing_fee': 2.5
-            },
-            'mastercard': {
-                'name': 'Mastercard',
-                'description': 'Pay with your Mastercard',
-                'icon': 'fab fa-cc-mastercard',
-                'available': True,
-                'processing_fee': 2.5
-            },
-            
-            # Paiements numériques
-            'paypal': {
-                'name': 'PayPal',
-                'description': 'Pay with your PayPal account',
-                'icon': 'fab fa-paypal',
-                'available': True,
-                'processing_fee': 3.4
-            },
-            'apple_pay': {
-                'name': 'Apple Pay',
-                'description': 'Pay with Apple Pay',
-                'icon': 'fab fa-apple-pay',
-                'available': True,
-                'processing_fee': 2.5
-            },
-            'google_pay': {
-                'name': 'Google Pay',
-                'description': 'Pay with Google Pay',
-                'icon': 'fab fa-google-pay',
-                'available': True,
-                'processing_fee': 2.5
-            },
-            
-            # Paiement à la livraison
-            'cash_delivery': {
-                'name': 'Cash on Delivery',
-                'description': 'Pay when your order is delivered',
-                'icon': 'fas fa-money-bill-wave',
-                'available': True,
-                'processing_fee': 0
-            },
-            
-            # Services marocains
-            'wafacash': {
-                'name': 'WafaCash',
-                'description': 'Pay with WafaCash service',
-                'icon': 'fas fa-university',
-                'available': True,
-                'processing_fee': 0
-            },
-            'cashplus': {
-                'name': 'CashPlus',
-                'description': 'Pay with CashPlus service',
-                'icon': 'fas fa-university',
-                'available': True,
-                'processing_fee': 0
-            },
-            'baridbanque': {
-                'name': 'Barid Bank',
-                'description': 'Pay with Barid Bank service',
-                'icon': 'fas fa-university',
-                'available': True,
-                'processing_fee': 0
-            },
-            
-            # Virements bancaires
-            'bank_transfer': {
-                'name': 'Bank Transfer',
-                'description': 'Direct bank transfer',
-                'icon': 'fas fa-university',
-                'available': True,
-                'processing_fee': 0
-            },
-            'cih_bank': {
-                'name': 'CIH Bank',
-                'description': 'Pay with your CIH Bank account',
-                'icon': 'fas fa-credit-card',
-                'available': True,
-                'processing_fee': 0
-            },
-            'attijariwafa': {
-                'name': 'Attijariwafa Bank',
-                'description': 'Pay with your Attijariwafa Bank account',
-                'icon': 'fas fa-credit-card',
-                'available': True,
-                'processing_fee': 0
-            },
-            'bmce': {
-                'name': 'BMCE Bank',
-                'description': 'Pay with your BMCE Bank account',
-                'icon': 'fas fa-credit-card',
-                'available': True,
-                'processing_fee': 0
-            },
-            
-            # Méthodes legacy (pour compatibilité)
-            'cash': {
-                'name': 'Cash on Delivery',
-                'description': 'Pay when your order is delivered',
-                'icon': 'fas fa-money-bill-wave',
-                'available': True,
-                'processing_fee': 0
-            },
-            'stripe': {
-                'name': 'Stripe',
-                'description': 'Secure online payment',
-                'icon': 'fas fa-shield-alt',
-                'available': True,
-                'processing_fee': 2.9
-            }
-        }
+        return GatewayRegistry.get_payment_methods()
+
+
+PAYMENT_METHODS = {
+    # Cartes bancaires
+    'credit_card': {
+        'name': 'Credit Card',
+        'description': 'Pay with your credit card',
+        'icon': 'fas fa-credit-card',
+        'available': True,
+        'processing_fee': 2.5
+    },
+    'debit_card': {
+        'name': 'Debit Card',
+        'description': 'Pay with your debit card',
+        'icon': 'fas fa-credit-card',
+        'available': True,
+        'processing_fee': 2.5
+    },
+    'visa': {
+        'name': 'Visa',
+        'description': 'Pay with your Visa card',
+        'icon': 'fab fa-cc-visa',
+        'available': True,
+        'processing_fee': 2.5
+    },
+    'mastercard': {
+        'name': 'Mastercard',
+        'description': 'Pay with your Mastercard',
+        'icon': 'fab fa-cc-mastercard',
+        'available': True,
+        'processing_fee': 2.5
+    },
+    
+    # Paiements numériques
+    'paypal': {
+        'name': 'PayPal',
+        'description': 'Pay with your PayPal account',
+        'icon': 'fab fa-paypal',
+        'available': True,
+        'processing_fee': 3.4
+    },
+    'apple_pay': {
+        'name': 'Apple Pay',
+        'description': 'Pay with Apple Pay',
+        'icon': 'fab fa-apple-pay',
+        'available': True,
+        'processing_fee': 2.5
+    },
+    'google_pay': {
+        'name': 'Google Pay',
+        'description': 'Pay with Google Pay',
+        'icon': 'fab fa-google-pay',
+        'available': True,
+        'processing_fee': 2.5
+    },
+    
+    # Paiement à la livraison
+    'cash_delivery': {
+        'name': 'Cash on Delivery',
+        'description': 'Pay when your order is delivered',
+        'icon': 'fas fa-money-bill-wave',
+        'available': True,
+        'processing_fee': 0
+    },
+    
+    # Services marocains
+    'wafacash': {
+        'name': 'WafaCash',
+        'description': 'Pay with WafaCash service',
+        'icon': 'fas fa-university',
+        'available': True,
+        'processing_fee': 0
+    },
+    'cashplus': {
+        'name': 'CashPlus',
+        'description': 'Pay with CashPlus service',
+        'icon': 'fas fa-university',
+        'available': True,
+        'processing_fee': 0
+    },
+    'baridbanque': {
+        'name': 'Barid Bank',
+        'description': 'Pay with Barid Bank service',
+        'icon': 'fas fa-university',
+        'available': True,
+        'processing_fee': 0
+    },
+    
+    # Virements bancaires
+    'bank_transfer': {
+        'name': 'Bank Transfer',
+        'description': 'Direct bank transfer',
+        'icon': 'fas fa-university',
+        'available': True,
+        'processing_fee': 0
+    },
+    'cih_bank': {
+        'name': 'CIH Bank',
+        'description': 'Pay with your CIH Bank account',
+        'icon': 'fas fa-credit-card',
+        'available': True,
+        'processing_fee': 0
+    },
+    'attijariwafa': {
+        'name': 'Attijariwafa Bank',
+        'description': 'Pay with your Attijariwafa Bank account',
+        'icon': 'fas fa-credit-card',
+        'available': True,
+        'processing_fee': 0
+    },
+    'bmce': {
+        'name': 'BMCE Bank',
+        'description': 'Pay with your BMCE Bank account',
+        'icon': 'fas fa-credit-card',
+        'available': True,
+        'processing_fee': 0
+    },
+    
+    # Méthodes legacy (pour compatibilité)
+    'cash': {
+        'name': 'Cash on Delivery',
+        'description': 'Pay when your order is delivered',
+        'icon': 'fas fa-money-bill-wave',
+        'available': True,
+        'processing_fee': 0
+    },
+    'stripe': {
+        'name': 'Stripe',
+        'description': 'Secure online payment',
+        'icon': 'fas fa-shield-alt',
+        'available': True,
+        'processing_fee': 2.9
+    }
+}
+
 
+# Built-in gateways
+GatewayRegistry.register(
+    'stripe', StripeGateway,
+    ['credit_card', 'debit_card', 'visa', 'mastercard', 'apple_pay', 'google_pay', 'stripe'],
+)
+GatewayRegistry.register('paypal', PayPalGateway, ['paypal'])
+GatewayRegistry.register('cash_on_delivery', CashOnDeliveryGateway, ['cash_delivery', 'cash'])
+GatewayRegistry.register('wafacash', lambda: MoroccanBankGateway('WafaCash'), ['wafacash'])
+GatewayRegistry.register('cashplus', lambda: MoroccanBankGateway('CashPlus'), ['cashplus'])
+GatewayRegistry.register('baridbanque', lambda: MoroccanBankGateway('Barid Bank'), ['baridbanque'])
+GatewayRegistry.register('bank_transfer', lambda: MoroccanBankGateway('Bank Transfer'), ['bank_transfer'])
+GatewayRegistry.register('cih_bank', lambda: MoroccanBankGateway('CIH'), ['cih_bank'])
+GatewayRegistry.register('attijariwafa', lambda: MoroccanBankGateway('Attijariwafa'), ['attijariwafa'])
+GatewayRegistry.register('bmce', lambda: MoroccanBankGateway('BMCE'), ['bmce'])
+GatewayRegistry.add_payment_methods(PAYMENT_METHODS)
@@ -0,0 +1,218 @@
+"""
+Background payment pipeline for KeyReport IT Store
+Runs gateway calls, order updates and receipt generation outside the web request
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+
+from .models import PaymentJob
+from .payment_gateway import PaymentService
+from .receipt_cache import ReceiptCache
+
+logger = logging.getLogger(__name__)
+
+
+def get_pipeline_mode() -> str:
+    """
+    How queued jobs are run.
+
+    ``thread`` (default) runs them on a small in-process thread pool,
+    with a sweeper thread picking up jobs a dead process left queued;
+    ``worker`` leaves them to the ``run_payment_worker`` command and
+    ``inline`` runs them before the request returns.
+    """
+    return getattr(settings, 'PAYMENT_PIPELINE_MODE', 'thread')
+
+
+def get_poll_interval() -> float:
+    """Seconds between sweeps of the queue in ``thread`` mode."""
+    return getattr(settings, 'PAYMENT_PIPELINE_POLL_INTERVAL', 30)
+
+
+def get_stale_after() -> timedelta:
+    """How long a job may sit queued or running before a sweep takes it over."""
+    return timedelta(seconds=getattr(settings, 'PAYMENT_PIPELINE_STALE_AFTER', 300))
+
+
+class PaymentPipeline:
+    """Service class to queue and run payment jobs."""
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _poller: Optional[threading.Thread] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def executor(cls) -> ThreadPoolExecutor:
+        """Thread pool used in ``thread`` mode, created on first use."""
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'PAYMENT_PIPELINE_THREADS', 4),
+                    thread_name_prefix='payment-pipeline',
+                )
+        return cls._executor
+
+    @classmethod
+    def start_poller(cls):
+        """
+        Start the ``thread`` mode sweeper of this process, once.
+
+        Jobs handed to the pool through on_commit are lost if the process
+        dies or recycles before running them; the sweeper runs queued jobs
+        older than PAYMENT_PIPELINE_STALE_AFTER and requeues stale running
+        ones every PAYMENT_PIPELINE_POLL_INTERVAL seconds, so whichever
+        process is alive picks them up.
+        """
+        with cls._lock:
+            if cls._poller is None or not cls._poller.is_alive():
+                cls._poller = threading.Thread(target=cls._poll, name='payment-pipeline-poller', daemon=True)
+                cls._poller.start()
+
+    @classmethod
+    def _poll(cls):
+        while True:
+            time.sleep(get_poll_interval())
+            close_old_connections()
+            try:
+                cls.requeue_stale(get_stale_after())
+                for job_id in cls.pending_ids(100, queued_before=timezone.now() - get_stale_after()):
+                    cls.executor().submit(cls._run_in_thread, job_id)
+            except Exception:
+                logger.exception('Payment pipeline sweep failed')
+            finally:
+                connections.close_all()
+
+    @staticmethod
+    def enqueue(payment, order_status: str = '', success_url: str = '',
+                failure_url: str = '', **gateway_kwargs) -> PaymentJob:
+        """
+        Queue ``payment`` for processing and return the job.
+
+        The gateway is only called for payments still in ``processing``;
+        payments the view already settled (cash on delivery, bank transfer)
+        only get their order update and receipt. ``order_status`` is applied
+        to the order when the payment succeeds.
+        """
+        job = PaymentJob.objects.create(
+            payment=payment,
+            gateway_kwargs=gateway_kwargs,
+            order_status=order_status,
+            success_url=success_url,
+            failure_url=failure_url,
+        )
+
+        mode = get_pipeline_mode()
+        if mode == 'inline':
+            PaymentPipeline.run_job(job.id)
+            job.refresh_from_db()
+        elif mode == 'thread':
+            # Wait for the job row to be committed before a thread can see it
+            transaction.on_commit(lambda: PaymentPipeline.executor().submit(PaymentPipeline._run_in_thread, job.id))
+            PaymentPipeline.start_poller()
+        return job
+
+    @staticmethod
+    def _run_in_thread(job_id: int):
+        close_old_connections()
+        try:
+            PaymentPipeline.run_job(job_id)
+        except Exception:
+            logger.exception('Payment job %s crashed', job_id)
+        finally:
+            connections.close_all()
+
+    @staticmethod
+    def claim(job_id: int) -> bool:
+        """Move a queued job to running; False if another worker got it first."""
+        return PaymentJob.objects.filter(id=job_id, status='queued').update(
+            status='running',
+            started_at=timezone.now(),
+        ) == 1
+
+    @staticmethod
+    def run_job(job_id: int) -> bool:
+        """Run one job through the gateway, order and receipt stages."""
+        if not PaymentPipeline.claim(job_id):
+            return False
+
+        job = PaymentJob.objects.select_related('payment__order').get(id=job_id)
+        job.attempts += 1
+        payment = job.payment
+        order = payment.order
+
+        try:
+            PaymentPipeline._set_stage(job, 'gateway')
+            if payment.status == 'processing':
+                result = PaymentService.process_payment(payment, **job.gateway_kwargs)
+            else:
+                result = {'success': payment.status != 'failed', 'status': payment.status}
+            job.result = {key: str(value) for key, value in result.items()}
+
+            if not result.get('success'):
+                if payment.status == 'processing':
+                    payment.status = 'failed'
+                    payment.save(update_fields=['status'])
+                PaymentPipeline._finish(job, 'failed', error=result.get('message', ''))
+                return True
+
+            PaymentPipeline._set_stage(job, 'order')
+            if job.order_status:
+                order.status = job.order_status
+                order.save(update_fields=['status', 'updated_at'])
+
+            PaymentPipeline._set_stage(job, 'receipt')
+            job.receipt.name, _ = ReceiptCache.get_or_render(payment, order)
+
+            PaymentPipeline._finish(job, 'succeeded')
+        except Exception as e:
+            logger.exception('Payment job %s failed', job.id)
+            PaymentPipeline._finish(job, 'failed', error=str(e))
+        return True
+
+    @staticmethod
+    def _set_stage(job: PaymentJob, stage: str):
+        job.stage = stage
+        PaymentJob.objects.filter(id=job.id).update(stage=stage)
+
+    @staticmethod
+    def _finish(job: PaymentJob, status: str, error: str = ''):
+        job.status = status
+        job.stage = 'done'
+        job.error = error
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'stage', 'error', 'result', 'receipt', 'attempts', 'finished_at'])
+
+    @staticmethod
+    def pending_ids(limit: int, queued_before=None) -> List[int]:
+        """Ids of queued jobs, oldest first, optionally only those queued before a time."""
+        jobs = PaymentJob.objects.filter(status='queued')
+        if queued_before is not None:
+            jobs = jobs.filter(created_at__lt=queued_before)
+        return list(jobs.order_by('created_at', 'id').values_list('id', flat=True)[:limit])
+
+    @staticmethod
+    def run_pending(limit: int = 20) -> int:
+        """Run up to ``limit`` queued jobs, oldest first, whoever queued them; returns how many ran."""
+        return sum(1 for job_id in PaymentPipeline.pending_ids(limit) if PaymentPipeline.run_job(job_id))
+
+    @staticmethod
+    def requeue_stale(older_than: timedelta) -> int:
+        """Put back jobs whose worker died while running them."""
+        return PaymentJob.objects.filter(
+            status='running',
+            started_at__lt=timezone.now() - older_than,
+        ).update(status='queued', stage='queued')
+
+    @staticmethod
+    def latest_job(payment) -> Optional[PaymentJob]:
+        """Most recent job of ``payment``."""
+        return payment.jobs.order_by('-created_at', '-id').first()
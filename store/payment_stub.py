@@ -0,0 +1,223 @@
+"""
+Local payment processor stand-in for KeyReport IT Store
+Simulates the Stripe, PayPal and Moroccan bank APIs with configurable latency, errors and webhooks
+"""
+
+import copy
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.request import Request, urlopen
+
+from .webhook_signing import WEBHOOK_SIGNATURE_HEADER, sign_payload
+
+DEFAULT_STUB_CONFIG: Dict[str, Any] = {
+    # fixed (ms), uniform (min_ms, max_ms), lognormal (median_ms, sigma) or exponential (mean_ms)
+    'latency': {'distribution': 'lognormal', 'median_ms': 120, 'sigma': 0.5},
+    'decline_rate': 0.03,     # 402 card declined
+    'error_rate': 0.02,       # 503 processor unavailable
+    'timeout_rate': 0.0,      # no answer before hang_seconds
+    'hang_seconds': 30,
+    # Error bursts: for duration_seconds out of every every_seconds, error_rate is replaced
+    'burst': {'every_seconds': 0, 'duration_seconds': 0, 'error_rate': 0.5},
+    'webhook_url': '',
+    'webhook_secret': 'stub-secret',
+    'webhook_delay_ms': 200,
+    'webhook_duplicate_rate': 0.0,
+    'seed': None,
+}
+
+def build_config(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Merge ``overrides`` into the defaults (one level deep for nested dicts)."""
+    config = copy.deepcopy(DEFAULT_STUB_CONFIG)
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            config[key].update(value)
+        else:
+            config[key] = value
+    return config
+
+
+class StubProcessor:
+    """
+    In-memory payment processor with injected latency and failures.
+
+    Understands ``POST /<processor>/charges``, ``GET /<processor>/charges/<id>``
+    and ``POST /<processor>/refunds`` for any processor name, so each
+    gateway can point at its own prefix of the same server.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = build_config(config)
+        self.random = random.Random(self.config['seed'])
+        self.charges: Dict[str, Dict[str, Any]] = {}
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def sample_latency(self) -> float:
+        """Seconds to wait before answering a request."""
+        latency = self.config['latency']
+        distribution = latency.get('distribution', 'fixed')
+        with self.lock:
+            if distribution == 'uniform':
+                ms = self.random.uniform(latency.get('min_ms', 0), latency.get('max_ms', 200))
+            elif distribution == 'lognormal':
+                ms = self.random.lognormvariate(math.log(latency.get('median_ms', 100)), latency.get('sigma', 0.5))
+            elif distribution == 'exponential':
+                ms = self.random.expovariate(1.0 / max(latency.get('mean_ms', 100), 1))
+            else:
+                ms = latency.get('ms', 100)
+        return ms / 1000.0
+
+    def current_error_rate(self) -> float:
+        """Error rate, raised while inside an error burst."""
+        burst = self.config['burst']
+        every = burst.get('every_seconds') or 0
+        if every and (time.monotonic() - self.started) % every < burst.get('duration_seconds', 0):
+            return burst.get('error_rate', 0.5)
+        return self.config['error_rate']
+
+    def pick_outcome(self) -> str:
+        """One of ok, decline, error or timeout."""
+        with self.lock:
+            roll = self.random.random()
+        for outcome, rate in (
+            ('timeout', self.config['timeout_rate']),
+            ('error', self.current_error_rate()),
+            ('decline', self.config['decline_rate']),
+        ):
+            if roll < rate:
+                return outcome
+            roll -= rate
+        return 'ok'
+
+    def handle(self, method: str, path: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """Answer one API call; sleeps for the injected latency first."""
+        time.sleep(self.sample_latency())
+
+        parts = [part for part in path.split('/') if part]
+        if len(parts) < 2:
+            return 404, {'error': 'not_found'}
+        processor, resource = parts[0], parts[1]
+
+        if method == 'GET' and resource == 'charges' and len(parts) == 3:
+            charge = self.charges.get(parts[2])
+            return (200, charge) if charge else (404, {'error': 'no_such_charge'})
+
+        if method != 'POST' or resource not in ('charges', 'refunds'):
+            return 404, {'error': 'not_found'}
+
+        outcome = self.pick_outcome()
+        if outcome == 'timeout':
+            time.sleep(self.config['hang_seconds'])
+            return 504, {'error': 'timeout'}
+        if outcome == 'error':
+            return 503, {'error': 'processor_unavailable'}
+
+        if resource == 'refunds':
+            charge = self.charges.get(body.get('charge_id', ''))
+            if charge is None:
+                return 404, {'error': 'no_such_charge'}
+            refund = {
+                'id': f"re_{uuid.uuid4().hex[:20]}",
+                'charge_id': charge['id'],
+                'amount': body.get('amount', charge['amount']),
+                'status': 'succeeded',
+            }
+            charge['status'] = 'refunded'
+            self.emit_webhook('refund.succeeded', processor, refund)
+            return 200, refund
+
+        if outcome == 'decline':
+            charge = self.record_charge(processor, body, 'declined')
+            self.emit_webhook('charge.failed', processor, charge)
+            return 402, dict(charge, error='card_declined')
+
+        charge = self.record_charge(processor, body, 'succeeded')
+        self.emit_webhook('charge.succeeded', processor, charge)
+        return 200, charge
+
+    def record_charge(self, processor: str, body: Dict[str, Any], status: str) -> Dict[str, Any]:
+        charge = {
+            'id': f"ch_{uuid.uuid4().hex[:20]}",
+            'processor': processor,
+            'amount': body.get('amount'),
+            'currency': body.get('currency', 'MAD'),
+            'reference': body.get('reference', ''),
+            'status': status,
+            'created': int(time.time()),
+        }
+        with self.lock:
+            self.charges[charge['id']] = charge
+        return charge
+
+    def emit_webhook(self, event_type: str, processor: str, data: Dict[str, Any]):
+        """Deliver the event to ``webhook_url`` after a delay, sometimes twice."""
+        url = self.config['webhook_url']
+        if not url:
+            return
+        event = {
+            'id': f"evt_{uuid.uuid4().hex[:20]}",
+            'type': event_type,
+            'processor': processor,
+            'created': int(time.time()),
+            'data': data,
+        }
+        with self.lock:
+            deliveries = 2 if self.random.random() < self.config['webhook_duplicate_rate'] else 1
+        timer = threading.Timer(self.config['webhook_delay_ms'] / 1000.0, self.deliver_webhook, args=(url, event, deliveries))
+        timer.daemon = True
+        timer.start()
+
+    def deliver_webhook(self, url: str, event: Dict[str, Any], deliveries: int = 1):
+        body = json.dumps(event).encode()
+        headers = {
+            'Content-Type': 'application/json',
+            WEBHOOK_SIGNATURE_HEADER: sign_payload(body, self.config['webhook_secret']),
+        }
+        for _ in range(deliveries):
+            try:
+                urlopen(Request(url, data=body, headers=headers, method='POST'), timeout=5).close()
+            except OSError:
+                pass
+
+    def make_server(self, host: str = '127.0.0.1', port: int = 8765) -> ThreadingHTTPServer:
+        """HTTP server answering with this processor; call serve_forever() on it."""
+        processor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    body = {}
+                status, payload = processor.handle(method, self.path, body)
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except OSError:
+                    # The client gave up (timed out) before we answered
+                    pass
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        return server
@@ -2,6 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
@@ -9,13 +10,18 @@ import uuid
 import json
 from datetime import datetime
 
-from .models import Order, OrderItem, Payment, Cart, CartItem
+from .models import Order, Payment, Cart, CartItem
 from .forms import OrderForm
-from .pdf_utils import generate_payment_receipt_response
+from .receipt_cache import ReceiptCache
+from .order_service import OrderPlacementService, OrderPlacementError
+from .idempotency import idempotent_post
+from .payment_pipeline import PaymentPipeline
+from .webhooks import InvalidWebhook, WebhookService
 # from .forms import CardPaymentForm, PayPalForm, CashDeliveryForm
 
 
 @login_required
+@idempotent_post
 def order_form(request, order_id=None):
     """
     Vue pour collecter les informations de livraison
@@ -53,22 +59,11 @@ def order_form(request, order_id=None):
             return redirect('store:professional_payment_order', order_id=order.id)
         else:
             # Créer une nouvelle commande
-            order = form.save(commit=False)
-            order.order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-            order.save()
-            
-            # Créer les items de commande
-            for cart_item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    unit_price=cart_item.product.price,
-                    total_price=cart_item.product.price * cart_item.quantity
-                )
-            
-            # Vider le panier
-            cart_items.delete()
+            try:
+                order = OrderPlacementService.place_order(cart, form.save(commit=False))
+            except OrderPlacementError as e:
+                messages.error(request, str(e))
+                return redirect('store:cart')
             
             messages.success(request, 'Commande créée avec succès!')
             return redirect('store:professional_payment_order', order_id=order.id)
@@ -115,6 +110,7 @@ def professional_payment(request, order_id=None):
 
 @login_required
 @require_http_methods(["POST"])
+@idempotent_post
 def process_professional_payment(request, order_id):
     """
     Traitement du paiement professionnel
@@ -178,32 +174,13 @@ def process_credit_card_payment(request, payment):
         messages.error(request, 'Date d\'expiration invalide.')
         return redirect('store:professional_payment_order', order_id=payment.order.id)
     
-    # Simulation du traitement de paiement
-    # Dans un vrai système, vous feriez appel à une passerelle de paiement
-    payment_status = simulate_payment_gateway(card_number, expiry_date, cvv, payment.amount)
-    
-    if payment_status['success']:
-        # Paiement réussi
-        payment.status = 'completed'
-        payment.card_last_four = card_number[-4:]
-        payment.card_brand = get_card_brand(card_number)
-        payment.processed_at = timezone.now()
-        payment.save()
-        
-        # Mettre à jour la commande
-        payment.order.status = 'confirmed'
-        payment.order.save()
-        
-        messages.success(request, 'Paiement effectué avec succès!')
-        # Automatically generate and return PDF receipt
-        return generate_payment_receipt_response(payment, payment.order)
-    else:
-        # Paiement échoué
-        payment.status = 'failed'
-        payment.save()
-        
-        messages.error(request, f'Paiement échoué: {payment_status["message"]}')
-        return redirect('store:payment_failed_professional', payment_id=payment.id)
+    # Seuls les 4 derniers chiffres sont conservés; le reste ne quitte pas la requête
+    payment.card_last_four = card_number[-4:]
+    payment.card_brand = get_card_brand(card_number)
+    payment.save(update_fields=['card_last_four', 'card_brand'])
+    
+    # L'appel à la passerelle se fait en arrière-plan
+    return enqueue_professional_payment(payment, 'confirmed', payment_method_id=f"pm_{payment.id}")
 
 
 def process_paypal_payment(request, payment):
@@ -216,27 +193,8 @@ def process_paypal_payment(request, payment):
         messages.error(request, 'Veuillez entrer votre email PayPal.')
         return redirect('store:professional_payment_order', order_id=payment.order.id)
     
-    # Simulation du traitement PayPal
-    # Dans un vrai système, vous feriez appel à l'API PayPal
-    payment_status = simulate_paypal_payment(paypal_email, payment.amount)
-    
-    if payment_status['success']:
-        payment.status = 'completed'
-        payment.processed_at = timezone.now()
-        payment.save()
-        
-        payment.order.status = 'confirmed'
-        payment.order.save()
-        
-        messages.success(request, 'Paiement PayPal effectué avec succès!')
-        # Automatically generate and return PDF receipt
-        return generate_payment_receipt_response(payment, payment.order)
-    else:
-        payment.status = 'failed'
-        payment.save()
-        
-        messages.error(request, f'Paiement PayPal échoué: {payment_status["message"]}')
-        return redirect('store:payment_failed_professional', payment_id=payment.id)
+    # L'appel à l'API PayPal se fait en arrière-plan
+    return enqueue_professional_payment(payment, 'confirmed', paypal_email=paypal_email)
 
 
 def process_cash_delivery_payment(request, payment):
@@ -248,13 +206,9 @@ def process_cash_delivery_payment(request, payment):
     payment.processed_at = timezone.now()
     payment.save()
     
-    # Mettre à jour la commande
-    payment.order.status = 'pending_payment'
-    payment.order.save()
-    
     messages.success(request, 'Commande confirmée! Vous paierez à la livraison.')
-    # Automatically generate and return PDF receipt
-    return generate_payment_receipt_response(payment, payment.order)
+    # La commande et le reçu sont traités en arrière-plan
+    return enqueue_professional_payment(payment, 'pending_payment')
 
 
 def process_bank_transfer_payment(request, payment):
@@ -266,13 +220,67 @@ def process_bank_transfer_payment(request, payment):
     payment.processed_at = timezone.now()
     payment.save()
     
-    # Mettre à jour la commande
-    payment.order.status = 'pending_payment'
-    payment.order.save()
-    
     messages.success(request, 'Commande confirmée! Veuillez effectuer le virement bancaire.')
-    # Automatically generate and return PDF receipt
-    return generate_payment_receipt_response(payment, payment.order)
+    # La commande et le reçu sont traités en arrière-plan
+    return enqueue_professional_payment(payment, 'pending_payment')
+
+
+def enqueue_professional_payment(payment, order_status, **gateway_kwargs):
+    """
+    Met le paiement en file d'attente et redirige vers la page de suivi
+    """
+    PaymentPipeline.enqueue(
+        payment,
+        order_status=order_status,
+        success_url=reverse('store:payment_success_professional', args=[payment.id]),
+        failure_url=reverse('store:payment_failed_professional', args=[payment.id]),
+        **gateway_kwargs
+    )
+    return redirect('store:payment_status', payment_id=payment.id)
+
+
+@login_required
+def payment_status(request, payment_id):
+    """
+    Page de suivi d'un paiement traité en arrière-plan
+    """
+    payment = get_object_or_404(Payment, id=payment_id, order__customer=request.user)
+    
+    context = {
+        'payment': payment,
+        'order': payment.order,
+        'job': PaymentPipeline.latest_job(payment),
+    }
+    
+    return render(request, 'store/payment_status.html', context)
+
+
+@login_required
+def payment_status_json(request, payment_id):
+    """
+    État du traitement d'un paiement, interrogé par la page de suivi
+    """
+    payment = get_object_or_404(Payment, id=payment_id, order__customer=request.user)
+    job = PaymentPipeline.latest_job(payment)
+    
+    if job is None:
+        return JsonResponse({'status': 'unknown', 'finished': True, 'payment_status': payment.status})
+    
+    data = {
+        'status': job.status,
+        'stage': job.stage,
+        'stage_label': str(job.get_stage_display()),
+        'finished': job.is_finished,
+        'payment_status': payment.status,
+    }
+    if job.status == 'succeeded':
+        data['redirect_url'] = job.success_url
+        data['receipt_url'] = reverse('store:download_payment_receipt_pdf', args=[payment.id])
+    elif job.status == 'failed':
+        data['redirect_url'] = job.failure_url
+        data['error'] = job.error
+    
+    return JsonResponse(data)
 
 
 def payment_success_professional(request, payment_id):
@@ -300,8 +308,8 @@ def download_payment_receipt_pdf(request, payment_id):
     # Generate filename
     filename = f"receipt_{payment.id}_{order.order_number}_{datetime.now().strftime('%Y%m%d')}.pdf"
     
-    # Generate and return PDF response
-    return generate_payment_receipt_response(payment, order, filename)
+    # Cached PDF, or 304 when the browser already has this version
+    return ReceiptCache.response(request, payment, order, filename)
 
 
 def payment_failed_professional(request, payment_id):
@@ -386,33 +394,17 @@ def get_card_brand(card_number):
         return 'unknown'
 
 
-def simulate_payment_gateway(card_number, expiry_date, cvv, amount):
-    """
-    Simulation d'une passerelle de paiement
-    """
-    # For testing purposes, always return success
-    return {
-        'success': True,
-        'transaction_id': f"TXN_{uuid.uuid4().hex[:8].upper()}",
-        'message': 'Paiement traité avec succès'
-    }
-
-
-def simulate_paypal_payment(email, amount):
+@csrf_exempt
+@require_http_methods(["POST"])
+def payment_webhook(request):
     """
-    Simulation d'un paiement PayPal
+    Réception des notifications des processeurs de paiement
     """
-    import random
-    
-    # 95% de chance de succès pour la démo
-    if random.random() < 0.95:
-        return {
-            'success': True,
-            'transaction_id': f"PP_{uuid.uuid4().hex[:8].upper()}",
-            'message': 'Paiement PayPal traité avec succès'
-        }
-    else:
-        return {
-            'success': False,
-            'message': 'Erreur de connexion PayPal'
-        }
+    body = request.body
+    if not WebhookService.verify_signature(body, request.headers.get(WebhookService.signature_header(), '')):
+        return JsonResponse({'error': 'invalid signature'}, status=403)
+    try:
+        WebhookService.ingest(body)
+    except InvalidWebhook as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'received': True})
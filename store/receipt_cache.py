@@ -0,0 +1,119 @@
+"""
+Receipt PDF cache for KeyReport IT Store
+Keeps rendered receipts on disk keyed by payment and content version and serves them conditionally
+"""
+
+import hashlib
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import PaymentJob
+from .pdf_utils import generate_payment_receipt_pdf
+from .sequences import SequenceService
+
+logger = logging.getLogger(__name__)
+
+# Bump when the receipt layout in pdf_utils changes so cached files are rebuilt
+RECEIPT_TEMPLATE_VERSION = 1
+
+
+def get_cache_dir() -> str:
+    return getattr(settings, 'RECEIPT_CACHE_DIR', 'receipts/cache')
+
+
+class ReceiptCache:
+    """Service class to render each receipt version once and serve it with validators."""
+
+    @staticmethod
+    def version(payment, order) -> str:
+        """
+        Hash of everything the receipt shows.
+
+        A refund, a status change or any order edit (which bumps
+        ``order.updated_at``) yields a new version, so a stale file is
+        never served even if invalidation was missed.
+        """
+        parts = [
+            RECEIPT_TEMPLATE_VERSION,
+            payment.id, payment.status, payment.amount, payment.payment_method,
+            payment.transaction_id, payment.receipt_number, payment.card_last_four,
+            payment.processed_at and payment.processed_at.isoformat(),
+            order.id, order.status, order.total_amount,
+            order.updated_at and order.updated_at.isoformat(),
+        ]
+        return hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()[:20]
+
+    @staticmethod
+    def last_modified(payment, order) -> datetime:
+        """Latest change the receipt shows, including refunds and status changes logged as PaymentEvents."""
+        latest_event = payment.events.order_by('-created_at').values_list('created_at', flat=True).first()
+        return max(filter(None, [payment.created_at, payment.processed_at, order.updated_at, latest_event]))
+
+    @staticmethod
+    def path(payment_id: int, version: str) -> str:
+        return f"{get_cache_dir()}/{payment_id}/{version}.pdf"
+
+    @staticmethod
+    def get_or_render(payment, order) -> Tuple[str, str]:
+        """
+        Return (storage path, version) of the current receipt, rendering
+        and storing it on a miss. Older versions of the same receipt are
+        removed when a new one is written.
+        """
+        SequenceService.assign_receipt_number(payment)
+        version = ReceiptCache.version(payment, order)
+        path = ReceiptCache.path(payment.id, version)
+        if not default_storage.exists(path):
+            pdf_content = generate_payment_receipt_pdf(payment, order)
+            ReceiptCache.invalidate(payment.id)
+            path = default_storage.save(path, ContentFile(pdf_content))
+        return path, version
+
+    @staticmethod
+    def invalidate(payment_id: int) -> int:
+        """Delete every cached version of a payment's receipt and drop the jobs' references to them."""
+        directory = f"{get_cache_dir()}/{payment_id}"
+        PaymentJob.objects.filter(payment_id=payment_id).exclude(receipt='').update(receipt='')
+        try:
+            _, files = default_storage.listdir(directory)
+        except (FileNotFoundError, NotImplementedError):
+            return 0
+        for name in files:
+            default_storage.delete(f"{directory}/{name}")
+        return len(files)
+
+    @staticmethod
+    def response(request, payment, order, filename: Optional[str] = None) -> HttpResponse:
+        """
+        Serve the receipt with ETag/Last-Modified validators.
+
+        A matching If-None-Match (or If-Modified-Since) gets a 304 before
+        the cache is touched; otherwise the cached file is streamed.
+        """
+        SequenceService.assign_receipt_number(payment)
+        etag = quote_etag(ReceiptCache.version(payment, order))
+        last_modified = int(ReceiptCache.last_modified(payment, order).timestamp())
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            path, _ = ReceiptCache.get_or_render(payment, order)
+            response = FileResponse(
+                default_storage.open(path, 'rb'),
+                as_attachment=True,
+                filename=filename or f"receipt_{payment.id}_{order.order_number}.pdf",
+                content_type='application/pdf',
+            )
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        response['X-Content-Type-Options'] = 'nosniff'
+        return response
@@ -0,0 +1,147 @@
+"""
+Bulk receipt export for KeyReport IT Store
+Renders receipts (in a process pool for the command) and streams them into a ZIP archive
+"""
+
+import logging
+import os
+import time
+import zipfile
+from collections import defaultdict
+from contextlib import ExitStack
+from datetime import datetime
+from multiprocessing import Pool
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections
+
+from .models import Payment
+from .receipt_cache import ReceiptCache
+
+logger = logging.getLogger(__name__)
+
+# Payments that have a meaningful receipt
+EXPORTABLE_STATUSES = ('completed', 'pending', 'partially_refunded', 'refunded')
+
+COPY_CHUNK_SIZE = 64 * 1024
+
+Progress = Callable[[int, int, Dict[int, Dict[str, float]]], None]
+
+
+def get_export_workers() -> int:
+    return getattr(settings, 'RECEIPT_EXPORT_WORKERS', None) or os.cpu_count() or 1
+
+
+def _init_worker():
+    """Make sure a spawned worker has Django loaded."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def render_receipt(payment_id: int) -> Tuple[int, str, str, int, float]:
+    """
+    Worker task: render (or reuse) one receipt in the shared cache.
+
+    Returns (payment id, archive name, storage path, worker pid, seconds)
+    so only a path crosses the process boundary, not the PDF.
+    """
+    start = time.perf_counter()
+    payment = Payment.objects.select_related('order__customer').get(id=payment_id)
+    path, _ = ReceiptCache.get_or_render(payment, payment.order)
+    arcname = f"{payment.created_at:%Y-%m}/receipt_{payment.receipt_number or payment.id}_{payment.order.order_number}.pdf"
+    return payment_id, arcname, path, os.getpid(), time.perf_counter() - start
+
+
+class _ZipStream:
+    """Write-only file object whose contents are drained by the generator."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ReceiptExportService:
+    """Service class to export many receipts at once."""
+
+    @staticmethod
+    def payments(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 customer: Optional[str] = None, payment_method: Optional[str] = None):
+        """Exportable payments matching the filters, oldest first."""
+        payments = Payment.objects.filter(status__in=EXPORTABLE_STATUSES)
+        if since:
+            payments = payments.filter(created_at__gte=since)
+        if until:
+            payments = payments.filter(created_at__lt=until)
+        if customer:
+            payments = payments.filter(order__customer__email__iexact=customer)
+        if payment_method:
+            payments = payments.filter(payment_method=payment_method)
+        return payments.order_by('created_at', 'id')
+
+    @staticmethod
+    def stream_zip(payments, workers: Optional[int] = None,
+                   progress: Optional[Progress] = None) -> Iterator[bytes]:
+        """
+        Yield a ZIP archive of the receipts of ``payments`` piece by piece.
+
+        Receipts are rendered into the receipt cache by a pool of
+        ``workers`` processes, or in this process when ``workers`` is 1,
+        as web requests must (forking a server worker is not safe). Each
+        finished file is copied into the archive in 64 KB chunks and
+        handed to the caller straight away, so memory does not grow with
+        the number of receipts. ``progress(done, total, per_worker)`` is
+        called after every receipt, with the receipt count and busy
+        seconds of each worker pid.
+        """
+        workers = workers or get_export_workers()
+        payment_ids = list(payments.values_list('id', flat=True).iterator())
+        total = len(payment_ids)
+        per_worker: Dict[int, Dict[str, float]] = defaultdict(lambda: {'receipts': 0, 'seconds': 0.0})
+
+        stream = _ZipStream()
+        with ExitStack() as stack:
+            if workers > 1:
+                # Forked workers must not share the parent's database connections
+                connections.close_all()
+                pool = stack.enter_context(Pool(workers, initializer=_init_worker))
+                results = pool.imap_unordered(render_receipt, payment_ids, chunksize=4)
+            else:
+                results = map(render_receipt, payment_ids)
+            archive = stack.enter_context(
+                zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED, allowZip64=True)
+            )
+            for done, (payment_id, arcname, path, pid, seconds) in enumerate(results, start=1):
+                with default_storage.open(path, 'rb') as source, archive.open(arcname, 'w', force_zip64=True) as target:
+                    for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b''):
+                        target.write(chunk)
+                        data = stream.drain()
+                        if data:
+                            yield data
+
+                per_worker[pid]['receipts'] += 1
+                per_worker[pid]['seconds'] += seconds
+                if progress:
+                    progress(done, total, per_worker)
+
+        yield stream.drain()
+        logger.info('Exported %s receipts with %s workers', total, workers)
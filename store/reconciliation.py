@@ -0,0 +1,255 @@
+"""
+Payment reconciliation for KeyReport IT Store
+Pages through orders and their payments to find drift, duplicates and orphans, and runs bulk refunds
+"""
+
+import logging
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db.models import Sum
+
+from .models import Order, Payment, PaymentEvent
+from .payment_gateway import PaymentService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# Orders whose payments were taken but which will never ship
+DEAD_ORDER_STATUSES = ('cancelled',)
+
+# Payment statuses that leave (some of) the money with us and can be refunded
+COLLECTED_STATUSES = ('completed', 'partially_refunded')
+
+Reporter = Callable[[str, Optional[int], List[int], str], None]
+
+
+def get_chunk_size() -> int:
+    return getattr(settings, 'RECONCILIATION_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def chunked(rows: Iterable, size: int) -> Iterator[List]:
+    """Split an iterable into lists of at most ``size`` items."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ReconciliationService:
+    """Service class to reconcile Order.payment_status with the Payment rows."""
+
+    @staticmethod
+    def expected_payment_status(statuses: List[str]) -> Optional[str]:
+        """
+        The order payment status the payments prove, or None when they
+        prove nothing yet (no payments, or one still pending/processing).
+        """
+        if 'completed' in statuses:
+            return 'paid'
+        if 'partially_refunded' in statuses:
+            return 'partially_refunded'
+        if not statuses or any(status in ('pending', 'processing') for status in statuses):
+            return None
+        if 'refunded' in statuses:
+            return 'refunded'
+        return 'failed'
+
+    @staticmethod
+    def reconcile(dry_run: bool = False, chunk_size: Optional[int] = None,
+                  report: Optional[Reporter] = None) -> Dict[str, int]:
+        """
+        Walk every order and its payments once, in primary key order.
+
+        Orders are read ``chunk_size`` at a time by keyset on the primary
+        key, together with the payments of that id range, so memory stays
+        bounded by the chunk size whatever the table sizes and no cursor
+        is open while fixes are written. Each issue is passed to
+        ``report(kind, order_id, payment_ids, detail)`` as it is found:
+
+        - ``status_mismatch``: Order.payment_status disagrees with what
+          its payments prove; fixed with one UPDATE per target status
+          and chunk.
+        - ``duplicate``: more than one collected payment for an order.
+        - ``amount_mismatch``: collected payments do not add up to the
+          order total.
+        - ``dead_order``: money collected for a cancelled order.
+        - ``unbacked_paid``: order marked paid without any payment.
+        - ``orphan``: payment rows whose order no longer exists.
+
+        Only status mismatches are fixed; the rest need a human.
+        Returns the count per kind plus ``orders`` and ``fixed``.
+        """
+        chunk_size = chunk_size or get_chunk_size()
+        counts: Dict[str, int] = defaultdict(int)
+
+        def emit(kind, order_id, payment_ids, detail):
+            counts[kind] += 1
+            if report:
+                report(kind, order_id, payment_ids, detail)
+
+        last_id = 0
+        while True:
+            orders = list(Order.objects.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'status', 'payment_status', 'total_amount'
+            )[:chunk_size])
+            payment_rows = Payment.objects.filter(order_id__gt=last_id)
+            if orders:
+                payment_rows = payment_rows.filter(order_id__lte=orders[-1][0])
+            groups: Dict[int, List[tuple]] = defaultdict(list)
+            for order_id, payment_id, status, amount in payment_rows.order_by('order_id', 'id').values_list(
+                'order_id', 'id', 'status', 'amount'
+            ):
+                groups[order_id].append((payment_id, status, amount))
+
+            fixes: Dict[str, List[int]] = defaultdict(list)
+            for order_id, order_status, payment_status, total in orders:
+                counts['orders'] += 1
+                payments = groups.pop(order_id, [])
+                statuses = [status for _, status, _ in payments]
+                collected = [(payment_id, amount) for payment_id, status, amount in payments
+                             if status in COLLECTED_STATUSES]
+
+                expected = ReconciliationService.expected_payment_status(statuses)
+                if expected and expected != payment_status:
+                    emit('status_mismatch', order_id, [p[0] for p in payments], f'{payment_status} -> {expected}')
+                    fixes[expected].append(order_id)
+                elif not payments and payment_status == 'paid':
+                    emit('unbacked_paid', order_id, [], 'order is paid but has no payment')
+
+                if len(collected) > 1:
+                    emit('duplicate', order_id, [p[0] for p in collected], f'{len(collected)} collected payments')
+                if collected:
+                    amount = sum((amount for _, amount in collected), Decimal('0.00'))
+                    if amount != total:
+                        emit('amount_mismatch', order_id, [p[0] for p in collected], f'collected {amount} of {total}')
+                    if order_status in DEAD_ORDER_STATUSES:
+                        emit('dead_order', order_id, [p[0] for p in collected], f'order is {order_status}')
+
+            # Whatever is left in the id range has no order
+            for order_id in sorted(groups):
+                emit('orphan', order_id, [p[0] for p in groups[order_id]], 'order does not exist')
+
+            if not dry_run:
+                for status, ids in fixes.items():
+                    counts['fixed'] += Order.objects.filter(id__in=ids).update(payment_status=status)
+            if not orders:
+                break
+            last_id = orders[-1][0]
+
+        return dict(counts)
+
+    @staticmethod
+    def _refunded_amounts(payment_ids: List[int]) -> Dict[int, Decimal]:
+        """Amount already refunded per payment, from the refund events."""
+        rows = PaymentEvent.objects.filter(
+            payment_id__in=payment_ids, event_type='refund_succeeded'
+        ).values('payment_id').annotate(total=Sum('amount')).order_by()
+        return {row['payment_id']: row['total'] or Decimal('0.00') for row in rows}
+
+    @staticmethod
+    def _lookup(rows: List[Dict[str, str]]) -> Dict[str, Payment]:
+        """Resolve one chunk of CSV rows to payments in at most three queries."""
+        keys = {'payment_id': {}, 'transaction_id': {}, 'order_number': {}}
+        for row in rows:
+            for key in keys:
+                value = (row.get(key) or '').strip()
+                if value:
+                    keys[key][value] = None
+                    break
+
+        found: Dict[str, Payment] = {}
+        payments = Payment.objects.select_related('order').only(
+            'id', 'order_id', 'payment_method', 'status', 'amount', 'transaction_id', 'order__order_number'
+        )
+        payment_ids = [int(value) for value in keys['payment_id'] if value.isdigit()]
+        if payment_ids:
+            for payment in payments.filter(id__in=payment_ids):
+                found[f'payment_id:{payment.id}'] = payment
+        if keys['transaction_id']:
+            for payment in payments.filter(transaction_id__in=list(keys['transaction_id'])):
+                found[f'transaction_id:{payment.transaction_id}'] = payment
+        if keys['order_number']:
+            for payment in payments.filter(order__order_number__in=list(keys['order_number']),
+                                           status__in=COLLECTED_STATUSES):
+                found.setdefault(f'order_number:{payment.order.order_number}', payment)
+        return found
+
+    @staticmethod
+    def bulk_refund(rows: Iterable[Dict[str, str]], dry_run: bool = False,
+                    chunk_size: Optional[int] = None,
+                    report: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, int]:
+        """
+        Refund the payments listed in ``rows`` (e.g. a csv.DictReader).
+
+        Each row names a payment by ``payment_id``, ``transaction_id`` or
+        ``order_number`` and may give a partial ``amount``; without one
+        whatever is left of the payment is refunded. Rows are read and
+        resolved a chunk at a time; refunds go through the payment's
+        gateway, which marks the payment refunded or partially_refunded,
+        and the orders of each chunk follow with one UPDATE per status.
+        ``report`` receives one result dict per row.
+        """
+        chunk_size = chunk_size or get_chunk_size()
+        counts: Dict[str, int] = defaultdict(int)
+
+        for chunk in chunked(rows, chunk_size):
+            payments = ReconciliationService._lookup(chunk)
+            refunded = ReconciliationService._refunded_amounts([payment.id for payment in payments.values()])
+            refunded_orders: Dict[str, List[int]] = defaultdict(list)
+            seen = set()
+
+            for line, row in enumerate(chunk, start=counts['rows'] + 1):
+                result = {'line': line, 'payment_id': '', 'amount': '', 'outcome': '', 'detail': ''}
+                payment = None
+                for key in ('payment_id', 'transaction_id', 'order_number'):
+                    value = (row.get(key) or '').strip()
+                    if value:
+                        payment = payments.get(f'{key}:{value}')
+                        break
+
+                if payment is None:
+                    result.update(outcome='not_found')
+                elif payment.id in seen:
+                    result.update(payment_id=payment.id, outcome='skipped', detail='listed twice')
+                elif payment.status not in COLLECTED_STATUSES:
+                    result.update(payment_id=payment.id, outcome='skipped', detail=f'payment is {payment.status}')
+                else:
+                    seen.add(payment.id)
+                    result['payment_id'] = payment.id
+                    remaining = payment.amount - refunded.get(payment.id, Decimal('0.00'))
+                    try:
+                        amount = Decimal(row['amount']) if (row.get('amount') or '').strip() else remaining
+                    except InvalidOperation:
+                        amount = None
+                    if amount is None or amount <= 0 or amount > remaining:
+                        result.update(outcome='error', detail=f"invalid amount {row.get('amount')!r}")
+                    elif dry_run:
+                        result.update(amount=amount, outcome='would_refund')
+                    else:
+                        try:
+                            response = PaymentService.refund_payment(payment, amount)
+                        except Exception as e:
+                            logger.exception('Refund of payment %s failed', payment.id)
+                            response = {'success': False, 'error': str(e)}
+                        if response.get('success'):
+                            refunded_orders[payment.status].append(payment.order_id)
+                            result.update(amount=amount, outcome='refunded')
+                        else:
+                            result.update(outcome='error', detail=response.get('error', 'refund failed'))
+
+                counts['rows'] += 1
+                counts[result['outcome']] += 1
+                if report:
+                    report(result)
+
+            for status, order_ids in refunded_orders.items():
+                Order.objects.filter(id__in=order_ids).update(payment_status=status)
+
+        return dict(counts)
@@ -0,0 +1,95 @@
+"""
+Document number allocation for KeyReport IT Store
+Hands out human-readable numbers for orders, tickets, service requests and receipts
+"""
+
+import threading
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import DocumentSequence
+
+
+class SequenceService:
+    """
+    Allocate monotonic document numbers from DB-backed counters.
+
+    Each process reserves a block of values with one locked UPDATE and
+    then serves numbers from memory, so workers only touch the counter
+    row once per block. Numbers are unique across workers; unused values
+    of a block are lost when the process exits, which leaves gaps but
+    never duplicates.
+    """
+
+    PREFIXES = {
+        'order': 'ORD',
+        'ticket': 'TKT',
+        'service': 'SRV',
+        'receipt': 'RCP',
+    }
+
+    _blocks: Dict[str, List[int]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def block_size(cls) -> int:
+        """Number of values reserved per round trip to the database."""
+        return getattr(settings, 'DOCUMENT_SEQUENCE_BLOCK_SIZE', 20)
+
+    @classmethod
+    def next_value(cls, name: str) -> int:
+        """Return the next value of the ``name`` sequence."""
+        with cls._lock:
+            block = cls._blocks.get(name)
+            if block and block[0] < block[1]:
+                value = block[0]
+                block[0] += 1
+                return value
+
+            if connection.in_atomic_block:
+                # The counter update would be rolled back together with the
+                # caller's transaction, so never keep a block around here
+                return cls._allocate(name, 1)
+
+            start = cls._allocate(name, cls.block_size())
+            cls._blocks[name] = [start + 1, start + cls.block_size()]
+            return start
+
+    @classmethod
+    def next_number(cls, name: str) -> str:
+        """Return the next formatted number, e.g. ``ORD-000042``."""
+        prefix = cls.PREFIXES.get(name, name.upper()[:3])
+        return f"{prefix}-{cls.next_value(name):06d}"
+
+    @classmethod
+    def reset(cls):
+        """Forget the blocks held by this process."""
+        with cls._lock:
+            cls._blocks.clear()
+
+    @staticmethod
+    def _allocate(name: str, size: int) -> int:
+        """Reserve ``size`` values and return the first one."""
+        with transaction.atomic():
+            sequence, _ = DocumentSequence.objects.select_for_update().get_or_create(name=name)
+            start = sequence.next_value
+            sequence.next_value = start + size
+            sequence.save(update_fields=['next_value', 'updated_at'])
+        return start
+
+    @classmethod
+    def assign_receipt_number(cls, payment) -> str:
+        """Give ``payment`` a receipt number if it does not have one yet."""
+        if not payment.receipt_number:
+            number = cls.next_number('receipt')
+            model = type(payment)
+            if model.objects.filter(pk=payment.pk, receipt_number='').update(receipt_number=number):
+                payment.receipt_number = number
+            else:
+                # Another request numbered this receipt first
+                payment.receipt_number = model.objects.values_list(
+                    'receipt_number', flat=True
+                ).get(pk=payment.pk)
+        return payment.receipt_number
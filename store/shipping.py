@@ -0,0 +1,164 @@
+"""
+Shipping rating engine for KeyReport IT Store
+Quotes Moroccan regional shipping from per-product weights using rate tables built once per process
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db.models import Case, DecimalField, F, Sum, When
+
+from .models import CartItem, OrderItem
+
+CENT = Decimal('0.01')
+
+DEFAULT_REGION_RATES = {
+    'Casablanca-Settat': Decimal('0.00'),  # Free shipping in Casablanca
+    'Rabat-Salé-Kénitra': Decimal('15.00'),
+    'Fès-Meknès': Decimal('25.00'),
+    'Marrakech-Safi': Decimal('30.00'),
+    'Tanger-Tétouan-Al Hoceïma': Decimal('35.00'),
+    'Oriental': Decimal('40.00'),
+    'Béni Mellal-Khénifra': Decimal('30.00'),
+    'Souss-Massa': Decimal('45.00'),
+    'Guelmim-Oued Noun': Decimal('60.00'),
+    'Laâyoune-Sakia El Hamra': Decimal('80.00'),
+    'Dakhla-Oued Ed-Dahab': Decimal('100.00'),
+    'Drâa-Tafilalet': Decimal('50.00'),
+}
+
+DEFAULT_DELIVERY_TIMES = {
+    'Casablanca-Settat': '1-2 jours',
+    'Rabat-Salé-Kénitra': '2-3 jours',
+    'Fès-Meknès': '3-4 jours',
+    'Marrakech-Safi': '3-5 jours',
+    'Tanger-Tétouan-Al Hoceïma': '4-5 jours',
+    'Oriental': '4-6 jours',
+    'Béni Mellal-Khénifra': '3-5 jours',
+    'Souss-Massa': '5-7 jours',
+    'Guelmim-Oued Noun': '7-10 jours',
+    'Laâyoune-Sakia El Hamra': '10-14 jours',
+    'Dakhla-Oued Ed-Dahab': '14-21 jours',
+    'Drâa-Tafilalet': '6-8 jours',
+}
+
+
+@lru_cache(maxsize=1)
+def get_rate_table() -> Dict:
+    """
+    Build the rate table once per process.
+
+    ``settings.SHIPPING_RATES`` may override any entry: ``regions``
+    (region -> base cost), ``delivery_times``, ``per_kg``,
+    ``default_rate`` and ``default_delivery_time``.
+    """
+    overrides = getattr(settings, 'SHIPPING_RATES', {})
+    regions = dict(DEFAULT_REGION_RATES)
+    regions.update({region: Decimal(str(cost)) for region, cost in overrides.get('regions', {}).items()})
+    delivery_times = dict(DEFAULT_DELIVERY_TIMES)
+    delivery_times.update(overrides.get('delivery_times', {}))
+    return {
+        'regions': regions,
+        'delivery_times': delivery_times,
+        'per_kg': Decimal(str(overrides.get('per_kg', '5.00'))),
+        'default_rate': Decimal(str(overrides.get('default_rate', '50.00'))),
+        'default_delivery_time': overrides.get('default_delivery_time', '5-7 jours'),
+    }
+
+
+class ShippingService:
+    """Service class to quote shipping costs for carts and orders."""
+
+    @staticmethod
+    def reload_rates():
+        """Drop the cached rate table, e.g. after changing SHIPPING_RATES."""
+        get_rate_table.cache_clear()
+
+    @staticmethod
+    def is_known_region(region: str) -> bool:
+        """Whether ``region`` has its own entry in the rate table."""
+        return region in get_rate_table()['regions']
+
+    @staticmethod
+    def get_delivery_time(region: str) -> str:
+        """Estimated delivery time for ``region``."""
+        table = get_rate_table()
+        return table['delivery_times'].get(region, table['default_delivery_time'])
+
+    @staticmethod
+    def quote(region: str, weight) -> Decimal:
+        """Shipping cost of a parcel of ``weight`` kg to ``region``."""
+        table = get_rate_table()
+        base_cost = table['regions'].get(region, table['default_rate'])
+        weight_cost = Decimal(str(weight)) * table['per_kg']
+        return (base_cost + weight_cost).quantize(CENT, rounding=ROUND_HALF_UP)
+
+    @staticmethod
+    def quote_cart(cart, region: str) -> Dict:
+        """
+        Quote a whole cart in one query.
+
+        Returns the subtotal, total weight, shipping cost, total and
+        delivery time for delivering ``cart`` to ``region``.
+        """
+        totals = CartItem.objects.filter(cart=cart).aggregate(
+            weight=Sum(F('quantity') * F('product__weight_kg'), output_field=DecimalField()),
+            subtotal=Sum(
+                # Same rule as Product.current_price: a zero sale price means no sale
+                F('quantity') * Case(
+                    When(product__sale_price__gt=0, then=F('product__sale_price')),
+                    default=F('product__price'),
+                ),
+                output_field=DecimalField(),
+            ),
+        )
+        weight = totals['weight'] or Decimal('0')
+        subtotal = (totals['subtotal'] or Decimal('0')).quantize(CENT)
+        shipping = ShippingService.quote(region, weight) if weight else Decimal('0.00')
+        return {
+            'region': region,
+            'weight': weight,
+            'subtotal': subtotal,
+            'shipping': shipping,
+            'total': subtotal + shipping,
+            'delivery_time': ShippingService.get_delivery_time(region),
+        }
+
+    @staticmethod
+    def quote_orders(orders: Iterable) -> Dict[int, Decimal]:
+        """
+        Quote several orders at once.
+
+        The weight of every order is summed in a single grouped query, then
+        each order is rated against its own shipping region. Returns a map
+        of order id to shipping cost.
+        """
+        regions = {order.id: order.shipping_state for order in orders}
+        if not regions:
+            return {}
+
+        weights = dict(
+            OrderItem.objects.filter(order_id__in=regions)
+            .values('order_id')
+            .annotate(weight=Sum(F('quantity') * F('product__weight_kg'), output_field=DecimalField()))
+            .values_list('order_id', 'weight')
+        )
+        return {
+            order_id: ShippingService.quote(region, weights[order_id]) if weights.get(order_id) else Decimal('0.00')
+            for order_id, region in regions.items()
+        }
+
+    @staticmethod
+    def quote_lines(region: str, lines: Iterable, weights: Dict[int, Decimal]) -> Optional[Decimal]:
+        """
+        Quote ``lines`` of (product_id, quantity) using already loaded ``weights``.
+
+        Returns None when ``region`` is not in the rate table, so callers can
+        keep a placeholder address unpriced.
+        """
+        if not ShippingService.is_known_region(region):
+            return None
+        weight = sum((weights[product_id] * quantity for product_id, quantity in lines), Decimal('0'))
+        return ShippingService.quote(region, weight)
@@ -0,0 +1,297 @@
+"""
+Customer account statements for KeyReport IT Store
+Streams multi-page PDF statements page by page so memory stays flat for any number of lines
+"""
+
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Iterator, List, Optional
+
+from django.conf import settings
+from django.db.models import Q, Sum
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from .models import Order, OrderItem, Payment
+from .pdf_utils import get_payment_method_display, get_payment_status_display
+from .reconciliation import chunked
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 50
+ROW_HEIGHT = 12
+TABLE_TOP = PAGE_HEIGHT - 175
+TABLE_BOTTOM = 70
+
+FONTS = {False: ('F1', 'Helvetica'), True: ('F2', 'Helvetica-Bold')}
+
+# Column positions: left edge of the text columns, right edge of the numeric ones
+COL_DATE = MARGIN
+COL_DESCRIPTION = MARGIN + 55
+COL_QUANTITY = 330
+COL_UNIT_PRICE = 385
+COL_AMOUNT = 440
+COL_DEBIT = 492
+COL_CREDIT = PAGE_WIDTH - MARGIN
+
+
+def get_chunk_size() -> int:
+    return getattr(settings, 'STATEMENT_CHUNK_SIZE', 200)
+
+
+def pdf_string(text: str) -> bytes:
+    """PDF literal string in WinAnsi encoding."""
+    data = str(text).encode('cp1252', errors='replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def money(value) -> str:
+    return f"{value:,.2f}".replace(',', ' ')
+
+
+class StreamingPDF:
+    """
+    Minimal PDF writer that emits every page as soon as it is finished.
+
+    Only byte offsets are kept between pages; the page tree, fonts and
+    cross-reference table are written by ``close`` at the end. Text uses
+    the standard Helvetica fonts, which need no embedding.
+    """
+
+    CATALOG, PAGES, FONT_REGULAR, FONT_BOLD = 1, 2, 3, 4
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+        self.page_ids: List[int] = []
+        self.next_id = 5
+
+    def _emit(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def _object(self, number: int, body: bytes) -> bytes:
+        self.offsets[number] = self.offset
+        return self._emit(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+
+    def open(self) -> bytes:
+        return self._emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def page(self, content: bytes) -> bytes:
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self.page_ids.append(page_id)
+        stream = zlib.compress(content)
+        return self._object(
+            content_id,
+            b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(stream) + stream + b'\nendstream'
+        ) + self._object(
+            page_id,
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] '
+            b'/Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> >> /Contents %d 0 R >>'
+            % (self.PAGES, PAGE_WIDTH, PAGE_HEIGHT, self.FONT_REGULAR, self.FONT_BOLD, content_id)
+        )
+
+    def close(self) -> bytes:
+        data = self._object(
+            self.FONT_REGULAR,
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>'
+        )
+        data += self._object(
+            self.FONT_BOLD,
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>'
+        )
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self.page_ids)
+        data += self._object(self.PAGES, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self.page_ids)))
+        data += self._object(self.CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % self.PAGES)
+
+        xref_offset = self.offset
+        xref = [b'xref\n0 %d\n' % self.next_id, b'0000000000 65535 f \n']
+        xref += [b'%010d 00000 n \n' % self.offsets[number] for number in range(1, self.next_id)]
+        xref.append(
+            b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+            % (self.next_id, self.CATALOG, xref_offset)
+        )
+        return data + self._emit(b''.join(xref))
+
+
+class StatementPage:
+    """Drawing operations of one page."""
+
+    def __init__(self):
+        self.ops: List[bytes] = []
+
+    def text(self, x: float, y: float, text: str, bold: bool = False, size: float = 8):
+        font = FONTS[bold][0].encode()
+        self.ops.append(b'BT /%s %g Tf %.2f %.2f Td %s Tj ET' % (font, size, x, y, pdf_string(text)))
+
+    def text_right(self, right: float, y: float, text: str, bold: bool = False, size: float = 8):
+        self.text(right - stringWidth(str(text), FONTS[bold][1], size), y, text, bold, size)
+
+    def fit(self, text: str, width: float, bold: bool = False, size: float = 8) -> str:
+        """Truncate ``text`` to ``width`` points."""
+        text = str(text)
+        font = FONTS[bold][1]
+        if stringWidth(text, font, size) <= width:
+            return text
+        while text and stringWidth(text + '...', font, size) > width:
+            text = text[:-1]
+        return text + '...'
+
+    def rule(self, y: float, width: float = 0.5):
+        self.ops.append(b'%g w %.2f %.2f m %.2f %.2f l S' % (width, MARGIN, y, PAGE_WIDTH - MARGIN, y))
+
+    def band(self, y: float, height: float):
+        self.ops.append(b'0.9 g %.2f %.2f %.2f %.2f re f 0 g' % (MARGIN, y, PAGE_WIDTH - 2 * MARGIN, height))
+
+    def content(self) -> bytes:
+        return b'\n'.join(self.ops)
+
+
+class StatementService:
+    """Service class to build customer account statements."""
+
+    @staticmethod
+    def orders(customer, since: datetime, until: datetime, chunk_size: Optional[int] = None) -> Iterator[tuple]:
+        """
+        (order, items, payments) for the customer's orders in [since, until).
+
+        Orders are read ``chunk_size`` at a time and the lines of each
+        chunk come from two extra queries. Plain values rather than model
+        instances keep prefetch reference cycles from piling up garbage
+        between collections.
+        """
+        chunk_size = chunk_size or get_chunk_size()
+        orders = Order.objects.filter(
+            customer=customer,
+            created_at__gte=since,
+            created_at__lt=until,
+        ).order_by('created_at', 'id').values('id', 'order_number', 'status', 'total_amount', 'created_at')
+
+        for chunk in chunked(orders.iterator(chunk_size=chunk_size), chunk_size):
+            order_ids = [order['id'] for order in chunk]
+            items, payments = defaultdict(list), defaultdict(list)
+            for item in OrderItem.objects.filter(order_id__in=order_ids).order_by('id').values(
+                'order_id', 'product__name', 'quantity', 'unit_price', 'total_price'
+            ):
+                items[item['order_id']].append(item)
+            for payment in Payment.objects.filter(order_id__in=order_ids).order_by('id').values(
+                'order_id', 'id', 'payment_method', 'status', 'amount', 'receipt_number', 'created_at', 'processed_at'
+            ).annotate(refunded=Sum('events__amount', filter=Q(events__event_type='refund_succeeded'))):
+                payments[payment['order_id']].append(payment)
+            for order in chunk:
+                yield order, items[order['id']], payments[order['id']]
+
+    @staticmethod
+    def render(customer, since: datetime, until: datetime, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Yield the statement PDF as it is produced.
+
+        Each page is written out as soon as it is full, so only the
+        current page and one chunk of orders are ever held in memory.
+        Orders are debited (except cancelled ones), completed payments
+        are credited and refunds debited back.
+        """
+        pdf = StreamingPDF()
+        yield pdf.open()
+
+        state = {'page': None, 'y': 0, 'number': 0}
+        totals = {'debit': Decimal('0.00'), 'credit': Decimal('0.00')}
+        period = f"{since:%d/%m/%Y} - {until - timedelta(days=1):%d/%m/%Y}"
+        customer_name = customer.get_full_name() or customer.email
+
+        def start_page():
+            state['number'] += 1
+            page = StatementPage()
+            page.text(MARGIN, PAGE_HEIGHT - 60, "RELEVÉ DE COMPTE", bold=True, size=16)
+            page.text(MARGIN, PAGE_HEIGHT - 78, "Key Analytics Report - Mazola rue 6, Casablanca - contact@keyreport.ma", size=8)
+            page.text(MARGIN, PAGE_HEIGHT - 105, f"Client: {customer_name}", bold=True, size=9)
+            if getattr(customer, 'company', ''):
+                page.text(MARGIN, PAGE_HEIGHT - 117, f"Société: {customer.company}", size=9)
+            page.text(MARGIN, PAGE_HEIGHT - 129, f"Email: {customer.email}", size=9)
+            page.text_right(COL_CREDIT, PAGE_HEIGHT - 105, f"Période: {period}", size=9)
+            page.text_right(COL_CREDIT, PAGE_HEIGHT - 117, f"Page {state['number']}", size=9)
+            if state['number'] > 1:
+                page.text_right(COL_CREDIT, PAGE_HEIGHT - 129, f"Report: débit {money(totals['debit'])} / crédit {money(totals['credit'])}", size=8)
+
+            page.band(TABLE_TOP - 4, ROW_HEIGHT + 2)
+            for x, label in ((COL_DATE, "Date"), (COL_DESCRIPTION, "Description")):
+                page.text(x, TABLE_TOP, label, bold=True)
+            for x, label in ((COL_QUANTITY, "Qté"), (COL_UNIT_PRICE, "P.U."), (COL_AMOUNT, "Montant"),
+                             (COL_DEBIT, "Débit"), (COL_CREDIT, "Crédit")):
+                page.text_right(x, TABLE_TOP, label, bold=True)
+            state['page'] = page
+            state['y'] = TABLE_TOP - ROW_HEIGHT - 4
+
+        def finish_page(last=False):
+            page = state['page']
+            if not last:
+                page.rule(TABLE_BOTTOM - 4)
+                page.text_right(COL_CREDIT, TABLE_BOTTOM - 16,
+                                f"À reporter: débit {money(totals['debit'])} / crédit {money(totals['credit'])}", size=8)
+            return pdf.page(page.content())
+
+        def row(date, description, quantity='', unit_price='', amount='', debit='', credit='', bold=False, indent=0):
+            """Draw one line, yielding the finished page first when it is full."""
+            if state['y'] < TABLE_BOTTOM:
+                yield finish_page()
+                start_page()
+            page, y = state['page'], state['y']
+            if date:
+                page.text(COL_DATE, y, date, bold=bold)
+            page.text(COL_DESCRIPTION + indent, y, page.fit(description, COL_QUANTITY - 30 - COL_DESCRIPTION - indent, bold), bold=bold)
+            for x, value in ((COL_QUANTITY, quantity), (COL_UNIT_PRICE, unit_price), (COL_AMOUNT, amount),
+                             (COL_DEBIT, debit), (COL_CREDIT, credit)):
+                if value != '':
+                    page.text_right(x, y, value, bold=bold)
+            state['y'] -= ROW_HEIGHT
+
+        start_page()
+        status_labels = dict(Order.STATUS_CHOICES)
+        for order, items, payments in StatementService.orders(customer, since, until, chunk_size):
+            cancelled = order['status'] == 'cancelled'
+            if not cancelled:
+                totals['debit'] += order['total_amount']
+            yield from row(
+                f"{order['created_at']:%d/%m/%Y}",
+                f"Commande {order['order_number']} ({status_labels.get(order['status'], order['status'])})",
+                debit='' if cancelled else money(order['total_amount']),
+                bold=True,
+            )
+            for item in items:
+                yield from row('', item['product__name'], str(item['quantity']), money(item['unit_price']),
+                               money(item['total_price']), indent=10)
+            for payment in payments:
+                label = (f"Paiement {get_payment_method_display(payment['payment_method'])} - "
+                         f"{get_payment_status_display(payment['status'])}")
+                if payment['receipt_number']:
+                    label += f" ({payment['receipt_number']})"
+                date = f"{(payment['processed_at'] or payment['created_at']):%d/%m/%Y}"
+                if payment['status'] in ('completed', 'partially_refunded', 'refunded'):
+                    totals['credit'] += payment['amount']
+                    yield from row(date, label, credit=money(payment['amount']), indent=10)
+                    if payment['status'] != 'completed':
+                        refunded = payment['refunded'] or payment['amount']
+                        totals['debit'] += refunded
+                        yield from row(date, f"Remboursement {payment['receipt_number'] or payment['id']}",
+                                       debit=money(refunded), indent=10)
+                else:
+                    yield from row(date, label, amount=money(payment['amount']), indent=10)
+            state['y'] -= 4
+
+        # Totals
+        if state['y'] < TABLE_BOTTOM + 3 * ROW_HEIGHT:
+            yield finish_page()
+            start_page()
+        page, y = state['page'], state['y']
+        page.rule(y + ROW_HEIGHT - 3)
+        page.text(COL_DESCRIPTION, y - 2, "Total de la période", bold=True, size=9)
+        page.text_right(COL_DEBIT, y - 2, money(totals['debit']), bold=True, size=9)
+        page.text_right(COL_CREDIT, y - 2, money(totals['credit']), bold=True, size=9)
+        balance = totals['debit'] - totals['credit']
+        page.text(COL_DESCRIPTION, y - 2 - ROW_HEIGHT * 1.5, "Solde dû" if balance > 0 else "Solde", bold=True, size=10)
+        page.text_right(COL_CREDIT, y - 2 - ROW_HEIGHT * 1.5, f"{money(balance)} MAD", bold=True, size=10)
+
+        yield finish_page(last=True)
+        yield pdf.close()
@@ -0,0 +1,96 @@
+"""
+Low-stock monitoring for KeyReport IT Store
+Finds products at or below their minimum stock level and raises alerts
+when a stock change crosses that threshold
+"""
+
+from typing import Dict, List
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import LowStockAlert, Product
+
+
+class LowStockService:
+    """Service class for low-stock queries, alerts and reorder lists."""
+
+    @staticmethod
+    def low_stock_products(active_only: bool = True):
+        """Products with stock <= min_stock_level, served by the partial low-stock index."""
+        products = Product.objects.filter(stock_quantity__lte=F('min_stock_level'))
+        if active_only:
+            products = products.filter(is_active=True)
+        return products.order_by('stock_quantity', 'name')
+
+    @staticmethod
+    def check_crossings(deltas: Dict[int, int]) -> List[LowStockAlert]:
+        """
+        Raise alerts for products whose last stock change crossed the threshold.
+
+        ``deltas`` maps product ids to the change that was just applied, so
+        the previous level is the current snapshot minus the delta. Only the
+        touched products are read, in one query.
+        """
+        deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+        if not deltas:
+            return []
+
+        alerts = []
+        rows = Product.objects.filter(id__in=deltas).values_list('id', 'stock_quantity', 'min_stock_level')
+        for product_id, stock, min_level in rows:
+            previous = stock - deltas[product_id]
+            if stock <= min_level < previous:
+                event_type = 'low_stock'
+            elif previous <= min_level < stock:
+                event_type = 'restocked'
+            else:
+                continue
+            alerts.append(LowStockAlert(
+                product_id=product_id,
+                event_type=event_type,
+                stock_quantity=stock,
+                min_stock_level=min_level,
+            ))
+
+        if alerts:
+            LowStockAlert.objects.bulk_create(alerts)
+        return alerts
+
+    @staticmethod
+    def open_alerts(limit: int = 20):
+        """Most recent unacknowledged alerts for the staff feed."""
+        return LowStockAlert.objects.filter(is_acknowledged=False).select_related('product')[:limit]
+
+    @staticmethod
+    def acknowledge(alerts, user) -> int:
+        """Mark ``alerts`` (a queryset) as acknowledged by ``user``."""
+        return alerts.filter(is_acknowledged=False).update(
+            is_acknowledged=True,
+            acknowledged_by=user,
+            acknowledged_at=timezone.now(),
+        )
+
+    @staticmethod
+    def reorder_quantity(stock_quantity: int, min_stock_level: int) -> int:
+        """Quantity to order to get back to twice the minimum stock level."""
+        return max(min_stock_level * 2 - stock_quantity, 0)
+
+    @staticmethod
+    def reorder_list(active_only: bool = True) -> List[Dict]:
+        """Low-stock products with a suggested reorder quantity."""
+        rows = LowStockService.low_stock_products(active_only).values_list(
+            'id', 'sku', 'name', 'brand', 'stock_quantity', 'min_stock_level'
+        )
+        return [
+            {
+                'product_id': product_id,
+                'sku': sku,
+                'name': name,
+                'brand': brand,
+                'stock_quantity': stock,
+                'min_stock_level': min_level,
+                'reorder_quantity': LowStockService.reorder_quantity(stock, min_level),
+            }
+            for product_id, sku, name, brand, stock, min_level in rows.iterator()
+        ]
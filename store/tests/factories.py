@@ -0,0 +1,95 @@
+"""
+Test data builders for KeyReport IT Store
+Small helpers creating users, products, carts and orders with the required fields filled in
+"""
+
+import itertools
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+
+from store.models import Cart, CartItem, Category, Order, OrderItem, Payment, Product
+
+User = get_user_model()
+
+_counter = itertools.count(1)
+
+
+class TempMediaMixin:
+    """Point MEDIA_ROOT at a directory removed after each test."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp(prefix='keyreport-tests-')
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+
+def make_user(email=None, user_type='customer', **extra):
+    email = email or f'user{next(_counter)}@example.ma'
+    extra.setdefault('is_staff', user_type in ('staff', 'admin'))
+    return User.objects.create_user(email=email, password='secret-pass-123', user_type=user_type, **extra)
+
+
+def make_category(**extra):
+    number = next(_counter)
+    extra.setdefault('name', f'Category {number}')
+    extra.setdefault('slug', f'category-{number}')
+    return Category.objects.create(**extra)
+
+
+def make_product(category=None, **extra):
+    number = next(_counter)
+    extra.setdefault('name', f'Product {number}')
+    extra.setdefault('slug', f'product-{number}')
+    extra.setdefault('sku', f'SKU-{number:05d}')
+    extra.setdefault('description', 'Test product')
+    extra.setdefault('price', Decimal('100.00'))
+    extra.setdefault('stock_quantity', 10)
+    extra.setdefault('main_image', 'products/test.jpg')
+    return Product.objects.create(category=category or make_category(), **extra)
+
+
+def make_cart(user, *lines):
+    """A cart holding ``(product, quantity)`` lines."""
+    cart = Cart.objects.create(user=user)
+    for product, quantity in lines:
+        CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+    return cart
+
+
+def order_details(**extra):
+    """Unsaved Order carrying the shipping and contact details of a checkout."""
+    extra.setdefault('shipping_address', '12 rue des Tests')
+    extra.setdefault('shipping_city', 'Casablanca')
+    extra.setdefault('shipping_state', 'Casablanca-Settat')
+    extra.setdefault('shipping_zip_code', '20000')
+    extra.setdefault('shipping_country', 'Morocco')
+    extra.setdefault('contact_phone', '0600000000')
+    extra.setdefault('contact_email', 'client@example.ma')
+    return Order(**extra)
+
+
+def make_order(customer=None, total=Decimal('100.00'), product=None, **extra):
+    """A saved order of ``total``, with one line of ``product`` when given."""
+    order = order_details(**extra)
+    order.order_number = order.order_number or f'ORD-T{next(_counter):05d}'
+    order.customer = customer or make_user()
+    order.subtotal = order.total_amount = total
+    order.save()
+    if product is not None:
+        OrderItem.objects.create(
+            order=order, product=product, quantity=1, unit_price=total, total_price=total,
+            product_name=product.name, product_sku=product.sku,
+        )
+    return order
+
+
+def make_payment(order=None, amount=None, **extra):
+    order = order or make_order()
+    extra.setdefault('payment_method', 'credit_card')
+    extra.setdefault('status', 'completed')
+    return Payment.objects.create(order=order, amount=order.total_amount if amount is None else amount, **extra)
@@ -0,0 +1,118 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.db import IntegrityError
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from store.idempotency import idempotent_post, purge_expired_keys
+from store.models import IdempotencyKey
+
+from .factories import make_user
+
+
+class IdempotentPostTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.factory = RequestFactory()
+        self.calls = []
+
+        @idempotent_post
+        def view(request):
+            self.calls.append(request.path)
+            status = int(request.POST.get('status', 200))
+            return HttpResponse(f'result {len(self.calls)}', status=status)
+
+        self.view = view
+
+    def post(self, key='key-1', path='/checkout/', user=None, **data):
+        request = self.factory.post(path, data, HTTP_IDEMPOTENCY_KEY=key)
+        request.user = user or self.user
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        return self.view(request)
+
+    def test_repeated_submission_replays_the_first_response(self):
+        first = self.post()
+        second = self.post()
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+
+    def test_key_is_read_from_the_form(self):
+        request = self.factory.post('/checkout/', {'idempotency_key': 'form-key'})
+        request.user = self.user
+        self.view(request)
+
+        self.assertTrue(IdempotencyKey.objects.filter(user=self.user, key='form-key', status='completed').exists())
+
+    def test_keys_are_scoped_per_user(self):
+        self.post()
+        self.post(user=make_user())
+
+        self.assertEqual(len(self.calls), 2)
+
+    def test_key_reused_for_another_path_is_rejected(self):
+        self.post()
+
+        response = self.post(path='/payment/')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_error_responses_are_not_stored(self):
+        self.assertEqual(self.post(status=400).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.assertEqual(self.post().status_code, 200)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_submission_in_progress_is_not_run_twice(self):
+        IdempotencyKey.objects.create(
+            key='key-1', user=self.user, request_path='/checkout/',
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.calls, [])
+
+    def test_key_released_during_the_race_asks_for_a_retry(self):
+        with mock.patch.object(IdempotencyKey.objects, 'create', side_effect=IntegrityError):
+            response = self.post()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.calls, [])
+
+    def test_expired_key_runs_the_view_again(self):
+        self.post()
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.post()
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+
+    def test_view_exception_releases_the_key(self):
+        @idempotent_post
+        def failing(request):
+            raise RuntimeError('boom')
+
+        request = self.factory.post('/checkout/', HTTP_IDEMPOTENCY_KEY='key-1')
+        request.user = self.user
+        with self.assertRaises(RuntimeError):
+            failing(request)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_purge_removes_only_expired_keys(self):
+        self.post(key='old')
+        self.post(key='new')
+        IdempotencyKey.objects.filter(key='old').update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(purge_expired_keys(), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
@@ -0,0 +1,106 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from store.inventory import InventoryService
+from store.models import Product, StockMovement
+
+from .factories import make_order, make_product, make_user
+
+
+class InventoryServiceTests(TestCase):
+    def setUp(self):
+        self.product = make_product(stock_quantity=10)
+        InventoryService.reconcile()
+
+    def test_movements_update_the_snapshot_in_one_pass(self):
+        other = make_product(stock_quantity=4)
+        InventoryService.record_movements([
+            StockMovement(product=self.product, quantity_delta=-3, reason='sale'),
+            StockMovement(product=self.product, quantity_delta=5, reason='return'),
+            StockMovement(product=other, quantity_delta=-4, reason='sale'),
+        ])
+
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 12)
+        self.assertEqual(Product.objects.get(pk=other.pk).stock_quantity, 0)
+
+    def test_zero_movements_are_dropped(self):
+        recorded = InventoryService.record_movements([
+            StockMovement(product=self.product, quantity_delta=0, reason='adjustment'),
+        ])
+
+        self.assertEqual(recorded, [])
+
+    def test_order_movements_reference_the_order(self):
+        order = make_order()
+
+        InventoryService.record_order(order, {self.product.id: 2})
+
+        movement = StockMovement.objects.get(reason='order')
+        self.assertEqual((movement.quantity_delta, movement.reference), (-2, order.order_number))
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 8)
+
+    def test_adjustment_records_a_change_already_saved(self):
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=7)
+
+        InventoryService.record_adjustment(self.product, 10, 7, reference='inventaire')
+
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 7)
+        self.assertEqual(StockMovement.objects.get(reason='adjustment').quantity_delta, -3)
+
+    def test_stock_as_of_undoes_later_movements(self):
+        before = timezone.now()
+        InventoryService.record_movements([StockMovement(product=self.product, quantity_delta=-4, reason='sale')])
+
+        self.assertEqual(InventoryService.stock_as_of(before, [self.product.id]), {self.product.id: 10})
+        self.assertEqual(InventoryService.stock_as_of(timezone.now() + timedelta(seconds=1))[self.product.id], 6)
+
+    def test_movement_history_is_newest_first(self):
+        InventoryService.record_movements([StockMovement(product=self.product, quantity_delta=-1, reason='sale')])
+
+        reasons = [movement.reason for movement in InventoryService.movement_history(self.product)]
+
+        self.assertEqual(reasons, ['sale', 'initial'])
+
+
+class ReconcileTests(TestCase):
+    def test_products_without_history_get_an_opening_balance(self):
+        product = make_product(stock_quantity=9)
+
+        result = InventoryService.reconcile()
+
+        self.assertEqual(result['opened'], [product.id])
+        movement = StockMovement.objects.get(product=product)
+        self.assertEqual((movement.reason, movement.quantity_delta), ('initial', 9))
+
+    def test_drift_is_recorded_as_a_reconciliation_movement(self):
+        product = make_product(stock_quantity=9)
+        InventoryService.reconcile()
+        Product.objects.filter(pk=product.pk).update(stock_quantity=6)
+
+        result = InventoryService.reconcile()
+
+        self.assertEqual(result['corrected'], [(product.id, 6, 9)])
+        self.assertEqual(StockMovement.objects.get(reason='reconciliation').quantity_delta, -3)
+        self.assertEqual(Product.objects.get(pk=product.pk).stock_quantity, 6)
+        self.assertEqual(sum(product.stock_movements.values_list('quantity_delta', flat=True)), 6)
+        self.assertEqual(InventoryService.reconcile(), {'opened': [], 'corrected': []})
+
+    def test_dry_run_writes_nothing(self):
+        make_product(stock_quantity=3)
+
+        result = InventoryService.reconcile(dry_run=True)
+
+        self.assertEqual(len(result['opened']), 1)
+        self.assertFalse(StockMovement.objects.exists())
+
+
+class StockMovementAdminTests(TestCase):
+    def test_movements_cannot_be_added_by_hand(self):
+        self.client.force_login(make_user(user_type='admin', is_superuser=True))
+
+        response = self.client.get(reverse('admin:store_stockmovement_add'))
+
+        self.assertEqual(response.status_code, 403)
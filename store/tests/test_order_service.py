@@ -0,0 +1,79 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from store.models import CartItem, Order, OrderItem, StockMovement
+from store.order_service import EmptyCartError, InsufficientStockError, OrderPlacementService
+
+from .factories import make_cart, make_product, make_user, order_details
+
+
+class OrderPlacementServiceTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.laptop = make_product(name='Laptop', price=Decimal('5000.00'), stock_quantity=5)
+        self.mouse = make_product(name='Mouse', price=Decimal('100.00'), sale_price=Decimal('80.00'), stock_quantity=20)
+
+    def test_places_order_from_cart(self):
+        cart = make_cart(self.user, (self.laptop, 2), (self.mouse, 3))
+
+        order = OrderPlacementService.place_order(cart, order_details())
+
+        self.assertTrue(order.order_number.startswith('ORD-'))
+        self.assertEqual(order.customer, self.user)
+        self.assertEqual(order.subtotal, Decimal('10240.00'))
+        self.assertEqual(order.total_amount, order.subtotal + order.tax_amount + order.shipping_cost)
+        items = {item.product_id: item for item in order.items.all()}
+        self.assertEqual(items[self.mouse.id].unit_price, Decimal('80.00'))
+        self.assertEqual(items[self.laptop.id].total_price, Decimal('10000.00'))
+        self.assertFalse(CartItem.objects.filter(cart=cart).exists())
+
+    def test_reserves_stock_through_the_ledger(self):
+        cart = make_cart(self.user, (self.laptop, 2))
+
+        order = OrderPlacementService.place_order(cart, order_details())
+
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.stock_quantity, 3)
+        movement = StockMovement.objects.get(product=self.laptop)
+        self.assertEqual((movement.quantity_delta, movement.reason, movement.order), (-2, 'order', order))
+
+    def test_replaces_temporary_order_number(self):
+        cart = make_cart(self.user, (self.mouse, 1))
+
+        order = OrderPlacementService.place_order(cart, order_details(order_number='TEMP-ABCD1234'))
+
+        self.assertTrue(order.order_number.startswith('ORD-'))
+
+    def test_empty_cart_is_rejected(self):
+        cart = make_cart(self.user)
+
+        with self.assertRaises(EmptyCartError):
+            OrderPlacementService.place_order(cart, order_details())
+        self.assertFalse(Order.objects.exists())
+
+    def test_shortage_rolls_back_the_whole_order(self):
+        cart = make_cart(self.user, (self.mouse, 2), (self.laptop, 6))
+
+        with self.assertRaises(InsufficientStockError) as raised:
+            OrderPlacementService.place_order(cart, order_details())
+
+        self.assertEqual(raised.exception.shortages, {'Laptop': 5})
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(StockMovement.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=cart).count(), 2)
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.stock_quantity, 20)
+
+    def test_competing_checkouts_cannot_oversell(self):
+        first = make_cart(self.user, (self.laptop, 3))
+        second = make_cart(make_user(), (self.laptop, 3))
+
+        OrderPlacementService.place_order(first, order_details())
+        with self.assertRaises(InsufficientStockError):
+            OrderPlacementService.place_order(second, order_details())
+
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.stock_quantity, 2)
+        self.assertEqual(Order.objects.count(), 1)
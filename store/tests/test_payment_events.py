@@ -0,0 +1,71 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from store.models import PaymentEvent
+from store.payment_events import PaymentEventService
+from store.payment_gateway import PaymentService
+
+from .factories import make_payment
+
+
+class PaymentEventServiceTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.payment = make_payment(amount=Decimal('200.00'))
+
+    def record(self, event_type, amount, days_ago=0):
+        event = PaymentEventService.record(self.payment, event_type, amount=amount)
+        PaymentEvent.objects.filter(pk=event.pk).update(created_at=self.now - timedelta(days=days_ago))
+        return event
+
+    def test_gateways_append_events_instead_of_overwriting_the_payment(self):
+        payment = make_payment(status='processing', amount=Decimal('80.00'))
+
+        PaymentService.process_payment(payment, payment_method_id='pm_card_visa')
+        PaymentService.verify_payment(payment)
+        PaymentService.refund_payment(payment, Decimal('30.00'))
+
+        events = list(payment.events.order_by('id').values_list('event_type', 'amount', 'gateway'))
+        self.assertEqual(events, [
+            ('charge_succeeded', Decimal('80.00'), 'stripe'),
+            ('verification', None, 'stripe'),
+            ('refund_succeeded', Decimal('30.00'), 'stripe'),
+        ])
+        refund = payment.events.get(event_type='refund_succeeded')
+        self.assertEqual(refund.external_id, refund.payload['refund_id'])
+        payment.refresh_from_db()
+        self.assertEqual(payment.processor_response, {})
+
+    def test_totals_group_by_event_type_within_the_period(self):
+        self.record('charge_succeeded', Decimal('200.00'))
+        self.record('refund_succeeded', Decimal('50.00'))
+        self.record('refund_succeeded', Decimal('25.00'))
+        self.record('refund_succeeded', Decimal('99.00'), days_ago=10)
+
+        totals = PaymentEventService.totals(self.now - timedelta(days=1))
+
+        self.assertEqual(totals, {
+            'charge_succeeded': {'count': 1, 'total': Decimal('200.00')},
+            'refund_succeeded': {'count': 2, 'total': Decimal('75.00')},
+        })
+
+    def test_refunds_are_newest_first_and_bounded(self):
+        older = self.record('refund_succeeded', Decimal('10.00'), days_ago=2)
+        newer = self.record('refund_succeeded', Decimal('20.00'), days_ago=1)
+        self.record('charge_succeeded', Decimal('200.00'), days_ago=1)
+
+        refunds = PaymentEventService.refunds(self.now - timedelta(days=3), self.now)
+
+        self.assertEqual(list(refunds), [newer, older])
+
+    def test_daily_totals(self):
+        self.record('charge_succeeded', Decimal('10.00'), days_ago=1)
+        self.record('charge_succeeded', Decimal('15.00'), days_ago=1)
+        self.record('charge_succeeded', Decimal('5.00'))
+
+        rows = list(PaymentEventService.daily_totals('charge_succeeded', self.now - timedelta(days=2)))
+
+        self.assertEqual([(count, total) for _, count, total in rows], [(2, Decimal('25.00')), (1, Decimal('5.00'))])
@@ -0,0 +1,150 @@
+import threading
+from decimal import Decimal
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from store.payment_gateway import (
+    CashOnDeliveryGateway, GatewayRegistry, MoroccanBankGateway, PaymentGateway, PaymentService,
+    StripeGateway,
+)
+
+from .factories import make_payment
+
+
+class FakeGateway(PaymentGateway):
+    built = 0
+
+    def __init__(self):
+        super().__init__()
+        FakeGateway.built += 1
+        self.gateway_name = 'fake'
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+
+class RegistryTestMixin:
+    def setUp(self):
+        super().setUp()
+        saved = (
+            dict(GatewayRegistry._factories), dict(GatewayRegistry._methods),
+            dict(GatewayRegistry._metadata),
+        )
+        FakeGateway.built = 0
+        GatewayRegistry.reset()
+
+        def restore():
+            GatewayRegistry.reset()
+            for registered, original in zip(
+                (GatewayRegistry._factories, GatewayRegistry._methods, GatewayRegistry._metadata), saved
+            ):
+                registered.clear()
+                registered.update(original)
+
+        self.addCleanup(restore)
+
+
+class GatewayRegistryTests(RegistryTestMixin, SimpleTestCase):
+    def test_methods_map_to_their_gateway(self):
+        self.assertIsInstance(GatewayRegistry.get_gateway('visa'), StripeGateway)
+        self.assertIsInstance(GatewayRegistry.get_gateway('cash'), CashOnDeliveryGateway)
+        self.assertIsInstance(GatewayRegistry.get_gateway('bmce'), MoroccanBankGateway)
+
+    def test_unknown_methods_fall_back_to_cash_on_delivery(self):
+        self.assertIsInstance(GatewayRegistry.get_gateway('bitcoin'), CashOnDeliveryGateway)
+
+    def test_gateways_are_built_once_and_shared(self):
+        self.assertIs(GatewayRegistry.get_gateway('visa'), GatewayRegistry.get_gateway('mastercard'))
+
+    def test_concurrent_first_use_builds_one_instance(self):
+        GatewayRegistry.register('fake', FakeGateway, ['fake'])
+        gateways, barrier = [], threading.Barrier(8)
+
+        def fetch():
+            barrier.wait()
+            gateways.append(GatewayRegistry.get_gateway('fake'))
+
+        threads = [threading.Thread(target=fetch) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(FakeGateway.built, 1)
+        self.assertEqual(len({id(gateway) for gateway in gateways}), 1)
+
+    def test_registering_again_closes_the_previous_instance(self):
+        GatewayRegistry.register('fake', FakeGateway, ['fake'])
+        old = GatewayRegistry.get_gateway('fake')
+
+        GatewayRegistry.register('fake', FakeGateway, ['fake'])
+
+        self.assertTrue(old.closed)
+        self.assertIsNot(GatewayRegistry.get_gateway('fake'), old)
+
+    @override_settings(PAYMENT_GATEWAYS={
+        'fake': {
+            'class': 'store.tests.test_payment_gateway.FakeGateway',
+            'methods': ['fake_pay'],
+            'metadata': {'fake_pay': {'name': 'Fake Pay'}},
+        },
+    })
+    def test_gateways_declared_in_settings_are_registered(self):
+        GatewayRegistry.reset()
+
+        self.assertIsInstance(GatewayRegistry.get_gateway('fake_pay'), FakeGateway)
+        self.assertEqual(PaymentService.get_payment_methods()['fake_pay'], {'name': 'Fake Pay'})
+
+    def test_reset_closes_built_gateways(self):
+        GatewayRegistry.register('fake', FakeGateway, ['fake'])
+        gateway = GatewayRegistry.get_gateway('fake')
+
+        GatewayRegistry.reset()
+
+        self.assertTrue(gateway.closed)
+
+
+class GatewayHttpTests(SimpleTestCase):
+    @override_settings(PAYMENT_GATEWAY_HTTP={'default': {'timeout': 3}, 'fake': {'pool_maxsize': 2}})
+    def test_http_options_merge_defaults_and_gateway_settings(self):
+        options = FakeGateway().get_http_options()
+
+        self.assertEqual((options['timeout'], options['pool_maxsize'], options['max_retries']), (3, 2, 2))
+
+    def test_session_is_created_lazily_and_reused(self):
+        gateway = FakeGateway()
+        self.assertIsNone(gateway._http)
+
+        session = gateway.http
+
+        self.assertIs(gateway.http, session)
+        gateway.close()
+        self.assertIsNone(gateway._http)
+
+    @override_settings(PAYMENT_GATEWAY_URLS={'stripe': 'http://127.0.0.1:9/'})
+    def test_api_url_is_read_from_settings(self):
+        self.assertEqual(StripeGateway().api_url, 'http://127.0.0.1:9/')
+        self.assertEqual(CashOnDeliveryGateway().api_url, '')
+
+
+class GatewayPaymentTests(RegistryTestMixin, TestCase):
+    def test_stripe_charge_completes_the_payment(self):
+        payment = make_payment(status='pending')
+
+        result = PaymentService.process_payment(payment, payment_method_id='pm_card_visa')
+
+        self.assertTrue(result['success'])
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertTrue(payment.transaction_id.startswith('pi_'))
+
+    def test_partial_refunds_add_up_to_a_full_refund(self):
+        payment = make_payment(amount=Decimal('300.00'))
+
+        PaymentService.refund_payment(payment, Decimal('100.00'))
+        self.assertEqual(payment.status, 'partially_refunded')
+
+        PaymentService.refund_payment(payment, Decimal('200.00'))
+        self.assertEqual(payment.status, 'refunded')
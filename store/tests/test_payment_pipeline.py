@@ -0,0 +1,125 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from store.models import PaymentJob
+from store.payment_pipeline import PaymentPipeline
+
+from .factories import TempMediaMixin, make_payment, make_user
+
+
+@override_settings(PAYMENT_PIPELINE_MODE='inline')
+class PaymentPipelineTests(TempMediaMixin, TestCase):
+    def test_successful_job_charges_updates_the_order_and_renders_the_receipt(self):
+        payment = make_payment(status='processing')
+
+        job = PaymentPipeline.enqueue(payment, order_status='confirmed', payment_method_id='pm_card_visa')
+
+        self.assertEqual((job.status, job.stage, job.attempts), ('succeeded', 'done', 1))
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(payment.order.status, 'confirmed')
+        self.assertTrue(default_storage.exists(job.receipt.name))
+
+    def test_declined_charge_fails_the_job_and_the_payment(self):
+        payment = make_payment(status='processing')
+
+        job = PaymentPipeline.enqueue(payment, order_status='confirmed')
+
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error, 'Please provide a valid payment method')
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.order.status), ('failed', 'pending'))
+
+    def test_settled_payments_skip_the_gateway(self):
+        payment = make_payment(status='pending', payment_method='cash_delivery')
+
+        with mock.patch('store.payment_pipeline.PaymentService.process_payment') as process:
+            job = PaymentPipeline.enqueue(payment)
+
+        process.assert_not_called()
+        self.assertEqual(job.status, 'succeeded')
+
+    def test_a_job_runs_only_once(self):
+        job = PaymentPipeline.enqueue(make_payment())
+
+        self.assertFalse(PaymentPipeline.run_job(job.id))
+        self.assertEqual(PaymentJob.objects.get(id=job.id).attempts, 1)
+
+    def test_latest_job(self):
+        payment = make_payment()
+        PaymentPipeline.enqueue(payment)
+        latest = PaymentPipeline.enqueue(payment)
+
+        self.assertEqual(PaymentPipeline.latest_job(payment), latest)
+
+
+class PaymentQueueTests(TempMediaMixin, TestCase):
+    @override_settings(PAYMENT_PIPELINE_MODE='thread')
+    def test_thread_mode_submits_the_job_after_commit(self):
+        with mock.patch.object(PaymentPipeline, 'start_poller') as start_poller, \
+                mock.patch.object(PaymentPipeline, 'executor') as executor, \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            job = PaymentPipeline.enqueue(make_payment())
+            executor.return_value.submit.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+        executor.return_value.submit.assert_called_once_with(PaymentPipeline._run_in_thread, job.id)
+        start_poller.assert_called_once_with()
+
+    @override_settings(PAYMENT_PIPELINE_MODE='worker')
+    def test_worker_mode_leaves_jobs_queued_for_run_pending(self):
+        first = PaymentPipeline.enqueue(make_payment())
+        second = PaymentPipeline.enqueue(make_payment())
+
+        self.assertEqual(PaymentPipeline.pending_ids(10), [first.id, second.id])
+        self.assertEqual(PaymentPipeline.run_pending(10), 2)
+        self.assertEqual(set(PaymentJob.objects.values_list('status', flat=True)), {'succeeded'})
+
+    @override_settings(PAYMENT_PIPELINE_MODE='worker')
+    def test_pending_ids_can_skip_recent_jobs(self):
+        old = PaymentPipeline.enqueue(make_payment())
+        PaymentJob.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(minutes=10))
+        PaymentPipeline.enqueue(make_payment())
+
+        self.assertEqual(
+            PaymentPipeline.pending_ids(10, queued_before=timezone.now() - timedelta(minutes=5)), [old.id]
+        )
+
+    @override_settings(PAYMENT_PIPELINE_MODE='worker')
+    def test_stale_running_jobs_are_requeued(self):
+        stale = PaymentPipeline.enqueue(make_payment())
+        fresh = PaymentPipeline.enqueue(make_payment())
+        PaymentJob.objects.filter(id=stale.id).update(
+            status='running', stage='gateway', started_at=timezone.now() - timedelta(minutes=10)
+        )
+        PaymentJob.objects.filter(id=fresh.id).update(status='running', started_at=timezone.now())
+
+        self.assertEqual(PaymentPipeline.requeue_stale(timedelta(minutes=5)), 1)
+        self.assertEqual(PaymentJob.objects.get(id=stale.id).stage, 'queued')
+        self.assertEqual(PaymentJob.objects.get(id=fresh.id).status, 'running')
+
+
+@override_settings(PAYMENT_PIPELINE_MODE='inline')
+class PaymentStatusViewTests(TempMediaMixin, TestCase):
+    def test_status_reports_the_finished_job(self):
+        payment = make_payment(status='processing')
+        PaymentPipeline.enqueue(payment, success_url='/done/', payment_method_id='pm_card_visa')
+        self.client.force_login(payment.order.customer)
+
+        data = self.client.get(reverse('store:payment_status_json', args=[payment.id])).json()
+
+        self.assertEqual((data['status'], data['finished'], data['redirect_url']), ('succeeded', True, '/done/'))
+        self.assertIn('receipt_url', data)
+
+    def test_status_is_private_to_the_customer(self):
+        payment = make_payment()
+        self.client.force_login(make_user())
+
+        response = self.client.get(reverse('store:payment_status_json', args=[payment.id]))
+
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,121 @@
+import threading
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from store.payment_gateway import StripeGateway
+from store.payment_stub import StubProcessor, build_config
+from store.webhook_signing import sign_payload
+
+from .factories import make_payment
+
+NO_LATENCY = {'distribution': 'fixed', 'ms': 0}
+
+
+def stub(**config):
+    config.setdefault('latency', NO_LATENCY)
+    config.setdefault('decline_rate', 0)
+    config.setdefault('error_rate', 0)
+    return StubProcessor(dict(config, seed=1))
+
+
+class StubProcessorTests(SimpleTestCase):
+    def test_overrides_are_merged_into_nested_defaults(self):
+        config = build_config({'latency': {'median_ms': 10}, 'decline_rate': 0.5})
+
+        self.assertEqual(config['latency'], {'distribution': 'lognormal', 'median_ms': 10, 'sigma': 0.5})
+        self.assertEqual(config['decline_rate'], 0.5)
+        self.assertEqual(build_config()['latency']['median_ms'], 120)
+
+    def test_latency_distributions(self):
+        self.assertEqual(stub(latency={'distribution': 'fixed', 'ms': 250}).sample_latency(), 0.25)
+        processor = stub(latency={'distribution': 'uniform', 'min_ms': 10, 'max_ms': 20})
+        for _ in range(20):
+            self.assertTrue(0.01 <= processor.sample_latency() <= 0.02)
+
+    def test_charge_refund_and_lookup(self):
+        processor = stub()
+
+        status, charge = processor.handle('POST', '/stripe/charges', {'amount': '10.00', 'reference': 'ORD-1'})
+        self.assertEqual((status, charge['status'], charge['processor']), (200, 'succeeded', 'stripe'))
+
+        status, refund = processor.handle('POST', '/stripe/refunds', {'charge_id': charge['id'], 'amount': '4.00'})
+        self.assertEqual((status, refund['amount']), (200, '4.00'))
+
+        status, stored = processor.handle('GET', f"/stripe/charges/{charge['id']}", {})
+        self.assertEqual((status, stored['status']), (200, 'refunded'))
+
+    def test_unknown_routes_and_charges(self):
+        processor = stub()
+
+        self.assertEqual(processor.handle('GET', '/stripe', {})[0], 404)
+        self.assertEqual(processor.handle('POST', '/stripe/refunds', {'charge_id': 'nope'})[0], 404)
+        self.assertEqual(processor.handle('GET', '/stripe/charges/nope', {})[0], 404)
+
+    def test_injected_declines_and_errors(self):
+        status, body = stub(decline_rate=1).handle('POST', '/paypal/charges', {'amount': '1'})
+        self.assertEqual((status, body['error'], body['status']), (402, 'card_declined', 'declined'))
+
+        self.assertEqual(stub(error_rate=1).handle('POST', '/paypal/charges', {})[0], 503)
+
+    def test_error_bursts_replace_the_error_rate(self):
+        processor = stub(burst={'every_seconds': 3600, 'duration_seconds': 3600, 'error_rate': 1})
+
+        self.assertEqual(processor.current_error_rate(), 1)
+        self.assertEqual(processor.pick_outcome(), 'error')
+
+    def test_outcome_rates_follow_the_configuration(self):
+        processor = stub(decline_rate=0.25, error_rate=0.25)
+
+        outcomes = [processor.pick_outcome() for _ in range(2000)]
+
+        for outcome in ('ok', 'error', 'decline'):
+            self.assertAlmostEqual(outcomes.count(outcome) / 2000, 0.5 if outcome == 'ok' else 0.25, delta=0.05)
+
+    def test_webhooks_are_signed_with_the_configured_secret(self):
+        processor = stub(webhook_url='http://example.invalid/', webhook_secret='s3cret')
+
+        with mock.patch('store.payment_stub.urlopen') as urlopen:
+            processor.deliver_webhook('http://example.invalid/', {'id': 'evt_1', 'type': 'charge.succeeded'}, 2)
+
+        sent = [call.args[0] for call in urlopen.call_args_list]
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(sent[0].get_header('X-webhook-signature'), sign_payload(sent[0].data, 's3cret'))
+
+
+class StubServerTests(TestCase):
+    def setUp(self):
+        self.processor = stub()
+        self.server = self.processor.make_server(port=0)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/stripe/'
+
+    def test_gateway_charges_and_refunds_over_http(self):
+        payment = make_payment(status='processing', amount=Decimal('250.00'))
+        with override_settings(PAYMENT_GATEWAY_URLS={'stripe': self.url}):
+            gateway = StripeGateway()
+            self.addCleanup(gateway.close)
+
+            charged = gateway.process_payment(payment, payment_method_id='pm_card_visa')
+            refunded = gateway.refund_payment(payment, Decimal('50.00'))
+
+        self.assertTrue(charged['success'])
+        self.assertIn(payment.transaction_id, self.processor.charges)
+        self.assertTrue(refunded['success'])
+        self.assertEqual(payment.status, 'partially_refunded')
+
+    def test_declines_fail_the_payment(self):
+        self.processor.config['decline_rate'] = 1
+        payment = make_payment(status='processing')
+        with override_settings(PAYMENT_GATEWAY_URLS={'stripe': self.url}):
+            gateway = StripeGateway()
+            self.addCleanup(gateway.close)
+            result = gateway.process_payment(payment, payment_method_id='pm_card_visa')
+
+        self.assertEqual((result['success'], result['message']), (False, 'Payment declined'))
+        self.assertEqual(payment.status, 'failed')
+        self.assertEqual(payment.events.get().event_type, 'charge_failed')
@@ -0,0 +1,99 @@
+import io
+import threading
+from decimal import Decimal
+
+from django.test import TestCase, TransactionTestCase
+from pypdf import PdfReader
+
+from store.pdf_utils import (
+    generate_payment_receipt_pdf, generate_payment_receipt_response, get_payment_status_display,
+    get_receipt_template,
+)
+
+from .factories import make_order, make_payment, make_product
+
+
+def pdf_text(data):
+    return '\n'.join(page.extract_text() for page in PdfReader(io.BytesIO(data)).pages)
+
+
+def make_receipt_payment(**extra):
+    product = make_product(name='Routeur Wifi 6')
+    order = make_order(total=Decimal('899.00'), product=product)
+    return make_payment(order, **extra)
+
+
+class ReceiptTemplateTests(TestCase):
+    def test_receipt_shows_the_order_and_payment(self):
+        payment = make_receipt_payment(card_last_four='4242', receipt_number='RCP-000007')
+
+        text = pdf_text(generate_payment_receipt_pdf(payment, payment.order))
+
+        for expected in ('RCP-000007', payment.order.order_number, 'Routeur Wifi 6', '899.00 MAD',
+                         '**** **** **** 4242', 'Complété', 'Merci pour votre achat!'):
+            self.assertIn(expected, text)
+
+    def test_footer_follows_status_and_method(self):
+        payment = make_receipt_payment(status='pending', payment_method='cash_delivery')
+
+        self.assertIn('Paiement à la livraison', pdf_text(generate_payment_receipt_pdf(payment, payment.order)))
+
+    def test_reused_template_renders_each_payment_independently(self):
+        first = make_receipt_payment(receipt_number='RCP-000001')
+        second = make_receipt_payment(receipt_number='RCP-000002', status='refunded')
+
+        generate_payment_receipt_pdf(first, first.order)
+        text = pdf_text(generate_payment_receipt_pdf(second, second.order))
+        again = pdf_text(generate_payment_receipt_pdf(first, first.order))
+
+        self.assertIn('RCP-000002', text)
+        self.assertNotIn('RCP-000001', text)
+        self.assertIn('Remboursé', text)
+        self.assertIn('RCP-000001', again)
+
+    def test_template_is_built_once_per_thread(self):
+        template = get_receipt_template()
+        other = []
+        thread = threading.Thread(target=lambda: other.append(get_receipt_template()))
+        thread.start()
+        thread.join()
+
+        self.assertIs(get_receipt_template(), template)
+        self.assertIsNot(other[0], template)
+
+    def test_response_numbers_the_receipt(self):
+        payment = make_receipt_payment()
+
+        response = generate_payment_receipt_response(payment, payment.order, 'receipt.pdf')
+
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="receipt.pdf"')
+        payment.refresh_from_db()
+        self.assertIn(payment.receipt_number, pdf_text(response.content))
+
+    def test_status_labels(self):
+        self.assertEqual(get_payment_status_display('partially_refunded'), 'Partiellement Remboursé')
+        self.assertEqual(get_payment_status_display('unknown'), 'unknown')
+
+
+class ConcurrentReceiptTests(TransactionTestCase):
+    def test_threads_render_valid_receipts_at_the_same_time(self):
+        payments = [make_receipt_payment(receipt_number=f'RCP-{n:06d}') for n in range(1, 5)]
+        texts, errors, barrier = {}, [], threading.Barrier(len(payments))
+
+        def render(payment):
+            barrier.wait()
+            try:
+                texts[payment.receipt_number] = pdf_text(generate_payment_receipt_pdf(payment, payment.order))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=render, args=(payment,)) for payment in payments]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        for number, text in texts.items():
+            self.assertIn(number, text)
+        self.assertEqual(len(texts), 4)
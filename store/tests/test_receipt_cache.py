@@ -0,0 +1,116 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from store.models import PaymentEvent, PaymentJob
+from store.payment_gateway import PaymentService
+from store.receipt_cache import ReceiptCache
+
+from .factories import TempMediaMixin, make_payment, make_user
+
+
+class ReceiptCacheTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.payment = make_payment(amount=Decimal('250.00'), transaction_id='pi_1')
+        self.order = self.payment.order
+
+    def test_receipt_is_rendered_once_per_version(self):
+        with mock.patch('store.receipt_cache.generate_payment_receipt_pdf', return_value=b'%PDF-1.4 test') as render:
+            first, version = ReceiptCache.get_or_render(self.payment, self.order)
+            second, _ = ReceiptCache.get_or_render(self.payment, self.order)
+
+        render.assert_called_once()
+        self.assertEqual(first, second)
+        self.assertEqual(first, ReceiptCache.path(self.payment.id, version))
+        self.assertTrue(self.payment.receipt_number.startswith('RCP-'))
+
+    def test_new_version_replaces_the_old_file(self):
+        old, old_version = ReceiptCache.get_or_render(self.payment, self.order)
+
+        self.payment.status = 'refunded'
+        new, new_version = ReceiptCache.get_or_render(self.payment, self.order)
+
+        self.assertNotEqual(old_version, new_version)
+        self.assertFalse(default_storage.exists(old))
+        self.assertTrue(default_storage.exists(new))
+
+    def test_invalidate_deletes_files_and_job_references(self):
+        path, _ = ReceiptCache.get_or_render(self.payment, self.order)
+        job = PaymentJob.objects.create(payment=self.payment, receipt=path)
+
+        self.assertEqual(ReceiptCache.invalidate(self.payment.id), 1)
+
+        self.assertFalse(default_storage.exists(path))
+        job.refresh_from_db()
+        self.assertEqual(job.receipt.name, '')
+        self.assertEqual(ReceiptCache.invalidate(self.payment.id), 0)
+
+    def test_refunds_invalidate_the_cached_receipt(self):
+        path, _ = ReceiptCache.get_or_render(self.payment, self.order)
+
+        PaymentService.refund_payment(self.payment, Decimal('50.00'))
+
+        self.assertFalse(default_storage.exists(path))
+
+    def test_last_modified_includes_payment_events(self):
+        later = timezone.now() + timedelta(hours=1)
+        PaymentEvent.objects.create(payment=self.payment, event_type='refund_succeeded', created_at=later)
+
+        self.assertEqual(ReceiptCache.last_modified(self.payment, self.order), later)
+
+
+class ReceiptDownloadTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.payment = make_payment(transaction_id='pi_1')
+        self.url = reverse('store:download_payment_receipt_pdf', args=[self.payment.id])
+        self.client.force_login(self.payment.order.customer)
+
+    def test_download_carries_validators(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertTrue(response['ETag'])
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_matching_etag_gets_304_without_rendering(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with mock.patch('store.receipt_cache.generate_payment_receipt_pdf') as render:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        render.assert_not_called()
+
+    def test_if_modified_since_gets_304(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_refund_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+
+        PaymentService.refund_payment(self.payment, Decimal('10.00'))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_stale_if_modified_since_gets_the_file(self):
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date(0))
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_customers_cannot_download(self):
+        self.client.force_login(make_user())
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
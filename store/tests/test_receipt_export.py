@@ -0,0 +1,97 @@
+import io
+import zipfile
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from store.models import Payment
+from store.receipt_export import ReceiptExportService
+
+from .factories import TempMediaMixin, make_order, make_payment, make_user
+
+
+def read_zip(chunks):
+    return zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+
+class ReceiptExportServiceTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_user(email='client@example.ma')
+        self.payments = [make_payment(make_order(self.customer)) for _ in range(3)]
+
+    def test_payments_filters(self):
+        make_payment(status='failed')
+        paypal = make_payment(payment_method='paypal')
+        Payment.objects.filter(pk=self.payments[0].pk).update(created_at=timezone.now() - timedelta(days=40))
+
+        self.assertEqual(ReceiptExportService.payments().count(), 4)
+        self.assertEqual(list(ReceiptExportService.payments(payment_method='paypal')), [paypal])
+        self.assertEqual(ReceiptExportService.payments(customer='CLIENT@example.ma').count(), 3)
+        self.assertEqual(ReceiptExportService.payments(since=timezone.now() - timedelta(days=1)).count(), 3)
+
+    def test_archive_holds_one_pdf_per_payment(self):
+        progress = []
+
+        with mock.patch('store.receipt_export.Pool') as pool:
+            chunks = list(ReceiptExportService.stream_zip(
+                ReceiptExportService.payments(), workers=1,
+                progress=lambda done, total, per_worker: progress.append((done, total)),
+            ))
+
+        pool.assert_not_called()
+        archive = read_zip(chunks)
+        self.assertEqual(archive.testzip(), None)
+        names = archive.namelist()
+        self.assertEqual(len(names), 3)
+        for payment in self.payments:
+            payment.refresh_from_db()
+            name = f"{payment.created_at:%Y-%m}/receipt_{payment.receipt_number}_{payment.order.order_number}.pdf"
+            self.assertIn(name, names)
+            self.assertTrue(archive.read(name).startswith(b'%PDF'))
+        self.assertEqual(progress, [(1, 3), (2, 3), (3, 3)])
+
+    def test_archive_is_streamed_in_pieces(self):
+        chunks = list(ReceiptExportService.stream_zip(ReceiptExportService.payments(), workers=1))
+
+        self.assertGreater(len(chunks), 3)
+
+    def test_export_reuses_cached_receipts(self):
+        list(ReceiptExportService.stream_zip(ReceiptExportService.payments(), workers=1))
+
+        with mock.patch('store.receipt_cache.generate_payment_receipt_pdf') as render:
+            list(ReceiptExportService.stream_zip(ReceiptExportService.payments(), workers=1))
+
+        render.assert_not_called()
+
+    def test_empty_export_is_a_valid_archive(self):
+        archive = read_zip(ReceiptExportService.stream_zip(Payment.objects.none(), workers=1))
+
+        self.assertEqual(archive.namelist(), [])
+
+
+class ExportReceiptsViewTests(TempMediaMixin, TestCase):
+    def test_staff_download_a_zip(self):
+        make_payment(payment_method='paypal')
+        make_payment()
+        self.client.force_login(make_user(user_type='staff'))
+
+        response = self.client.get(reverse('store:export_receipts'), {'method': 'paypal'})
+
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertEqual(len(read_zip(response.streaming_content).namelist()), 1)
+
+    def test_bad_dates_are_rejected(self):
+        self.client.force_login(make_user(user_type='staff'))
+
+        response = self.client.get(reverse('store:export_receipts'), {'since': '18/10/2026'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_customers_cannot_export(self):
+        self.client.force_login(make_user())
+
+        self.assertEqual(self.client.get(reverse('store:export_receipts')).status_code, 302)
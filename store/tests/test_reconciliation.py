@@ -0,0 +1,156 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from store.models import Order, Payment
+from store.reconciliation import ReconciliationService, chunked
+
+from .factories import TempMediaMixin, make_order, make_payment
+
+
+class ReconcileTests(TestCase):
+    def reconcile(self, **kwargs):
+        issues = []
+        counts = ReconciliationService.reconcile(
+            report=lambda kind, order_id, payment_ids, detail: issues.append((kind, order_id)), **kwargs
+        )
+        return counts, issues
+
+    def test_order_status_follows_its_payments(self):
+        self.assertEqual(ReconciliationService.expected_payment_status(['failed', 'completed']), 'paid')
+        self.assertEqual(ReconciliationService.expected_payment_status(['partially_refunded']), 'partially_refunded')
+        self.assertEqual(ReconciliationService.expected_payment_status(['refunded', 'failed']), 'refunded')
+        self.assertEqual(ReconciliationService.expected_payment_status(['failed']), 'failed')
+        self.assertIsNone(ReconciliationService.expected_payment_status(['failed', 'processing']))
+        self.assertIsNone(ReconciliationService.expected_payment_status([]))
+
+    def test_status_mismatches_are_fixed(self):
+        payment = make_payment()
+
+        counts, issues = self.reconcile()
+
+        self.assertEqual(issues, [('status_mismatch', payment.order_id)])
+        self.assertEqual(counts['fixed'], 1)
+        self.assertEqual(Order.objects.get(pk=payment.order_id).payment_status, 'paid')
+        self.assertEqual(self.reconcile()[1], [])
+
+    def test_dry_run_only_reports(self):
+        payment = make_payment()
+
+        counts, _ = self.reconcile(dry_run=True)
+
+        self.assertNotIn('fixed', counts)
+        self.assertEqual(Order.objects.get(pk=payment.order_id).payment_status, 'pending')
+
+    def test_issues_needing_a_human_are_reported(self):
+        duplicate = make_order(payment_status='paid')
+        make_payment(duplicate)
+        make_payment(duplicate)
+        short = make_order(payment_status='paid')
+        make_payment(short, amount=Decimal('60.00'))
+        cancelled = make_order(payment_status='paid', status='cancelled')
+        make_payment(cancelled)
+        unbacked = make_order(payment_status='paid')
+
+        counts, issues = self.reconcile()
+
+        self.assertEqual(sorted(issues), sorted([
+            ('duplicate', duplicate.id), ('amount_mismatch', duplicate.id),
+            ('amount_mismatch', short.id),
+            ('dead_order', cancelled.id),
+            ('unbacked_paid', unbacked.id),
+        ]))
+        self.assertEqual(counts['orders'], 4)
+
+    def test_payments_without_an_order_are_orphans(self):
+        payment = make_payment()
+        Payment.objects.filter(pk=payment.pk).update(order_id=payment.order_id + 1000)
+        self.addCleanup(Payment.objects.filter(pk=payment.pk).delete)
+
+        _, issues = self.reconcile()
+
+        self.assertIn(('orphan', payment.order_id + 1000), issues)
+
+    def test_results_do_not_depend_on_the_chunk_size(self):
+        for _ in range(5):
+            make_payment()
+        make_order(payment_status='paid')
+
+        small, small_issues = self.reconcile(chunk_size=2, dry_run=True)
+        large, large_issues = self.reconcile(chunk_size=100, dry_run=True)
+
+        self.assertEqual((small, small_issues), (large, large_issues))
+        self.assertEqual(small['orders'], 6)
+
+    def test_chunked(self):
+        self.assertEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+
+class BulkRefundTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.payment = make_payment(amount=Decimal('300.00'), transaction_id='pi_test_1')
+        self.results = []
+
+    def refund(self, *rows, **kwargs):
+        return ReconciliationService.bulk_refund(rows, report=self.results.append, **kwargs)
+
+    def test_full_refund_by_payment_id(self):
+        counts = self.refund({'payment_id': str(self.payment.id)})
+
+        self.assertEqual(counts, {'rows': 1, 'refunded': 1})
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'refunded')
+        self.assertEqual(self.payment.order.payment_status, 'refunded')
+        self.assertEqual(self.results[0]['amount'], Decimal('300.00'))
+
+    def test_partial_refunds_default_to_what_is_left(self):
+        self.refund({'transaction_id': 'pi_test_1', 'amount': '100.00'})
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.order.payment_status, 'partially_refunded')
+
+        self.refund({'order_number': self.payment.order.order_number})
+
+        self.assertEqual(self.results[1]['amount'], Decimal('200.00'))
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.order.payment_status), ('refunded', 'refunded'))
+
+    def test_refund_larger_than_what_is_left_is_rejected(self):
+        self.refund({'payment_id': str(self.payment.id), 'amount': '250'})
+
+        counts = self.refund({'payment_id': str(self.payment.id), 'amount': '60'})
+
+        self.assertEqual(counts['error'], 1)
+        self.assertEqual(self.payment.events.filter(event_type='refund_succeeded').count(), 1)
+
+    def test_rows_that_cannot_be_refunded(self):
+        failed = make_payment(status='failed')
+        other = make_payment()
+
+        counts = self.refund(
+            {'payment_id': '999999'},
+            {'payment_id': str(failed.id)},
+            {'payment_id': str(other.id), 'amount': 'abc'},
+            {'transaction_id': 'pi_test_1', 'amount': '10'},
+            {'payment_id': str(self.payment.id), 'amount': '10'},
+        )
+
+        self.assertEqual([result['outcome'] for result in self.results],
+                         ['not_found', 'skipped', 'error', 'refunded', 'skipped'])
+        self.assertEqual(self.results[4]['detail'], 'listed twice')
+        self.assertEqual(counts['rows'], 5)
+
+    def test_dry_run_refunds_nothing(self):
+        counts = self.refund({'payment_id': str(self.payment.id)}, dry_run=True)
+
+        self.assertEqual(counts['would_refund'], 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+
+    def test_rows_are_numbered_across_chunks(self):
+        other = make_payment()
+
+        self.refund({'payment_id': str(self.payment.id)}, {'payment_id': str(other.id)}, chunk_size=1)
+
+        self.assertEqual([result['line'] for result in self.results], [1, 2])
+        self.assertEqual([result['outcome'] for result in self.results], ['refunded', 'refunded'])
@@ -0,0 +1,95 @@
+import threading
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from store.models import DocumentSequence
+from store.sequences import SequenceService
+
+from .factories import make_payment
+
+
+class SequenceServiceTests(TestCase):
+    def setUp(self):
+        SequenceService.reset()
+        self.addCleanup(SequenceService.reset)
+
+    def test_numbers_are_prefixed_and_increasing(self):
+        first = SequenceService.next_number('order')
+        second = SequenceService.next_number('order')
+
+        self.assertRegex(first, r'^ORD-\d{6}$')
+        self.assertLess(first, second)
+
+    def test_sequences_are_independent(self):
+        SequenceService.next_value('order')
+        SequenceService.next_value('order')
+
+        self.assertEqual(SequenceService.next_value('ticket'), 1)
+
+    def test_inside_a_transaction_only_one_value_is_reserved(self):
+        value = SequenceService.next_value('order')
+
+        self.assertEqual(DocumentSequence.objects.get(name='order').next_value, value + 1)
+        self.assertNotIn('order', SequenceService._blocks)
+
+    def test_receipt_number_is_assigned_once(self):
+        payment = make_payment()
+
+        number = SequenceService.assign_receipt_number(payment)
+        self.assertRegex(number, r'^RCP-\d{6}$')
+
+        # A second request working on a stale copy gets the stored number
+        payment.receipt_number = ''
+        self.assertEqual(SequenceService.assign_receipt_number(payment), number)
+
+
+@override_settings(DOCUMENT_SEQUENCE_BLOCK_SIZE=50)
+class SequenceBlockTests(TransactionTestCase):
+    def setUp(self):
+        SequenceService.reset()
+        self.addCleanup(SequenceService.reset)
+
+    def test_block_is_reserved_with_one_update(self):
+        first = SequenceService.next_value('order')
+
+        self.assertEqual(DocumentSequence.objects.get(name='order').next_value, first + 50)
+        self.assertEqual(SequenceService.next_value('order'), first + 1)
+
+    def test_processes_never_share_numbers(self):
+        # reset() stands in for a second worker process with no block in memory
+        first_worker = [SequenceService.next_value('order') for _ in range(3)]
+        SequenceService.reset()
+        second_worker = [SequenceService.next_value('order') for _ in range(3)]
+
+        self.assertFalse(set(first_worker) & set(second_worker))
+        self.assertGreater(min(second_worker), max(first_worker))
+
+    def test_threads_never_share_numbers(self):
+        SequenceService.next_value('order')
+        values, barrier = [], threading.Barrier(8)
+
+        def allocate():
+            barrier.wait()
+            for _ in range(5):
+                values.append(SequenceService.next_value('order'))
+
+        threads = [threading.Thread(target=allocate) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(values), 40)
+        self.assertEqual(len(set(values)), 40)
+
+    def test_no_block_is_kept_from_a_rolled_back_transaction(self):
+        try:
+            with transaction.atomic():
+                SequenceService.next_value('order')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertNotIn('order', SequenceService._blocks)
+        self.assertEqual(SequenceService.next_value('order'), 1)
@@ -0,0 +1,66 @@
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+
+from store.models import OrderItem
+from store.shipping import ShippingService
+
+from .factories import make_cart, make_order, make_product, make_user
+
+
+class ShippingServiceTests(TestCase):
+    def setUp(self):
+        ShippingService.reload_rates()
+        self.addCleanup(ShippingService.reload_rates)
+
+    def test_quote_adds_the_weight_rate_to_the_region_base(self):
+        self.assertEqual(ShippingService.quote('Fès-Meknès', Decimal('2.5')), Decimal('37.50'))
+        self.assertEqual(ShippingService.quote('Nowhere', 1), Decimal('55.00'))
+
+    @override_settings(SHIPPING_RATES={'regions': {'Oriental': '10'}, 'per_kg': '2', 'default_delivery_time': '9 jours'})
+    def test_settings_override_the_rate_table(self):
+        ShippingService.reload_rates()
+
+        self.assertEqual(ShippingService.quote('Oriental', 1), Decimal('12.00'))
+        self.assertEqual(ShippingService.quote('Souss-Massa', 1), Decimal('47.00'))
+        self.assertEqual(ShippingService.get_delivery_time('Nowhere'), '9 jours')
+
+    def test_quote_cart_uses_sale_prices_and_weights(self):
+        laptop = make_product(price=Decimal('5000.00'), sale_price=Decimal('4500.00'), weight_kg=Decimal('2.000'))
+        cable = make_product(price=Decimal('50.00'), sale_price=Decimal('0.00'), weight_kg=Decimal('0.100'))
+        cart = make_cart(make_user(), (laptop, 1), (cable, 5))
+
+        quote = ShippingService.quote_cart(cart, 'Rabat-Salé-Kénitra')
+
+        self.assertEqual(quote['subtotal'], Decimal('4750.00'))
+        self.assertEqual(quote['weight'], Decimal('2.5'))
+        self.assertEqual(quote['shipping'], Decimal('27.50'))
+        self.assertEqual(quote['total'], Decimal('4777.50'))
+        self.assertEqual(quote['delivery_time'], '2-3 jours')
+
+    def test_empty_cart_ships_for_free(self):
+        quote = ShippingService.quote_cart(make_cart(make_user()), 'Oriental')
+
+        self.assertEqual((quote['subtotal'], quote['shipping']), (Decimal('0.00'), Decimal('0.00')))
+
+    def test_quote_orders_rates_each_order_in_its_region(self):
+        product = make_product(weight_kg=Decimal('1.000'))
+        near = make_order(product=product, shipping_state='Casablanca-Settat')
+        far = make_order(product=product, shipping_state='Oriental')
+        OrderItem.objects.filter(order=far).update(quantity=3)
+        empty = make_order()
+
+        self.assertEqual(ShippingService.quote_orders([near, far, empty]), {
+            near.id: Decimal('5.00'),
+            far.id: Decimal('55.00'),
+            empty.id: Decimal('0.00'),
+        })
+
+    def test_quote_lines_leaves_unknown_regions_unpriced(self):
+        product = make_product()
+
+        self.assertIsNone(ShippingService.quote_lines('Unknown', [(product.id, 1)], {product.id: Decimal('1')}))
+        self.assertEqual(
+            ShippingService.quote_lines('Oriental', [(product.id, 2)], {product.id: Decimal('1.5')}),
+            Decimal('55.00'),
+        )
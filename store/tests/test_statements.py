@@ -0,0 +1,119 @@
+import io
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from pypdf import PdfReader
+
+from store.models import PaymentEvent
+from store.statements import StatementService, pdf_string
+
+from .factories import make_order, make_payment, make_product, make_user
+
+
+def read_pdf(chunks):
+    reader = PdfReader(io.BytesIO(b''.join(chunks)))
+    return [page.extract_text() for page in reader.pages]
+
+
+class StatementServiceTests(TestCase):
+    def setUp(self):
+        self.customer = make_user(first_name='Salma', last_name='Idrissi')
+        self.since = timezone.now() - timedelta(days=1)
+        self.until = timezone.now() + timedelta(days=1)
+
+    def render(self, **kwargs):
+        return read_pdf(StatementService.render(self.customer, self.since, self.until, **kwargs))
+
+    def test_orders_lines_and_payments_are_listed(self):
+        order = make_order(self.customer, total=Decimal('1250.00'), product=make_product(name='Switch 24 ports'))
+        make_payment(order)
+
+        pages = self.render()
+
+        self.assertEqual(len(pages), 1)
+        for expected in ('Client: Salma Idrissi', order.order_number, 'Switch 24 ports', 'Paiement Carte de Crédit',
+                         '1 250.00', 'Total de la période', 'Solde 0.00 MAD'):
+            self.assertIn(expected, pages[0])
+
+    def test_balance_debits_orders_and_refunds_and_credits_payments(self):
+        paid = make_order(self.customer, total=Decimal('300.00'))
+        payment = make_payment(paid, status='partially_refunded')
+        PaymentEvent.objects.create(payment=payment, event_type='refund_succeeded', amount=Decimal('50.00'))
+        make_order(self.customer, total=Decimal('80.00'))
+        make_order(self.customer, total=Decimal('999.00'), status='cancelled')
+
+        text = self.render()[0]
+
+        self.assertIn('Remboursement', text)
+        # Debit 300 + 80 + 50 refunded, credit 300
+        self.assertIn('430.00', text)
+        self.assertIn('Solde dû', text)
+        self.assertIn('130.00 MAD', text)
+
+    def test_long_statements_carry_totals_across_pages(self):
+        for _ in range(70):
+            make_order(self.customer, total=Decimal('10.00'))
+
+        pages = self.render()
+
+        self.assertGreater(len(pages), 1)
+        self.assertIn('Page 2', pages[1])
+        self.assertIn('À reporter', pages[0])
+        self.assertIn('Report: débit', pages[1])
+        self.assertIn('700.00 MAD', pages[-1])
+
+    def test_output_does_not_depend_on_the_chunk_size(self):
+        for _ in range(7):
+            make_payment(make_order(self.customer))
+
+        small = b''.join(StatementService.render(self.customer, self.since, self.until, chunk_size=2))
+        large = b''.join(StatementService.render(self.customer, self.since, self.until, chunk_size=100))
+
+        self.assertEqual(small, large)
+
+    def test_only_the_customers_orders_in_the_period_are_listed(self):
+        mine = make_order(self.customer)
+        other = make_order()
+        old = make_order(self.customer)
+        old.__class__.objects.filter(pk=old.pk).update(created_at=self.since - timedelta(days=30))
+
+        text = self.render()[0]
+
+        self.assertIn(mine.order_number, text)
+        self.assertNotIn(other.order_number, text)
+        self.assertNotIn(old.order_number, text)
+
+    def test_pdf_strings_are_escaped(self):
+        self.assertEqual(pdf_string('a(b)\\'), b'(a\\(b\\)\\\\)')
+
+
+class CustomerStatementViewTests(TestCase):
+    def setUp(self):
+        self.customer = make_user()
+        self.order = make_order(self.customer)
+        self.url = reverse('store:customer_statement')
+
+    def test_customer_downloads_the_current_month(self):
+        self.client.force_login(self.customer)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn(self.order.order_number, read_pdf(response.streaming_content)[0])
+
+    def test_bad_month_is_rejected(self):
+        self.client.force_login(self.customer)
+
+        self.assertEqual(self.client.get(self.url, {'month': '2026-13'}).status_code, 400)
+
+    def test_only_staff_can_pick_the_customer(self):
+        self.client.force_login(make_user())
+        response = self.client.get(self.url, {'customer': self.customer.pk})
+        self.assertNotIn(self.order.order_number, read_pdf(response.streaming_content)[0])
+
+        self.client.force_login(make_user(user_type='staff'))
+        response = self.client.get(self.url, {'customer': self.customer.pk})
+        self.assertIn(self.order.order_number, read_pdf(response.streaming_content)[0])
@@ -0,0 +1,84 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from store.inventory import InventoryService
+from store.models import LowStockAlert, StockMovement
+from store.stock_alerts import LowStockService
+
+from .factories import make_product, make_user
+
+
+def sell(product, quantity):
+    InventoryService.record_movements([StockMovement(product=product, quantity_delta=-quantity, reason='sale')])
+
+
+class LowStockServiceTests(TestCase):
+    def setUp(self):
+        self.product = make_product(stock_quantity=8, min_stock_level=5)
+        InventoryService.reconcile()
+
+    def test_crossing_the_threshold_raises_one_alert(self):
+        sell(self.product, 2)
+        self.assertFalse(LowStockAlert.objects.exists())
+
+        sell(self.product, 1)
+        sell(self.product, 1)
+
+        alert = LowStockAlert.objects.get()
+        self.assertEqual((alert.event_type, alert.stock_quantity, alert.min_stock_level), ('low_stock', 5, 5))
+
+    def test_restocking_above_the_threshold_is_recorded(self):
+        sell(self.product, 6)
+        InventoryService.record_movements([StockMovement(product=self.product, quantity_delta=10, reason='return')])
+
+        self.assertEqual(
+            list(LowStockAlert.objects.order_by('id').values_list('event_type', flat=True)),
+            ['low_stock', 'restocked'],
+        )
+
+    def test_opening_balances_never_raise_alerts(self):
+        make_product(stock_quantity=1, min_stock_level=5)
+
+        InventoryService.reconcile()
+
+        self.assertFalse(LowStockAlert.objects.exists())
+
+    def test_low_stock_products_and_reorder_list(self):
+        low = make_product(stock_quantity=2, min_stock_level=5)
+        make_product(stock_quantity=1, min_stock_level=5, is_active=False)
+
+        self.assertEqual(list(LowStockService.low_stock_products()), [low])
+        self.assertEqual(LowStockService.reorder_list(), [{
+            'product_id': low.id, 'sku': low.sku, 'name': low.name, 'brand': '',
+            'stock_quantity': 2, 'min_stock_level': 5, 'reorder_quantity': 8,
+        }])
+
+    def test_acknowledge_closes_open_alerts(self):
+        staff = make_user(user_type='staff')
+        sell(self.product, 4)
+
+        self.assertEqual(LowStockService.acknowledge(LowStockAlert.objects.all(), staff), 1)
+
+        self.assertFalse(LowStockService.open_alerts().exists())
+        self.assertEqual(LowStockAlert.objects.get().acknowledged_by, staff)
+
+
+class LowStockFeedTests(TestCase):
+    def test_feed_lists_products_and_alerts_for_staff(self):
+        product = make_product(stock_quantity=6, min_stock_level=5)
+        InventoryService.reconcile()
+        sell(product, 3)
+        self.client.force_login(make_user(user_type='staff'))
+
+        data = self.client.get(reverse('store:low_stock_feed')).json()
+
+        self.assertEqual([row['id'] for row in data['products']], [product.id])
+        self.assertEqual(data['products'][0]['reorder_quantity'], 7)
+        self.assertEqual([alert['product_id'] for alert in data['alerts']], [product.id])
+
+    def test_feed_is_staff_only(self):
+        self.client.force_login(make_user())
+
+        response = self.client.get(reverse('store:low_stock_feed'))
+
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,201 @@
+import json
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from store.models import Order, PaymentEvent, WebhookEvent
+from store.webhook_signing import sign_payload
+from store.webhooks import InvalidWebhook, WebhookService
+
+from .factories import make_order, make_payment
+
+SECRET = 'whsec-test'
+
+
+def event(event_id, event_type='charge.succeeded', **data):
+    return {'id': event_id, 'type': event_type, 'processor': 'stripe', 'data': data}
+
+
+@override_settings(PAYMENT_WEBHOOK_SECRET=SECRET)
+class WebhookEndpointTests(TestCase):
+    def post(self, payload, signature=None):
+        body = json.dumps(payload).encode()
+        return self.client.post(
+            reverse('store:payment_webhook'), body, content_type='application/json',
+            HTTP_X_WEBHOOK_SIGNATURE=sign_payload(body, SECRET) if signature is None else signature,
+        )
+
+    def test_signed_events_are_stored(self):
+        response = self.post(event('evt_1', id='ch_1'))
+
+        self.assertEqual(response.json(), {'received': True})
+        self.assertEqual(WebhookEvent.objects.get().event_id, 'evt_1')
+
+    def test_bad_signatures_are_rejected(self):
+        self.assertEqual(self.post(event('evt_1'), signature='forged').status_code, 403)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_redeliveries_are_stored_once(self):
+        self.post(event('evt_1', id='ch_1'))
+        self.post(event('evt_1', id='ch_1'))
+
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+    def test_malformed_events_are_rejected(self):
+        self.assertEqual(self.post({'type': 'charge.succeeded'}).status_code, 400)
+
+
+class WebhookSignatureTests(TestCase):
+    @override_settings(PAYMENT_WEBHOOK_SECRET='')
+    def test_unsigned_webhooks_are_refused_without_a_secret(self):
+        self.assertFalse(WebhookService.verify_signature(b'{}', ''))
+
+    @override_settings(PAYMENT_WEBHOOK_SECRET='', PAYMENT_WEBHOOK_ALLOW_UNSIGNED=True)
+    def test_unsigned_webhooks_can_be_allowed_for_local_testing(self):
+        self.assertTrue(WebhookService.verify_signature(b'{}', ''))
+
+    def test_ingest_rejects_invalid_json(self):
+        with self.assertRaises(InvalidWebhook):
+            WebhookService.ingest(b'not json')
+
+
+class ApplyPendingTests(TestCase):
+    def ingest(self, payload):
+        WebhookService.ingest(json.dumps(payload).encode())
+
+    def test_successful_charge_completes_payment_and_confirms_order(self):
+        payment = make_payment(status='processing', transaction_id='ch_1')
+        self.ingest(event('evt_1', id='ch_1', amount='100.00'))
+
+        self.assertEqual(WebhookService.apply_pending(), 1)
+
+        payment.refresh_from_db()
+        order = Order.objects.get(pk=payment.order_id)
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual((order.payment_status, order.status), ('paid', 'confirmed'))
+        self.assertEqual(payment.events.get().event_type, 'charge_succeeded')
+        self.assertEqual(WebhookEvent.objects.get().status, 'applied')
+
+    def test_charge_is_matched_by_order_reference_before_the_transaction_id_is_known(self):
+        payment = make_payment(status='processing')
+        self.ingest(event('evt_1', id='ch_9', reference=payment.order.order_number))
+
+        WebhookService.apply_pending()
+
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.transaction_id), ('completed', 'ch_9'))
+
+    def test_refund_moves_a_shipped_order_to_refunded(self):
+        order = make_order(status='shipped', payment_status='paid')
+        payment = make_payment(order, transaction_id='ch_1')
+        self.ingest(event('evt_1', 'refund.succeeded', id='re_1', charge_id='ch_1'))
+
+        WebhookService.apply_pending()
+
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.payment_status), ('refunded', 'refunded'))
+        self.assertEqual(payment.events.get().external_id, 're_1')
+
+    def test_partial_refunds_add_up_to_refunded(self):
+        order = make_order(status='shipped', payment_status='paid')
+        payment = make_payment(order, amount=Decimal('100.00'), transaction_id='ch_1')
+        self.ingest(event('evt_1', 'refund.succeeded', id='re_1', charge_id='ch_1', amount='30.00'))
+
+        WebhookService.apply_pending()
+
+        payment.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual(payment.status, 'partially_refunded')
+        self.assertEqual((order.status, order.payment_status), ('shipped', 'partially_refunded'))
+
+        self.ingest(event('evt_2', 'refund.succeeded', id='re_2', charge_id='ch_1', amount='70.00'))
+        WebhookService.apply_pending()
+
+        payment.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual(payment.status, 'refunded')
+        self.assertEqual((order.status, order.payment_status), ('refunded', 'refunded'))
+        self.assertEqual(payment.events.filter(event_type='refund_succeeded').count(), 2)
+
+    def test_refunds_already_recorded_are_not_applied_again(self):
+        order = make_order(status='shipped', payment_status='partially_refunded')
+        payment = make_payment(order, amount=Decimal('100.00'), status='partially_refunded', transaction_id='ch_1')
+        PaymentEvent.objects.create(payment=payment, event_type='refund_succeeded', gateway='stripe',
+                                    amount=Decimal('30.00'), external_id='re_1')
+        self.ingest(event('evt_1', 'refund.succeeded', id='re_1', charge_id='ch_1', amount='30.00'))
+
+        self.assertEqual(WebhookService.apply_pending(), 1)
+
+        payment.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual(payment.status, 'partially_refunded')
+        self.assertEqual(order.payment_status, 'partially_refunded')
+        self.assertEqual(payment.events.count(), 1)
+        self.assertEqual(WebhookEvent.objects.get().status, 'applied')
+
+    def test_failed_charge_leaves_the_order_status(self):
+        payment = make_payment(status='processing', transaction_id='ch_1')
+        self.ingest(event('evt_1', 'charge.failed', id='ch_1'))
+
+        WebhookService.apply_pending()
+
+        order = Order.objects.get(pk=payment.order_id)
+        self.assertEqual((order.status, order.payment_status), ('pending', 'failed'))
+
+    def test_refunded_payments_are_never_reopened(self):
+        payment = make_payment(status='refunded', transaction_id='ch_1')
+        self.ingest(event('evt_1', id='ch_1'))
+
+        WebhookService.apply_pending()
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'refunded')
+        self.assertEqual(WebhookEvent.objects.get().error, 'payment is refunded')
+
+    def test_events_already_recorded_only_sync_the_order(self):
+        payment = make_payment(transaction_id='ch_1')
+        self.ingest(event('evt_1', id='ch_1'))
+
+        WebhookService.apply_pending()
+
+        self.assertFalse(payment.events.exists())
+        self.assertEqual(Order.objects.get(pk=payment.order_id).payment_status, 'paid')
+
+    def test_duplicate_deliveries_apply_once(self):
+        payment = make_payment(status='processing', transaction_id='ch_1')
+        self.ingest(event('evt_1', id='ch_1'))
+        WebhookService.apply_pending()
+        self.ingest(event('evt_1', id='ch_1'))
+
+        self.assertEqual(WebhookService.apply_pending(), 0)
+        self.assertEqual(payment.events.count(), 1)
+
+    @override_settings(PAYMENT_WEBHOOK_MAX_ATTEMPTS=2)
+    def test_unmatched_events_wait_then_fail_and_can_be_retried(self):
+        self.ingest(event('evt_1', id='ch_unknown'))
+
+        self.assertEqual(WebhookService.apply_pending(), 0)
+        self.assertEqual(WebhookEvent.objects.get().status, 'pending')
+        self.assertEqual(WebhookService.apply_pending(), 1)
+        self.assertEqual(WebhookEvent.objects.get().status, 'failed')
+
+        self.assertEqual(WebhookService.retry_failed(), 1)
+        self.assertEqual(WebhookEvent.objects.get().attempts, 0)
+
+    def test_unknown_event_types_are_ignored(self):
+        self.ingest(event('evt_1', 'customer.created'))
+
+        WebhookService.apply_pending()
+
+        self.assertEqual(WebhookEvent.objects.get().status, 'ignored')
+
+    def test_batch_applies_many_payments_at_once(self):
+        payments = [make_payment(status='processing', transaction_id=f'ch_{n}') for n in range(5)]
+        for n in range(5):
+            self.ingest(event(f'evt_{n}', id=f'ch_{n}'))
+
+        with self.assertNumQueries(9):
+            self.assertEqual(WebhookService.apply_pending(), 5)
+
+        self.assertEqual({Order.objects.get(pk=p.order_id).payment_status for p in payments}, {'paid'})
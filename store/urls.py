@@ -2,6 +2,7 @@ from django.urls import path
 from . import views
 from . import professional_payment_views
 from . import views_modern
+from . import admin_views
 
 app_name = 'store'
 
@@ -32,11 +33,13 @@ urlpatterns = [
     path('remove-cart-item/<int:item_id>/', views.remove_cart_item, name='remove_cart_item'),
     path('checkout/', views.checkout, name='checkout'),
     path('process-checkout/', views.process_checkout, name='process_checkout'),
+    path('shipping/quote/', views.shipping_quote, name='shipping_quote'),
     # path('process-payment/', views.process_payment, name='process_payment'),
     
     # User orders
     path('orders/', views.order_list, name='order_list'),
     path('order/<int:pk>/', views.order_detail, name='order_detail'),
+    path('orders/statement/', views.customer_statement, name='customer_statement'),
     
     # Payment confirmation and receipt
     path('payment-confirmation/', views.payment_confirmation, name='payment_confirmation'),
@@ -70,9 +73,14 @@ urlpatterns = [
     path('payment-success/<int:payment_id>/', professional_payment_views.payment_success_professional, name='payment_success_professional'),
     path('payment-failed/<int:payment_id>/', professional_payment_views.payment_failed_professional, name='payment_failed_professional'),
     path('payment-receipt-pdf/<int:payment_id>/', professional_payment_views.download_payment_receipt_pdf, name='download_payment_receipt_pdf'),
+    path('payment/<int:payment_id>/status/', professional_payment_views.payment_status, name='payment_status'),
+    path('payment/<int:payment_id>/status.json', professional_payment_views.payment_status_json, name='payment_status_json'),
+    path('webhooks/payments/', professional_payment_views.payment_webhook, name='payment_webhook'),
     
     # Admin Dashboard
     # path('admin/dashboard/', views.admin_dashboard, name='admin_dashboard'),
+    path('staff/low-stock/', admin_views.low_stock_feed, name='low_stock_feed'),
+    path('staff/receipts/export/', admin_views.export_receipts, name='export_receipts'),
     
     # Contact Demo
     path('contact-demo/', views.contact_demo, name='contact_demo'),
@@ -3,8 +3,9 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
@@ -17,14 +18,20 @@ from .professional_payment_views import (
     payment_success_professional,
     payment_failed_professional
 )
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
 import time
+from datetime import datetime
 
 from .models import Category, Product, Order, OrderItem, Cart, CartItem, Payment, Wishlist, ProductReview
 from .forms import ProductForm, CategoryForm, ProductReviewForm, PaymentMethodForm, CardPaymentForm, BankTransferForm, PayPalForm, PaymentConfirmationForm
 from .admin_views import admin_dashboard
 from .payment_gateway import PaymentService
+from .order_service import OrderPlacementService, OrderPlacementError
+from .shipping import ShippingService
+from .idempotency import idempotent_post
+from .payment_pipeline import PaymentPipeline
+from .statements import StatementService
 
 
 
@@ -294,6 +301,27 @@ def checkout(request):
 
 
 
+@login_required
+def shipping_quote(request):
+    """Return the shipping quote for the user's cart as JSON."""
+    region = request.GET.get('region', '')
+    cart = Cart.objects.filter(user=request.user).first()
+    if cart is None:
+        return JsonResponse({'success': False, 'error': 'Cart is empty'}, status=404)
+    
+    quote = ShippingService.quote_cart(cart, region)
+    return JsonResponse({
+        'success': True,
+        'region': region,
+        'weight': str(quote['weight']),
+        'subtotal': str(quote['subtotal']),
+        'shipping': str(quote['shipping']),
+        'total': str(quote['total']),
+        'delivery_time': quote['delivery_time'],
+    })
+
+
+
 def order_list(request):
     """List user's orders."""
     orders = Order.objects.filter(customer=request.user).order_by('-created_at')
@@ -315,6 +343,28 @@ def order_detail(request, pk):
     return render(request, 'store/order_detail.html', context)
 
 
+@login_required
+def customer_statement(request):
+    """Monthly account statement PDF (?month=YYYY-MM), streamed page by page."""
+    try:
+        month = datetime.strptime(request.GET.get('month') or timezone.now().strftime('%Y-%m'), '%Y-%m')
+    except ValueError:
+        return JsonResponse({'error': 'month must be YYYY-MM'}, status=400)
+    since = timezone.make_aware(month)
+    until = timezone.make_aware(month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1))
+    
+    customer = request.user
+    if request.GET.get('customer') and request.user.is_staff:
+        customer = get_object_or_404(CustomUser, pk=request.GET['customer'])
+    
+    response = StreamingHttpResponse(
+        StatementService.render(customer, since, until),
+        content_type='application/pdf',
+    )
+    response['Content-Disposition'] = f'attachment; filename="releve_{customer.pk}_{month:%Y_%m}.pdf"'
+    return response
+
+
 
 def toggle_wishlist(request):
     """Toggle product in user's wishlist."""
@@ -408,6 +458,7 @@ def submit_review(request, product_id):
 
 
 
+@idempotent_post
 def payment_method_selection(request, order_id=None):
     """Payment method selection view."""
     # Si pas d'order_id, utiliser le panier actuel
@@ -437,37 +488,19 @@ def payment_method_selection(request, order_id=None):
             
             # Si pas de commande, créer une commande depuis le panier
             if not order:
-                # Générer un numéro de commande unique
-                import uuid
-                order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-                
-                order = Order.objects.create(
-                    order_number=order_number,
-                    customer=request.user,
-                    status='pending',
-                    subtotal=cart_total,
-                    total_amount=cart_total,
-                    shipping_address="À définir",
-                    shipping_city="À définir",
-                    shipping_state="À définir",
-                    shipping_zip_code="00000",
-                    shipping_country="Maroc"
-                )
-                
-                # Créer les OrderItems
-                for cart_item in cart_items:
-                    OrderItem.objects.create(
-                        order=order,
-                        product=cart_item.product,
-                        quantity=cart_item.quantity,
-                        unit_price=cart_item.product.current_price,
-                        total_price=cart_item.quantity * cart_item.product.current_price,
-                        product_name=cart_item.product.name,
-                        product_sku=cart_item.product.sku or "N/A"
-                    )
-                
-                # Vider le panier
-                cart.items.all().delete()
+                try:
+                    order = OrderPlacementService.place_order(cart, Order(
+                        customer=request.user,
+                        status='pending',
+                        shipping_address="À définir",
+                        shipping_city="À définir",
+                        shipping_state="À définir",
+                        shipping_zip_code="00000",
+                        shipping_country="Maroc"
+                    ))
+                except OrderPlacementError as e:
+                    messages.error(request, str(e))
+                    return redirect('store:cart')
             
             # Redirection selon le mode de paiement
             if payment_method in ['wafacash', 'cashplus', 'barid_bank']:
@@ -489,6 +522,7 @@ def payment_method_selection(request, order_id=None):
 
 
 
+@idempotent_post
 def payment_process(request, order_id, payment_method):
     """Payment processing view."""
     order = get_object_or_404(Order, id=order_id, customer=request.user)
@@ -529,35 +563,17 @@ def payment_process(request, order_id, payment_method):
                     order=order,
                     payment_method=payment_method,
                     amount=order.total_amount,
-                    status='pending'
+                    status='processing'
                 )
                 
-                # Process payment
-                result = PaymentService.process_payment(payment)
-                
-                if result['success']:
-                    order.status = 'confirmed'
-                    order.save()
-                    messages.success(request, result['message'])
-                    return redirect('store:payment_success', payment_id=payment.id)
-                else:
-                    messages.error(request, result['message'])
+                # Process payment in the background
+                return enqueue_payment(payment)
         
         elif payment_method in ['credit_card', 'debit_card', 'visa', 'mastercard', 'stripe', 'apple_pay', 'google_pay']:
             card_form = CardPaymentForm(request.POST)
             confirmation_form = PaymentConfirmationForm(request.POST)
             
             if card_form.is_valid() and confirmation_form.is_valid():
-                # Extract month and year from expiry_date (MM/AA format)
-                expiry_date = card_form.cleaned_data['expiry_date']
-                expiry_month = expiry_date[:2]
-                expiry_year = '20' + expiry_date[3:]
-                
-                # Prepare card details with separate month and year
-                card_details = card_form.cleaned_data.copy()
-                card_details['expiry_month'] = expiry_month
-                card_details['expiry_year'] = expiry_year
-                
                 # Create payment record
                 payment = Payment.objects.create(
                     order=order,
@@ -568,20 +584,8 @@ def payment_process(request, order_id, payment_method):
                     card_brand=payment_method
                 )
                 
-                # Process payment
-                result = PaymentService.process_payment(
-                    payment, 
-                    payment_method_id=f"pm_{payment.id}",
-                    card_details=card_details
-                )
-                
-                if result['success']:
-                    order.status = 'confirmed'
-                    order.save()
-                    messages.success(request, result['message'])
-                    return redirect('store:payment_success', payment_id=payment.id)
-                else:
-                    messages.error(request, result['message'])
+                # Process payment in the background; card details stay in this request
+                return enqueue_payment(payment, payment_method_id=f"pm_{payment.id}")
         
         elif payment_method in ['bank_transfer', 'cih_bank', 'attijariwafa', 'bmce']:
             bank_form = BankTransferForm(request.POST)
@@ -596,19 +600,8 @@ def payment_process(request, order_id, payment_method):
                     status='processing'
                 )
                 
-                # Process payment
-                result = PaymentService.process_payment(
-                    payment,
-                    bank_details=bank_form.cleaned_data
-                )
-                
-                if result['success']:
-                    order.status = 'confirmed'
-                    order.save()
-                    messages.success(request, result['message'])
-                    return redirect('store:payment_success', payment_id=payment.id)
-                else:
-                    messages.error(request, result['message'])
+                # Process payment in the background
+                return enqueue_payment(payment, bank_details=bank_form.cleaned_data)
         
         elif payment_method == 'paypal':
             paypal_form = PayPalForm(request.POST)
@@ -623,19 +616,8 @@ def payment_process(request, order_id, payment_method):
                     status='processing'
                 )
                 
-                # Process payment
-                result = PaymentService.process_payment(
-                    payment,
-                    paypal_email=paypal_form.cleaned_data['paypal_email']
-                )
-                
-                if result['success']:
-                    order.status = 'confirmed'
-                    order.save()
-                    messages.success(request, result['message'])
-                    return redirect('store:payment_success', payment_id=payment.id)
-                else:
-                    messages.error(request, result['message'])
+                # Process payment in the background
+                return enqueue_payment(payment, paypal_email=paypal_form.cleaned_data['paypal_email'])
     
     context = {
         'order': order,
@@ -649,6 +631,18 @@ def payment_process(request, order_id, payment_method):
     return render(request, 'store/payment_process.html', context)
 
 
+def enqueue_payment(payment, **gateway_kwargs):
+    """Queue a payment for the background pipeline and show its status page."""
+    PaymentPipeline.enqueue(
+        payment,
+        order_status='confirmed',
+        success_url=reverse('store:payment_success', args=[payment.id]),
+        failure_url=reverse('store:payment_failed', args=[payment.id]),
+        **gateway_kwargs
+    )
+    return redirect('store:payment_status', payment_id=payment.id)
+
+
 
 def payment_success(request, payment_id):
     """Payment success view."""
@@ -720,27 +714,35 @@ def process_checkout(request):
             messages.error(request, 'Veuillez remplir tous les champs obligatoires.')
             return redirect('store:checkout')
         
+        cart = Cart.objects.filter(user=request.user).first()
+        if cart is None or not cart.items.exists():
+            messages.warning(request, 'Your cart is empty.')
+            return redirect('store:cart')
+        
+        quote = ShippingService.quote_cart(cart, shipping_state)
+        
         # Store order data in session
         order_data = {
             'customerName': contact_name,
             'customerEmail': contact_email,
             'customerPhone': contact_phone,
             'paymentMethod': payment_method,
-            'subtotal': '159.00',
-            'shipping': 'Gratuit',
+            'subtotal': str(quote['subtotal']),
+            'shipping': f"{quote['shipping']} MAD" if quote['shipping'] else 'Gratuit',
             'taxes': '0.00',
-            'total': '159.00',
+            'total': str(quote['total']),
             'deliveryAddress': f"{shipping_address}, {shipping_city}",
             'deliveryRegion': shipping_state,
-            'deliveryTime': '1-2 jours ouvrables',
+            'deliveryTime': quote['delivery_time'],
             'items': [
                 {
-                    'name': 'Carte Graphique NVIDIA RTX 4060',
-                    'sku': 'RTX4060-8GB',
-                    'quantity': 1,
-                    'price': '159.00',
-                    'total': '159.00'
+                    'name': item.product.name,
+                    'sku': item.product.sku,
+                    'quantity': item.quantity,
+                    'price': str(item.product.current_price),
+                    'total': str(item.total_price)
                 }
+                for item in cart.items.select_related('product')
             ]
         }
         
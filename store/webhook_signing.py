@@ -0,0 +1,14 @@
+"""
+Webhook signatures for KeyReport IT Store
+HMAC signing shared by the webhook endpoint and the local processor stand-in
+"""
+
+import hashlib
+import hmac
+
+WEBHOOK_SIGNATURE_HEADER = 'X-Webhook-Signature'
+
+
+def sign_payload(body: bytes, secret: str) -> str:
+    """HMAC-SHA256 signature of a webhook body."""
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
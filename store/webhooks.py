@@ -0,0 +1,263 @@
+"""
+Payment webhook inbox for KeyReport IT Store
+Stores processor notifications durably on receipt and applies them to payments and orders in batches
+"""
+
+import hmac
+import json
+import logging
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Set, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import Order, Payment, PaymentEvent, WebhookEvent
+from .webhook_signing import WEBHOOK_SIGNATURE_HEADER, sign_payload
+
+logger = logging.getLogger(__name__)
+
+# event type -> (payment status, order payment status, PaymentEvent type)
+EVENT_TRANSITIONS = {
+    'charge.succeeded': ('completed', 'paid', 'charge_succeeded'),
+    'charge.failed': ('failed', 'failed', 'charge_failed'),
+    'refund.succeeded': ('refunded', 'refunded', 'refund_succeeded'),
+}
+
+# Payment statuses each transition may leave; a late success wins over a
+# failure we recorded on timeout, but nothing reopens a refunded payment.
+ALLOWED_FROM = {
+    'completed': ('pending', 'processing', 'failed'),
+    'failed': ('pending', 'processing'),
+    'partially_refunded': ('completed', 'partially_refunded'),
+    'refunded': ('pending', 'processing', 'completed', 'partially_refunded'),
+}
+
+# order payment status -> (order status, order statuses it may replace);
+# a failed charge leaves the order where it is for the customer to retry.
+ORDER_TRANSITIONS = {
+    'paid': ('confirmed', ('pending',)),
+    'refunded': ('refunded', ('pending', 'confirmed', 'processing', 'shipped', 'delivered')),
+}
+
+
+class InvalidWebhook(Exception):
+    """Raised when a webhook body cannot be accepted."""
+
+
+def get_max_attempts() -> int:
+    return getattr(settings, 'PAYMENT_WEBHOOK_MAX_ATTEMPTS', 5)
+
+
+class WebhookService:
+    """Service class to receive and apply payment processor webhooks."""
+
+    @staticmethod
+    def signature_header() -> str:
+        return getattr(settings, 'PAYMENT_WEBHOOK_SIGNATURE_HEADER', WEBHOOK_SIGNATURE_HEADER)
+
+    @staticmethod
+    def verify_signature(body: bytes, signature: str) -> bool:
+        """
+        Check the HMAC of ``body`` against ``PAYMENT_WEBHOOK_SECRET``.
+
+        Without a configured secret webhooks are rejected, unless
+        ``PAYMENT_WEBHOOK_ALLOW_UNSIGNED`` is set for local testing.
+        """
+        secret = getattr(settings, 'PAYMENT_WEBHOOK_SECRET', '')
+        if not secret:
+            return getattr(settings, 'PAYMENT_WEBHOOK_ALLOW_UNSIGNED', False)
+        return hmac.compare_digest(sign_payload(body, secret), signature or '')
+
+    @staticmethod
+    def ingest(body: bytes) -> None:
+        """
+        Store one webhook in the inbox.
+
+        A single INSERT that ignores conflicts on the event id, so
+        redeliveries are dropped by the unique index without a lookup.
+        """
+        try:
+            event = json.loads(body)
+        except ValueError:
+            raise InvalidWebhook('Body is not valid JSON')
+        if not isinstance(event, dict) or not event.get('id') or not event.get('type'):
+            raise InvalidWebhook('Event id and type are required')
+
+        WebhookEvent.objects.bulk_create([
+            WebhookEvent(
+                event_id=str(event['id'])[:100],
+                processor=str(event.get('processor', ''))[:50],
+                event_type=str(event['type'])[:50],
+                payload=event,
+            )
+        ], ignore_conflicts=True)
+
+    @staticmethod
+    def _resolve_payments(events: List[WebhookEvent]) -> Dict[str, Payment]:
+        """Map charge ids and order references to payments in at most two queries."""
+        charge_ids, references = set(), set()
+        for event in events:
+            data = event.payload.get('data') or {}
+            charge_ids.add(data.get('charge_id') or data.get('id') or '')
+            if data.get('reference'):
+                references.add(data['reference'])
+        charge_ids.discard('')
+
+        payments = Payment.objects.only('id', 'order_id', 'status', 'amount', 'transaction_id', 'processed_at')
+        found: Dict[str, Payment] = {}
+        if charge_ids:
+            for payment in payments.filter(transaction_id__in=charge_ids):
+                found[payment.transaction_id] = payment
+        if references:
+            # Charges can be reported before the synchronous response stored
+            # the transaction id; fall back to the order's latest payment.
+            rows = payments.filter(order__order_number__in=references).annotate(
+                order_number=F('order__order_number')
+            ).order_by('id')
+            for payment in rows:
+                found[f'ref:{payment.order_number}'] = payment
+        return found
+
+    @staticmethod
+    def _recorded(payments: Dict[str, Payment]) -> Tuple[Set[tuple], Dict[int, Decimal]]:
+        """
+        (payment id, event type, external id) of the events already
+        recorded for ``payments``, and the amount refunded so far per
+        payment, in one query.
+        """
+        known: Set[tuple] = set()
+        refunded: Dict[int, Decimal] = defaultdict(Decimal)
+        rows = PaymentEvent.objects.filter(
+            payment_id__in={payment.id for payment in payments.values()}
+        ).values_list('payment_id', 'event_type', 'external_id', 'amount')
+        for payment_id, event_type, external_id, amount in rows:
+            if external_id:
+                known.add((payment_id, event_type, external_id))
+            if event_type == 'refund_succeeded':
+                refunded[payment_id] += amount or Decimal('0.00')
+        return known, refunded
+
+    @staticmethod
+    def apply_pending(limit: int = 100) -> int:
+        """
+        Apply up to ``limit`` pending events, oldest first.
+
+        Payments are resolved in bulk, then changed with one bulk_update,
+        orders (payment and order status) with one UPDATE per payment
+        status, and the resulting PaymentEvents with one INSERT. Events
+        whose payment cannot be found yet stay pending until
+        ``PAYMENT_WEBHOOK_MAX_ATTEMPTS``. Charges and refunds the
+        synchronous flow already recorded under the same external id are
+        not applied again, and a refund only marks the payment refunded
+        once all refunds cover its amount.
+        Returns the number of events that left the inbox.
+        """
+        now = timezone.now()
+        max_attempts = get_max_attempts()
+
+        with transaction.atomic():
+            events = list(
+                WebhookEvent.objects.select_for_update(skip_locked=True)
+                .filter(status='pending')
+                .order_by('received_at', 'id')[:limit]
+            )
+            if not events:
+                return 0
+            payments = WebhookService._resolve_payments(events)
+            known, refunded = WebhookService._recorded(payments)
+
+            changed: Dict[int, Payment] = {}
+            order_updates: Dict[str, List[int]] = defaultdict(list)
+            payment_events: List[PaymentEvent] = []
+            done = 0
+
+            for event in events:
+                event.attempts += 1
+                transition = EVENT_TRANSITIONS.get(event.event_type)
+                if transition is None:
+                    event.status, event.error = 'ignored', 'unhandled event type'
+                    done += 1
+                    continue
+
+                data = event.payload.get('data') or {}
+                payment = payments.get(data.get('charge_id') or data.get('id') or '')
+                if payment is None and data.get('reference'):
+                    payment = payments.get(f"ref:{data['reference']}")
+                if payment is None:
+                    if event.attempts >= max_attempts:
+                        event.status, event.error = 'failed', 'no matching payment'
+                        done += 1
+                    continue
+
+                payment_status, order_status, event_type = transition
+                external_id = str(data.get('id', ''))[:100]
+                if external_id and (payment.id, event_type, external_id) in known:
+                    # Recorded by the synchronous flow (or an earlier event) under the same id
+                    event.status, event.applied_at = 'applied', now
+                    done += 1
+                    continue
+                try:
+                    amount = Decimal(str(data['amount'])) if data.get('amount') else None
+                except InvalidOperation:
+                    amount = None
+                if event_type == 'refund_succeeded':
+                    amount = amount or payment.amount - refunded[payment.id]
+                    if refunded[payment.id] + amount < payment.amount:
+                        payment_status = order_status = 'partially_refunded'
+
+                if payment.status == payment_status and payment_status != 'partially_refunded':
+                    # Already recorded by the synchronous flow; just make sure the order agrees
+                    order_updates[order_status].append(payment.order_id)
+                    event.status, event.applied_at = 'applied', now
+                elif payment.status not in ALLOWED_FROM[payment_status]:
+                    event.status, event.error = 'ignored', f'payment is {payment.status}'
+                else:
+                    payment.status = payment_status
+                    if payment_status == 'completed':
+                        payment.transaction_id = payment.transaction_id or data.get('id', '')
+                        payment.processed_at = payment.processed_at or now
+                    changed[payment.id] = payment
+                    order_updates[order_status].append(payment.order_id)
+                    payment_events.append(PaymentEvent(
+                        payment_id=payment.id,
+                        event_type=event_type,
+                        gateway=event.processor,
+                        amount=amount or payment.amount,
+                        external_id=external_id,
+                        payload=event.payload,
+                    ))
+                    if external_id:
+                        known.add((payment.id, event_type, external_id))
+                    if event_type == 'refund_succeeded':
+                        refunded[payment.id] += amount
+                    event.status, event.applied_at = 'applied', now
+                done += 1
+
+            if changed:
+                Payment.objects.bulk_update(changed.values(), ['status', 'transaction_id', 'processed_at'])
+            for payment_status, order_ids in order_updates.items():
+                WebhookService.update_orders(order_ids, payment_status)
+            PaymentEvent.objects.bulk_create(payment_events)
+            WebhookEvent.objects.bulk_update(events, ['status', 'error', 'attempts', 'applied_at'])
+
+        logger.info('Applied %s webhook events (%s payments changed)', done, len(changed))
+        return done
+
+    @staticmethod
+    def update_orders(order_ids: List[int], payment_status: str) -> int:
+        """Set the payment status of orders and move their order status along in the same UPDATE."""
+        fields = {'payment_status': payment_status}
+        if payment_status in ORDER_TRANSITIONS:
+            order_status, allowed = ORDER_TRANSITIONS[payment_status]
+            fields['status'] = Case(When(status__in=allowed, then=Value(order_status)), default=F('status'))
+        return Order.objects.filter(id__in=order_ids).update(**fields)
+
+    @staticmethod
+    def retry_failed(events=None) -> int:
+        """Put failed events back in the inbox."""
+        events = WebhookEvent.objects.all() if events is None else events
+        return events.filter(status='failed').update(status='pending', attempts=0, error='')
@@ -1,8 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from .models import (
-    SupportTicket, TicketResponse, ServiceRequest, 
-    ServiceSchedule, Document
+    SupportTicket, SupportDailyStat, TicketCounter, TicketResponse, TicketSearchTerm, ServiceRequest, 
+    ServiceSchedule, TechnicianServiceArea, Document, DocumentBlob, DocumentText, DocumentUpload
 )
 
 
@@ -30,7 +30,10 @@ class SupportTicketAdmin(admin.ModelAdmin):
         'ticket_number', 'title', 'customer__email', 
         'customer__first_name', 'customer__last_name'
     )
-    readonly_fields = ('ticket_number', 'created_at', 'updated_at')
+    readonly_fields = (
+        'ticket_number', 'created_at', 'updated_at',
+        'first_response_at', 'first_responder', 'first_response_seconds', 'resolution_seconds', 'resolved_by'
+    )
     list_editable = ('priority', 'status', 'assigned_to')
     
     inlines = [TicketResponseInline]
@@ -49,6 +52,12 @@ class SupportTicketAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'updated_at', 'resolved_at', 'closed_at'),
             'classes': ('collapse',)
         }),
+        ('SLA', {
+            'fields': (
+                'first_response_at', 'first_responder', 'first_response_seconds', 'resolution_seconds', 'resolved_by'
+            ),
+            'classes': ('collapse',)
+        }),
     )
     
     def get_queryset(self, request):
@@ -58,6 +67,59 @@ class SupportTicketAdmin(admin.ModelAdmin):
         )
 
 
+@admin.register(TicketCounter)
+class TicketCounterAdmin(admin.ModelAdmin):
+    """Admin configuration for TicketCounter model."""
+    
+    list_display = ('scope', 'status', 'priority', 'count')
+    list_filter = ('status', 'priority')
+    search_fields = ('scope',)
+    readonly_fields = ('scope', 'status', 'priority', 'count')
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(SupportDailyStat)
+class SupportDailyStatAdmin(admin.ModelAdmin):
+    """Admin configuration for SupportDailyStat model."""
+    
+    list_display = (
+        'day', 'agent', 'ticket_type', 'tickets_created', 'first_responses',
+        'first_response_breaches', 'tickets_resolved', 'resolution_breaches'
+    )
+    list_filter = ('ticket_type', 'day', 'agent')
+    readonly_fields = (
+        'day', 'agent', 'ticket_type', 'tickets_created', 'first_responses', 'first_response_seconds',
+        'first_response_breaches', 'tickets_resolved', 'resolution_seconds', 'resolution_breaches'
+    )
+    list_select_related = ('agent',)
+    date_hierarchy = 'day'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TicketSearchTerm)
+class TicketSearchTermAdmin(admin.ModelAdmin):
+    """Admin configuration for TicketSearchTerm model."""
+    
+    list_display = ('term', 'ticket', 'response', 'weight', 'is_internal')
+    list_filter = ('is_internal',)
+    search_fields = ('term', 'ticket__ticket_number')
+    readonly_fields = ('ticket', 'response', 'term', 'weight', 'is_internal')
+    list_select_related = ('ticket',)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(TicketResponse)
 class TicketResponseAdmin(admin.ModelAdmin):
     """Admin configuration for TicketResponse model."""
@@ -164,6 +226,17 @@ class ServiceScheduleAdmin(admin.ModelAdmin):
         )
 
 
+@admin.register(TechnicianServiceArea)
+class TechnicianServiceAreaAdmin(admin.ModelAdmin):
+    """Admin configuration for TechnicianServiceArea model."""
+    
+    list_display = ('technician', 'city', 'is_active', 'created_at')
+    list_filter = ('city', 'is_active')
+    search_fields = ('city', 'technician__email', 'technician__first_name', 'technician__last_name')
+    list_editable = ('is_active',)
+    list_select_related = ('technician',)
+
+
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
     """Admin configuration for Document model."""
@@ -177,12 +250,16 @@ class DocumentAdmin(admin.ModelAdmin):
         'title', 'customer__email', 'customer__first_name', 
         'customer__last_name', 'description'
     )
-    readonly_fields = ('created_at', 'updated_at', 'file_info')
+    readonly_fields = ('created_at', 'updated_at', 'file_info', 'original_filename', 'blob')
     
     fieldsets = (
         (None, {
             'fields': ('title', 'document_type', 'file', 'customer')
         }),
+        ('Storage', {
+            'fields': ('original_filename', 'blob'),
+            'classes': ('collapse',)
+        }),
         ('Related Objects', {
             'fields': ('related_order', 'related_ticket', 'related_service')
         }),
@@ -201,7 +278,7 @@ class DocumentAdmin(admin.ModelAdmin):
             return format_html(
                 '<span style="font-family: monospace;">{}</span><br>'
                 '<small>Size: {} MB | Type: {}</small>',
-                obj.file.name.split('/')[-1],
+                obj.download_filename,
                 obj.file_size_mb,
                 obj.file_extension
             )
@@ -213,3 +290,61 @@ class DocumentAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related(
             'customer', 'related_order', 'related_ticket', 'related_service'
         )
+
+
+@admin.register(DocumentBlob)
+class DocumentBlobAdmin(admin.ModelAdmin):
+    """Admin configuration for DocumentBlob model."""
+    
+    list_display = ('sha256', 'size', 'file', 'created_at')
+    search_fields = ('sha256',)
+    readonly_fields = ('sha256', 'file', 'size', 'created_at')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DocumentUpload)
+class DocumentUploadAdmin(admin.ModelAdmin):
+    """Admin configuration for DocumentUpload model."""
+    
+    list_display = ('filename', 'uploaded_by', 'size', 'received', 'status', 'document', 'updated_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('filename', 'uploaded_by__email', 'upload_id')
+    readonly_fields = (
+        'upload_id', 'uploaded_by', 'filename', 'size', 'sha256', 'received', 'status', 'error',
+        'blob', 'document', 'created_at', 'updated_at'
+    )
+    list_select_related = ('uploaded_by', 'document')
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(DocumentText)
+class DocumentTextAdmin(admin.ModelAdmin):
+    """Admin configuration for DocumentText model."""
+    
+    list_display = ('document', 'status', 'attempts', 'queued_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('document__title', 'error')
+    readonly_fields = (
+        'document', 'status', 'content', 'error', 'attempts', 'queued_at', 'started_at', 'finished_at'
+    )
+    list_select_related = ('document',)
+    actions = ['requeue_extraction']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def requeue_extraction(self, request, queryset):
+        """Extract the text of the selected documents again."""
+        from .extraction import DocumentTextPipeline
+        texts = list(queryset.select_related('document'))
+        for text in texts:
+            DocumentTextPipeline.enqueue(text.document)
+        self.message_user(request, f'{len(texts)} documents were queued for text extraction.')
+    requeue_extraction.short_description = 'Extract text again'
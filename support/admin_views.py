@@ -0,0 +1,35 @@
+"""
+Staff views for KeyReport IT Store support
+Support SLA dashboard served from the daily rollups
+"""
+
+from datetime import datetime, timedelta
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.shortcuts import render
+from django.utils import timezone
+
+from .metrics import SupportMetricsService, get_sla_targets
+
+
+@staff_member_required
+def support_dashboard(request):
+    """First response and resolution times per agent and ticket type."""
+    until = timezone.localdate()
+    try:
+        days = max(1, min(int(request.GET.get('days', 30)), 366))
+    except ValueError:
+        days = 30
+    since = until - timedelta(days=days - 1)
+    if request.GET.get('since'):
+        try:
+            since = datetime.strptime(request.GET['since'], '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    
+    context = SupportMetricsService.summary(since, until)
+    context.update({
+        'days': days,
+        'sla_targets': sorted(get_sla_targets().items(), key=lambda item: item[1]),
+    })
+    return render(request, 'admin/support_dashboard.html', context)
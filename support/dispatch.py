@@ -0,0 +1,281 @@
+"""
+Service dispatch for KeyReport IT Store
+Assigns a day's pending service requests to technicians in one batch
+"""
+
+import logging
+import time as clock
+from collections import defaultdict
+from datetime import date, time
+from typing import Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import ServiceRequest, ServiceSchedule, TechnicianServiceArea
+from .scheduling import (
+    RELEASED_STATUSES, AvailabilityIndex, DaySchedule, SchedulingConflict, SchedulingService,
+    get_day_bounds, get_slot_step, get_working_days, to_minutes,
+)
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# Service requests the dispatcher may place
+DISPATCHABLE_STATUSES = ('pending', 'approved')
+
+# Minutes booked per service type unless SERVICE_DURATIONS says otherwise
+DEFAULT_DURATIONS = {
+    'installation': 120,
+    'maintenance': 90,
+    'repair': 90,
+    'training': 120,
+    'consultation': 60,
+    'other': 60,
+}
+
+
+def get_durations() -> Dict[str, int]:
+    return {**DEFAULT_DURATIONS, **getattr(settings, 'SERVICE_DURATIONS', {})}
+
+
+def get_load_weight() -> float:
+    return getattr(settings, 'DISPATCH_LOAD_WEIGHT', 0.5)
+
+
+class Assignment(NamedTuple):
+    request_id: int
+    technician_id: int
+    start: int
+    duration: int
+
+    @property
+    def start_time(self) -> time:
+        return time(self.start // 60, self.start % 60)
+
+
+class DispatchPlan:
+    """Outcome of a dispatch run."""
+
+    def __init__(self, day: date):
+        self.day = day
+        self.assignments: List[Assignment] = []
+        self.unassigned: Dict[int, str] = {}
+        self.load: Dict[int, int] = defaultdict(int)
+        self.solve_seconds = 0.0
+        self.write_seconds = 0.0
+
+
+class DispatchService:
+    """Service class to assign pending service requests to technicians."""
+
+    @staticmethod
+    def pending_requests(day: date) -> List[dict]:
+        """Unscheduled requests whose preferred date is ``day``."""
+        return list(
+            ServiceRequest.objects.filter(
+                preferred_date=day, status__in=DISPATCHABLE_STATUSES, schedule__isnull=True
+            ).order_by('preferred_time', 'id').values('id', 'service_city', 'service_type', 'preferred_time')
+        )
+
+    @staticmethod
+    def technicians_by_city() -> Dict[str, List[int]]:
+        """Active technicians of every city, keyed by lower-case city name."""
+        technicians = defaultdict(list)
+        areas = TechnicianServiceArea.objects.filter(is_active=True, technician__is_active=True).values_list(
+            'city', 'technician_id'
+        )
+        for city, technician_id in areas:
+            technicians[city.strip().lower()].append(technician_id)
+        return technicians
+
+    @staticmethod
+    def _nearest_fit(schedule: DaySchedule, duration: int, preferred: int) -> Optional[int]:
+        """Start of the free slot closest to ``preferred``, aligned to the slot step."""
+        day_start, day_end = get_day_bounds()
+        step = get_slot_step()
+
+        later = None
+        for gap_start, gap_end in schedule.gaps(day_start, day_end, preferred):
+            start = -(-gap_start // step) * step
+            if start + duration <= gap_end:
+                later = start
+                break
+
+        # Latest start before the preferred time; the job may run past it
+        earlier = None
+        for gap_start, gap_end in schedule.gaps(day_start, day_end):
+            if gap_start >= preferred:
+                break
+            start = min(gap_end - duration, preferred - 1) // step * step
+            if start >= gap_start:
+                earlier = start
+
+        if later is None or (earlier is not None and preferred - earlier < later - preferred):
+            return earlier
+        return later
+
+    @staticmethod
+    def solve(requests: List[dict], technicians: Dict[str, List[int]],
+              bookings: Dict[int, DaySchedule], day: date) -> DispatchPlan:
+        """
+        Greedy assignment without database access.
+
+        Requests with the fewest candidate technicians go first, longer
+        jobs before shorter ones. Each request goes to the technician of
+        its city whose nearest free slot minimises
+        ``|start - preferred time| + DISPATCH_LOAD_WEIGHT x booked minutes``,
+        so work spreads over the team unless that means moving the
+        appointment far from the customer's preferred time. ``bookings``
+        is updated in place with the new appointments.
+        """
+        started = clock.perf_counter()
+        plan = DispatchPlan(day)
+        durations = get_durations()
+        weight = get_load_weight()
+        if day.weekday() not in get_working_days():
+            plan.unassigned = {request['id']: 'not a working day' for request in requests}
+            return plan
+
+        for technician_id, schedule in bookings.items():
+            plan.load[technician_id] = sum(end - start for start, end in zip(schedule.starts, schedule.ends))
+
+        def candidates(request):
+            return technicians.get(request['service_city'].strip().lower(), [])
+
+        ordered = sorted(
+            requests,
+            key=lambda request: (
+                len(candidates(request)),
+                -durations.get(request['service_type'], 60),
+                request['preferred_time'],
+            ),
+        )
+        for request in ordered:
+            team = candidates(request)
+            if not team:
+                plan.unassigned[request['id']] = f"no technician serves {request['service_city']}"
+                continue
+
+            duration = durations.get(request['service_type'], 60)
+            preferred = to_minutes(request['preferred_time'])
+            best = None
+            for technician_id in team:
+                schedule = bookings.setdefault(technician_id, DaySchedule())
+                start = DispatchService._nearest_fit(schedule, duration, preferred)
+                if start is None:
+                    continue
+                cost = abs(start - preferred) + weight * plan.load[technician_id]
+                if best is None or cost < best[0]:
+                    best = (cost, technician_id, start)
+
+            if best is None:
+                plan.unassigned[request['id']] = 'no free slot'
+                continue
+            _, technician_id, start = best
+            bookings[technician_id].add(start, start + duration)
+            plan.load[technician_id] += duration
+            plan.assignments.append(Assignment(request['id'], technician_id, start, duration))
+
+        plan.solve_seconds = clock.perf_counter() - started
+        return plan
+
+    @staticmethod
+    def plan(day: date) -> DispatchPlan:
+        """Load the day's requests, technicians and bookings and solve."""
+        index = AvailabilityIndex.build(day, 0)
+        return DispatchService.solve(
+            DispatchService.pending_requests(day),
+            DispatchService.technicians_by_city(),
+            {technician_id: days[day] for technician_id, days in index.days.items() if day in days},
+            day,
+        )
+
+    @staticmethod
+    def _check_overlaps(day: date, assignments: List[Assignment]) -> None:
+        """Raise SchedulingConflict if a new assignment overlaps any booking of its technician."""
+        new_requests = {assignment.request_id for assignment in assignments}
+        rows = (
+            ServiceSchedule.objects.filter(
+                scheduled_date=day, technician_id__in={assignment.technician_id for assignment in assignments}
+            )
+            .exclude(service_request__status__in=RELEASED_STATUSES)
+            .order_by('technician_id', 'scheduled_time')
+            .values_list('technician_id', 'service_request_id', 'scheduled_time', 'estimated_duration')
+        )
+        current, reach, owner = None, 0, None
+        for technician_id, request_id, start, duration in rows:
+            start = to_minutes(start)
+            if technician_id != current:
+                current, reach, owner = technician_id, 0, None
+            elif start < reach and (request_id in new_requests or owner in new_requests):
+                raise SchedulingConflict(
+                    f'Technician {technician_id} is double-booked on {day} at {start // 60:02d}:{start % 60:02d}'
+                )
+            if start + duration > reach:
+                reach, owner = start + duration, request_id
+
+    @staticmethod
+    def dispatch(day: date, dry_run: bool = False) -> DispatchPlan:
+        """
+        Plan ``day`` and write every assignment in one transaction.
+
+        Technician rows are locked and the planned requests re-read under
+        lock, since the plan was made outside the transaction; the
+        schedules are then inserted with one bulk_create and the requests
+        updated with one bulk_update, and the day is checked for overlaps.
+        A request or booking changed concurrently rolls the whole batch
+        back with SchedulingConflict.
+        """
+        plan = DispatchService.plan(day)
+        if dry_run or not plan.assignments:
+            return plan
+
+        started = clock.perf_counter()
+        now = timezone.now()
+        technician_ids = {assignment.technician_id for assignment in plan.assignments}
+        request_ids = {assignment.request_id for assignment in plan.assignments}
+        try:
+            with transaction.atomic():
+                list(User.objects.select_for_update().filter(pk__in=technician_ids).values_list('pk', flat=True))
+                still_pending = set(
+                    ServiceRequest.objects.select_for_update().filter(
+                        id__in=request_ids, status__in=DISPATCHABLE_STATUSES, schedule__isnull=True
+                    ).values_list('id', flat=True)
+                )
+                if still_pending != request_ids:
+                    raise SchedulingConflict(
+                        f'{len(request_ids - still_pending)} service requests changed while {day} was planned'
+                    )
+                ServiceSchedule.objects.bulk_create([
+                    ServiceSchedule(
+                        service_request_id=assignment.request_id,
+                        technician_id=assignment.technician_id,
+                        scheduled_date=day,
+                        scheduled_time=assignment.start_time,
+                        estimated_duration=assignment.duration,
+                    )
+                    for assignment in plan.assignments
+                ])
+                ServiceRequest.objects.bulk_update([
+                    ServiceRequest(
+                        id=assignment.request_id,
+                        assigned_technician_id=assignment.technician_id,
+                        status='scheduled',
+                        scheduled_at=now,
+                    )
+                    for assignment in plan.assignments
+                ], ['assigned_technician', 'status', 'scheduled_at'], batch_size=500)
+                DispatchService._check_overlaps(day, plan.assignments)
+                transaction.on_commit(SchedulingService.reset)
+        except IntegrityError as e:
+            # Another booking gave one of the requests its schedule first
+            raise SchedulingConflict(f'A service request for {day} was booked concurrently') from e
+
+        plan.write_seconds = clock.perf_counter() - started
+        logger.info('Dispatched %s service requests for %s (%s left unassigned)',
+                    len(plan.assignments), day, len(plan.unassigned))
+        return plan
@@ -0,0 +1,184 @@
+"""
+Document downloads for KeyReport IT Store
+Streams stored files in chunks with Range and conditional request support, or hands them to the front-end server
+"""
+
+import mimetypes
+import os
+import re
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+# Accepted values of SUPPORT_DOWNLOAD_OFFLOAD
+OFFLOAD_SENDFILE = 'x-sendfile'
+OFFLOAD_ACCEL_REDIRECT = 'x-accel-redirect'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_chunk_size() -> int:
+    return getattr(settings, 'SUPPORT_DOWNLOAD_CHUNK_SIZE', 64 * 1024)
+
+
+def get_offload() -> Optional[str]:
+    """How the front-end server sends files: None (Django streams), 'x-sendfile' or 'x-accel-redirect'."""
+    return getattr(settings, 'SUPPORT_DOWNLOAD_OFFLOAD', None)
+
+
+def get_accel_prefix() -> str:
+    """nginx ``internal`` location mapped onto MEDIA_ROOT."""
+    return getattr(settings, 'SUPPORT_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive of a single ``bytes=`` range, clamped to the
+    file; None when the header should be ignored and the whole file
+    sent. Raises ValueError when the range cannot be satisfied.
+
+    Multiple ranges are answered with the whole file, which RFC 9110
+    allows and keeps us clear of multipart/byteranges bodies.
+    """
+    match = RANGE_RE.match(header.strip().replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if not length or not size:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def read_range(storage, name: str, start: int, length: int, chunk_size: int) -> Iterator[bytes]:
+    """Yield ``length`` bytes of ``name`` from ``start``; the file is opened on first iteration."""
+    with storage.open(name, 'rb') as handle:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+class DocumentDownloadService:
+    """Service class to serve stored files without loading them into memory."""
+
+    @staticmethod
+    def stat(field_file) -> Tuple[int, datetime]:
+        """Size and modification time of a stored file; Http404 if it is missing."""
+        storage, name = field_file.storage, field_file.name
+        if not name or not storage.exists(name):
+            raise Http404("File not found.")
+        return storage.size(name), storage.get_modified_time(name)
+
+    @staticmethod
+    def etag(size: int, modified: datetime) -> str:
+        return quote_etag(f"{size:x}-{int(modified.timestamp() * 1000000):x}")
+
+    @staticmethod
+    def _range_applies(request, etag: str, last_modified: int) -> bool:
+        """If-Range: honour Range only while the client's copy is current."""
+        validator = request.META.get('HTTP_IF_RANGE')
+        if not validator:
+            return True
+        if validator.startswith(('"', 'W/')):
+            return validator == etag
+        return parse_http_date_safe(validator) == last_modified
+
+    @staticmethod
+    def _offload(field_file, response: HttpResponse) -> bool:
+        """Let the front-end server send the file; False when it cannot."""
+        offload = get_offload()
+        if offload == OFFLOAD_SENDFILE:
+            try:
+                response['X-Sendfile'] = field_file.path
+            except NotImplementedError:
+                return False
+            return True
+        if offload == OFFLOAD_ACCEL_REDIRECT:
+            response['X-Accel-Redirect'] = get_accel_prefix().rstrip('/') + '/' + quote(field_file.name)
+            return True
+        return False
+
+    @staticmethod
+    def serve(request, field_file, filename: Optional[str] = None, as_attachment: bool = True) -> HttpResponse:
+        """
+        Serve ``field_file`` once the caller has checked permissions.
+
+        With SUPPORT_DOWNLOAD_OFFLOAD set only headers are returned and the
+        front-end server (Apache mod_xsendfile, lighttpd or nginx) sends
+        the bytes, including ranges. Otherwise the file is streamed in
+        SUPPORT_DOWNLOAD_CHUNK_SIZE chunks: the whole file as 200, a
+        single byte range as 206, or 304 when the client's validators
+        still match.
+        """
+        storage, name = field_file.storage, field_file.name
+        size, modified = DocumentDownloadService.stat(field_file)
+        etag = DocumentDownloadService.etag(size, modified)
+        last_modified = int(modified.timestamp())
+        filename = filename or os.path.basename(name)
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(content_type=content_type)
+            if DocumentDownloadService._offload(field_file, response):
+                response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+            else:
+                response = DocumentDownloadService._stream(
+                    request, storage, name, size, content_type, etag, last_modified
+                )
+                if response.status_code != 416:
+                    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        response['X-Content-Type-Options'] = 'nosniff'
+        return response
+
+    @staticmethod
+    def _stream(request, storage, name: str, size: int, content_type: str,
+                etag: str, last_modified: int) -> HttpResponse:
+        chunk_size = get_chunk_size()
+        requested = request.META.get('HTTP_RANGE')
+        byte_range = None
+        if requested and request.method in ('GET', 'HEAD') and \
+                DocumentDownloadService._range_applies(request, etag, last_modified):
+            try:
+                byte_range = parse_range(requested, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                response['Accept-Ranges'] = 'bytes'
+                return response
+
+        if byte_range is None:
+            response = FileResponse(storage.open(name, 'rb'), content_type=content_type)
+            response.block_size = chunk_size
+            response['Content-Length'] = str(size)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                read_range(storage, name, start, end - start + 1, chunk_size),
+                status=206, content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+        return response
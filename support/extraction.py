@@ -0,0 +1,269 @@
+"""
+Document text extraction for KeyReport IT Store
+Pulls the text out of stored PDFs and text files on a worker pool and indexes it for document search
+"""
+
+import io
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+from django.utils.html import strip_tags
+from pypdf import PdfReader
+
+from .models import Document, DocumentText
+
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = frozenset(['.txt', '.csv', '.log', '.md', '.json', '.xml'])
+HTML_EXTENSIONS = frozenset(['.html', '.htm'])
+
+
+def get_extraction_mode() -> str:
+    """
+    How queued extractions are run.
+
+    ``thread`` (default) runs them on a small in-process thread pool,
+    with a sweeper thread picking up rows nothing is running yet;
+    ``worker`` leaves them to the ``run_document_extractor`` command and
+    ``inline`` runs them before the request returns.
+    """
+    return getattr(settings, 'DOCUMENT_EXTRACTION_MODE', 'thread')
+
+
+def get_poll_interval() -> float:
+    """Seconds between sweeps of the queue in ``thread`` mode."""
+    return getattr(settings, 'DOCUMENT_EXTRACTION_POLL_INTERVAL', 30)
+
+
+def get_stale_after() -> timedelta:
+    """How long an extraction may run before a sweep requeues it."""
+    return timedelta(seconds=getattr(settings, 'DOCUMENT_EXTRACTION_STALE_AFTER', 600))
+
+
+def get_max_bytes() -> int:
+    return getattr(settings, 'DOCUMENT_EXTRACTION_MAX_BYTES', 20 * 1024 * 1024)
+
+
+def get_max_chars() -> int:
+    return getattr(settings, 'DOCUMENT_EXTRACTION_MAX_CHARS', 200000)
+
+
+def pdf_text(data: bytes) -> str:
+    """Text of every page, stopping once DOCUMENT_EXTRACTION_MAX_CHARS is reached."""
+    reader = PdfReader(io.BytesIO(data))
+    pages, length = [], 0
+    for page in reader.pages:
+        text = page.extract_text() or ''
+        pages.append(text)
+        length += len(text)
+        if length >= get_max_chars():
+            break
+    return '\n'.join(pages)
+
+
+def decode_text(data: bytes) -> str:
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return data.decode('cp1252', errors='replace')
+
+
+def extract_text(filename: str, data: bytes) -> Optional[str]:
+    """Text of a file by its extension, or None for formats we do not read."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.pdf' or data[:5] == b'%PDF-':
+        return pdf_text(data)
+    if extension in TEXT_EXTENSIONS:
+        return decode_text(data)
+    if extension in HTML_EXTENSIONS:
+        return strip_tags(decode_text(data))
+    return None
+
+
+class DocumentTextPipeline:
+    """Service class to queue and run document text extraction."""
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _poller: Optional[threading.Thread] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def executor(cls) -> ThreadPoolExecutor:
+        """Thread pool used in ``thread`` mode, created on first use."""
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'DOCUMENT_EXTRACTION_THREADS', 2),
+                    thread_name_prefix='document-extraction',
+                )
+        return cls._executor
+
+    @classmethod
+    def start_poller(cls):
+        """
+        Start the ``thread`` mode sweeper of this process, once.
+
+        Rows handed to the pool through on_commit are lost if the process
+        dies first, and rows queued by the migration or ``queue_missing``
+        are never handed to it; the sweeper runs queued rows and requeues
+        stale running ones every DOCUMENT_EXTRACTION_POLL_INTERVAL seconds.
+        """
+        if get_extraction_mode() != 'thread':
+            return
+        with cls._lock:
+            if cls._poller is None or not cls._poller.is_alive():
+                cls._poller = threading.Thread(target=cls._poll, name='document-extraction-poller', daemon=True)
+                cls._poller.start()
+
+    @classmethod
+    def _poll(cls):
+        while True:
+            close_old_connections()
+            try:
+                cls.requeue_stale(get_stale_after())
+                # Rows queued since the last sweep were submitted by enqueue
+                queued_before = timezone.now() - timedelta(seconds=get_poll_interval())
+                for text_id in cls.pending_ids(100, queued_before=queued_before):
+                    cls.executor().submit(cls._run_in_thread, text_id)
+            except Exception:
+                logger.exception('Document extraction sweep failed')
+            finally:
+                connections.close_all()
+            time.sleep(get_poll_interval())
+
+    @staticmethod
+    def enqueue(document: Document) -> DocumentText:
+        """(Re)queue ``document`` for extraction and indexing."""
+        text, _ = DocumentText.objects.update_or_create(
+            document=document,
+            defaults={'status': 'queued', 'error': '', 'queued_at': timezone.now(), 'started_at': None},
+        )
+
+        mode = get_extraction_mode()
+        if mode == 'inline':
+            DocumentTextPipeline.run_job(text.id)
+            text.refresh_from_db()
+        elif mode == 'thread':
+            # Wait for the row to be committed before a thread can see it
+            transaction.on_commit(
+                lambda: DocumentTextPipeline.executor().submit(DocumentTextPipeline._run_in_thread, text.id)
+            )
+            DocumentTextPipeline.start_poller()
+        return text
+
+    @staticmethod
+    def queue_missing() -> int:
+        """Queue every document that has no extracted text yet, e.g. after a restore."""
+        now = timezone.now()
+        missing = Document.objects.filter(text__isnull=True).values_list('id', flat=True)
+        created = DocumentText.objects.bulk_create(
+            [DocumentText(document_id=document_id, queued_at=now) for document_id in missing.iterator()],
+            batch_size=500,
+        )
+        return len(created)
+
+    @staticmethod
+    def _run_in_thread(text_id: int) -> int:
+        close_old_connections()
+        try:
+            return int(DocumentTextPipeline.run_job(text_id))
+        except Exception:
+            logger.exception('Document extraction %s crashed', text_id)
+            return 0
+        finally:
+            connections.close_all()
+
+    @staticmethod
+    def claim(text_id: int) -> Optional[datetime]:
+        """
+        Move a queued extraction to running and return the ``started_at``
+        that identifies this run; None if another worker got it first.
+        """
+        started_at = timezone.now()
+        claimed = DocumentText.objects.filter(id=text_id, status='queued').update(
+            status='running',
+            started_at=started_at,
+        )
+        return started_at if claimed else None
+
+    @staticmethod
+    def extract(document: Document) -> Tuple[str, str, str]:
+        """(status, text, error) for the file of ``document``."""
+        storage, name = document.file.storage, document.file.name
+        if not name or not storage.exists(name):
+            return 'failed', '', 'File not found'
+        if document.blob_id:
+            # Same content as a document already extracted
+            known = DocumentText.objects.filter(document__blob_id=document.blob_id, status='done').exclude(
+                document_id=document.id
+            ).values_list('content', flat=True).first()
+            if known is not None:
+                return 'done', known, ''
+        if storage.size(name) > get_max_bytes():
+            return 'skipped', '', f'Larger than {get_max_bytes()} bytes'
+        with storage.open(name, 'rb') as handle:
+            data = handle.read()
+        content = extract_text(document.original_filename or name, data)
+        if content is None:
+            return 'skipped', '', 'Unsupported file type'
+        return 'done', re.sub(r'[ \t]+', ' ', content.replace('\x00', '')).strip()[:get_max_chars()], ''
+
+    @staticmethod
+    def run_job(text_id: int) -> bool:
+        """Extract one document's text and rebuild its search terms."""
+        from .search import DocumentSearchService
+        started_at = DocumentTextPipeline.claim(text_id)
+        if started_at is None:
+            return False
+
+        text = DocumentText.objects.select_related('document').get(id=text_id)
+        document = text.document
+        try:
+            status, content, error = DocumentTextPipeline.extract(document)
+        except Exception as e:
+            logger.exception('Text extraction of document %s failed', document.id)
+            status, content, error = 'failed', '', str(e)
+
+        with transaction.atomic():
+            # Only the run that still owns the row finishes it; a requeue or a
+            # newer claim resets started_at, and that run indexes the current file
+            finished = DocumentText.objects.filter(
+                id=text_id, status='running', started_at=started_at,
+            ).update(
+                status=status, content=content, error=error,
+                attempts=text.attempts + 1, finished_at=timezone.now(),
+            )
+            if finished:
+                DocumentSearchService.index_document(document, content)
+        return True
+
+    @staticmethod
+    def pending_ids(limit: int, queued_before=None) -> List[int]:
+        """Ids of queued extractions, oldest first, optionally only those queued before a time."""
+        texts = DocumentText.objects.filter(status='queued')
+        if queued_before is not None:
+            texts = texts.filter(queued_at__lt=queued_before)
+        return list(texts.order_by('queued_at', 'id').values_list('id', flat=True)[:limit])
+
+    @staticmethod
+    def run_pending(limit: int = 20) -> int:
+        """Run up to ``limit`` queued extractions on the thread pool; returns how many ran."""
+        executor = DocumentTextPipeline.executor()
+        return sum(executor.map(DocumentTextPipeline._run_in_thread, DocumentTextPipeline.pending_ids(limit)))
+
+    @staticmethod
+    def requeue_stale(older_than: timedelta) -> int:
+        """Put back extractions whose worker died while running them."""
+        return DocumentText.objects.filter(
+            status='running',
+            started_at__lt=timezone.now() - older_than,
+        ).update(status='queued')
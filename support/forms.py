@@ -1,5 +1,5 @@
 from django import forms
-from .models import SupportTicket, ServiceRequest, ServiceSchedule
+from .models import SupportTicket, ServiceRequest, ServiceSchedule, Document
 from django.utils import timezone
 
 
@@ -180,3 +180,14 @@ class ServiceScheduleForm(forms.ModelForm):
         if duration and duration < 15:
             raise forms.ValidationError('Estimated duration must be at least 15 minutes.')
         return duration
+
+
+class DocumentForm(forms.ModelForm):
+    """Form for the details of a document whose file arrived as a chunked upload."""
+    
+    class Meta:
+        model = Document
+        fields = [
+            'title', 'document_type', 'customer', 'related_order',
+            'related_ticket', 'related_service', 'description'
+        ]
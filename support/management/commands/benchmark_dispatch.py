@@ -0,0 +1,121 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import date, time as clock_time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from support.dispatch import DEFAULT_DURATIONS, DispatchService
+from support.models import ServiceRequest, TechnicianServiceArea
+
+User = get_user_model()
+
+CITIES = ['Casablanca', 'Rabat', 'Marrakech', 'Fes', 'Tanger', 'Agadir', 'Meknes', 'Oujda']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the batch service dispatcher on synthetic requests and technicians'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Service requests to dispatch')
+        parser.add_argument('--technicians', type=int, default=60, help='Technicians across all cities')
+        parser.add_argument('--cities', type=int, default=6, help=f'Number of cities (max {len(CITIES)})')
+        parser.add_argument('--runs', type=int, default=5, help='Solver-only runs to average')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark data instead of rolling back')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        cities = CITIES[:max(1, min(options['cities'], len(CITIES)))]
+        requests, technicians = self.synthetic(rng, options['requests'], options['technicians'], cities)
+
+        # Solver alone, on in-memory data
+        timings = []
+        for _ in range(options['runs']):
+            plan = DispatchService.solve(requests, technicians, {}, date.today())
+            timings.append(plan.solve_seconds)
+
+        self.stdout.write(f'Dispatching {len(requests)} requests over {options["technicians"]} technicians in {len(cities)} cities')
+        self.stdout.write('=' * 50)
+        self.stdout.write(f'Solver (median of {options["runs"]}): {statistics.median(timings) * 1000:.1f} ms')
+        self.stdout.write(f'Assigned / unassigned:  {len(plan.assignments)} / {len(plan.unassigned)}')
+        loads = sorted(plan.load.values())
+        if loads:
+            self.stdout.write(f'Booked minutes per technician: min {loads[0]}, median {statistics.median(loads):.0f}, max {loads[-1]}')
+
+        # Full run against the database: load, solve, write in one transaction
+        try:
+            with transaction.atomic():
+                elapsed, plan = self.run_database(rng, options['requests'], options['technicians'], cities)
+                if not options['keep']:
+                    raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(f'Database run:           {elapsed * 1000:.1f} ms '
+                          f'(solve {plan.solve_seconds * 1000:.1f} ms, write {plan.write_seconds * 1000:.1f} ms)')
+        if elapsed < 1:
+            self.stdout.write(self.style.SUCCESS('Under one second per run.'))
+        else:
+            self.stdout.write(self.style.WARNING('Slower than one second per run.'))
+
+    def synthetic(self, rng, request_count, technician_count, cities):
+        """Requests as returned by pending_requests() and a city -> technicians map."""
+        technicians = {city.lower(): [] for city in cities}
+        for technician_id in range(1, technician_count + 1):
+            technicians[rng.choice(cities).lower()].append(technician_id)
+        requests = [
+            {
+                'id': request_id,
+                'service_city': rng.choice(cities),
+                'service_type': rng.choice(list(DEFAULT_DURATIONS)),
+                'preferred_time': clock_time(rng.randint(8, 16), rng.choice((0, 30))),
+            }
+            for request_id in range(1, request_count + 1)
+        ]
+        return requests, technicians
+
+    def run_database(self, rng, request_count, technician_count, cities):
+        """Create the synthetic data for a free day and time DispatchService.dispatch()."""
+        run = uuid.uuid4().hex[:6]
+        customer, _ = User.objects.get_or_create(
+            email='benchmark@keyreport.ma',
+            defaults={'first_name': 'Benchmark', 'last_name': 'User'}
+        )
+        staff = User.objects.bulk_create([
+            User(email=f'tech-{run}-{i}@keyreport.ma', user_type='staff')
+            for i in range(technician_count)
+        ])
+        TechnicianServiceArea.objects.bulk_create([
+            TechnicianServiceArea(technician=technician, city=rng.choice(cities))
+            for technician in staff
+        ])
+        day = date.today() + timedelta(days=365 + rng.randint(0, 300))
+        ServiceRequest.objects.bulk_create([
+            ServiceRequest(
+                request_number=f'BENCH-{run}-{i:05d}',
+                customer=customer,
+                service_type=rng.choice(list(DEFAULT_DURATIONS)),
+                title='Benchmark service',
+                description='Benchmark service',
+                status='pending',
+                service_address='Benchmark address',
+                service_city=rng.choice(cities),
+                service_state='Benchmark',
+                service_zip_code='00000',
+                preferred_date=day,
+                preferred_time=clock_time(rng.randint(8, 16), rng.choice((0, 30))),
+            )
+            for i in range(request_count)
+        ])
+
+        start = time.perf_counter()
+        plan = DispatchService.dispatch(day)
+        return time.perf_counter() - start, plan
+
+
+class _Rollback(Exception):
+    """Used to discard the benchmark data."""
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from support.uploads import ChunkedUploadService, DocumentBlobService
+
+
+class Command(BaseCommand):
+    help = 'Move documents onto deduplicated storage, expire stale uploads and delete unreferenced blobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-prune', action='store_true', help='Keep blobs no document refers to')
+
+    def handle(self, *args, **options):
+        moved, deleted = DocumentBlobService.deduplicate()
+        expired = ChunkedUploadService.expire()
+        pruned = 0 if options['no_prune'] else DocumentBlobService.prune()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Moved {moved} documents to deduplicated storage ({deleted} duplicate files deleted), '
+                f'expired {expired} uploads, pruned {pruned} blobs.'
+            )
+        )
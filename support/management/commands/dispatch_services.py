@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from support.dispatch import DispatchService
+from support.scheduling import SchedulingConflict
+
+
+class Command(BaseCommand):
+    help = "Assign a day's pending service requests to technicians"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Day to dispatch (YYYY-MM-DD, default: tomorrow)')
+        parser.add_argument('--dry-run', action='store_true', help='Show the plan without writing schedules')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                day = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be YYYY-MM-DD')
+        else:
+            day = timezone.localdate() + timedelta(days=1)
+
+        try:
+            plan = DispatchService.dispatch(day, dry_run=options['dry_run'])
+        except SchedulingConflict as e:
+            raise CommandError(f'{e}; nothing was written, run the dispatch again')
+
+        for assignment in sorted(plan.assignments, key=lambda a: (a.technician_id, a.start)):
+            self.stdout.write(
+                f'  request {assignment.request_id:>6} -> technician {assignment.technician_id:>4} '
+                f'at {assignment.start_time:%H:%M} ({assignment.duration} min)'
+            )
+        for request_id, reason in plan.unassigned.items():
+            self.stdout.write(self.style.WARNING(f'  request {request_id:>6} not assigned: {reason}'))
+
+        self.stdout.write('=' * 50)
+        self.stdout.write(f'Day:          {day}')
+        self.stdout.write(f'Assigned:     {len(plan.assignments)}')
+        self.stdout.write(f'Unassigned:   {len(plan.unassigned)}')
+        self.stdout.write(f'Solve time:   {plan.solve_seconds * 1000:.1f} ms')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run: no schedules written.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Write time:   {plan.write_seconds * 1000:.1f} ms'))
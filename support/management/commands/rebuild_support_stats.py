@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from support.metrics import SupportMetricsService
+
+
+class Command(BaseCommand):
+    help = 'Recompute ticket SLA timings and the daily support statistics from tickets and responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Tickets read and updated per batch')
+
+    def handle(self, *args, **options):
+        tickets = SupportMetricsService.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt support statistics from {tickets} tickets.')
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from support.ticket_service import TicketCounterService
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-status and per-priority ticket counters from the tickets table'
+
+    def handle(self, *args, **options):
+        rows = TicketCounterService.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {rows} ticket counters.')
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from support.search import TicketSearchService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of support tickets and their responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows read per query')
+
+    def handle(self, *args, **options):
+        tickets = TicketSearchService.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {tickets} tickets for search.')
+        )
@@ -0,0 +1,41 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from support.extraction import DocumentTextPipeline
+
+
+class Command(BaseCommand):
+    help = 'Extract and index the text of queued documents on a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the queued extractions once and exit')
+        parser.add_argument('--queue-missing', action='store_true', help='First queue documents never extracted')
+        parser.add_argument('--batch', type=int, default=20, help='Extractions to claim per poll')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=600, help='Requeue running extractions older than this many seconds')
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(seconds=options['stale_after'])
+
+        if options['queue_missing']:
+            queued = DocumentTextPipeline.queue_missing()
+            self.stdout.write(f'Queued {queued} documents')
+
+        requeued = DocumentTextPipeline.requeue_stale(stale_after)
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale extractions'))
+
+        while True:
+            close_old_connections()
+            processed = DocumentTextPipeline.run_pending(options['batch'])
+            if processed:
+                self.stdout.write(f'Extracted {processed} documents')
+
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['sleep'])
+                DocumentTextPipeline.requeue_stale(stale_after)
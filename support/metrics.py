@@ -0,0 +1,271 @@
+"""
+Support metrics for KeyReport IT Store
+Maintains per-ticket SLA timings and daily per-agent, per-type rollups for the support dashboard
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import SupportDailyStat, SupportTicket, TicketResponse
+
+logger = logging.getLogger(__name__)
+
+# A ticket in one of these statuses counts as resolved
+RESOLVED_STATUSES = ('resolved', 'closed')
+
+# priority -> (first response, resolution) targets in hours
+DEFAULT_SLA_TARGETS = {
+    'urgent': (1, 8),
+    'high': (4, 24),
+    'medium': (8, 72),
+    'low': (24, 120),
+}
+
+STAT_FIELDS = (
+    'tickets_created', 'first_responses', 'first_response_seconds', 'first_response_breaches',
+    'tickets_resolved', 'resolution_seconds', 'resolution_breaches',
+)
+
+# (+1 resolved / -1 reopened, resolved_at, resolution seconds, resolving agent id)
+Resolution = Tuple[int, datetime, int, Optional[int]]
+
+
+def get_sla_targets() -> Dict[str, Tuple[int, int]]:
+    return {**DEFAULT_SLA_TARGETS, **getattr(settings, 'SUPPORT_SLA_TARGETS', {})}
+
+
+def elapsed_seconds(start: datetime, end: datetime) -> int:
+    return max(0, int((end - start).total_seconds()))
+
+
+def breached(priority: str, seconds: int, target: int) -> int:
+    """1 if ``seconds`` exceeds the first response (0) or resolution (1) target of ``priority``."""
+    hours = get_sla_targets().get(priority, DEFAULT_SLA_TARGETS['medium'])[target]
+    return int(seconds > hours * 3600)
+
+
+class SupportMetricsService:
+    """Service class to maintain and read support SLA statistics."""
+
+    @staticmethod
+    def _add(day: date, agent_id: Optional[int], ticket_type: str, **deltas) -> None:
+        """Add ``deltas`` to one rollup row, creating it on first use."""
+        rows = SupportDailyStat.objects.filter(day=day, agent_id=agent_id, ticket_type=ticket_type)
+        if rows.update(**{name: F(name) + value for name, value in deltas.items()}):
+            return
+        try:
+            with transaction.atomic():
+                SupportDailyStat.objects.create(day=day, agent_id=agent_id, ticket_type=ticket_type, **deltas)
+        except IntegrityError:
+            # Another request created the row first
+            rows.update(**{name: F(name) + value for name, value in deltas.items()})
+
+    @staticmethod
+    def track_status(ticket: SupportTicket, previous) -> Optional[Resolution]:
+        """
+        Called before a ticket is saved: stamp or clear the resolution
+        fields when the status enters or leaves resolved/closed.
+
+        ``previous`` is the (customer, status, priority) the ticket was
+        loaded with, None for a new ticket. Returns the change to apply
+        to the rollups once the ticket is saved; a resolution is credited
+        to the assignee at that moment, and a reopening takes it back from
+        the same agent even if the ticket was reassigned in between.
+        """
+        if 'status' in ticket.get_deferred_fields() or (previous is None and not ticket._state.adding):
+            return None
+        resolved_before = previous is not None and previous[1] in RESOLVED_STATUSES
+        resolved_now = ticket.status in RESOLVED_STATUSES
+
+        if resolved_now and not resolved_before:
+            now = timezone.now()
+            ticket.resolved_at = ticket.resolved_at or now
+            ticket.resolution_seconds = elapsed_seconds(ticket.created_at or now, ticket.resolved_at)
+            ticket.resolved_by_id = ticket.assigned_to_id
+            return 1, ticket.resolved_at, ticket.resolution_seconds, ticket.resolved_by_id
+        if resolved_before and not resolved_now and ticket.resolved_at:
+            change = (-1, ticket.resolved_at, ticket.resolution_seconds or 0, ticket.resolved_by_id)
+            ticket.resolved_at = None
+            ticket.resolution_seconds = None
+            ticket.resolved_by_id = None
+            return change
+        return None
+
+    @staticmethod
+    def record_ticket(ticket: SupportTicket, created: bool, resolution: Optional[Resolution]) -> None:
+        """
+        Called after a ticket is saved: count its creation and (un)resolution.
+
+        Creations are not credited to an agent (``rebuild`` cannot know
+        who a ticket was first assigned to); resolutions go to the agent
+        carried in ``resolution``.
+        """
+        if created:
+            SupportMetricsService._add(
+                timezone.localdate(ticket.created_at), None, ticket.ticket_type, tickets_created=1
+            )
+        if resolution:
+            delta, resolved_at, seconds, agent_id = resolution
+            SupportMetricsService._add(
+                timezone.localdate(resolved_at), agent_id, ticket.ticket_type,
+                tickets_resolved=delta,
+                resolution_seconds=delta * seconds,
+                resolution_breaches=delta * breached(ticket.priority, seconds, 1),
+            )
+
+    @staticmethod
+    def record_response(response: TicketResponse) -> bool:
+        """
+        Record ``response`` as the ticket's first response if it is the
+        first reply by someone other than the customer.
+
+        The conditional UPDATE makes concurrent replies race safely: only
+        one of them sets the fields and is counted in the rollups.
+        """
+        ticket = response.ticket
+        if response.author_id == ticket.customer_id:
+            return False
+        seconds = elapsed_seconds(ticket.created_at, response.created_at)
+        updated = SupportTicket.objects.filter(pk=ticket.pk, first_response_at__isnull=True).update(
+            first_response_at=response.created_at,
+            first_responder_id=response.author_id,
+            first_response_seconds=seconds,
+        )
+        if not updated:
+            return False
+        ticket.first_response_at = response.created_at
+        ticket.first_responder_id = response.author_id
+        ticket.first_response_seconds = seconds
+        SupportMetricsService._add(
+            timezone.localdate(response.created_at), response.author_id, ticket.ticket_type,
+            first_responses=1,
+            first_response_seconds=seconds,
+            first_response_breaches=breached(ticket.priority, seconds, 0),
+        )
+        return True
+
+    @staticmethod
+    def rebuild(chunk_size: int = 1000) -> int:
+        """
+        Recompute every ticket's SLA fields and all rollups from tickets
+        and responses. Returns the number of tickets processed.
+        """
+        first = (
+            TicketResponse.objects.filter(ticket=OuterRef('pk'))
+            .exclude(author=OuterRef('customer'))
+            .order_by('created_at', 'id')
+        )
+        tickets = SupportTicket.objects.annotate(
+            reply_at=Subquery(first.values('created_at')[:1]),
+            reply_by=Subquery(first.values('author')[:1]),
+        ).only(
+            'id', 'ticket_type', 'priority', 'status', 'assigned_to', 'created_at', 'updated_at',
+            'resolved_at', 'resolved_by', 'closed_at',
+        ).order_by('id')
+
+        rollups: Dict[tuple, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+        fields = [
+            'resolved_at', 'resolution_seconds', 'resolved_by',
+            'first_response_at', 'first_responder', 'first_response_seconds',
+        ]
+        batch: List[SupportTicket] = []
+        total = 0
+
+        with transaction.atomic():
+            for ticket in tickets.iterator(chunk_size=chunk_size):
+                total += 1
+                rollups[(timezone.localdate(ticket.created_at), None, ticket.ticket_type)]['tickets_created'] += 1
+
+                ticket.first_response_at, ticket.first_responder_id, ticket.first_response_seconds = None, None, None
+                if ticket.reply_at:
+                    seconds = elapsed_seconds(ticket.created_at, ticket.reply_at)
+                    ticket.first_response_at, ticket.first_responder_id = ticket.reply_at, ticket.reply_by
+                    ticket.first_response_seconds = seconds
+                    row = rollups[(timezone.localdate(ticket.reply_at), ticket.reply_by, ticket.ticket_type)]
+                    row['first_responses'] += 1
+                    row['first_response_seconds'] += seconds
+                    row['first_response_breaches'] += breached(ticket.priority, seconds, 0)
+
+                if ticket.status in RESOLVED_STATUSES:
+                    ticket.resolved_at = ticket.resolved_at or ticket.closed_at or ticket.updated_at
+                    seconds = elapsed_seconds(ticket.created_at, ticket.resolved_at)
+                    ticket.resolution_seconds = seconds
+                    # Tickets resolved before resolved_by existed go to their assignee
+                    ticket.resolved_by_id = ticket.resolved_by_id or ticket.assigned_to_id
+                    row = rollups[(timezone.localdate(ticket.resolved_at), ticket.resolved_by_id, ticket.ticket_type)]
+                    row['tickets_resolved'] += 1
+                    row['resolution_seconds'] += seconds
+                    row['resolution_breaches'] += breached(ticket.priority, seconds, 1)
+                else:
+                    ticket.resolved_at, ticket.resolution_seconds, ticket.resolved_by_id = None, None, None
+
+                batch.append(ticket)
+                if len(batch) >= chunk_size:
+                    SupportTicket.objects.bulk_update(batch, fields)
+                    batch = []
+            SupportTicket.objects.bulk_update(batch, fields)
+
+            SupportDailyStat.objects.all().delete()
+            SupportDailyStat.objects.bulk_create([
+                SupportDailyStat(day=day, agent_id=agent_id, ticket_type=ticket_type, **values)
+                for (day, agent_id, ticket_type), values in rollups.items()
+            ], batch_size=500)
+
+        logger.info('Rebuilt support metrics from %s tickets (%s rollup rows)', total, len(rollups))
+        return total
+
+    @staticmethod
+    def _averages(row: dict) -> dict:
+        """Add average hours and breach rates to a row of summed stats."""
+        row['avg_first_response_hours'] = (
+            row['first_response_seconds'] / row['first_responses'] / 3600 if row['first_responses'] else None
+        )
+        row['avg_resolution_hours'] = (
+            row['resolution_seconds'] / row['tickets_resolved'] / 3600 if row['tickets_resolved'] else None
+        )
+        responses_and_resolutions = row['first_responses'] + row['tickets_resolved']
+        row['breach_rate'] = (
+            (row['first_response_breaches'] + row['resolution_breaches']) * 100 / responses_and_resolutions
+            if responses_and_resolutions else None
+        )
+        return row
+
+    @staticmethod
+    def summary(since: date, until: date) -> dict:
+        """
+        Dashboard figures for ``since``..``until`` (inclusive), read from
+        the rollups only: totals, per agent, per ticket type and per day.
+        """
+        stats = SupportDailyStat.objects.filter(day__range=(since, until)).order_by()
+        sums = {name: Sum(name) for name in STAT_FIELDS}
+
+        def rows(queryset):
+            return [
+                SupportMetricsService._averages({**row, **{name: row[name] or 0 for name in STAT_FIELDS}})
+                for row in queryset
+            ]
+
+        type_labels = dict(SupportTicket.TICKET_TYPE_CHOICES)
+        by_type = rows(stats.values('ticket_type').annotate(**sums).order_by('ticket_type'))
+        for row in by_type:
+            row['label'] = type_labels.get(row['ticket_type'], row['ticket_type'])
+
+        totals = stats.aggregate(**sums)
+        return {
+            'since': since,
+            'until': until,
+            'totals': SupportMetricsService._averages({name: totals[name] or 0 for name in STAT_FIELDS}),
+            'by_agent': rows(
+                stats.values('agent_id', 'agent__email', 'agent__first_name', 'agent__last_name')
+                .annotate(**sums).order_by('-tickets_resolved', '-first_responses')
+            ),
+            'by_type': by_type,
+            'daily': rows(stats.values('day').annotate(**sums).order_by('day')),
+        }
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    """Count the existing tickets per customer, status and priority."""
+    SupportTicket = apps.get_model('support', 'SupportTicket')
+    TicketCounter = apps.get_model('support', 'TicketCounter')
+    totals = {}
+    rows = SupportTicket.objects.values('customer_id', 'status', 'priority').annotate(n=Count('id')).order_by()
+    for row in rows:
+        for scope in ('all', str(row['customer_id'])):
+            key = (scope, row['status'], row['priority'])
+            totals[key] = totals.get(key, 0) + row['n']
+    TicketCounter.objects.bulk_create([
+        TicketCounter(scope=scope, status=status, priority=priority, count=count)
+        for (scope, status, priority), count in totals.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(help_text="'all' or a customer id", max_length=20, verbose_name='Scope')),
+                ('status', models.CharField(choices=[('open', 'Open'), ('in_progress', 'In Progress'), ('waiting_customer', 'Waiting for Customer'), ('resolved', 'Resolved'), ('closed', 'Closed')], max_length=20, verbose_name='Status')),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('urgent', 'Urgent')], max_length=20, verbose_name='Priority')),
+                ('count', models.IntegerField(default=0, verbose_name='Count')),
+            ],
+            options={
+                'verbose_name': 'Ticket Counter',
+                'verbose_name_plural': 'Ticket Counters',
+                'ordering': ['scope', 'status', 'priority'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='supportticket',
+            index=models.Index(fields=['status', 'priority', 'created_at'], name='support_sup_status_0ed72f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supportticket',
+            index=models.Index(fields=['customer', 'status', 'priority', 'created_at'], name='support_sup_custome_97418c_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ticketcounter',
+            unique_together={('scope', 'status', 'priority')},
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:14
+
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Frozen copy of the support.search tokeniser as it was when the index was
+# added; later changes to it are applied with rebuild_ticket_search.
+TITLE_WEIGHT = 3
+
+STOP_WORDS = frozenset("""
+    a an and are as at be but by for from has have i in is it its my no not of on or so
+    that the this to was we with you your
+    au aux avec ce ces dans de des du elle en est et il ils je la le les leur mais me mon
+    ne nous on ou par pas pour qu que qui sa se ses son sur ta te tu un une vos votre vous
+""".split())
+
+
+def term_weights(*fields):
+    weights = Counter()
+    for text, weight in fields:
+        text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().lower()
+        for word in re.findall(r'[a-z0-9]+', text):
+            if len(word) < 2 or word in STOP_WORDS:
+                continue
+            if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+                word = word[:-1]
+            weights[word[:40]] += weight
+    return weights
+
+
+def index_existing(apps, schema_editor):
+    """Index the tickets and responses created before search existed."""
+    SupportTicket = apps.get_model('support', 'SupportTicket')
+    TicketResponse = apps.get_model('support', 'TicketResponse')
+    TicketSearchTerm = apps.get_model('support', 'TicketSearchTerm')
+    postings = []
+    for ticket_id, title, description in SupportTicket.objects.values_list('id', 'title', 'description').iterator():
+        for term, weight in term_weights((title, TITLE_WEIGHT), (description, 1)).items():
+            postings.append(TicketSearchTerm(ticket_id=ticket_id, term=term, weight=weight))
+        if len(postings) >= 10000:
+            TicketSearchTerm.objects.bulk_create(postings, batch_size=1000)
+            postings = []
+    responses = TicketResponse.objects.values_list('id', 'ticket_id', 'message', 'is_internal')
+    for response_id, ticket_id, message, is_internal in responses.iterator():
+        for term, weight in term_weights((message, 1)).items():
+            postings.append(TicketSearchTerm(
+                ticket_id=ticket_id, response_id=response_id, term=term, weight=weight, is_internal=is_internal
+            ))
+        if len(postings) >= 10000:
+            TicketSearchTerm.objects.bulk_create(postings, batch_size=1000)
+            postings = []
+    TicketSearchTerm.objects.bulk_create(postings, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0002_ticket_list_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=40, verbose_name='Term')),
+                ('weight', models.PositiveIntegerField(default=1, verbose_name='Weight')),
+                ('is_internal', models.BooleanField(default=False, verbose_name='Internal Note')),
+                ('response', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='support.ticketresponse', verbose_name='Response')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='support.supportticket', verbose_name='Ticket')),
+            ],
+            options={
+                'verbose_name': 'Ticket Search Term',
+                'verbose_name_plural': 'Ticket Search Terms',
+                'indexes': [models.Index(fields=['term', 'ticket'], name='support_tic_term_ff8ded_idx'), models.Index(fields=['ticket', 'response'], name='support_tic_ticket__494e25_idx')],
+            },
+        ),
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('support', '0003_ticketsearchterm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TechnicianServiceArea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=100, verbose_name='City')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Active')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Technician Service Area',
+                'verbose_name_plural': 'Technician Service Areas',
+                'ordering': ['city', 'technician'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='serviceschedule',
+            index=models.Index(fields=['technician', 'scheduled_date', 'scheduled_time'], name='support_ser_technic_1da247_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serviceschedule',
+            index=models.Index(fields=['scheduled_date'], name='support_ser_schedul_065c2b_idx'),
+        ),
+        migrations.AddField(
+            model_name='technicianservicearea',
+            name='technician',
+            field=models.ForeignKey(limit_choices_to={'user_type__in': ['staff', 'admin']}, on_delete=django.db.models.deletion.CASCADE, related_name='service_areas', to=settings.AUTH_USER_MODEL, verbose_name='Technician'),
+        ),
+        migrations.AddIndex(
+            model_name='technicianservicearea',
+            index=models.Index(fields=['city', 'is_active'], name='support_tec_city_f0e64b_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='technicianservicearea',
+            unique_together={('technician', 'city')},
+        ),
+    ]
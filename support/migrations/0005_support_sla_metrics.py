@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('support', '0004_technician_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supportticket',
+            name='first_responder',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='first_responses', to=settings.AUTH_USER_MODEL, verbose_name='First Responder'),
+        ),
+        migrations.AddField(
+            model_name='supportticket',
+            name='first_response_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='First Response At'),
+        ),
+        migrations.AddField(
+            model_name='supportticket',
+            name='first_response_seconds',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='First Response Time (s)'),
+        ),
+        migrations.AddField(
+            model_name='supportticket',
+            name='resolution_seconds',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Resolution Time (s)'),
+        ),
+        migrations.CreateModel(
+            name='SupportDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Day')),
+                ('ticket_type', models.CharField(choices=[('technical', 'Technical Issue'), ('billing', 'Billing Question'), ('product', 'Product Support'), ('service', 'Service Request'), ('general', 'General Inquiry')], max_length=20, verbose_name='Ticket Type')),
+                ('tickets_created', models.IntegerField(default=0, verbose_name='Tickets Created')),
+                ('first_responses', models.IntegerField(default=0, verbose_name='First Responses')),
+                ('first_response_seconds', models.BigIntegerField(default=0, verbose_name='First Response Time (s)')),
+                ('first_response_breaches', models.IntegerField(default=0, verbose_name='First Response SLA Breaches')),
+                ('tickets_resolved', models.IntegerField(default=0, verbose_name='Tickets Resolved')),
+                ('resolution_seconds', models.BigIntegerField(default=0, verbose_name='Resolution Time (s)')),
+                ('resolution_breaches', models.IntegerField(default=0, verbose_name='Resolution SLA Breaches')),
+                ('agent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='support_stats', to=settings.AUTH_USER_MODEL, verbose_name='Agent')),
+            ],
+            options={
+                'verbose_name': 'Support Daily Stat',
+                'verbose_name_plural': 'Support Daily Stats',
+                'ordering': ['-day', 'agent', 'ticket_type'],
+                'indexes': [models.Index(fields=['agent', 'day'], name='support_sup_agent_i_dbe5d2_idx'), models.Index(fields=['ticket_type', 'day'], name='support_sup_ticket__333560_idx')],
+                'unique_together': {('day', 'agent', 'ticket_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('support', '0005_support_sla_metrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('file', models.FileField(max_length=255, upload_to='documents/blobs/', verbose_name='Stored File')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Size (bytes)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Document Blob',
+                'verbose_name_plural': 'Document Blobs',
+            },
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='original_filename',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Original Filename'),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=models.FileField(max_length=255, upload_to='documents/', verbose_name='Document File'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='documents', to='support.documentblob', verbose_name='Stored Content'),
+        ),
+        migrations.CreateModel(
+            name='DocumentUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Upload ID')),
+                ('filename', models.CharField(max_length=255, verbose_name='Filename')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Size (bytes)')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='Declared SHA-256')),
+                ('received', models.PositiveBigIntegerField(default=0, verbose_name='Bytes Received')),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('complete', 'Complete'), ('failed', 'Failed')], default='uploading', max_length=20, verbose_name='Status')),
+                ('error', models.CharField(blank=True, max_length=255, verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('blob', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='uploads', to='support.documentblob', verbose_name='Stored Content')),
+                ('document', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload', to='support.document', verbose_name='Document')),
+                ('uploaded_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_uploads', to=settings.AUTH_USER_MODEL, verbose_name='Uploaded By')),
+            ],
+            options={
+                'verbose_name': 'Document Upload',
+                'verbose_name_plural': 'Document Uploads',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'updated_at'], name='support_doc_status_f9ec12_idx')],
+            },
+        ),
+    ]
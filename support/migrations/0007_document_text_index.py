@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def queue_existing(apps, schema_editor):
+    """Queue existing documents for text extraction; the extractor indexes them."""
+    Document = apps.get_model('support', 'Document')
+    DocumentText = apps.get_model('support', 'DocumentText')
+    now = timezone.now()
+    DocumentText.objects.bulk_create(
+        [DocumentText(document_id=document_id, queued_at=now)
+         for document_id in Document.objects.values_list('id', flat=True).iterator()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0006_document_blobs_and_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('skipped', 'Skipped'), ('failed', 'Failed')], default='queued', max_length=20, verbose_name='Status')),
+                ('content', models.TextField(blank=True, verbose_name='Extracted Text')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('queued_at', models.DateTimeField(verbose_name='Queued At')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started At')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished At')),
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='text', to='support.document', verbose_name='Document')),
+            ],
+            options={
+                'verbose_name': 'Document Text',
+                'verbose_name_plural': 'Document Texts',
+                'indexes': [models.Index(fields=['status', 'queued_at'], name='support_doc_status_d27138_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DocumentSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=40, verbose_name='Term')),
+                ('weight', models.PositiveIntegerField(default=1, verbose_name='Weight')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='support.document', verbose_name='Document')),
+            ],
+            options={
+                'verbose_name': 'Document Search Term',
+                'verbose_name_plural': 'Document Search Terms',
+                'indexes': [models.Index(fields=['term', 'document'], name='support_doc_term_bd6b19_idx')],
+            },
+        ),
+        migrations.RunPython(queue_existing, migrations.RunPython.noop),
+    ]
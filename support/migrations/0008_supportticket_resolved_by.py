@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def credit_resolved_tickets(apps, schema_editor):
+    """Resolved tickets were credited to their assignee; record that as who resolved them."""
+    SupportTicket = apps.get_model('support', 'SupportTicket')
+    SupportTicket.objects.filter(resolved_at__isnull=False).update(resolved_by=models.F('assigned_to'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('support', '0007_document_text_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supportticket',
+            name='resolved_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resolved_tickets', to=settings.AUTH_USER_MODEL, verbose_name='Resolved By'),
+        ),
+        migrations.RunPython(credit_resolved_tickets, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,9 @@
-from django.db import models
+import os
+import uuid
+
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
 from store.models import Product
@@ -66,6 +71,27 @@ class SupportTicket(models.Model):
     resolved_at = models.DateTimeField(blank=True, null=True, verbose_name=_('Resolved At'))
     closed_at = models.DateTimeField(blank=True, null=True, verbose_name=_('Closed At'))
     
+    # SLA, maintained by support.metrics
+    first_response_at = models.DateTimeField(blank=True, null=True, verbose_name=_('First Response At'))
+    first_responder = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='first_responses',
+        verbose_name=_('First Responder')
+    )
+    first_response_seconds = models.PositiveIntegerField(blank=True, null=True, verbose_name=_('First Response Time (s)'))
+    resolution_seconds = models.PositiveIntegerField(blank=True, null=True, verbose_name=_('Resolution Time (s)'))
+    resolved_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='resolved_tickets',
+        verbose_name=_('Resolved By')
+    )
+    
     class Meta:
         verbose_name = _('Support Ticket')
         verbose_name_plural = _('Support Tickets')
@@ -75,11 +101,66 @@ class SupportTicket(models.Model):
             models.Index(fields=['assigned_to', 'status']),
             models.Index(fields=['priority', 'status']),
             models.Index(fields=['ticket_type', 'status']),
+            models.Index(fields=['status', 'priority', 'created_at']),
+            models.Index(fields=['customer', 'status', 'priority', 'created_at']),
         ]
     
     def __str__(self):
         return f"Ticket {self.ticket_number}: {self.title}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the counters were last told about this ticket
+        instance._counted = instance._counter_key()
+        instance._indexed = instance._search_key()
+        return instance
+    
+    def _counter_key(self):
+        """(customer id, status, priority) as counted in TicketCounter, or None if not loaded."""
+        if {'customer_id', 'status', 'priority'} & self.get_deferred_fields():
+            return None
+        return (self.customer_id, self.status, self.priority)
+    
+    def _search_key(self):
+        """(title, description) as last indexed for search, or None if not loaded."""
+        if {'title', 'description'} & self.get_deferred_fields():
+            return None
+        return (self.title, self.description)
+    
+    def save(self, *args, **kwargs):
+        """
+        Save the ticket, move it between status/priority counters,
+        record its SLA figures and reindex changed text, all in one
+        transaction.
+
+        ``QuerySet.update()`` bypasses this; run ``rebuild_ticket_counters``,
+        ``rebuild_ticket_search`` and ``rebuild_support_stats`` after bulk
+        updates of status, priority, customer, title or description.
+        """
+        from .metrics import SupportMetricsService
+        from .search import TicketSearchService
+        from .ticket_service import TicketCounterService
+        with transaction.atomic():
+            previous = getattr(self, '_counted', None)
+            adding = self._state.adding
+            resolution = SupportMetricsService.track_status(self, previous)
+            super().save(*args, **kwargs)
+            SupportMetricsService.record_ticket(self, adding, resolution)
+            current = self._counter_key()
+            if current is not None and current != previous:
+                TicketCounterService.move(previous, current)
+                self._counted = current
+            indexed = self._search_key()
+            if indexed is not None and indexed != getattr(self, '_indexed', None):
+                TicketSearchService.index_ticket(self)
+                self._indexed = indexed
+    
+    def delete(self, *args, **kwargs):
+        """Delete the ticket; counters follow in the same transaction (see ticket_deleted)."""
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+    
     def get_absolute_url(self):
         from django.urls import reverse
         return reverse('support:ticket_detail', kwargs={'pk': self.pk})
@@ -106,6 +187,33 @@ class SupportTicket(models.Model):
         return status_classes.get(self.status, 'secondary')
 
 
+@receiver(post_delete, sender=SupportTicket)
+def ticket_deleted(sender, instance, **kwargs):
+    """Take a deleted ticket off the counters, including tickets deleted by cascade or queryset."""
+    from .ticket_service import TicketCounterService
+    counted = getattr(instance, '_counted', None) or instance._counter_key()
+    if counted is not None:
+        TicketCounterService.move(counted, None)
+
+
+class TicketCounter(models.Model):
+    """Number of tickets per status and priority, kept up to date for the list filter badges."""
+    
+    scope = models.CharField(max_length=20, verbose_name=_('Scope'), help_text=_("'all' or a customer id"))
+    status = models.CharField(max_length=20, choices=SupportTicket.STATUS_CHOICES, verbose_name=_('Status'))
+    priority = models.CharField(max_length=20, choices=SupportTicket.PRIORITY_CHOICES, verbose_name=_('Priority'))
+    count = models.IntegerField(default=0, verbose_name=_('Count'))
+    
+    class Meta:
+        verbose_name = _('Ticket Counter')
+        verbose_name_plural = _('Ticket Counters')
+        ordering = ['scope', 'status', 'priority']
+        unique_together = ['scope', 'status', 'priority']
+    
+    def __str__(self):
+        return f"{self.scope} {self.status}/{self.priority}: {self.count}"
+
+
 class TicketResponse(models.Model):
     """Response to a support ticket."""
     
@@ -122,6 +230,80 @@ class TicketResponse(models.Model):
     
     def __str__(self):
         return f"Response to {self.ticket.ticket_number} by {self.author.email}"
+    
+    def save(self, *args, **kwargs):
+        """Save the response, (re)index its message for search and record a first response."""
+        from .metrics import SupportMetricsService
+        from .search import TicketSearchService
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        TicketSearchService.index_response(self)
+        if adding:
+            SupportMetricsService.record_response(self)
+
+
+class SupportDailyStat(models.Model):
+    """Daily support activity per agent and ticket type, used by the support dashboard."""
+    
+    day = models.DateField(verbose_name=_('Day'))
+    agent = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='support_stats',
+        verbose_name=_('Agent')
+    )
+    ticket_type = models.CharField(max_length=20, choices=SupportTicket.TICKET_TYPE_CHOICES, verbose_name=_('Ticket Type'))
+    
+    tickets_created = models.IntegerField(default=0, verbose_name=_('Tickets Created'))
+    first_responses = models.IntegerField(default=0, verbose_name=_('First Responses'))
+    first_response_seconds = models.BigIntegerField(default=0, verbose_name=_('First Response Time (s)'))
+    first_response_breaches = models.IntegerField(default=0, verbose_name=_('First Response SLA Breaches'))
+    tickets_resolved = models.IntegerField(default=0, verbose_name=_('Tickets Resolved'))
+    resolution_seconds = models.BigIntegerField(default=0, verbose_name=_('Resolution Time (s)'))
+    resolution_breaches = models.IntegerField(default=0, verbose_name=_('Resolution SLA Breaches'))
+    
+    class Meta:
+        verbose_name = _('Support Daily Stat')
+        verbose_name_plural = _('Support Daily Stats')
+        ordering = ['-day', 'agent', 'ticket_type']
+        unique_together = ['day', 'agent', 'ticket_type']
+        indexes = [
+            models.Index(fields=['agent', 'day']),
+            models.Index(fields=['ticket_type', 'day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.agent or '-'} {self.ticket_type}"
+
+
+class TicketSearchTerm(models.Model):
+    """Inverted index entry: a term of a ticket's title/description or of one of its responses."""
+    
+    ticket = models.ForeignKey(SupportTicket, on_delete=models.CASCADE, related_name='search_terms', verbose_name=_('Ticket'))
+    response = models.ForeignKey(
+        TicketResponse,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='search_terms',
+        verbose_name=_('Response')
+    )
+    term = models.CharField(max_length=40, verbose_name=_('Term'))
+    weight = models.PositiveIntegerField(default=1, verbose_name=_('Weight'))
+    is_internal = models.BooleanField(default=False, verbose_name=_('Internal Note'))
+    
+    class Meta:
+        verbose_name = _('Ticket Search Term')
+        verbose_name_plural = _('Ticket Search Terms')
+        indexes = [
+            models.Index(fields=['term', 'ticket']),
+            models.Index(fields=['ticket', 'response']),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} -> {self.ticket_id}"
 
 
 class ServiceRequest(models.Model):
@@ -237,9 +419,70 @@ class ServiceSchedule(models.Model):
         verbose_name = _('Service Schedule')
         verbose_name_plural = _('Service Schedules')
         ordering = ['scheduled_date', 'scheduled_time']
+        indexes = [
+            models.Index(fields=['technician', 'scheduled_date', 'scheduled_time']),
+            models.Index(fields=['scheduled_date']),
+        ]
     
     def __str__(self):
         return f"Service {self.service_request.request_number} scheduled for {self.scheduled_date} at {self.scheduled_time}"
+    
+    def clean(self):
+        """Reject a schedule that overlaps another booking of the same technician."""
+        from django.core.exceptions import ValidationError
+        from .scheduling import SchedulingService
+        if self.technician_id and self.scheduled_date and self.scheduled_time and self.estimated_duration:
+            conflicts = SchedulingService.conflicts(
+                self.technician_id, self.scheduled_date, self.scheduled_time,
+                self.estimated_duration, exclude_id=self.pk
+            )
+            if conflicts:
+                raise ValidationError(_('The technician is already booked at that time (%(service)s).') % {
+                    'service': conflicts[0].service_request.request_number,
+                })
+
+
+class TechnicianServiceArea(models.Model):
+    """City a technician can be sent to for on-site services."""
+    
+    technician = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='service_areas',
+        verbose_name=_('Technician'),
+        limit_choices_to={'user_type__in': ['staff', 'admin']}
+    )
+    city = models.CharField(max_length=100, verbose_name=_('City'))
+    is_active = models.BooleanField(default=True, verbose_name=_('Active'))
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Technician Service Area')
+        verbose_name_plural = _('Technician Service Areas')
+        ordering = ['city', 'technician']
+        unique_together = ['technician', 'city']
+        indexes = [
+            models.Index(fields=['city', 'is_active']),
+        ]
+    
+    def __str__(self):
+        return f"{self.technician} - {self.city}"
+
+
+class DocumentBlob(models.Model):
+    """Stored document content, kept once per distinct SHA-256."""
+    
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name=_('SHA-256'))
+    file = models.FileField(upload_to='documents/blobs/', max_length=255, verbose_name=_('Stored File'))
+    size = models.PositiveBigIntegerField(verbose_name=_('Size (bytes)'))
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Document Blob')
+        verbose_name_plural = _('Document Blobs')
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.size} bytes)"
 
 
 class Document(models.Model):
@@ -256,7 +499,16 @@ class Document(models.Model):
     
     title = models.CharField(max_length=200, verbose_name=_('Document Title'))
     document_type = models.CharField(max_length=20, choices=DOCUMENT_TYPE_CHOICES, verbose_name=_('Document Type'))
-    file = models.FileField(upload_to='documents/', verbose_name=_('Document File'))
+    file = models.FileField(upload_to='documents/', max_length=255, verbose_name=_('Document File'))
+    blob = models.ForeignKey(
+        DocumentBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='documents',
+        verbose_name=_('Stored Content')
+    )
+    original_filename = models.CharField(max_length=255, blank=True, verbose_name=_('Original Filename'))
     
     # Related objects
     customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='documents', verbose_name=_('Customer'))
@@ -298,6 +550,39 @@ class Document(models.Model):
     def __str__(self):
         return f"{self.get_document_type_display()}: {self.title}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._indexed = instance._search_key()
+        return instance
+    
+    def _search_key(self):
+        """(file, title, description) as last queued for text extraction, or None if not loaded."""
+        if {'file', 'title', 'description'} & self.get_deferred_fields():
+            return None
+        return (self.file.name, self.title, self.description)
+    
+    def save(self, *args, **kwargs):
+        """Save the document, storing a newly attached file once per distinct content and queueing text extraction."""
+        from .extraction import DocumentTextPipeline
+        if self.file and not self.file._committed:
+            from .uploads import DocumentBlobService
+            self.original_filename = os.path.basename(self.file.name)
+            self.blob = DocumentBlobService.store(self.file, self.original_filename)
+            self.file = self.blob.file.name
+        super().save(*args, **kwargs)
+        indexed = self._search_key()
+        if indexed is not None and indexed != getattr(self, '_indexed', None):
+            DocumentTextPipeline.enqueue(self)
+            self._indexed = indexed
+    
+    @property
+    def download_filename(self):
+        """Name offered to the browser; stored files are named by their hash."""
+        if self.original_filename:
+            return self.original_filename
+        return os.path.basename(self.file.name) if self.file else ''
+    
     def get_absolute_url(self):
         from django.urls import reverse
         return reverse('support:document_detail', kwargs={'pk': self.pk})
@@ -315,3 +600,103 @@ class Document(models.Model):
         if self.file:
             return round(self.file.size / (1024 * 1024), 2)
         return 0
+
+
+class DocumentUpload(models.Model):
+    """Resumable chunked upload of one document file."""
+    
+    STATUS_CHOICES = [
+        ('uploading', _('Uploading')),
+        ('complete', _('Complete')),
+        ('failed', _('Failed')),
+    ]
+    
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False, verbose_name=_('Upload ID'))
+    uploaded_by = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='document_uploads', verbose_name=_('Uploaded By')
+    )
+    filename = models.CharField(max_length=255, verbose_name=_('Filename'))
+    size = models.PositiveBigIntegerField(verbose_name=_('Size (bytes)'))
+    sha256 = models.CharField(max_length=64, blank=True, verbose_name=_('Declared SHA-256'))
+    received = models.PositiveBigIntegerField(default=0, verbose_name=_('Bytes Received'))
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading', verbose_name=_('Status'))
+    error = models.CharField(max_length=255, blank=True, verbose_name=_('Error'))
+    blob = models.ForeignKey(
+        DocumentBlob,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='uploads',
+        verbose_name=_('Stored Content')
+    )
+    document = models.OneToOneField(
+        Document,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload',
+        verbose_name=_('Document')
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Document Upload')
+        verbose_name_plural = _('Document Uploads')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} bytes)"
+
+
+class DocumentText(models.Model):
+    """Text extracted from a document's file, and the extraction job that produces it."""
+    
+    STATUS_CHOICES = [
+        ('queued', _('Queued')),
+        ('running', _('Running')),
+        ('done', _('Done')),
+        ('skipped', _('Skipped')),
+        ('failed', _('Failed')),
+    ]
+    
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='text', verbose_name=_('Document'))
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', verbose_name=_('Status'))
+    content = models.TextField(blank=True, verbose_name=_('Extracted Text'))
+    error = models.TextField(blank=True, verbose_name=_('Error'))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_('Attempts'))
+    
+    queued_at = models.DateTimeField(verbose_name=_('Queued At'))
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name=_('Started At'))
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name=_('Finished At'))
+    
+    class Meta:
+        verbose_name = _('Document Text')
+        verbose_name_plural = _('Document Texts')
+        indexes = [
+            models.Index(fields=['status', 'queued_at']),
+        ]
+    
+    def __str__(self):
+        return f"Text of document {self.document_id} ({self.get_status_display()})"
+
+
+class DocumentSearchTerm(models.Model):
+    """Inverted index entry: a term of a document's title, description or extracted text."""
+    
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='search_terms', verbose_name=_('Document'))
+    term = models.CharField(max_length=40, verbose_name=_('Term'))
+    weight = models.PositiveIntegerField(default=1, verbose_name=_('Weight'))
+    
+    class Meta:
+        verbose_name = _('Document Search Term')
+        verbose_name_plural = _('Document Search Terms')
+        indexes = [
+            models.Index(fields=['term', 'document']),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} -> {self.document_id}"
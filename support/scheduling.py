@@ -0,0 +1,324 @@
+"""
+Service scheduling for KeyReport IT Store
+Per-technician availability index, free slot search and conflict-free booking
+"""
+
+import heapq
+import logging
+import threading
+import time as clock
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ServiceRequest, ServiceSchedule, TechnicianServiceArea
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# Service requests in these statuses no longer hold their slot
+RELEASED_STATUSES = ('completed', 'cancelled')
+
+
+class SchedulingConflict(Exception):
+    """Raised when a booking overlaps another one of the same technician."""
+
+
+class OutsideWorkingHours(SchedulingConflict):
+    """Raised when a booking falls on a non-working day or outside the service day."""
+
+
+class Slot(NamedTuple):
+    start: datetime
+    end: datetime
+    technician_id: int
+
+
+def get_day_bounds() -> Tuple[int, int]:
+    """Working hours as minutes since midnight."""
+    start = getattr(settings, 'SERVICE_DAY_START', time(8, 0))
+    end = getattr(settings, 'SERVICE_DAY_END', time(18, 0))
+    return start.hour * 60 + start.minute, end.hour * 60 + end.minute
+
+
+def get_working_days() -> Tuple[int, ...]:
+    return getattr(settings, 'SERVICE_WORKING_DAYS', (0, 1, 2, 3, 4, 5))
+
+
+def get_slot_step() -> int:
+    return getattr(settings, 'SERVICE_SLOT_STEP', 30)
+
+
+def get_horizon_days() -> int:
+    return getattr(settings, 'SCHEDULING_HORIZON_DAYS', 60)
+
+
+def get_index_ttl() -> int:
+    return getattr(settings, 'SCHEDULING_INDEX_TTL', 60)
+
+
+def to_minutes(value: time) -> int:
+    return value.hour * 60 + value.minute
+
+
+class DaySchedule:
+    """
+    Bookings of one technician on one day as sorted arrays.
+
+    ``starts``/``ends`` hold the intervals in minutes ordered by start;
+    ``reach[i]`` is the latest end among the first i + 1 intervals, so
+    the first free minute after any point is one binary search away,
+    even if older data contains overlapping bookings.
+    """
+
+    __slots__ = ('starts', 'ends', 'reach')
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.reach: List[int] = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _rebuild_reach(self, position: int = 0):
+        latest = self.reach[position - 1] if position else -1
+        del self.reach[position:]
+        for end in self.ends[position:]:
+            latest = max(latest, end)
+            self.reach.append(latest)
+
+    def add(self, start: int, end: int):
+        position = bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self._rebuild_reach(position)
+
+    def remove(self, start: int, end: int):
+        position = bisect_left(self.starts, start)
+        while position < len(self.starts) and self.starts[position] == start:
+            if self.ends[position] == end:
+                del self.starts[position], self.ends[position]
+                self._rebuild_reach(position)
+                return
+            position += 1
+
+    def gaps(self, day_start: int, day_end: int, after: int = 0) -> Iterator[Tuple[int, int]]:
+        """Free [start, end) ranges within working hours, from ``after`` on."""
+        cursor = max(day_start, after)
+        position = bisect_right(self.starts, cursor)
+        if position:
+            cursor = max(cursor, self.reach[position - 1])
+        while cursor < day_end and position < len(self.starts):
+            if self.starts[position] > cursor:
+                yield cursor, min(self.starts[position], day_end)
+            cursor = max(cursor, self.ends[position])
+            position += 1
+        if cursor < day_end:
+            yield cursor, day_end
+
+
+class AvailabilityIndex:
+    """Per-technician, per-day booking arrays over a date window."""
+
+    def __init__(self, first_day: date, last_day: date):
+        self.first_day = first_day
+        self.last_day = last_day
+        self.built_at = clock.monotonic()
+        self.days: Dict[int, Dict[date, DaySchedule]] = {}
+
+    @classmethod
+    def build(cls, first_day: date, days: int) -> 'AvailabilityIndex':
+        """Load every active booking of the window with one query."""
+        index = cls(first_day, first_day + timedelta(days=days))
+        rows = (
+            ServiceSchedule.objects.filter(scheduled_date__range=(index.first_day, index.last_day))
+            .exclude(service_request__status__in=RELEASED_STATUSES)
+            .order_by()
+            .values_list('technician_id', 'scheduled_date', 'scheduled_time', 'estimated_duration')
+        )
+        for technician_id, day, start, duration in rows:
+            index.add(technician_id, day, to_minutes(start), to_minutes(start) + duration)
+        return index
+
+    def covers(self, day: date) -> bool:
+        return self.first_day <= day <= self.last_day
+
+    def day(self, technician_id: int, day: date) -> DaySchedule:
+        return self.days.get(technician_id, {}).get(day) or DaySchedule()
+
+    def add(self, technician_id: int, day: date, start: int, end: int):
+        if self.covers(day):
+            self.days.setdefault(technician_id, {}).setdefault(day, DaySchedule()).add(start, end)
+
+    def remove(self, technician_id: int, day: date, start: int, end: int):
+        schedule = self.days.get(technician_id, {}).get(day)
+        if schedule is not None:
+            schedule.remove(start, end)
+
+    def free_slots(self, technician_id: int, after: datetime, duration: int) -> Iterator[Slot]:
+        """Free slots of ``duration`` minutes for one technician, in time order."""
+        day_start, day_end = get_day_bounds()
+        working_days = get_working_days()
+        step = get_slot_step()
+        day = after.date()
+        while day <= self.last_day:
+            if day.weekday() in working_days:
+                offset = to_minutes(after.time()) if day == after.date() else 0
+                for gap_start, gap_end in self.day(technician_id, day).gaps(day_start, day_end, offset):
+                    start = -(-gap_start // step) * step
+                    while start + duration <= gap_end:
+                        begins = datetime.combine(day, time(start // 60, start % 60))
+                        yield Slot(begins, begins + timedelta(minutes=duration), technician_id)
+                        start += step
+            day += timedelta(days=1)
+
+
+class SchedulingService:
+    """
+    Find free technician slots and book them without overlaps.
+
+    The availability index is built from ServiceSchedule once per process
+    and kept in step with the bookings made here; it is rebuilt after
+    ``SCHEDULING_INDEX_TTL`` seconds to pick up bookings made by other
+    processes. Bookings are always checked against the database, so a
+    stale index can only suggest a slot that is then refused.
+    """
+
+    _index: Optional[AvailabilityIndex] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def index(cls) -> AvailabilityIndex:
+        today = timezone.localdate()
+        with cls._lock:
+            index = cls._index
+            if index is None or index.first_day != today or clock.monotonic() - index.built_at > get_index_ttl():
+                index = cls._index = AvailabilityIndex.build(today, get_horizon_days())
+            return index
+
+    @classmethod
+    def reset(cls):
+        """Drop the availability index held by this process."""
+        with cls._lock:
+            cls._index = None
+
+    @staticmethod
+    def technicians_in(city: str) -> List[int]:
+        return list(
+            TechnicianServiceArea.objects.filter(city__iexact=city.strip(), is_active=True, technician__is_active=True)
+            .values_list('technician_id', flat=True)
+        )
+
+    @classmethod
+    def next_free_slots(cls, city: str, duration: int, count: int = 5,
+                        after: Optional[datetime] = None) -> List[Slot]:
+        """
+        The ``count`` earliest slots of ``duration`` minutes, across the
+        technicians serving ``city``.
+
+        Slots start no earlier than now, whatever ``after`` says. Each
+        technician's slots are produced lazily from the day arrays and
+        merged on a heap, so only the days up to the last returned
+        slot are visited, whatever the number of bookings.
+        """
+        now = timezone.localtime().replace(tzinfo=None, second=0, microsecond=0)
+        after = max(after, now) if after else now
+        index = cls.index()
+        streams = [index.free_slots(technician_id, after, duration) for technician_id in cls.technicians_in(city)]
+        slots = []
+        for slot in heapq.merge(*streams):
+            slots.append(slot)
+            if len(slots) >= count:
+                break
+        return slots
+
+    @staticmethod
+    def conflicts(technician_id: int, day: date, start: time, duration: int,
+                  exclude_id: Optional[int] = None) -> List[ServiceSchedule]:
+        """Active bookings of a technician overlapping the given interval."""
+        begins, ends = to_minutes(start), to_minutes(start) + duration
+        bookings = (
+            ServiceSchedule.objects.filter(technician_id=technician_id, scheduled_date=day)
+            .exclude(service_request__status__in=RELEASED_STATUSES)
+            .select_related('service_request')
+        )
+        if exclude_id:
+            bookings = bookings.exclude(id=exclude_id)
+        return [
+            booking for booking in bookings
+            if to_minutes(booking.scheduled_time) < ends
+            and to_minutes(booking.scheduled_time) + booking.estimated_duration > begins
+        ]
+
+    @classmethod
+    def book(cls, service_request: ServiceRequest, technician, day: date, start: time,
+             duration: int, notes: str = '') -> ServiceSchedule:
+        """
+        Book (or move) the appointment of ``service_request``.
+
+        The technician row is locked first, which serialises bookings of
+        one technician on databases with row locks. The schedule is then
+        written before the overlap check, so on SQLite the write lock
+        taken by the INSERT/UPDATE makes the check see every committed
+        booking. Any overlap raises SchedulingConflict and rolls back;
+        a day or time outside SERVICE_WORKING_DAYS and the service day
+        raises OutsideWorkingHours before anything is written.
+        """
+        day_start, day_end = get_day_bounds()
+        if day.weekday() not in get_working_days():
+            raise OutsideWorkingHours(f'{day} is not a working day')
+        if to_minutes(start) < day_start or to_minutes(start) + duration > day_end:
+            raise OutsideWorkingHours(
+                f'Appointments must fit between {day_start // 60:02d}:{day_start % 60:02d} '
+                f'and {day_end // 60:02d}:{day_end % 60:02d}'
+            )
+
+        previous = None
+        with transaction.atomic():
+            list(User.objects.select_for_update().filter(pk=technician.pk).values_list('pk', flat=True))
+            schedule = ServiceSchedule.objects.filter(service_request=service_request).first()
+            if schedule is None:
+                schedule = ServiceSchedule(service_request=service_request)
+            else:
+                previous = (schedule.technician_id, schedule.scheduled_date,
+                            to_minutes(schedule.scheduled_time), to_minutes(schedule.scheduled_time) + schedule.estimated_duration)
+            schedule.technician = technician
+            schedule.scheduled_date = day
+            schedule.scheduled_time = start
+            schedule.estimated_duration = duration
+            schedule.notes = notes or schedule.notes
+            schedule.save()
+
+            conflicts = cls.conflicts(technician.pk, day, start, duration, exclude_id=schedule.pk)
+            if conflicts:
+                raise SchedulingConflict(
+                    f'{technician} is already booked for {conflicts[0].service_request.request_number} '
+                    f'at {conflicts[0].scheduled_time:%H:%M} on {day}'
+                )
+
+            ServiceRequest.objects.filter(pk=service_request.pk).update(
+                assigned_technician=technician, status='scheduled', scheduled_at=timezone.now()
+            )
+            transaction.on_commit(lambda: cls._track(previous, schedule))
+
+        logger.info('Booked %s with %s on %s at %s', service_request.request_number, technician, day, start)
+        return schedule
+
+    @classmethod
+    def _track(cls, previous, schedule: ServiceSchedule):
+        """Mirror a committed booking in this process's index."""
+        index = cls._index
+        if index is None:
+            return
+        with cls._lock:
+            if previous:
+                index.remove(*previous)
+            start = to_minutes(schedule.scheduled_time)
+            index.add(schedule.technician_id, schedule.scheduled_date, start, start + schedule.estimated_duration)
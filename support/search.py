@@ -0,0 +1,281 @@
+"""
+Ticket and document search for KeyReport IT Store
+Keeps inverted indexes of ticket, response and document text and ranks matches by term weight
+"""
+
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, Sum, Value, When
+
+from .models import Document, DocumentSearchTerm, SupportTicket, TicketResponse, TicketSearchTerm
+from .ticket_service import ALL_SCOPE, TicketCounterService, TicketListService, get_page_size
+
+logger = logging.getLogger(__name__)
+
+# A term in the title counts as much as this many in the body
+TITLE_WEIGHT = 3
+
+MAX_TERM_LENGTH = 40
+
+STOP_WORDS = frozenset("""
+    a an and are as at be but by for from has have i in is it its my no not of on or so
+    that the this to was we with you your
+    au aux avec ce ces dans de des du elle en est et il ils je la le les leur mais me mon
+    ne nous on ou par pas pour qu que qui sa se ses son sur ta te tu un une vos votre vous
+""".split())
+
+
+def get_max_results() -> int:
+    return getattr(settings, 'SUPPORT_SEARCH_MAX_RESULTS', 200)
+
+
+def idf(documents: int, frequencies: Dict[str, int]) -> Dict[str, float]:
+    """BM25-style inverse document frequency of each term among ``documents``."""
+    return {
+        term: math.log(1 + (documents - df + 0.5) / (df + 0.5))
+        for term, df in frequencies.items()
+    }
+
+
+def rank(postings, key: str, weights: Dict[str, float]):
+    """
+    Group ``postings`` by ``key``: more distinct matched terms first, then
+    the sum of weight x idf, newest first on ties.
+    """
+    score = Sum(Case(
+        *[
+            When(term=term, then=ExpressionWrapper(F('weight') * Value(value), output_field=FloatField()))
+            for term, value in weights.items()
+        ],
+        default=Value(0.0),
+        output_field=FloatField(),
+    ))
+    return (
+        postings.order_by().values(key)
+        .annotate(matched=Count('term', distinct=True), score=score)
+        .order_by('-matched', '-score', f'-{key}_id')
+    )
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split ``text`` into index terms: lower case, accents removed, stop
+    words dropped and a trailing plural ``s`` stripped, so "Pilotes
+    d'imprimante" and "pilote imprimante" share their terms.
+    """
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().lower()
+    terms = []
+    for word in re.findall(r'[a-z0-9]+', text):
+        if len(word) < 2 or word in STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(word[:MAX_TERM_LENGTH])
+    return terms
+
+
+def term_weights(*fields) -> Counter:
+    """Sum term frequencies over (text, weight) pairs."""
+    weights: Counter = Counter()
+    for text, weight in fields:
+        for term in tokenize(text):
+            weights[term] += weight
+    return weights
+
+
+class TicketSearchService:
+    """Service class to index and search support tickets."""
+
+    @staticmethod
+    def _postings(ticket_id: int, weights: Counter, response_id: Optional[int] = None,
+                  is_internal: bool = False) -> List[TicketSearchTerm]:
+        return [
+            TicketSearchTerm(ticket_id=ticket_id, response_id=response_id, term=term,
+                             weight=weight, is_internal=is_internal)
+            for term, weight in weights.items()
+        ]
+
+    @staticmethod
+    def index_ticket(ticket: SupportTicket) -> int:
+        """Replace the title/description terms of ``ticket``; returns the number of terms."""
+        postings = TicketSearchService._postings(
+            ticket.id, term_weights((ticket.title, TITLE_WEIGHT), (ticket.description, 1))
+        )
+        with transaction.atomic():
+            TicketSearchTerm.objects.filter(ticket_id=ticket.id, response__isnull=True).delete()
+            TicketSearchTerm.objects.bulk_create(postings)
+        return len(postings)
+
+    @staticmethod
+    def index_response(response: TicketResponse) -> int:
+        """Replace the terms of one response; the ticket's other terms are untouched."""
+        postings = TicketSearchService._postings(
+            response.ticket_id, term_weights((response.message, 1)),
+            response_id=response.id, is_internal=response.is_internal,
+        )
+        with transaction.atomic():
+            TicketSearchTerm.objects.filter(response_id=response.id).delete()
+            TicketSearchTerm.objects.bulk_create(postings)
+        return len(postings)
+
+    @staticmethod
+    def rebuild(chunk_size: int = 500) -> int:
+        """
+        Reindex every ticket and response from scratch; returns the number of tickets.
+
+        Runs in one transaction, so searches keep seeing the old index
+        until the new one is complete. Rows are read in keyset pages, so
+        no cursor is open while postings are written.
+        """
+        total = 0
+        with transaction.atomic():
+            TicketSearchTerm.objects.all().delete()
+            last_id = 0
+            while True:
+                tickets = list(SupportTicket.objects.filter(id__gt=last_id).order_by('id').values_list(
+                    'id', 'title', 'description'
+                )[:chunk_size])
+                if not tickets:
+                    break
+                batch: List[TicketSearchTerm] = []
+                for ticket_id, title, description in tickets:
+                    batch += TicketSearchService._postings(
+                        ticket_id, term_weights((title, TITLE_WEIGHT), (description, 1))
+                    )
+                TicketSearchTerm.objects.bulk_create(batch)
+                total += len(tickets)
+                last_id = tickets[-1][0]
+
+            last_id = 0
+            while True:
+                responses = list(TicketResponse.objects.filter(id__gt=last_id).order_by('id').values_list(
+                    'id', 'ticket_id', 'message', 'is_internal'
+                )[:chunk_size])
+                if not responses:
+                    break
+                batch = []
+                for response_id, ticket_id, message, is_internal in responses:
+                    batch += TicketSearchService._postings(
+                        ticket_id, term_weights((message, 1)), response_id, is_internal
+                    )
+                TicketSearchTerm.objects.bulk_create(batch)
+                last_id = responses[-1][0]
+        logger.info('Reindexed %s tickets for search', total)
+        return total
+
+    @staticmethod
+    def _idf(terms: Iterable[str]) -> Dict[str, float]:
+        """Inverse document frequency of each term over all tickets."""
+        documents = TicketCounterService.count(ALL_SCOPE) or 1
+        frequencies = dict(
+            TicketSearchTerm.objects.filter(term__in=terms).order_by()
+            .values('term').annotate(df=Count('ticket', distinct=True)).values_list('term', 'df')
+        )
+        return idf(documents, frequencies)
+
+    @staticmethod
+    def search(user, query: str, status: Optional[str] = None, priority: Optional[str] = None,
+               limit: Optional[int] = None) -> List[int]:
+        """
+        Ids of the tickets ``user`` may see that match ``query``, best first.
+
+        Tickets containing more of the query terms come first, then the
+        sum of weight x idf of the matched terms breaks ties, so rare
+        words and words in the title count most. Customers never match on
+        internal notes.
+        """
+        scope = TicketCounterService.scope_for(user)
+        terms = sorted(set(tokenize(query)))
+        if scope is None or not terms:
+            return []
+        weights = TicketSearchService._idf(terms)
+        if not weights:
+            return []
+
+        postings = TicketSearchTerm.objects.filter(term__in=weights.keys())
+        if scope != ALL_SCOPE:
+            postings = postings.filter(ticket__customer=user, is_internal=False)
+        if status:
+            postings = postings.filter(ticket__status=status)
+        if priority:
+            postings = postings.filter(ticket__priority=priority)
+
+        ranked = rank(postings, 'ticket', weights)
+        return [row['ticket'] for row in ranked[:limit or get_max_results()]]
+
+    @staticmethod
+    def page(user, query: str, status: Optional[str] = None, priority: Optional[str] = None,
+             page_number=None, per_page: Optional[int] = None):
+        """
+        Return (page, badges) for a ticket list search.
+
+        Only the ranked ids are paginated; the tickets of the requested
+        page are then loaded with the usual list projection.
+        """
+        badges = TicketCounterService.badges(TicketCounterService.scope_for(user))
+        ticket_ids = TicketSearchService.search(user, query, status, priority)
+        page = Paginator(ticket_ids, per_page or get_page_size()).get_page(page_number)
+        tickets = TicketListService.list_queryset(user).filter(id__in=page.object_list).in_bulk()
+        page.object_list = [tickets[ticket_id] for ticket_id in page.object_list if ticket_id in tickets]
+        return page, badges
+
+
+class DocumentSearchService:
+    """Service class to index and search support documents by title, description and file text."""
+
+    @staticmethod
+    def index_document(document: Document, content: str = '') -> int:
+        """Replace the terms of ``document``; returns the number of terms."""
+        weights = term_weights((document.title, TITLE_WEIGHT), (document.description, 1), (content, 1))
+        postings = [
+            DocumentSearchTerm(document_id=document.id, term=term, weight=weight)
+            for term, weight in weights.items()
+        ]
+        with transaction.atomic():
+            DocumentSearchTerm.objects.filter(document_id=document.id).delete()
+            DocumentSearchTerm.objects.bulk_create(postings, batch_size=1000)
+        return len(postings)
+
+    @staticmethod
+    def search(user, query: str, document_type: Optional[str] = None,
+               limit: Optional[int] = None) -> List[int]:
+        """
+        Ids of the documents ``user`` may see that match ``query``, best
+        first. Only the index is read, never the files.
+        """
+        terms = sorted(set(tokenize(query)))
+        if not user.is_authenticated or not terms:
+            return []
+        frequencies = dict(
+            DocumentSearchTerm.objects.filter(term__in=terms).order_by()
+            .values('term').annotate(df=Count('document', distinct=True)).values_list('term', 'df')
+        )
+        if not frequencies:
+            return []
+        weights = idf(Document.objects.count() or 1, frequencies)
+
+        postings = DocumentSearchTerm.objects.filter(term__in=weights.keys())
+        if not user.is_staff_member():
+            postings = postings.filter(document__customer=user)
+        if document_type:
+            postings = postings.filter(document__document_type=document_type)
+        ranked = rank(postings, 'document', weights)
+        return [row['document'] for row in ranked[:limit or get_max_results()]]
+
+    @staticmethod
+    def page(user, query: str, document_type: Optional[str] = None, page_number=None,
+             per_page: int = 20):
+        """Paginate the ranked ids, then load only the documents of the requested page."""
+        document_ids = DocumentSearchService.search(user, query, document_type)
+        page = Paginator(document_ids, per_page).get_page(page_number)
+        documents = Document.objects.filter(id__in=page.object_list).in_bulk()
+        page.object_list = [documents[document_id] for document_id in page.object_list if document_id in documents]
+        return page
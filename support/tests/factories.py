@@ -0,0 +1,60 @@
+"""
+Test data builders for KeyReport IT Store support
+Small helpers creating tickets, service requests, technicians and documents with the required fields filled in
+"""
+
+import itertools
+from datetime import time, timedelta
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from store.tests.factories import TempMediaMixin, make_user  # noqa: F401
+from support.models import Document, ServiceRequest, SupportTicket, TechnicianServiceArea
+
+_counter = itertools.count(1)
+
+
+def make_ticket(customer=None, **extra):
+    number = next(_counter)
+    extra.setdefault('ticket_number', f'TKT-T{number:05d}')
+    extra.setdefault('title', f'Ticket {number}')
+    extra.setdefault('description', 'Test ticket')
+    return SupportTicket.objects.create(customer=customer or make_user(), **extra)
+
+
+def next_weekday(weekday=0, weeks=1):
+    """A ``weekday`` (0 = Monday) at least ``weeks`` weeks from today."""
+    day = timezone.localdate() + timedelta(weeks=weeks)
+    return day + timedelta(days=(weekday - day.weekday()) % 7)
+
+
+def make_technician(city='Casablanca', **extra):
+    technician = make_user(user_type='staff', **extra)
+    TechnicianServiceArea.objects.create(technician=technician, city=city)
+    return technician
+
+
+def make_service_request(customer=None, **extra):
+    number = next(_counter)
+    extra.setdefault('request_number', f'SRV-T{number:05d}')
+    extra.setdefault('service_type', 'repair')
+    extra.setdefault('title', f'Service {number}')
+    extra.setdefault('description', 'Test service')
+    extra.setdefault('service_address', '6 rue Mazola')
+    extra.setdefault('service_city', 'Casablanca')
+    extra.setdefault('service_state', 'Casablanca-Settat')
+    extra.setdefault('service_zip_code', '20000')
+    extra.setdefault('preferred_date', next_weekday())
+    extra.setdefault('preferred_time', time(10, 0))
+    return ServiceRequest.objects.create(customer=customer or make_user(), **extra)
+
+
+def make_document(customer=None, content=b"Rapport d'intervention", filename='report.txt', **extra):
+    """A document whose file holds ``content``; needs TempMediaMixin."""
+    number = next(_counter)
+    extra.setdefault('title', f'Document {number}')
+    extra.setdefault('document_type', 'service_report')
+    document = Document(customer=customer or make_user(), file=ContentFile(content, name=filename), **extra)
+    document.save()
+    return document
@@ -0,0 +1,135 @@
+from datetime import time
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from support.dispatch import DispatchService
+from support.models import ServiceRequest, ServiceSchedule
+from support.scheduling import DaySchedule, SchedulingConflict, SchedulingService
+
+from .factories import make_service_request, make_technician, next_weekday
+
+
+def request(request_id, preferred, city='Casablanca', service_type='consultation'):
+    return {'id': request_id, 'service_city': city, 'service_type': service_type, 'preferred_time': preferred}
+
+
+class SolveTests(SimpleTestCase):
+    def setUp(self):
+        self.monday = next_weekday(0)
+
+    def test_requests_get_the_nearest_free_slot(self):
+        bookings = {1: DaySchedule()}
+        bookings[1].add(600, 690)
+
+        plan = DispatchService.solve([request(10, time(10, 0))], {'casablanca': [1]}, bookings, self.monday)
+
+        self.assertEqual([(a.technician_id, a.start_time) for a in plan.assignments], [(1, time(9, 0))])
+        self.assertEqual(list(bookings[1].starts), [540, 600])
+
+    def test_earlier_slots_may_run_past_the_preferred_time(self):
+        plan = DispatchService.solve([request(10, time(12, 0), service_type='installation')], {'casablanca': [1]},
+                                     {1: DaySchedule()}, self.monday)
+
+        self.assertEqual(plan.assignments[0].start_time, time(12, 0))
+
+        bookings = {1: DaySchedule()}
+        bookings[1].add(720, 1080)
+        plan = DispatchService.solve([request(10, time(11, 0), service_type='installation')], {'casablanca': [1]},
+                                     bookings, self.monday)
+
+        self.assertEqual(plan.assignments[0].start_time, time(10, 0))
+
+    def test_work_spreads_over_the_team(self):
+        plan = DispatchService.solve(
+            [request(10, time(10, 0)), request(11, time(10, 0))], {'casablanca': [1, 2]}, {}, self.monday
+        )
+
+        self.assertEqual({(a.technician_id, a.start) for a in plan.assignments}, {(1, 600), (2, 600)})
+        self.assertEqual(dict(plan.load), {1: 60, 2: 60})
+
+    @override_settings(SERVICE_DURATIONS={'consultation': 600})
+    def test_unplaceable_requests_say_why(self):
+        plan = DispatchService.solve(
+            [request(10, time(9, 0)), request(11, time(9, 0)), request(12, time(9, 0), city='Rabat')],
+            {'casablanca': [1]}, {}, self.monday,
+        )
+
+        self.assertEqual(len(plan.assignments), 1)
+        self.assertEqual(sorted(plan.unassigned.values()), ['no free slot', 'no technician serves Rabat'])
+
+    def test_non_working_days_are_not_dispatched(self):
+        plan = DispatchService.solve([request(10, time(10, 0))], {'casablanca': [1]}, {}, next_weekday(6))
+
+        self.assertEqual(plan.assignments, [])
+        self.assertEqual(plan.unassigned, {10: 'not a working day'})
+
+
+class DispatchTests(TestCase):
+    def setUp(self):
+        SchedulingService.reset()
+        self.addCleanup(SchedulingService.reset)
+        self.monday = next_weekday(0)
+        self.technician = make_technician()
+
+    def test_dispatch_writes_schedules_around_existing_bookings(self):
+        SchedulingService.book(make_service_request(), self.technician, self.monday, time(10, 0), 60)
+        pending = [make_service_request(preferred_date=self.monday, service_type='consultation') for _ in range(2)]
+        make_service_request(preferred_date=self.monday, status='completed')
+
+        plan = DispatchService.dispatch(self.monday)
+
+        self.assertEqual(len(plan.assignments), 2)
+        times = sorted(ServiceSchedule.objects.filter(service_request__in=pending).values_list('scheduled_time', flat=True))
+        self.assertEqual(times, [time(9, 0), time(11, 0)])
+        self.assertEqual(
+            set(ServiceRequest.objects.filter(pk__in=[p.pk for p in pending]).values_list('status', flat=True)),
+            {'scheduled'},
+        )
+
+    def test_dry_run_writes_nothing(self):
+        make_service_request(preferred_date=self.monday)
+
+        plan = DispatchService.dispatch(self.monday, dry_run=True)
+
+        self.assertEqual(len(plan.assignments), 1)
+        self.assertFalse(ServiceSchedule.objects.exists())
+
+    def test_requests_changed_after_planning_roll_the_batch_back(self):
+        first = make_service_request(preferred_date=self.monday)
+        make_service_request(preferred_date=self.monday)
+        plan = DispatchService.plan(self.monday)
+        ServiceRequest.objects.filter(pk=first.pk).update(status='cancelled')
+
+        with mock.patch.object(DispatchService, 'plan', return_value=plan):
+            with self.assertRaises(SchedulingConflict):
+                DispatchService.dispatch(self.monday)
+
+        self.assertFalse(ServiceSchedule.objects.exists())
+
+    def test_bookings_made_after_planning_roll_the_batch_back(self):
+        service = make_service_request(preferred_date=self.monday)
+        plan = DispatchService.plan(self.monday)
+        SchedulingService.book(make_service_request(), self.technician, self.monday, plan.assignments[0].start_time, 30)
+
+        with mock.patch.object(DispatchService, 'plan', return_value=plan):
+            with self.assertRaises(SchedulingConflict):
+                DispatchService.dispatch(self.monday)
+
+        self.assertFalse(ServiceSchedule.objects.filter(service_request=service).exists())
+
+    def test_command_reports_the_plan(self):
+        make_service_request(preferred_date=self.monday)
+        make_service_request(preferred_date=self.monday, service_city='Rabat')
+        out = StringIO()
+
+        call_command('dispatch_services', date=self.monday.isoformat(), stdout=out)
+
+        self.assertIn('Assigned:     1', out.getvalue())
+        self.assertIn('no technician serves Rabat', out.getvalue())
+
+    def test_command_rejects_bad_dates(self):
+        with self.assertRaises(CommandError):
+            call_command('dispatch_services', date='18/10/2026', stdout=StringIO())
@@ -0,0 +1,116 @@
+import os
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from support.downloads import parse_range
+
+from .factories import TempMediaMixin, make_document, make_user
+
+CONTENT = bytes(range(256)) * 4
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_single_ranges_are_clamped_to_the_file(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=95-200', 100), (95, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-500', 100), (0, 99))
+        self.assertEqual(parse_range(' bytes = 1 - 2 ', 100), (1, 2))
+
+    def test_ranges_we_ignore_serve_the_whole_file(self):
+        for header in ('bytes=5-2', 'bytes=0-1,5-6', 'items=0-1', 'bytes=-', 'bytes=a-b'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range(header, 100))
+
+    def test_unsatisfiable_ranges_raise(self):
+        for header, size in (('bytes=100-', 100), ('bytes=-0', 100), ('bytes=-10', 0)):
+            with self.subTest(header=header, size=size):
+                with self.assertRaises(ValueError):
+                    parse_range(header, size)
+
+
+@override_settings(DOCUMENT_EXTRACTION_MODE='worker', SUPPORT_DOWNLOAD_CHUNK_SIZE=100)
+class DocumentDownloadTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_user()
+        self.document = make_document(self.customer, content=CONTENT, filename='rapport.pdf')
+        self.url = reverse('support:document_download', args=[self.document.pk])
+        self.client.force_login(self.customer)
+
+    def get(self, **headers):
+        return self.client.get(self.url, **headers)
+
+    def test_whole_file_is_streamed_under_its_original_name(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('filename="rapport.pdf"', response['Content-Disposition'])
+        self.assertTrue(response['ETag'])
+
+    def test_byte_range_gets_206_in_chunks(self):
+        response = self.get(HTTP_RANGE='bytes=10-309')
+
+        chunks = list(response.streaming_content)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(chunks), CONTENT[10:310])
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(response['Content-Range'], f'bytes 10-309/{len(CONTENT)}')
+        self.assertEqual(response['Content-Length'], '300')
+
+    def test_unsatisfiable_range_gets_416(self):
+        response = self.get(HTTP_RANGE=f'bytes={len(CONTENT)}-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_current_validators_get_304(self):
+        first = self.get()
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+    def test_if_range_only_honours_ranges_of_the_current_file(self):
+        first = self.get()
+
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=first['ETag']).status_code, 206)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=first['Last-Modified']).status_code, 206)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"').status_code, 200)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=http_date(0)).status_code, 200)
+
+    @override_settings(SUPPORT_DOWNLOAD_OFFLOAD='x-sendfile')
+    def test_sendfile_offload_returns_headers_only(self):
+        response = self.get()
+
+        self.assertEqual(response['X-Sendfile'], self.document.file.path)
+        self.assertEqual(response.content, b'')
+        self.assertIn('filename="rapport.pdf"', response['Content-Disposition'])
+
+    @override_settings(SUPPORT_DOWNLOAD_OFFLOAD='x-accel-redirect', SUPPORT_DOWNLOAD_ACCEL_PREFIX='/internal/')
+    def test_accel_redirect_points_at_the_internal_location(self):
+        response = self.get()
+
+        self.assertEqual(response['X-Accel-Redirect'], f'/internal/{self.document.file.name}')
+        self.assertTrue(response['ETag'])
+
+    def test_missing_files_are_404(self):
+        os.remove(self.document.file.path)
+
+        self.assertEqual(self.get().status_code, 404)
+
+    def test_other_customers_cannot_download(self):
+        self.client.force_login(make_user())
+
+        self.assertEqual(self.get().status_code, 404)
+
+    def test_staff_can_download_any_document(self):
+        self.client.force_login(make_user(user_type='staff'))
+
+        self.assertEqual(self.get().status_code, 200)
@@ -0,0 +1,218 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from reportlab.pdfgen import canvas
+
+from support.extraction import DocumentTextPipeline, extract_text
+from support.models import DocumentText
+from support.search import DocumentSearchService
+
+from .factories import TempMediaMixin, make_document, make_user
+
+
+def make_pdf(*pages):
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+    for text in pages:
+        pdf.drawString(72, 720, text)
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+class ExtractTextTests(SimpleTestCase):
+    def test_pdf_pages_are_read(self):
+        text = extract_text('rapport.pdf', make_pdf('Onduleur remplace', 'Garantie deux ans'))
+
+        self.assertIn('Onduleur remplace', text)
+        self.assertIn('Garantie deux ans', text)
+
+    def test_pdf_content_is_recognised_without_the_extension(self):
+        self.assertIn('Facture', extract_text('scan', make_pdf('Facture 42')))
+
+    @override_settings(DOCUMENT_EXTRACTION_MAX_CHARS=10)
+    def test_pdf_reading_stops_at_the_character_limit(self):
+        text = extract_text('long.pdf', make_pdf('Premiere page assez longue', 'Seconde page'))
+
+        self.assertNotIn('Seconde', text)
+
+    def test_text_and_html_files(self):
+        self.assertEqual(extract_text('notes.txt', 'Câble réseau'.encode('cp1252')), 'Câble réseau')
+        self.assertEqual(extract_text('page.html', b'<p>Routeur <b>Wifi</b></p>'), 'Routeur Wifi')
+
+    def test_other_formats_are_not_read(self):
+        self.assertIsNone(extract_text('photo.jpg', b'\xff\xd8\xff'))
+
+
+@override_settings(DOCUMENT_EXTRACTION_MODE='worker')
+class DocumentTextPipelineTests(TempMediaMixin, TestCase):
+    def test_documents_are_queued_on_save_and_when_their_text_changes(self):
+        document = make_document()
+        text = document.text
+        self.assertEqual(text.status, 'queued')
+
+        DocumentTextPipeline.run_job(text.id)
+        document.save()
+        self.assertEqual(DocumentText.objects.get().status, 'done')
+
+        document.title = 'Nouveau titre'
+        document.save()
+        self.assertEqual(DocumentText.objects.get().status, 'queued')
+
+    def test_job_indexes_the_file_content_for_search(self):
+        customer = make_user()
+        document = make_document(customer, content=make_pdf('Onduleur remplace'), filename='rapport.pdf')
+
+        self.assertTrue(DocumentTextPipeline.run_job(document.text.id))
+
+        text = DocumentText.objects.get()
+        self.assertEqual((text.status, text.attempts), ('done', 1))
+        self.assertIn('Onduleur', text.content)
+        self.assertEqual(DocumentSearchService.search(customer, 'onduleur'), [document.id])
+        self.assertEqual(DocumentSearchService.search(make_user(), 'onduleur'), [])
+
+    def test_a_claimed_job_does_not_run_twice(self):
+        document = make_document()
+        DocumentTextPipeline.run_job(document.text.id)
+
+        self.assertFalse(DocumentTextPipeline.run_job(document.text.id))
+
+    def test_unsupported_files_are_skipped(self):
+        document = make_document(content=b'\x00\x01', filename='image.bin')
+
+        DocumentTextPipeline.run_job(document.text.id)
+
+        text = DocumentText.objects.get()
+        self.assertEqual((text.status, text.error), ('skipped', 'Unsupported file type'))
+        self.assertTrue(DocumentSearchService.search(make_user(user_type='staff'), document.title))
+
+    def test_broken_files_fail_with_the_error(self):
+        document = make_document(content=b'%PDF-1.4 broken', filename='broken.pdf')
+
+        # pypdf warns about the file too
+        with self.assertLogs(level='WARNING') as logs:
+            DocumentTextPipeline.run_job(document.text.id)
+
+        text = DocumentText.objects.get()
+        self.assertEqual(text.status, 'failed')
+        self.assertTrue(text.error)
+        self.assertIn(f'Text extraction of document {document.id} failed', logs.output[-1])
+
+    def test_identical_content_reuses_the_extracted_text(self):
+        content = make_pdf('Garantie')
+        first = make_document(content=content, filename='a.pdf')
+        DocumentTextPipeline.run_job(first.text.id)
+        second = make_document(content=content, filename='b.pdf')
+
+        with mock.patch('support.extraction.extract_text') as extract:
+            DocumentTextPipeline.run_job(second.text.id)
+
+        extract.assert_not_called()
+        self.assertIn('Garantie', DocumentText.objects.get(document=second).content)
+
+    def test_a_newer_enqueue_wins_over_a_running_job(self):
+        document = make_document()
+
+        def requeue_while_running(running):
+            DocumentTextPipeline.enqueue(running)
+            return 'done', 'old text', ''
+
+        with mock.patch.object(DocumentTextPipeline, 'extract', side_effect=requeue_while_running):
+            DocumentTextPipeline.run_job(document.text.id)
+
+        text = DocumentText.objects.get()
+        self.assertEqual((text.status, text.content), ('queued', ''))
+
+    def test_a_stale_run_does_not_finish_the_run_that_replaced_it(self):
+        document = make_document()
+
+        def requeued_and_claimed_again(running):
+            DocumentTextPipeline.requeue_stale(timedelta(0))
+            self.assertTrue(DocumentTextPipeline.claim(document.text.id))
+            return 'done', 'ancien texte', ''
+
+        with mock.patch.object(DocumentTextPipeline, 'extract', side_effect=requeued_and_claimed_again):
+            DocumentTextPipeline.run_job(document.text.id)
+
+        text = DocumentText.objects.get()
+        self.assertEqual((text.status, text.content), ('running', ''))
+        self.assertEqual(DocumentSearchService.search(document.customer, 'ancien'), [])
+
+    def test_pending_ids_oldest_first_and_queued_before(self):
+        first, second = make_document(), make_document()
+        DocumentText.objects.filter(document=first).update(queued_at=timezone.now() - timedelta(minutes=5))
+        first_id, second_id = first.text.id, second.text.id
+
+        self.assertEqual(DocumentTextPipeline.pending_ids(10), [first_id, second_id])
+        self.assertEqual(DocumentTextPipeline.pending_ids(10, queued_before=timezone.now() - timedelta(minutes=1)),
+                         [first_id])
+
+    def test_stale_running_jobs_are_requeued(self):
+        document = make_document()
+        self.assertTrue(DocumentTextPipeline.claim(document.text.id))
+        self.assertIsNone(DocumentTextPipeline.claim(document.text.id))
+        DocumentText.objects.update(started_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(DocumentTextPipeline.requeue_stale(timedelta(minutes=10)), 1)
+        self.assertEqual(DocumentTextPipeline.pending_ids(10), [document.text.id])
+
+    def test_queue_missing_covers_documents_without_text(self):
+        make_document()
+        DocumentText.objects.all().delete()
+
+        self.assertEqual(DocumentTextPipeline.queue_missing(), 1)
+        self.assertEqual(DocumentTextPipeline.queue_missing(), 0)
+
+    @override_settings(DOCUMENT_EXTRACTION_MODE='inline')
+    def test_inline_mode_extracts_before_returning(self):
+        document = make_document(content=b'Clavier sans fil')
+
+        self.assertEqual(document.text.status, 'done')
+        self.assertIn('Clavier', document.text.content)
+
+    @override_settings(DOCUMENT_EXTRACTION_MODE='thread')
+    def test_thread_mode_submits_after_commit(self):
+        with mock.patch.object(DocumentTextPipeline, 'executor') as executor, \
+                mock.patch.object(DocumentTextPipeline, 'start_poller') as start_poller:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                document = make_document()
+            executor.return_value.submit.assert_not_called()
+            for callback in callbacks:
+                callback()
+
+        executor.return_value.submit.assert_called_once_with(DocumentTextPipeline._run_in_thread, document.text.id)
+        start_poller.assert_called()
+
+    def test_document_list_searches_file_content(self):
+        customer = make_user()
+        document = make_document(customer, content=b'Imprimante laser')
+        make_document(customer, content=b'Ecran')
+        DocumentTextPipeline.run_job(document.text.id)
+        self.client.force_login(customer)
+
+        response = self.client.get(reverse('support:document_list'), {'q': 'imprimante'})
+
+        self.assertEqual(list(response.context['documents']), [document])
+
+
+@override_settings(DOCUMENT_EXTRACTION_MODE='worker')
+class ExtractorCommandTests(TempMediaMixin, TransactionTestCase):
+    def test_worker_threads_run_the_queue(self):
+        documents = [make_document(content=f'Rapport {n}'.encode()) for n in range(3)]
+        out = io.StringIO()
+        # The in-memory SQLite test database locks tables between writing threads
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+
+        with mock.patch.object(DocumentTextPipeline, '_executor', executor):
+            call_command('run_document_extractor', once=True, stdout=out)
+
+        self.assertIn('Extracted 3 documents', out.getvalue())
+        self.assertEqual(set(DocumentText.objects.values_list('status', flat=True)), {'done'})
+        self.assertEqual(DocumentText.objects.get(document=documents[2]).content, 'Rapport 2')
@@ -0,0 +1,170 @@
+from datetime import datetime, time, timedelta
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from support.models import ServiceRequest, ServiceSchedule
+from support.scheduling import DaySchedule, OutsideWorkingHours, SchedulingConflict, SchedulingService
+
+from .factories import make_service_request, make_technician, make_user, next_weekday
+
+
+class DayScheduleTests(SimpleTestCase):
+    def test_gaps_skip_overlapping_bookings(self):
+        schedule = DaySchedule()
+        schedule.add(600, 720)
+        schedule.add(540, 660)
+        schedule.add(780, 840)
+
+        self.assertEqual(list(schedule.gaps(480, 1080)), [(480, 540), (720, 780), (840, 1080)])
+        self.assertEqual(list(schedule.gaps(480, 1080, after=610)), [(720, 780), (840, 1080)])
+
+    def test_removed_bookings_free_their_time(self):
+        schedule = DaySchedule()
+        schedule.add(540, 600)
+        schedule.add(540, 660)
+
+        schedule.remove(540, 660)
+
+        self.assertEqual(list(schedule.gaps(480, 720)), [(480, 540), (600, 720)])
+
+
+class SchedulingTests(TestCase):
+    def setUp(self):
+        SchedulingService.reset()
+        self.addCleanup(SchedulingService.reset)
+        self.technician = make_technician()
+        self.monday = next_weekday(0)
+
+    def book(self, start, duration=60, day=None, service=None):
+        service = service or make_service_request()
+        return SchedulingService.book(service, self.technician, day or self.monday, start, duration)
+
+    def test_booking_schedules_the_request(self):
+        schedule = self.book(time(10, 0))
+
+        service = ServiceRequest.objects.get(pk=schedule.service_request_id)
+        self.assertEqual((service.status, service.assigned_technician), ('scheduled', self.technician))
+
+    def test_overlapping_bookings_are_refused_and_rolled_back(self):
+        self.book(time(10, 0))
+        second = make_service_request()
+
+        with self.assertRaises(SchedulingConflict):
+            self.book(time(10, 30), service=second)
+
+        self.assertFalse(ServiceSchedule.objects.filter(service_request=second).exists())
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'pending')
+
+    def test_adjacent_and_released_bookings_do_not_conflict(self):
+        first = self.book(time(10, 0))
+        self.book(time(11, 0))
+        ServiceRequest.objects.filter(pk=first.service_request_id).update(status='cancelled')
+
+        self.book(time(10, 0))
+
+        self.assertEqual(ServiceSchedule.objects.count(), 3)
+
+    def test_moving_a_booking_frees_its_old_slot(self):
+        schedule = self.book(time(10, 0))
+
+        self.book(time(14, 0), service=schedule.service_request)
+        self.book(time(10, 0))
+
+        self.assertEqual(ServiceSchedule.objects.count(), 2)
+
+    def test_non_working_days_and_hours_are_refused(self):
+        with self.assertRaisesMessage(OutsideWorkingHours, 'not a working day'):
+            self.book(time(10, 0), day=next_weekday(6))
+        with self.assertRaises(OutsideWorkingHours):
+            self.book(time(17, 30))
+        with self.assertRaises(OutsideWorkingHours):
+            self.book(time(7, 30))
+
+        self.assertFalse(ServiceSchedule.objects.exists())
+
+    def test_free_slots_skip_bookings_across_technicians(self):
+        other = make_technician()
+        self.book(time(8, 0))
+        SchedulingService.book(make_service_request(), other, self.monday, time(8, 0), 90)
+        SchedulingService.reset()
+
+        slots = SchedulingService.next_free_slots(
+            'casablanca', 60, count=3, after=datetime.combine(self.monday, time(8, 0))
+        )
+
+        self.assertEqual([(s.start.time(), s.technician_id) for s in slots], [
+            (time(9, 0), self.technician.pk), (time(9, 30), self.technician.pk), (time(9, 30), other.pk),
+        ])
+
+    def test_free_slots_follow_committed_bookings_without_a_rebuild(self):
+        after = datetime.combine(self.monday, time(8, 0))
+        SchedulingService.next_free_slots('Casablanca', 60, after=after)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(time(8, 0))
+
+        self.assertEqual(SchedulingService.next_free_slots('Casablanca', 60, count=1, after=after)[0].start.time(),
+                         time(9, 0))
+
+    def test_free_slots_never_start_in_the_past(self):
+        now = timezone.localtime().replace(tzinfo=None)
+
+        slots = SchedulingService.next_free_slots('Casablanca', 30, count=20, after=now - timedelta(days=3))
+
+        self.assertTrue(slots)
+        self.assertTrue(all(slot.start >= now.replace(second=0, microsecond=0) for slot in slots))
+
+    def test_free_slots_skip_non_working_days(self):
+        saturday = next_weekday(5)
+
+        slots = SchedulingService.next_free_slots(
+            'Casablanca', 600, count=2, after=datetime.combine(saturday, time(8, 0))
+        )
+
+        self.assertEqual([slot.start.date() for slot in slots], [saturday, saturday + timedelta(days=2)])
+
+
+class ServiceBookViewTests(TestCase):
+    def setUp(self):
+        SchedulingService.reset()
+        self.addCleanup(SchedulingService.reset)
+        self.technician = make_technician()
+        self.service = make_service_request()
+        self.url = reverse('support:service_book', args=[self.service.pk])
+        self.client.force_login(make_user(user_type='staff'))
+
+    def post(self, day, start, duration=60):
+        return self.client.post(self.url, {
+            'technician': self.technician.pk, 'date': day.isoformat(), 'time': start, 'duration': duration,
+        })
+
+    def test_booking_returns_201(self):
+        response = self.post(next_weekday(0), '09:00')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['time'], '09:00')
+
+    def test_conflicts_return_409(self):
+        SchedulingService.book(make_service_request(), self.technician, next_weekday(0), time(9, 0), 60)
+
+        self.assertEqual(self.post(next_weekday(0), '09:30').status_code, 409)
+
+    def test_outside_working_hours_returns_400(self):
+        self.assertEqual(self.post(next_weekday(6), '09:00').status_code, 400)
+        self.assertEqual(self.post(next_weekday(0), '17:30').status_code, 400)
+        self.assertEqual(self.post(next_weekday(0), '9h').status_code, 400)
+
+    def test_customers_cannot_book(self):
+        self.client.force_login(make_user())
+
+        self.assertEqual(self.post(next_weekday(0), '09:00').status_code, 404)
+
+    def test_slots_view_lists_free_slots(self):
+        response = self.client.get(reverse('support:service_slots'), {
+            'city': 'Casablanca', 'count': 2, 'after': f'{next_weekday(0)}T08:00',
+        })
+
+        self.assertEqual([slot['start'][-5:] for slot in response.json()['slots']], ['08:00', '08:30'])
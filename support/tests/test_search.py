@@ -0,0 +1,88 @@
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from support.models import SupportTicket, TicketResponse, TicketSearchTerm
+from support.search import TicketSearchService, tokenize
+
+from .factories import make_ticket, make_user
+
+
+class TokenizeTests(SimpleTestCase):
+    def test_accents_stop_words_and_plurals_are_normalised(self):
+        self.assertEqual(tokenize("Pilotes d'imprimante"), tokenize('pilote imprimante'))
+        self.assertEqual(tokenize('Le écran ne marche pas'), ['ecran', 'marche'])
+
+    def test_double_s_is_kept(self):
+        self.assertEqual(tokenize('access'), ['access'])
+
+
+class TicketSearchTests(TestCase):
+    def setUp(self):
+        self.customer = make_user()
+        self.staff = make_user(user_type='staff')
+
+    def search(self, query, user=None, **kwargs):
+        return TicketSearchService.search(user or self.staff, query, **kwargs)
+
+    def test_tickets_matching_more_terms_rank_first(self):
+        printer = make_ticket(self.customer, title='Imprimante bloquée', description='Le bac papier est coincé')
+        both = make_ticket(self.customer, title='Imprimante réseau', description='Pilote introuvable')
+
+        self.assertEqual(self.search('pilote imprimante'), [both.id, printer.id])
+
+    def test_title_matches_outrank_description_matches(self):
+        body = make_ticket(description='Le routeur redémarre sans cesse')
+        title = make_ticket(title='Routeur en panne')
+
+        self.assertEqual(self.search('routeur'), [title.id, body.id])
+
+    def test_edits_reindex_the_ticket(self):
+        ticket = make_ticket(title='Clavier')
+
+        ticket.title = 'Souris'
+        ticket.save()
+
+        self.assertEqual(self.search('clavier'), [])
+        self.assertEqual(self.search('souris'), [ticket.id])
+
+    def test_customers_never_match_on_internal_notes_or_others_tickets(self):
+        ticket = make_ticket(self.customer, title='Facture')
+        TicketResponse.objects.create(ticket=ticket, author=self.staff, message='remboursement prévu',
+                                      is_internal=True)
+        make_ticket(title='Facture')
+
+        self.assertEqual(self.search('remboursement', self.customer), [])
+        self.assertEqual(self.search('remboursement'), [ticket.id])
+        self.assertEqual(self.search('facture', self.customer), [ticket.id])
+
+    def test_filters_apply_to_the_ticket(self):
+        open_ticket = make_ticket(title='Disque')
+        make_ticket(title='Disque', status='closed')
+
+        self.assertEqual(self.search('disque', status='open'), [open_ticket.id])
+
+    def test_rebuild_restores_the_index_after_bulk_updates(self):
+        ticket = make_ticket(title='Batterie')
+        TicketResponse.objects.create(ticket=ticket, author=self.staff, message='chargeur remplacé')
+        SupportTicket.objects.update(title='Alimentation')
+
+        self.assertEqual(TicketSearchService.rebuild(chunk_size=1), 1)
+
+        self.assertEqual(self.search('batterie'), [])
+        self.assertEqual(self.search('alimentation'), [ticket.id])
+        self.assertEqual(self.search('chargeur'), [ticket.id])
+        self.assertEqual(TicketSearchTerm.objects.filter(response__isnull=False).count(), 2)
+
+    def test_queries_made_only_of_stop_words_match_nothing(self):
+        make_ticket(title='Le la les')
+
+        self.assertEqual(self.search('le la'), [])
+
+    def test_list_view_searches_with_q(self):
+        ticket = make_ticket(self.customer, title='Écran noir')
+        make_ticket(self.customer, title='Clavier')
+        self.client.force_login(self.customer)
+
+        response = self.client.get(reverse('support:ticket_list'), {'q': 'ecran'})
+
+        self.assertEqual(list(response.context['tickets']), [ticket])
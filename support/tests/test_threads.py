@@ -0,0 +1,91 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from support.models import TicketResponse
+from support.threads import TicketThreadService
+
+from .factories import make_ticket, make_user
+
+
+class TicketThreadTests(TestCase):
+    def setUp(self):
+        self.customer = make_user()
+        self.staff = make_user(user_type='staff')
+        self.ticket = make_ticket(self.customer)
+        self.responses = [
+            TicketResponse.objects.create(ticket=self.ticket, author=self.staff, message=f'Message {n}',
+                                          is_internal=n == 3)
+            for n in range(5)
+        ]
+
+    def test_pages_go_back_in_time_in_chronological_order(self):
+        latest, has_older = TicketThreadService.page(self.ticket, self.staff, limit=2)
+        older, still_older = TicketThreadService.page(self.ticket, self.staff, before=latest[0].id, limit=2)
+        oldest, none_left = TicketThreadService.page(self.ticket, self.staff, before=older[0].id, limit=2)
+
+        self.assertEqual(latest, self.responses[3:])
+        self.assertEqual(older, self.responses[1:3])
+        self.assertEqual(oldest, self.responses[:1])
+        self.assertEqual((has_older, still_older, none_left), (True, True, False))
+
+    def test_customers_never_see_internal_notes(self):
+        page, has_older = TicketThreadService.page(self.ticket, self.customer, limit=4)
+
+        self.assertNotIn(self.responses[3], page)
+        self.assertEqual(len(page), 4)
+        self.assertFalse(has_older)
+
+    def test_page_loads_authors_in_the_same_query(self):
+        with self.assertNumQueries(1):
+            page, _ = TicketThreadService.page(self.ticket, self.staff)
+            [TicketThreadService.serialize(response) for response in page]
+
+
+class TicketThreadViewTests(TestCase):
+    def setUp(self):
+        self.customer = make_user()
+        self.staff = make_user(user_type='staff')
+        self.ticket = make_ticket(self.customer)
+
+    def reply(self, user, **data):
+        self.client.force_login(user)
+        self.client.post(reverse('support:ticket_detail', args=[self.ticket.pk]), {'message': 'Bonjour', **data})
+        return TicketResponse.objects.latest('id')
+
+    def test_staff_replies_are_internal_unless_shown_to_the_customer(self):
+        self.assertTrue(self.reply(self.staff).is_internal)
+        self.assertFalse(self.reply(self.staff, visible_to_customer='on').is_internal)
+
+    def test_customer_replies_are_never_internal(self):
+        self.assertFalse(self.reply(self.customer, is_internal='on').is_internal)
+
+    @override_settings(SUPPORT_THREAD_PAGE_SIZE=2)
+    def test_older_responses_load_as_json(self):
+        responses = [
+            TicketResponse.objects.create(ticket=self.ticket, author=self.staff, message=f'Message {n}')
+            for n in range(3)
+        ]
+        self.client.force_login(self.customer)
+
+        detail = self.client.get(reverse('support:ticket_detail', args=[self.ticket.pk]))
+        older = self.client.get(reverse('support:ticket_responses', args=[self.ticket.pk]),
+                                {'before': responses[1].id}).json()
+
+        self.assertEqual(list(detail.context['responses']), responses[1:])
+        self.assertTrue(detail.context['has_older_responses'])
+        self.assertEqual([r['message'] for r in older['responses']], ['Message 0'])
+        self.assertEqual((older['has_older'], older['before']), (False, responses[0].id))
+
+    def test_responses_of_other_customers_tickets_are_hidden(self):
+        self.client.force_login(make_user())
+
+        response = self.client.get(reverse('support:ticket_responses', args=[self.ticket.pk]))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_bad_cursor_is_rejected(self):
+        self.client.force_login(self.customer)
+
+        response = self.client.get(reverse('support:ticket_responses', args=[self.ticket.pk]), {'before': 'x'})
+
+        self.assertEqual(response.status_code, 400)
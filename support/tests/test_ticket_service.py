@@ -0,0 +1,120 @@
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase
+from django.urls import reverse
+
+from support.models import SupportTicket, TicketCounter
+from support.ticket_service import ALL_SCOPE, TicketCounterService, TicketListService
+
+from .factories import make_ticket, make_user
+
+
+class TicketCounterTests(TestCase):
+    def setUp(self):
+        self.customer = make_user()
+
+    def badges(self, scope=ALL_SCOPE):
+        return TicketCounterService.badges(scope)
+
+    def test_new_tickets_are_counted_in_both_scopes(self):
+        make_ticket(self.customer, priority='high')
+        make_ticket(self.customer)
+        make_ticket()
+
+        self.assertEqual(self.badges()['total'], 3)
+        mine = self.badges(str(self.customer.pk))
+        self.assertEqual(mine['total'], 2)
+        self.assertEqual(mine['status']['open'], 2)
+        self.assertEqual(mine['priority']['high'], 1)
+        self.assertEqual(mine['status']['closed'], 0)
+
+    def test_status_and_priority_changes_move_the_ticket(self):
+        ticket = make_ticket(self.customer)
+
+        ticket.status = 'in_progress'
+        ticket.priority = 'urgent'
+        ticket.save()
+
+        badges = self.badges()
+        self.assertEqual((badges['status']['open'], badges['status']['in_progress']), (0, 1))
+        self.assertEqual(TicketCounterService.count(ALL_SCOPE, 'in_progress', 'urgent'), 1)
+        self.assertEqual(TicketCounterService.count(ALL_SCOPE, 'open'), 0)
+
+    def test_saving_an_unchanged_ticket_keeps_the_counts(self):
+        ticket = make_ticket(self.customer)
+
+        SupportTicket.objects.get(pk=ticket.pk).save()
+        ticket.save()
+
+        self.assertEqual(self.badges()['total'], 1)
+
+    def test_deleting_tickets_and_their_customer_updates_counters(self):
+        make_ticket(self.customer).delete()
+        make_ticket(self.customer)
+        make_ticket(self.customer)
+
+        self.customer.delete()
+
+        self.assertEqual(self.badges()['total'], 0)
+        self.assertEqual(self.badges(str(self.customer.pk))['total'], 0)
+
+    def test_counter_update_failure_rolls_back_the_ticket(self):
+        with mock.patch.object(TicketCounterService, 'move', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                make_ticket(self.customer)
+
+        self.assertFalse(SupportTicket.objects.exists())
+
+    def test_rebuild_matches_the_tickets(self):
+        make_ticket(self.customer, status='resolved')
+        make_ticket()
+        SupportTicket.objects.update(priority='low')
+
+        self.assertEqual(TicketCounterService.rebuild(), 4)
+
+        self.assertEqual(TicketCounterService.count(ALL_SCOPE, priority='low'), 2)
+        self.assertEqual(TicketCounter.objects.filter(priority='medium').count(), 0)
+
+    def test_anonymous_users_have_no_scope(self):
+        self.assertIsNone(TicketCounterService.scope_for(AnonymousUser()))
+        self.assertEqual(TicketCounterService.count(None), 0)
+
+
+class TicketListTests(TestCase):
+    def setUp(self):
+        self.customer = make_user()
+        self.staff = make_user(user_type='staff')
+        self.mine = [make_ticket(self.customer, assigned_to=self.staff) for _ in range(3)]
+        self.other = make_ticket(priority='high')
+
+    def test_customers_list_only_their_tickets(self):
+        page, badges = TicketListService.page(self.customer)
+
+        self.assertEqual(set(page.object_list), set(self.mine))
+        self.assertEqual(badges['total'], 3)
+
+    def test_staff_list_every_ticket_and_can_filter(self):
+        page, badges = TicketListService.page(self.staff, priority='high')
+
+        self.assertEqual(list(page.object_list), [self.other])
+        self.assertEqual(page.paginator.count, 1)
+        self.assertEqual(badges['total'], 4)
+
+    def test_page_loads_customer_and_assignee_in_one_query(self):
+        page, _ = TicketListService.page(self.staff, per_page=2)
+
+        with self.assertNumQueries(1):
+            rows = [(t.customer.email, t.assigned_to and t.assigned_to.email, t.excerpt) for t in page]
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(page.paginator.num_pages, 2)
+
+    def test_list_view_renders_badges(self):
+        self.client.force_login(self.customer)
+
+        response = self.client.get(reverse('support:ticket_list'), {'status': 'open'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['badges']['total'], 3)
+        self.assertEqual(len(response.context['tickets']), 3)
@@ -0,0 +1,250 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from support.models import Document, DocumentBlob, DocumentUpload
+from support.uploads import ChunkedUploadService, DocumentBlobService, UploadError, UploadOffsetMismatch
+
+from .factories import TempMediaMixin, make_document, make_user
+
+CONTENT = os.urandom(1000)
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+class DroppedStream(io.BytesIO):
+    """A request body whose connection drops after ``limit`` bytes."""
+
+    def __init__(self, data, limit):
+        super().__init__(data[:limit])
+
+    def read(self, size=-1):
+        data = super().read(size)
+        if not data:
+            raise OSError('connection reset')
+        return data
+
+
+class UploadTestMixin(TempMediaMixin):
+    def setUp(self):
+        super().setUp()
+        parts_dir = tempfile.mkdtemp(prefix='keyreport-parts-')
+        self.addCleanup(shutil.rmtree, parts_dir, ignore_errors=True)
+        self.enterContext(override_settings(
+            DOCUMENT_UPLOAD_PARTS_DIR=parts_dir, DOCUMENT_UPLOAD_CHUNK_SIZE=400, DOCUMENT_EXTRACTION_MODE='worker',
+        ))
+        self.staff = make_user(user_type='staff')
+
+
+class ChunkedUploadTests(UploadTestMixin, TestCase):
+    def start(self, **extra):
+        return ChunkedUploadService.start(self.staff, extra.pop('filename', 'rapport.pdf'), len(CONTENT), **extra)
+
+    def send(self, upload, offset, end):
+        return ChunkedUploadService.write_chunk(upload, offset, end - offset, io.BytesIO(CONTENT[offset:end]))
+
+    def test_chunks_complete_into_a_blob(self):
+        upload = self.start(sha256=SHA256)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for offset in range(0, len(CONTENT), 400):
+                upload = self.send(upload, offset, min(offset + 400, len(CONTENT)))
+
+        self.assertEqual(upload.status, 'complete')
+        self.assertEqual(upload.blob.sha256, SHA256)
+        with default_storage.open(upload.blob.file.name, 'rb') as handle:
+            self.assertEqual(handle.read(), CONTENT)
+        self.assertFalse(os.path.exists(ChunkedUploadService.part_path(upload)))
+
+    def test_chunks_must_continue_where_the_upload_is(self):
+        upload = self.send(self.start(), 0, 400)
+
+        with self.assertRaises(UploadOffsetMismatch) as raised:
+            self.send(upload, 800, 1000)
+        self.assertEqual(raised.exception.offset, 400)
+        with self.assertRaises(UploadError):
+            self.send(upload, 400, 1000)
+
+    def test_dropped_chunk_keeps_the_bytes_received(self):
+        upload = self.start(sha256=SHA256)
+
+        upload = ChunkedUploadService.write_chunk(upload, 0, 400, DroppedStream(CONTENT, 150))
+        self.assertEqual(upload.received, 150)
+        # The retry lands on a worker without the running hash
+        ChunkedUploadService._hashers.clear()
+        upload = self.send(upload, 150, 550)
+        upload = self.send(upload, 550, 950)
+        upload = self.send(upload, 950, 1000)
+
+        self.assertEqual(upload.status, 'complete')
+        self.assertEqual(upload.blob.sha256, SHA256)
+
+    def test_checksum_mismatch_fails_the_upload(self):
+        upload = self.start(sha256='0' * 64)
+        for offset in (0, 400, 800):
+            upload = self.send(upload, offset, min(offset + 400, len(CONTENT)))
+
+        self.assertEqual((upload.status, upload.error), ('failed', 'Checksum mismatch'))
+        self.assertFalse(DocumentBlob.objects.exists())
+        with self.assertRaisesMessage(UploadError, 'Checksum mismatch'):
+            self.send(upload, 1000, 1000)
+
+    def test_known_content_completes_without_sending_bytes(self):
+        blob = make_document(content=CONTENT).blob
+
+        upload = self.start(sha256=SHA256.upper())
+
+        self.assertEqual((upload.status, upload.received, upload.blob), ('complete', len(CONTENT), blob))
+
+    def test_identical_uploads_share_one_blob(self):
+        blobs = []
+        for _ in range(2):
+            upload = self.start()
+            for offset in (0, 400, 800):
+                upload = self.send(upload, offset, min(offset + 400, len(CONTENT)))
+            blobs.append(upload.blob)
+
+        self.assertEqual(blobs[0], blobs[1])
+        self.assertEqual(DocumentBlob.objects.count(), 1)
+
+    def test_bad_starts_are_refused(self):
+        for filename, size, sha256 in (('', 10, ''), ('a.pdf', 0, ''), ('a.pdf', 10, 'xyz')):
+            with self.subTest(filename=filename, size=size, sha256=sha256):
+                with self.assertRaises(UploadError):
+                    ChunkedUploadService.start(self.staff, filename, size, sha256)
+
+    def test_attach_creates_the_document_once(self):
+        upload = self.start()
+        for offset in (0, 400, 800):
+            upload = self.send(upload, offset, min(offset + 400, len(CONTENT)))
+
+        document = ChunkedUploadService.attach(
+            upload, Document(title='Rapport', document_type='service_report', customer=make_user())
+        )
+
+        self.assertEqual((document.blob, document.original_filename), (upload.blob, 'rapport.pdf'))
+        self.assertEqual(document.download_filename, 'rapport.pdf')
+        with self.assertRaises(UploadError):
+            ChunkedUploadService.attach(
+                upload, Document(title='Encore', document_type='other', customer=document.customer)
+            )
+
+    def test_incomplete_uploads_cannot_be_attached(self):
+        with self.assertRaises(UploadError):
+            ChunkedUploadService.attach(self.start(), Document(title='Rapport', document_type='other'))
+
+    def test_idle_uploads_expire_and_lose_their_part(self):
+        upload = self.send(self.start(), 0, 400)
+        DocumentUpload.objects.filter(pk=upload.pk).update(updated_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(ChunkedUploadService.expire(), 1)
+
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.error), ('failed', 'Expired'))
+        self.assertFalse(os.path.exists(ChunkedUploadService.part_path(upload)))
+
+
+class DocumentBlobTests(UploadTestMixin, TestCase):
+    def test_documents_with_the_same_content_share_a_file(self):
+        first = make_document(content=CONTENT, filename='a.pdf')
+        second = make_document(content=CONTENT, filename='b.pdf')
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(second.download_filename, 'b.pdf')
+        self.assertEqual(DocumentBlob.objects.count(), 1)
+
+    def test_legacy_documents_are_moved_onto_blobs(self):
+        old_name = default_storage.save('documents/old.pdf', io.BytesIO(CONTENT))
+        legacy = Document.objects.create(title='Ancien', document_type='other', customer=make_user(), file=old_name)
+        existing = make_document(content=CONTENT)
+
+        self.assertEqual(DocumentBlobService.deduplicate(), (1, 1))
+
+        legacy.refresh_from_db()
+        self.assertEqual((legacy.blob, legacy.original_filename), (existing.blob, 'old.pdf'))
+        self.assertFalse(default_storage.exists(old_name))
+
+    def test_prune_keeps_blobs_of_recent_unattached_uploads(self):
+        orphan = make_document(content=b'orphan')
+        orphan_blob = orphan.blob
+        orphan.delete()
+        upload = ChunkedUploadService.start(self.staff, 'x.txt', len(CONTENT))
+        upload = ChunkedUploadService.write_chunk(upload, 0, 400, io.BytesIO(CONTENT[:400]))
+        upload = ChunkedUploadService.write_chunk(upload, 400, 400, io.BytesIO(CONTENT[400:800]))
+        upload = ChunkedUploadService.write_chunk(upload, 800, 200, io.BytesIO(CONTENT[800:]))
+
+        self.assertEqual(DocumentBlobService.prune(), 1)
+
+        self.assertFalse(DocumentBlob.objects.filter(pk=orphan_blob.pk).exists())
+        self.assertFalse(default_storage.exists(orphan_blob.file.name))
+        self.assertTrue(DocumentBlob.objects.filter(pk=upload.blob_id).exists())
+
+    def test_clean_command_reports(self):
+        out = io.StringIO()
+
+        call_command('clean_document_storage', stdout=out)
+
+        self.assertIn('expired 0 uploads, pruned 0 blobs', out.getvalue())
+
+
+class DocumentUploadViewTests(UploadTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.staff)
+
+    def put(self, upload_id, first, last):
+        return self.client.put(
+            reverse('support:document_upload', args=[upload_id]), CONTENT[first:last + 1],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {first}-{last}/{len(CONTENT)}',
+        )
+
+    def test_upload_in_chunks_then_create_the_document(self):
+        started = self.client.post(reverse('support:document_upload_start'), {
+            'filename': 'rapport.pdf', 'size': len(CONTENT), 'sha256': SHA256,
+        })
+        upload_id = started.json()['upload_id']
+
+        self.assertEqual(started.status_code, 201)
+        self.assertEqual(self.put(upload_id, 0, 399).json()['offset'], 400)
+        conflict = self.put(upload_id, 800, 999)
+        self.assertEqual((conflict.status_code, conflict.json()['offset']), (409, 400))
+        self.put(upload_id, 400, 799)
+        self.assertEqual(self.put(upload_id, 800, 999).json()['status'], 'complete')
+
+        customer = make_user()
+        response = self.client.post(reverse('support:document_upload_complete', args=[upload_id]), {
+            'title': 'Rapport', 'document_type': 'service_report', 'customer': customer.pk,
+        })
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['sha256'], SHA256)
+        self.assertEqual(Document.objects.get().customer, customer)
+
+    def test_missing_content_range_is_rejected(self):
+        upload = ChunkedUploadService.start(self.staff, 'a.txt', len(CONTENT))
+
+        response = self.client.put(reverse('support:document_upload', args=[upload.upload_id]), CONTENT[:10],
+                                   content_type='application/octet-stream')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_uploads_of_other_staff_are_hidden(self):
+        upload = ChunkedUploadService.start(make_user(user_type='staff'), 'a.txt', len(CONTENT))
+
+        self.assertEqual(self.client.get(reverse('support:document_upload', args=[upload.upload_id])).status_code, 404)
+
+    def test_customers_cannot_upload(self):
+        self.client.force_login(make_user())
+
+        response = self.client.post(reverse('support:document_upload_start'), {'filename': 'a.txt', 'size': 10})
+
+        self.assertEqual(response.status_code, 404)
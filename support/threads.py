@@ -0,0 +1,65 @@
+"""
+Ticket conversation threads for KeyReport IT Store
+Loads ticket responses newest page first, with authors joined and internal notes filtered per viewer
+"""
+
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.utils.formats import date_format
+from django.utils.timezone import localtime
+
+from .models import SupportTicket, TicketResponse
+
+# Columns a thread needs from responses and their authors
+THREAD_FIELDS = (
+    'id', 'ticket', 'message', 'is_internal', 'created_at',
+    'author', 'author__id', 'author__email', 'author__first_name', 'author__last_name',
+)
+
+
+def get_thread_page_size() -> int:
+    return getattr(settings, 'SUPPORT_THREAD_PAGE_SIZE', 20)
+
+
+class TicketThreadService:
+    """Service class to load a ticket's responses page by page."""
+
+    @staticmethod
+    def responses(ticket: SupportTicket, user):
+        """Responses of ``ticket`` visible to ``user``; only staff see internal notes."""
+        responses = TicketResponse.objects.filter(ticket=ticket)
+        if not (user.is_authenticated and user.is_staff_member()):
+            responses = responses.filter(is_internal=False)
+        return responses.select_related('author').only(*THREAD_FIELDS)
+
+    @staticmethod
+    def page(ticket: SupportTicket, user, before: Optional[int] = None,
+             limit: Optional[int] = None) -> Tuple[List[TicketResponse], bool]:
+        """
+        The ``limit`` most recent responses older than response id
+        ``before`` (or the latest ones), in chronological order, and
+        whether older responses remain.
+
+        Pages are cut on the response id rather than with OFFSET, so
+        loading older messages costs the same however long the thread.
+        """
+        limit = limit or get_thread_page_size()
+        responses = TicketThreadService.responses(ticket, user)
+        if before:
+            responses = responses.filter(id__lt=before)
+        rows = list(responses.order_by('-id')[:limit + 1])
+        has_older = len(rows) > limit
+        return rows[:limit][::-1], has_older
+
+    @staticmethod
+    def serialize(response: TicketResponse) -> dict:
+        author = response.author
+        return {
+            'id': response.id,
+            'author': author.get_full_name() or author.email,
+            'is_internal': response.is_internal,
+            'message': response.message,
+            'created_at': response.created_at.isoformat(),
+            'created_display': date_format(localtime(response.created_at), 'M d, Y H:i'),
+        }
@@ -0,0 +1,187 @@
+"""
+Ticket listing for KeyReport IT Store
+Projected, index-friendly ticket lists and incrementally maintained status/priority counters
+"""
+
+import logging
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Substr
+
+from .models import SupportTicket, TicketCounter
+
+logger = logging.getLogger(__name__)
+
+# Scope of the counters that cover every ticket (what staff see)
+ALL_SCOPE = 'all'
+
+# Columns rendered by the ticket list; everything else stays in the database
+LIST_FIELDS = (
+    'id', 'ticket_number', 'title', 'ticket_type', 'priority', 'status', 'created_at',
+    'customer', 'assigned_to',
+    'customer__id', 'customer__email', 'customer__first_name', 'customer__last_name',
+    'assigned_to__id', 'assigned_to__email', 'assigned_to__first_name', 'assigned_to__last_name',
+)
+
+# Characters of the description shown as an excerpt in the list
+EXCERPT_LENGTH = 200
+
+CounterKey = Tuple[int, str, str]
+
+
+def get_page_size() -> int:
+    return getattr(settings, 'SUPPORT_TICKETS_PER_PAGE', 20)
+
+
+class TicketCounterService:
+    """
+    Service class to keep per-status and per-priority ticket counts.
+
+    One row per (scope, status, priority) is kept for every customer and
+    for the ``all`` scope, so badge totals and the count of any filter
+    combination are a sum over at most 20 rows instead of a COUNT over
+    the tickets table.
+    """
+
+    @staticmethod
+    def _add(scope: str, status: str, priority: str, delta: int) -> None:
+        updated = TicketCounter.objects.filter(
+            scope=scope, status=status, priority=priority
+        ).update(count=F('count') + delta)
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                TicketCounter.objects.create(scope=scope, status=status, priority=priority, count=delta)
+        except IntegrityError:
+            # Another request created the row first
+            TicketCounter.objects.filter(
+                scope=scope, status=status, priority=priority
+            ).update(count=F('count') + delta)
+
+    @staticmethod
+    def move(previous: Optional[CounterKey], current: Optional[CounterKey]) -> None:
+        """
+        Move one ticket from the ``previous`` (customer id, status,
+        priority) bucket to ``current``. ``None`` means the ticket did
+        not exist before (creation) or does not exist any more (deletion).
+        """
+        for key, delta in ((previous, -1), (current, 1)):
+            if key is None:
+                continue
+            customer_id, status, priority = key
+            TicketCounterService._add(ALL_SCOPE, status, priority, delta)
+            TicketCounterService._add(str(customer_id), status, priority, delta)
+
+    @staticmethod
+    def scope_for(user) -> Optional[str]:
+        """Counter scope of the tickets ``user`` may list, or None for none."""
+        if not user.is_authenticated:
+            return None
+        return ALL_SCOPE if user.is_staff_member() else str(user.pk)
+
+    @staticmethod
+    def badges(scope: Optional[str]) -> Dict[str, Dict[str, int]]:
+        """
+        Ticket counts of a scope as ``{'status': {...}, 'priority': {...},
+        'total': n}``, with every choice present.
+        """
+        by_status = Counter({value: 0 for value, _ in SupportTicket.STATUS_CHOICES})
+        by_priority = Counter({value: 0 for value, _ in SupportTicket.PRIORITY_CHOICES})
+        if scope is not None:
+            for status, priority, count in TicketCounter.objects.filter(scope=scope).order_by().values_list(
+                'status', 'priority', 'count'
+            ):
+                by_status[status] += count
+                by_priority[priority] += count
+        return {
+            'status': dict(by_status),
+            'priority': dict(by_priority),
+            'total': sum(by_status.values()),
+        }
+
+    @staticmethod
+    def count(scope: Optional[str], status: Optional[str] = None, priority: Optional[str] = None) -> int:
+        """Number of tickets of a scope matching the list filters."""
+        if scope is None:
+            return 0
+        counters = TicketCounter.objects.filter(scope=scope)
+        if status:
+            counters = counters.filter(status=status)
+        if priority:
+            counters = counters.filter(priority=priority)
+        return counters.aggregate(total=Sum('count'))['total'] or 0
+
+    @staticmethod
+    def rebuild() -> int:
+        """Recompute every counter from the tickets table; returns the number of rows written."""
+        totals: Counter = Counter()
+        rows = SupportTicket.objects.values('customer_id', 'status', 'priority').annotate(n=Count('id')).order_by()
+        for row in rows:
+            totals[(ALL_SCOPE, row['status'], row['priority'])] += row['n']
+            totals[(str(row['customer_id']), row['status'], row['priority'])] += row['n']
+
+        with transaction.atomic():
+            TicketCounter.objects.all().delete()
+            TicketCounter.objects.bulk_create([
+                TicketCounter(scope=scope, status=status, priority=priority, count=count)
+                for (scope, status, priority), count in totals.items()
+            ])
+        logger.info('Rebuilt %s ticket counters', len(totals))
+        return len(totals)
+
+
+class TicketListService:
+    """Service class to build the support ticket list."""
+
+    @staticmethod
+    def list_queryset(user, status: Optional[str] = None, priority: Optional[str] = None):
+        """
+        Tickets ``user`` may see, newest first, with only the list columns.
+
+        Customer and assignee come from the same query; the description is
+        reduced to an ``excerpt`` in SQL. The filters line up with the
+        (status, priority, created_at) indexes.
+        """
+        scope = TicketCounterService.scope_for(user)
+        if scope is None:
+            return SupportTicket.objects.none()
+
+        tickets = SupportTicket.objects.all()
+        if scope != ALL_SCOPE:
+            tickets = tickets.filter(customer=user)
+        if status:
+            tickets = tickets.filter(status=status)
+        if priority:
+            tickets = tickets.filter(priority=priority)
+
+        return (
+            tickets.select_related('customer', 'assigned_to')
+            .only(*LIST_FIELDS)
+            .annotate(excerpt=Substr('description', 1, EXCERPT_LENGTH))
+            .order_by('-created_at', '-id')
+        )
+
+    @staticmethod
+    def page(user, status: Optional[str] = None, priority: Optional[str] = None,
+             page_number=None, per_page: Optional[int] = None):
+        """
+        Return (page, badges) for the ticket list.
+
+        The paginator is handed the count from the counters, so a page
+        costs one SELECT with LIMIT/OFFSET plus one read of the counters.
+        """
+        scope = TicketCounterService.scope_for(user)
+        badges = TicketCounterService.badges(scope)
+
+        paginator = Paginator(TicketListService.list_queryset(user, status, priority), per_page or get_page_size())
+        if not status and not priority:
+            paginator.count = badges['total']
+        else:
+            paginator.count = TicketCounterService.count(scope, status, priority)
+        return paginator.get_page(page_number), badges
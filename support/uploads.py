@@ -0,0 +1,314 @@
+"""
+Document uploads for KeyReport IT Store
+Resumable chunked uploads hashed while they stream, stored once per distinct content
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Tuple
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Document, DocumentBlob, DocumentUpload
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# Running hashes kept per process, so a chunk only hashes its own bytes
+MAX_CACHED_HASHERS = 256
+
+
+class UploadError(Exception):
+    """Raised when an upload request cannot be applied."""
+
+
+class UploadOffsetMismatch(UploadError):
+    """Raised when a chunk does not start where the upload left off."""
+
+    def __init__(self, offset: int):
+        super().__init__(f'Upload is at byte {offset}')
+        self.offset = offset
+
+
+def get_chunk_size() -> int:
+    return getattr(settings, 'DOCUMENT_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)
+
+
+def get_max_size() -> int:
+    return getattr(settings, 'DOCUMENT_UPLOAD_MAX_SIZE', 100 * 1024 * 1024)
+
+
+def get_parts_dir() -> str:
+    """Local directory holding partial uploads; must be shared by all workers."""
+    return getattr(settings, 'DOCUMENT_UPLOAD_PARTS_DIR', os.path.join(tempfile.gettempdir(), 'document-uploads'))
+
+
+def get_expiry() -> timedelta:
+    return timedelta(hours=getattr(settings, 'DOCUMENT_UPLOAD_EXPIRY_HOURS', 24))
+
+
+def blob_name(sha256: str, filename: str) -> str:
+    """Storage path of a blob: sharded by hash, keeping the extension for content sniffing."""
+    extension = os.path.splitext(filename)[1].lower()[:10]
+    return f"documents/blobs/{sha256[:2]}/{sha256}{extension}"
+
+
+class DocumentBlobService:
+    """Service class to store document content once per SHA-256."""
+
+    @staticmethod
+    def hash_file(file) -> Tuple[str, int]:
+        """SHA-256 and size of a file, read in chunks."""
+        digest = hashlib.sha256()
+        size = 0
+        file.seek(0)
+        for chunk in file.chunks(READ_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+        file.seek(0)
+        return digest.hexdigest(), size
+
+    @staticmethod
+    def store(file, filename: str) -> DocumentBlob:
+        """The blob holding the content of ``file``, written only if it is new."""
+        sha256, size = DocumentBlobService.hash_file(file)
+        return DocumentBlob.objects.filter(sha256=sha256).first() or DocumentBlobService.create(
+            sha256, size, file, filename
+        )
+
+    @staticmethod
+    def create(sha256: str, size: int, file, filename: str) -> DocumentBlob:
+        """Write a new blob; if another request stored the same content first, use that one."""
+        name = default_storage.save(blob_name(sha256, filename), file)
+        try:
+            with transaction.atomic():
+                return DocumentBlob.objects.create(sha256=sha256, file=name, size=size)
+        except IntegrityError:
+            default_storage.delete(name)
+            return DocumentBlob.objects.get(sha256=sha256)
+
+    @staticmethod
+    def deduplicate() -> Tuple[int, int]:
+        """
+        Move documents stored before blobs existed onto blobs and delete
+        the files no document points at any more. Returns (documents
+        moved, files deleted).
+        """
+        moved = deleted = 0
+        documents = Document.objects.filter(blob__isnull=True).exclude(file='').only('id', 'file', 'original_filename')
+        for document in documents.iterator(chunk_size=200):
+            old_name = document.file.name
+            if not default_storage.exists(old_name):
+                logger.warning('Document %s points at missing file %s', document.id, old_name)
+                continue
+            with default_storage.open(old_name, 'rb') as handle:
+                blob = DocumentBlobService.store(File(handle), old_name)
+            Document.objects.filter(pk=document.pk).update(
+                blob=blob, file=blob.file.name,
+                original_filename=document.original_filename or os.path.basename(old_name),
+            )
+            moved += 1
+            if old_name != blob.file.name and not Document.objects.filter(file=old_name).exists():
+                default_storage.delete(old_name)
+                deleted += 1
+        return moved, deleted
+
+    @staticmethod
+    def prune() -> int:
+        """Delete blobs no document refers to, except those of recent uploads not yet attached."""
+        pending = DocumentUpload.objects.filter(
+            status='complete', document__isnull=True, blob__isnull=False,
+            updated_at__gte=timezone.now() - get_expiry(),
+        ).values('blob')
+        orphans = DocumentBlob.objects.filter(documents__isnull=True).exclude(id__in=pending)
+        pruned = 0
+        for blob in orphans:
+            name = blob.file.name
+            blob.delete()
+            default_storage.delete(name)
+            pruned += 1
+        return pruned
+
+
+class ChunkedUploadService:
+    """
+    Resumable uploads sent as consecutive byte ranges.
+
+    Chunks are appended to a part file while the SHA-256 is updated with
+    the same bytes; the running hash is cached per process and rebuilt
+    from the part file when a chunk lands on another worker. Once the
+    last byte arrives the content is stored as a DocumentBlob, or the
+    existing blob with that hash is reused.
+    """
+
+    _hashers: 'OrderedDict[str, Tuple[int, object]]' = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def part_path(upload: DocumentUpload) -> str:
+        return os.path.join(get_parts_dir(), f'{upload.upload_id}.part')
+
+    @staticmethod
+    def start(user, filename: str, size: int, sha256: str = '') -> DocumentUpload:
+        """
+        Open an upload. When the client sends the SHA-256 of content that
+        is already stored, the upload completes at once with no bytes sent.
+        """
+        filename = os.path.basename(filename or '').strip()
+        sha256 = (sha256 or '').strip().lower()
+        if not filename:
+            raise UploadError('filename is required')
+        if size <= 0 or size > get_max_size():
+            raise UploadError(f'size must be between 1 and {get_max_size()} bytes')
+        if sha256 and not SHA256_RE.match(sha256):
+            raise UploadError('sha256 must be 64 hexadecimal characters')
+
+        upload = DocumentUpload(uploaded_by=user, filename=filename[:255], size=size, sha256=sha256)
+        blob = DocumentBlob.objects.filter(sha256=sha256, size=size).first() if sha256 else None
+        if blob:
+            upload.blob, upload.received, upload.status = blob, size, 'complete'
+        upload.save()
+        return upload
+
+    @classmethod
+    def _hasher(cls, upload: DocumentUpload, path: str):
+        """The running hash of the first ``upload.received`` bytes."""
+        key = str(upload.upload_id)
+        with cls._lock:
+            cached = cls._hashers.pop(key, None)
+        if cached and cached[0] == upload.received:
+            return cached[1]
+        digest = hashlib.sha256()
+        remaining = upload.received
+        with open(path, 'rb') as part:
+            while remaining > 0:
+                data = part.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                digest.update(data)
+                remaining -= len(data)
+        return digest
+
+    @classmethod
+    def _remember(cls, upload: DocumentUpload, digest) -> None:
+        with cls._lock:
+            cls._hashers[str(upload.upload_id)] = (upload.received, digest)
+            while len(cls._hashers) > MAX_CACHED_HASHERS:
+                cls._hashers.popitem(last=False)
+
+    @classmethod
+    def write_chunk(cls, upload: DocumentUpload, offset: int, length: int, stream) -> DocumentUpload:
+        """
+        Append ``length`` bytes read from ``stream`` at byte ``offset``.
+
+        The chunk must start at ``upload.received``; anything else raises
+        UploadOffsetMismatch with the offset to resume from. If the client
+        drops mid-chunk the bytes read so far are kept, so the retry only
+        sends the rest.
+        """
+        with transaction.atomic():
+            upload = DocumentUpload.objects.select_for_update().get(pk=upload.pk)
+            if upload.status != 'uploading':
+                if upload.status == 'complete':
+                    return upload
+                raise UploadError(upload.error or 'Upload failed')
+            if offset != upload.received:
+                raise UploadOffsetMismatch(upload.received)
+            if length <= 0 or length > get_chunk_size() or offset + length > upload.size:
+                raise UploadError(f'Chunks must be 1 to {get_chunk_size()} bytes within the declared size')
+
+            path = cls.part_path(upload)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'ab') as part:
+                # Drop bytes written by an attempt that never got recorded
+                part.truncate(upload.received)
+                digest = cls._hasher(upload, path)
+                remaining = length
+                while remaining > 0:
+                    try:
+                        data = stream.read(min(READ_SIZE, remaining))
+                    except OSError:
+                        break
+                    if not data:
+                        break
+                    part.write(data)
+                    digest.update(data)
+                    remaining -= len(data)
+
+            upload.received += length - remaining
+            upload.save(update_fields=['received', 'updated_at'])
+            if upload.received == upload.size:
+                cls._finish(upload, path, digest.hexdigest())
+            else:
+                cls._remember(upload, digest)
+        return upload
+
+    @staticmethod
+    def _finish(upload: DocumentUpload, path: str, sha256: str) -> None:
+        if upload.sha256 and upload.sha256 != sha256:
+            upload.status, upload.error = 'failed', 'Checksum mismatch'
+        else:
+            blob = DocumentBlob.objects.filter(sha256=sha256).first()
+            if blob is None:
+                with open(path, 'rb') as part:
+                    blob = DocumentBlobService.create(sha256, upload.size, File(part), upload.filename)
+            upload.blob, upload.status = blob, 'complete'
+        upload.save(update_fields=['blob', 'status', 'error', 'updated_at'])
+        transaction.on_commit(lambda: os.path.exists(path) and os.remove(path))
+
+    @staticmethod
+    def attach(upload: DocumentUpload, document: Document) -> Document:
+        """Save ``document`` (unsaved, built from a DocumentForm) pointing at the upload's blob."""
+        if upload.status != 'complete' or upload.blob is None:
+            raise UploadError('Upload is not complete')
+        if upload.document_id:
+            raise UploadError('Upload is already attached to a document')
+        document.blob = upload.blob
+        document.file = upload.blob.file.name
+        document.original_filename = upload.filename
+        with transaction.atomic():
+            document.save()
+            upload.document = document
+            upload.save(update_fields=['document', 'updated_at'])
+        return document
+
+    @staticmethod
+    def expire() -> int:
+        """Fail uploads idle for longer than DOCUMENT_UPLOAD_EXPIRY_HOURS and delete their parts."""
+        stale = DocumentUpload.objects.filter(status='uploading', updated_at__lt=timezone.now() - get_expiry())
+        expired = 0
+        for upload in stale:
+            path = ChunkedUploadService.part_path(upload)
+            if os.path.exists(path):
+                os.remove(path)
+            expired += DocumentUpload.objects.filter(pk=upload.pk, status='uploading').update(
+                status='failed', error='Expired', updated_at=timezone.now()
+            )
+        return expired
+
+    @staticmethod
+    def serialize(upload: DocumentUpload) -> dict:
+        return {
+            'upload_id': str(upload.upload_id),
+            'filename': upload.filename,
+            'size': upload.size,
+            'offset': upload.received,
+            'status': upload.status,
+            'error': upload.error,
+            'chunk_size': get_chunk_size(),
+            'sha256': upload.blob.sha256 if upload.blob_id else None,
+            'document': upload.document_id,
+        }
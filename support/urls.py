@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import admin_views, views
 
 app_name = 'support'
 
@@ -8,6 +8,7 @@ urlpatterns = [
     path('tickets/', views.ticket_list, name='ticket_list'),
     path('ticket/new/', views.ticket_create, name='ticket_create'),
     path('ticket/<int:pk>/', views.ticket_detail, name='ticket_detail'),
+    path('ticket/<int:pk>/responses/', views.ticket_responses, name='ticket_responses'),
     path('ticket/<int:pk>/edit/', views.ticket_update, name='ticket_update'),
     path('ticket/<int:pk>/close/', views.ticket_close, name='ticket_close'),
     
@@ -16,9 +17,17 @@ urlpatterns = [
     path('service/new/', views.service_create, name='service_create'),
     path('service/<int:pk>/', views.service_detail, name='service_detail'),
     path('service/<int:pk>/edit/', views.service_update, name='service_update'),
+    path('service/<int:pk>/book/', views.service_book, name='service_book'),
+    path('services/slots/', views.service_slots, name='service_slots'),
     
     # Documents
     path('documents/', views.document_list, name='document_list'),
     path('document/<int:pk>/', views.document_detail, name='document_detail'),
     path('document/<int:pk>/download/', views.document_download, name='document_download'),
+    path('documents/uploads/', views.document_upload_start, name='document_upload_start'),
+    path('documents/uploads/<uuid:upload_id>/', views.document_upload, name='document_upload'),
+    path('documents/uploads/<uuid:upload_id>/complete/', views.document_upload_complete, name='document_upload_complete'),
+    
+    # Staff
+    path('staff/dashboard/', admin_views.support_dashboard, name='support_dashboard'),
 ]
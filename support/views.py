@@ -2,45 +2,52 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.http import HttpResponse, Http404
+from django.http import Http404, JsonResponse
 from django.utils import timezone
+from django.views.decorators.http import require_http_methods, require_POST
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy
-import os
+from django.contrib.auth import get_user_model
+from datetime import datetime
+import re
 
-from .models import SupportTicket, ServiceRequest, Document, TicketResponse
-from .forms import SupportTicketForm, ServiceRequestForm
+from store.sequences import SequenceService
+
+from .models import SupportTicket, ServiceRequest, Document, DocumentUpload, TicketResponse
+from .downloads import DocumentDownloadService
+from .extraction import DocumentTextPipeline
+from .forms import DocumentForm, SupportTicketForm, ServiceRequestForm
+from .scheduling import OutsideWorkingHours, SchedulingConflict, SchedulingService
+from .search import DocumentSearchService, TicketSearchService
+from .threads import TicketThreadService
+from .ticket_service import TicketListService
+from .uploads import ChunkedUploadService, UploadError, UploadOffsetMismatch
+
+User = get_user_model()
 
 
 def ticket_list(request):
     """List support tickets."""
-    if request.user.is_authenticated:
-        if request.user.is_staff_member():
-            # Staff can see all tickets
-            tickets = SupportTicket.objects.all()
-        else:
-            # Customers can only see their own tickets
-            tickets = SupportTicket.objects.filter(customer=request.user)
-    else:
-        tickets = SupportTicket.objects.none()
-    
-    # Filtering
     status = request.GET.get('status')
-    if status:
-        tickets = tickets.filter(status=status)
-    
     priority = request.GET.get('priority')
-    if priority:
-        tickets = tickets.filter(priority=priority)
+    query = request.GET.get('q', '').strip()
     
-    # Pagination
-    paginator = Paginator(tickets, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Staff see all tickets, customers only their own; the page count and
+    # filter badges come from the ticket counters rather than a COUNT
+    if query:
+        page_obj, badges = TicketSearchService.page(
+            request.user, query, status, priority, page_number=request.GET.get('page')
+        )
+    else:
+        page_obj, badges = TicketListService.page(
+            request.user, status, priority, page_number=request.GET.get('page')
+        )
     
     context = {
         'tickets': page_obj,
+        'badges': badges,
+        'search_query': query,
         'status_filter': status,
         'priority_filter': priority,
     }
@@ -55,7 +62,7 @@ def ticket_create(request):
         if form.is_valid():
             ticket = form.save(commit=False)
             ticket.customer = request.user
-            ticket.ticket_number = f"TKT-{request.user.id}-{int(timezone.now().timestamp())}"
+            ticket.ticket_number = SequenceService.next_number('ticket')
             ticket.save()
             
             messages.success(request, 'Support ticket created successfully!')
@@ -72,7 +79,7 @@ def ticket_create(request):
 
 def ticket_detail(request, pk):
     """View ticket details."""
-    ticket = get_object_or_404(SupportTicket, pk=pk)
+    ticket = get_object_or_404(SupportTicket.objects.select_related('customer', 'assigned_to', 'related_product'), pk=pk)
     
     # Check if user has permission to view this ticket
     if not request.user.is_authenticated or (
@@ -88,18 +95,46 @@ def ticket_detail(request, pk):
                 ticket=ticket,
                 author=request.user,
                 message=message,
-                is_internal=request.user.is_staff_member()
+                # Staff replies stay internal unless explicitly shown to the customer
+                is_internal=request.user.is_staff_member() and not request.POST.get('visible_to_customer')
             )
             messages.success(request, 'Response added successfully!')
             return redirect('support:ticket_detail', pk=ticket.pk)
     
+    # Latest page only; older responses are fetched from ticket_responses
+    responses, has_older = TicketThreadService.page(ticket, request.user)
+    
     context = {
         'ticket': ticket,
-        'responses': ticket.responses.all(),
+        'responses': responses,
+        'has_older_responses': has_older,
     }
     return render(request, 'support/ticket_detail.html', context)
 
 
+def ticket_responses(request, pk):
+    """Older responses of a ticket as JSON, for loading the thread on scroll."""
+    ticket = get_object_or_404(SupportTicket.objects.only('id', 'customer'), pk=pk)
+    
+    if not request.user.is_authenticated or (
+        not request.user.is_staff_member() and 
+        ticket.customer_id != request.user.pk
+    ):
+        raise Http404("Ticket not found.")
+    
+    try:
+        before = int(request.GET['before']) if request.GET.get('before') else None
+    except ValueError:
+        return JsonResponse({'error': 'before must be a response id'}, status=400)
+    
+    responses, has_older = TicketThreadService.page(ticket, request.user, before=before)
+    return JsonResponse({
+        'responses': [TicketThreadService.serialize(response) for response in responses],
+        'has_older': has_older,
+        'before': responses[0].id if responses else None,
+    })
+
+
 @login_required
 def ticket_update(request, pk):
     """Update a support ticket."""
@@ -191,7 +226,7 @@ def service_create(request):
         if form.is_valid():
             service = form.save(commit=False)
             service.customer = request.user
-            service.request_number = f"SRV-{request.user.id}-{int(timezone.now().timestamp())}"
+            service.request_number = SequenceService.next_number('service')
             service.save()
             
             messages.success(request, 'Service request created successfully!')
@@ -249,6 +284,76 @@ def service_update(request, pk):
     return render(request, 'support/service_form.html', context)
 
 
+@login_required
+def service_slots(request):
+    """Next free technician slots for a city, as JSON (staff only)."""
+    if not request.user.is_staff_member():
+        raise Http404("Permission denied.")
+    
+    city = request.GET.get('city', '').strip()
+    if not city:
+        return JsonResponse({'error': 'city is required'}, status=400)
+    try:
+        duration = int(request.GET.get('duration', 60))
+        count = min(int(request.GET.get('count', 5)), 50)
+        after = request.GET.get('after')
+        after = datetime.strptime(after, '%Y-%m-%dT%H:%M') if after else None
+    except ValueError:
+        return JsonResponse({'error': 'duration and count must be integers, after YYYY-MM-DDTHH:MM'}, status=400)
+    if duration < 15:
+        return JsonResponse({'error': 'duration must be at least 15 minutes'}, status=400)
+    
+    slots = SchedulingService.next_free_slots(city, duration, count, after)
+    return JsonResponse({
+        'city': city,
+        'duration': duration,
+        'slots': [
+            {
+                'technician_id': slot.technician_id,
+                'start': slot.start.isoformat(timespec='minutes'),
+                'end': slot.end.isoformat(timespec='minutes'),
+            }
+            for slot in slots
+        ],
+    })
+
+
+@login_required
+@require_POST
+def service_book(request, pk):
+    """Book a technician for a service request; 400 outside working hours, 409 if the slot is taken (staff only)."""
+    if not request.user.is_staff_member():
+        raise Http404("Permission denied.")
+    
+    service = get_object_or_404(ServiceRequest, pk=pk)
+    try:
+        technician = get_object_or_404(
+            User, pk=int(request.POST['technician']), user_type__in=['staff', 'admin']
+        )
+        day = datetime.strptime(request.POST['date'], '%Y-%m-%d').date()
+        start = datetime.strptime(request.POST['time'], '%H:%M').time()
+        duration = int(request.POST.get('duration', 60))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'technician, date (YYYY-MM-DD) and time (HH:MM) are required'}, status=400)
+    if duration < 15:
+        return JsonResponse({'error': 'duration must be at least 15 minutes'}, status=400)
+    
+    try:
+        schedule = SchedulingService.book(service, technician, day, start, duration, request.POST.get('notes', ''))
+    except OutsideWorkingHours as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except SchedulingConflict as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    
+    return JsonResponse({
+        'service': service.request_number,
+        'technician_id': schedule.technician_id,
+        'date': schedule.scheduled_date.isoformat(),
+        'time': schedule.scheduled_time.strftime('%H:%M'),
+        'duration': schedule.estimated_duration,
+    }, status=201)
+
+
 def document_list(request):
     """List documents."""
     if request.user.is_authenticated:
@@ -263,17 +368,30 @@ def document_list(request):
     
     # Filtering
     document_type = request.GET.get('document_type')
-    if document_type:
-        documents = documents.filter(document_type=document_type)
+    query = request.GET.get('q', '').strip()
     
-    # Pagination
-    paginator = Paginator(documents, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Make sure this process works through documents still waiting for extraction
+    DocumentTextPipeline.start_poller()
+    
+    if query:
+        # Ranked from the text index, so files are never opened here
+        page_obj = DocumentSearchService.page(
+            request.user, query, document_type, page_number=request.GET.get('page')
+        )
+    else:
+        if document_type:
+            documents = documents.filter(document_type=document_type)
+        
+        # Pagination
+        paginator = Paginator(documents, 20)
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
     
     context = {
         'documents': page_obj,
         'document_type_filter': document_type,
+        'document_types': Document.DOCUMENT_TYPE_CHOICES,
+        'search_query': query,
     }
     return render(request, 'support/document_list.html', context)
 
@@ -298,15 +416,88 @@ def document_detail(request, pk):
 @login_required
 def document_download(request, pk):
     """Download a document."""
-    document = get_object_or_404(Document, pk=pk)
+    document = get_object_or_404(Document.objects.only('id', 'customer', 'file', 'original_filename'), pk=pk)
     
     # Check if user has permission to download this document
-    if not request.user.is_staff_member() and document.customer != request.user:
+    if not request.user.is_staff_member() and document.customer_id != request.user.pk:
         raise Http404("Document not found.")
     
-    if document.file and os.path.exists(document.file.path):
-        response = HttpResponse(document.file, content_type='application/octet-stream')
-        response['Content-Disposition'] = f'attachment; filename="{os.path.basename(document.file.name)}"'
-        return response
-    else:
-        raise Http404("File not found.")
+    # Streamed in chunks (or sent by the front-end server) with Range and
+    # ETag support, so large service reports never sit in worker memory
+    return DocumentDownloadService.serve(request, document.file, filename=document.download_filename)
+
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+@login_required
+@require_POST
+def document_upload_start(request):
+    """Open a chunked document upload (staff only)."""
+    if not request.user.is_staff_member():
+        raise Http404("Permission denied.")
+    
+    try:
+        upload = ChunkedUploadService.start(
+            request.user,
+            request.POST.get('filename', ''),
+            int(request.POST.get('size', 0)),
+            request.POST.get('sha256', ''),
+        )
+    except ValueError:
+        return JsonResponse({'error': 'size must be a number of bytes'}, status=400)
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse(ChunkedUploadService.serialize(upload), status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'PUT'])
+def document_upload(request, upload_id):
+    """
+    GET reports how far an upload got; PUT appends the chunk in the body,
+    placed by a ``Content-Range: bytes <first>-<last>/<size>`` header.
+    """
+    if not request.user.is_staff_member():
+        raise Http404("Permission denied.")
+    
+    upload = get_object_or_404(DocumentUpload, upload_id=upload_id, uploaded_by=request.user)
+    if request.method == 'PUT':
+        match = CONTENT_RANGE_RE.match(request.META.get('HTTP_CONTENT_RANGE', ''))
+        if not match or int(match.group(3)) != upload.size:
+            return JsonResponse({'error': f'Content-Range: bytes <first>-<last>/{upload.size} is required'}, status=400)
+        first, last = int(match.group(1)), int(match.group(2))
+        try:
+            upload = ChunkedUploadService.write_chunk(upload, first, last - first + 1, request)
+        except UploadOffsetMismatch as e:
+            return JsonResponse({'error': str(e), 'offset': e.offset}, status=409)
+        except UploadError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse(ChunkedUploadService.serialize(upload))
+
+
+@login_required
+@require_POST
+def document_upload_complete(request, upload_id):
+    """Create the document for a finished upload from the posted details (staff only)."""
+    if not request.user.is_staff_member():
+        raise Http404("Permission denied.")
+    
+    upload = get_object_or_404(
+        DocumentUpload.objects.select_related('blob'), upload_id=upload_id, uploaded_by=request.user
+    )
+    form = DocumentForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    try:
+        document = ChunkedUploadService.attach(upload, form.save(commit=False))
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    
+    return JsonResponse({
+        'document': document.pk,
+        'url': document.get_absolute_url(),
+        'sha256': document.blob.sha256,
+    }, status=201)